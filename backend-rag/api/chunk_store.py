@@ -0,0 +1,428 @@
+"""
+Almacén columnar de metadata de chunks (índice en memoria)
+
+Sustituye el dict por chunk: cada campo es una columna alineada con las filas
+de la matriz de vectores.
+
+- Campos de texto repetidos (document_id, collection, title, language...):
+  codificados por diccionario (array int32 de códigos + lista de valores).
+- Campos enteros (page_number, token_count, year...): int64 con centinela.
+- Campos float (ocr_confidence...): float64 (NaN = ausente).
+- content_hash: bytes de ancho fijo.
+- chunk_text: blob contiguo con offsets, opcionalmente comprimido por chunk
+  (zlib o zstd); solo se descomprime al materializar el top-k.
+- Cualquier otro campo se guarda tal cual en un dict disperso por fila.
+
+Los filtros de búsqueda se evalúan sobre los códigos (máscara numpy) y los
+resultados se materializan como dict solo para las filas devueltas.
+
+`save`/`load` persisten las columnas como ficheros .npy + blob; con
+`load(..., mmap=True)` el almacén es de solo lectura y sus páginas se
+comparten entre procesos (ver api/shared_index.py).
+"""
+import json
+import zlib
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+HASH_FIELD = "content_hash"
+HASH_WIDTH = 16
+TEXT_FIELD = "chunk_text"
+ID_FIELD = "chunk_id"
+
+_CODE_MISSING = -1
+_INT_MISSING = np.iinfo(np.int64).min
+
+
+class _CategoricalColumn:
+    """Columna de strings codificada por diccionario"""
+
+    def __init__(self):
+        self.codes = np.full(0, _CODE_MISSING, dtype=np.int32)
+        self.values: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+        return code
+
+    def codes_for(self, values: Iterable[str]) -> np.ndarray:
+        """Códigos de los valores conocidos (los desconocidos no existen en la columna)"""
+        return np.asarray(
+            [self.index[v] for v in values if v in self.index],
+            dtype=np.int32
+        )
+
+
+class ColumnarChunkStore:
+    """Metadata de chunks en columnas, una fila por vector"""
+
+    def __init__(self, compression: Optional[str] = None):
+        """
+        Args:
+            compression: Compresión del texto por chunk (None, "zlib" o "zstd")
+        """
+        if compression not in (None, "zlib", "zstd"):
+            raise ValueError(f"Unsupported text compression: {compression}")
+        self.compression = compression
+        if compression == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+        self.size = 0
+        self._capacity = 0
+        self._categorical: Dict[str, _CategoricalColumn] = {}
+        self._ints: Dict[str, np.ndarray] = {}
+        self._floats: Dict[str, np.ndarray] = {}
+        self._hashes = np.zeros(0, dtype=f"S{HASH_WIDTH}")
+        self._has_hash = np.zeros(0, dtype=bool)
+        self._extras: Dict[int, Dict[str, Any]] = {}
+
+        # Texto: blob append-only con (offset, longitud) por fila
+        self._blob = bytearray()
+        self._text_offsets = np.zeros(0, dtype=np.int64)
+        self._text_lengths = np.full(0, _CODE_MISSING, dtype=np.int32)
+        self._live_text_bytes = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    # ============ CAPACIDAD ============
+
+    def reserve(self, extra: int) -> None:
+        """Asegurar capacidad para `extra` filas nuevas (crecimiento geométrico)"""
+        needed = self.size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2, 1024)
+
+        def grow(array: np.ndarray, fill) -> np.ndarray:
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        for column in self._categorical.values():
+            column.codes = grow(column.codes, _CODE_MISSING)
+        for name, array in self._ints.items():
+            self._ints[name] = grow(array, _INT_MISSING)
+        for name, array in self._floats.items():
+            self._floats[name] = grow(array, np.nan)
+        self._hashes = grow(self._hashes, b"")
+        self._has_hash = grow(self._has_hash, False)
+        self._text_offsets = grow(self._text_offsets, 0)
+        self._text_lengths = grow(self._text_lengths, _CODE_MISSING)
+        self._capacity = capacity
+
+    def _column(self, name: str) -> _CategoricalColumn:
+        column = self._categorical.get(name)
+        if column is None:
+            column = _CategoricalColumn()
+            column.codes = np.full(self._capacity, _CODE_MISSING, dtype=np.int32)
+            self._categorical[name] = column
+        return column
+
+    def _numeric(self, columns: Dict[str, np.ndarray], name: str, fill, dtype) -> np.ndarray:
+        array = columns.get(name)
+        if array is None:
+            array = np.full(self._capacity, fill, dtype=dtype)
+            columns[name] = array
+        return array
+
+    # ============ ESCRITURA ============
+
+    def append(self, chunk: Dict[str, Any]) -> int:
+        """Añadir una fila (llamar antes a `reserve`). Devuelve el índice de fila"""
+        if self.size >= self._capacity:
+            self.reserve(1)
+        row = self.size
+        self.size += 1
+        self.set(row, chunk)
+        return row
+
+    def set(self, row: int, chunk: Dict[str, Any]) -> None:
+        """Escribir (o sobrescribir) la metadata de una fila"""
+        self._clear(row)
+        extras = {}
+
+        # Un campo va a columna solo si su tipo coincide con el de la columna
+        # existente; si no (o si no cabe), se guarda tal cual en extras
+        for name, value in chunk.items():
+            if name in (ID_FIELD, "embedding") or value is None:
+                continue
+            kind = type(value)
+            if name == TEXT_FIELD and kind is str:
+                self._set_text(row, value)
+            elif name == HASH_FIELD and kind is str and len(value) == HASH_WIDTH and value.isascii():
+                self._hashes[row] = value.encode("ascii")
+                self._has_hash[row] = True
+            elif kind is str and name not in self._ints and name not in self._floats:
+                column = self._column(name)
+                column.codes[row] = column.encode(value)
+            elif kind is int and name not in self._categorical and name not in self._floats \
+                    and _INT_MISSING < value < 2 ** 63:
+                self._numeric(self._ints, name, _INT_MISSING, np.int64)[row] = value
+            elif kind is float and name not in self._categorical and name not in self._ints \
+                    and value == value:
+                self._numeric(self._floats, name, np.nan, np.float64)[row] = value
+            else:
+                extras[name] = value
+
+        if extras:
+            self._extras[row] = extras
+        self._maybe_compact()
+
+    def _clear(self, row: int) -> None:
+        for column in self._categorical.values():
+            column.codes[row] = _CODE_MISSING
+        for array in self._ints.values():
+            array[row] = _INT_MISSING
+        for array in self._floats.values():
+            array[row] = np.nan
+        self._has_hash[row] = False
+        if self._text_lengths[row] >= 0:
+            self._live_text_bytes -= int(self._text_lengths[row])
+            self._text_lengths[row] = _CODE_MISSING
+        self._extras.pop(row, None)
+
+    def _set_text(self, row: int, text: str) -> None:
+        data = text.encode("utf-8")
+        if self.compression == "zlib":
+            data = zlib.compress(data, 1)
+        elif self.compression == "zstd":
+            data = self._compressor.compress(data)
+        self._text_offsets[row] = len(self._blob)
+        self._text_lengths[row] = len(data)
+        self._blob += data
+        self._live_text_bytes += len(data)
+
+    def move(self, src: int, dst: int) -> None:
+        """Copiar la fila `src` sobre `dst` (para borrar con swap-remove)"""
+        self._clear(dst)
+        for column in self._categorical.values():
+            column.codes[dst] = column.codes[src]
+        for array in self._ints.values():
+            array[dst] = array[src]
+        for array in self._floats.values():
+            array[dst] = array[src]
+        self._hashes[dst] = self._hashes[src]
+        self._has_hash[dst] = self._has_hash[src]
+        self._text_offsets[dst] = self._text_offsets[src]
+        self._text_lengths[dst] = self._text_lengths[src]
+        if self._text_lengths[src] >= 0:
+            self._live_text_bytes += int(self._text_lengths[src])
+        if src in self._extras:
+            self._extras[dst] = self._extras[src]
+
+    def pop(self) -> None:
+        """Eliminar la última fila"""
+        self.size -= 1
+        self._clear(self.size)
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Reescribir el blob de texto si más de la mitad es basura"""
+        if len(self._blob) < 1 << 20 or self._live_text_bytes * 2 > len(self._blob):
+            return
+        blob = bytearray()
+        for row in range(self.size):
+            length = int(self._text_lengths[row])
+            if length < 0:
+                continue
+            offset = int(self._text_offsets[row])
+            self._text_offsets[row] = len(blob)
+            blob += self._blob[offset:offset + length]
+        self._blob = blob
+
+    # ============ LECTURA ============
+
+    def text(self, row: int) -> Optional[str]:
+        length = int(self._text_lengths[row])
+        if length < 0:
+            return None
+        offset = int(self._text_offsets[row])
+        data = bytes(self._blob[offset:offset + length])
+        if self.compression == "zlib":
+            data = zlib.decompress(data)
+        elif self.compression == "zstd":
+            data = self._decompressor.decompress(data)
+        return data.decode("utf-8")
+
+    def value(self, row: int, name: str) -> Any:
+        """Valor de un campo de una fila (None si no existe)"""
+        if name == TEXT_FIELD:
+            return self.text(row)
+        if name in self._categorical:
+            code = self._categorical[name].codes[row]
+            if code >= 0:
+                return self._categorical[name].values[code]
+        if name in self._ints:
+            value = self._ints[name][row]
+            if value != _INT_MISSING:
+                return int(value)
+        if name in self._floats:
+            value = self._floats[name][row]
+            if not np.isnan(value):
+                return float(value)
+        if name == HASH_FIELD and self._has_hash[row]:
+            return self._hashes[row].decode("ascii")
+        return self._extras.get(row, {}).get(name)
+
+    def get(self, row: int, chunk_id: Optional[str] = None) -> Dict[str, Any]:
+        """Materializar una fila como dict"""
+        chunk: Dict[str, Any] = {}
+        if chunk_id is not None:
+            chunk[ID_FIELD] = chunk_id
+        if self._has_hash[row]:
+            chunk[HASH_FIELD] = self._hashes[row].decode("ascii")
+        for name, column in self._categorical.items():
+            code = column.codes[row]
+            if code >= 0:
+                chunk[name] = column.values[code]
+        for name, array in self._ints.items():
+            value = array[row]
+            if value != _INT_MISSING:
+                chunk[name] = int(value)
+        for name, array in self._floats.items():
+            value = array[row]
+            if not np.isnan(value):
+                chunk[name] = float(value)
+        text = self.text(row)
+        if text is not None:
+            chunk[TEXT_FIELD] = text
+        chunk.update(self._extras.get(row, {}))
+        return chunk
+
+    # ============ FILTROS ============
+
+    def filter_mask(self, filter_metadata: Dict[str, Any]) -> np.ndarray:
+        """
+        Máscara booleana de filas que cumplen el filtro
+
+        Admite {"collection": str, "book_ids": [document_id, ...]}; el resto
+        de claves se ignoran (como en el resto de backends).
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for key, name in (("collection", "collection"), ("book_ids", "document_id")):
+            if key not in filter_metadata:
+                continue
+            value = filter_metadata[key]
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+
+            column = self._categorical.get(name)
+            codes = column.codes_for(values) if column is not None else []
+            if len(codes) == 0:
+                return np.zeros(self.size, dtype=bool)
+            column_codes = column.codes[:self.size]
+            mask &= column_codes == codes[0] if len(codes) == 1 else np.isin(column_codes, codes)
+        return mask
+
+    def rows_where(self, name: str, value: str) -> np.ndarray:
+        """Filas cuyo campo categórico `name` vale `value`"""
+        column = self._categorical.get(name)
+        if column is None or value not in column.index:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(column.codes[:self.size] == column.index[value])
+
+    def distinct(self, name: str) -> set:
+        """Valores distintos de un campo categórico en las filas actuales"""
+        column = self._categorical.get(name)
+        if column is None:
+            return set()
+        codes = np.unique(column.codes[:self.size])
+        return {column.values[code] for code in codes.tolist() if code >= 0}
+
+    def nbytes(self) -> int:
+        """Memoria aproximada de las columnas (sin vectores ni diccionarios)"""
+        total = len(self._blob) + self._hashes.nbytes + self._has_hash.nbytes
+        total += self._text_offsets.nbytes + self._text_lengths.nbytes
+        total += sum(a.nbytes for a in self._ints.values())
+        total += sum(a.nbytes for a in self._floats.values())
+        total += sum(c.codes.nbytes for c in self._categorical.values())
+        return total
+
+    # ============ PERSISTENCIA ============
+
+    def save(self, directory: str) -> None:
+        """Guardar las columnas en `directory` (que debe existir)"""
+        out = Path(directory)
+        size = self.size
+        categorical = list(self._categorical.items())
+        ints = list(self._ints.items())
+        floats = list(self._floats.items())
+
+        for idx, (_, column) in enumerate(categorical):
+            np.save(out / f"categorical_{idx}.npy", column.codes[:size])
+        for idx, (_, array) in enumerate(ints):
+            np.save(out / f"int_{idx}.npy", array[:size])
+        for idx, (_, array) in enumerate(floats):
+            np.save(out / f"float_{idx}.npy", array[:size])
+        np.save(out / "hashes.npy", self._hashes[:size])
+        np.save(out / "has_hash.npy", self._has_hash[:size])
+        np.save(out / "text_offsets.npy", self._text_offsets[:size])
+        np.save(out / "text_lengths.npy", self._text_lengths[:size])
+        with open(out / "text.bin", "wb") as f:
+            f.write(memoryview(self._blob))
+
+        meta = {
+            "size": size,
+            "compression": self.compression,
+            "categorical": [[name, column.values] for name, column in categorical],
+            "ints": [name for name, _ in ints],
+            "floats": [name for name, _ in floats],
+            "live_text_bytes": self._live_text_bytes,
+            "extras": {str(row): extras for row, extras in self._extras.items() if row < size},
+        }
+        (out / "columns.json").write_text(
+            json.dumps(meta, ensure_ascii=False, default=str), encoding="utf-8"
+        )
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "ColumnarChunkStore":
+        """
+        Cargar un almacén guardado con `save`
+
+        Args:
+            directory: Directorio del almacén
+            mmap: Si True, las columnas y el texto se mapean en memoria en solo
+                lectura (páginas compartidas entre procesos); si False se copian
+                a memoria y el almacén admite escrituras
+        """
+        src = Path(directory)
+        meta = json.loads((src / "columns.json").read_text(encoding="utf-8"))
+        mmap_mode = "r" if mmap else None
+
+        def array(name: str) -> np.ndarray:
+            return np.load(src / name, mmap_mode=mmap_mode)
+
+        store = cls(compression=meta["compression"])
+        store.size = store._capacity = meta["size"]
+        for idx, (name, values) in enumerate(meta["categorical"]):
+            column = _CategoricalColumn()
+            column.codes = array(f"categorical_{idx}.npy")
+            column.values = values
+            column.index = {value: code for code, value in enumerate(values)}
+            store._categorical[name] = column
+        store._ints = {name: array(f"int_{idx}.npy") for idx, name in enumerate(meta["ints"])}
+        store._floats = {name: array(f"float_{idx}.npy") for idx, name in enumerate(meta["floats"])}
+        store._hashes = array("hashes.npy")
+        store._has_hash = array("has_hash.npy")
+        store._text_offsets = array("text_offsets.npy")
+        store._text_lengths = array("text_lengths.npy")
+        store._live_text_bytes = meta["live_text_bytes"]
+        store._extras = {int(row): extras for row, extras in meta["extras"].items()}
+
+        blob_path = src / "text.bin"
+        if not mmap:
+            store._blob = bytearray(blob_path.read_bytes())
+        elif blob_path.stat().st_size:
+            store._blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            store._blob = np.zeros(0, dtype=np.uint8)
+        return store
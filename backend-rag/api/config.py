@@ -12,13 +12,47 @@ class Settings(BaseSettings):
     openai_api_key: str
     openai_embedding_model: str = "text-embedding-3-large"
     openai_llm_model: str = "gpt-4-turbo-preview"
+    openai_base_url: str | None = None  # API compatible (p. ej. benchmarks/fake_openai.py)
+
+    # Cuota de OpenAI compartida entre ingesta y /query (api/quota.py)
+    openai_embedding_rpm: int | None = None  # None = sin límite
+    openai_embedding_tpm: int | None = None
+    openai_llm_rpm: int | None = None
+    openai_llm_tpm: int | None = None
+    openai_quota_state_dir: str | None = None  # Estado compartido entre procesos (None = por proceso)
+    openai_quota_bulk_reserve: float = 0.2  # Fracción de cuota que la ingesta deja a /query
+    openai_quota_burst_seconds: float = 10.0  # Capacidad de los buckets
 
     # Google Cloud
     google_cloud_project: str
     gcs_bucket_name: str
     document_ai_processor_id: str | None = None
+    document_ai_pages_per_shard: int = 15
+    document_ai_max_concurrency: int = 4
+    document_ai_batch_threshold_pages: int | None = None
+    document_ai_batch_gcs_prefix: str | None = None
     vertex_ai_index_id: str | None = None
     vertex_ai_endpoint_id: str | None = None
+    vertex_ai_max_workers: int = 8
+    vertex_ai_upsert_batch_size: int = 500
+    vertex_ai_document_index_path: str = ".vertex-documents.sqlite"  # document_id → chunk_ids (volumen compartido si hay varias instancias)
+
+    # Caché OCR (por hash de contenido)
+    ocr_cache_dir: str | None = ".ocr-cache"
+    ocr_cache_gcs_bucket: str | None = None
+    ocr_cache_max_bytes: int = 2 * 1024 ** 3
+
+    # OCR local (Tesseract)
+    ocr_engine: str | None = None  # documentai | pypdf | tesseract (None = según --simple-ocr)
+    tesseract_lang: str = "spa"
+    tesseract_dpi: int = 300
+    tesseract_workers: int | None = None  # None = núcleos disponibles
+    tesseract_max_in_flight_pages: int | None = None  # None = 2 por proceso
+
+    # Enrutado por página: capa de texto si sirve, OCR solo para el resto
+    ocr_route_pages: bool = True
+    ocr_text_layer_min_chars: int = 40  # Caracteres mínimos de la capa de texto
+    ocr_text_layer_min_alpha_ratio: float = 0.6  # Fracción mínima de letras
 
     # Vector DB alternativas
     pinecone_api_key: str | None = None
@@ -26,10 +60,32 @@ class Settings(BaseSettings):
     qdrant_url: str = "http://localhost:6333"
     qdrant_api_key: str | None = None
 
+    # Backend de vectores ("in-memory", "partitioned" o "vertex"; ver registro en api/vectordb.py)
+    vector_db_backend: str = "in-memory"
+
+    # Índice particionado por colección (ver api/partitioned_index.py)
+    partitions_dir: str | None = None
+    partition_memory_budget_mb: int = 2048
+    partition_flush_interval: float = 30.0
+
+    # Índice en memoria
+    in_memory_text_compression: str | None = None  # None, "zlib" o "zstd" (texto de chunks)
+    search_workers: int | None = None  # Pool de CPU de búsqueda (None = núcleos, 0 = en el event loop)
+    search_block_rows: int = 16384  # Filas por bloque paralelo de una búsqueda
+
+    # Índice compartido entre workers (ver api/shared_index.py)
+    index_mode: str = "local"  # "local", "writer" o "reader"
+    index_dir: str | None = None
+    index_writer_url: str | None = None  # writer al que los readers reenvían las escrituras
+    index_publish_interval: float = 2.0  # Cada publicación reescribe el snapshot completo (subir en ingestas masivas)
+    index_refresh_interval: float = 1.0
+    index_keep_generations: int = 2
+
     # API Config
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     api_workers: int = 4
+    warmup_retry_interval: float = 5.0  # Reintento del warmup mientras no esté listo (backoff hasta 60 s)
     cors_origins: str = "http://localhost:3000"
 
     # RAG Config
@@ -38,6 +94,41 @@ class Settings(BaseSettings):
     top_k_results: int = 10
     rerank_top_k: int = 5
     min_ocr_confidence: float = 0.85
+    query_collapse_duplicates: bool = True  # Agrupar casi duplicados marcados en la ingesta
+
+    # Latencia de /query (api/latency.py)
+    query_deadline_seconds: float = 20.0  # Presupuesto total por consulta
+    llm_min_budget_seconds: float = 1.0  # Por debajo, respuesta degradada sin LLM
+    llm_hedge_enabled: bool = False  # El hedge duplica coste y cuota de las consultas lentas (ver README)
+    llm_hedge_percentile: float = 95.0  # Se lanza el hedge al superar este percentil
+    llm_hedge_initial_delay: float = 4.0  # Retardo hasta tener muestras suficientes
+    llm_hedge_min_delay: float = 0.5
+    openai_fallback_llm_model: str | None = None  # Modelo del hedge (None = el mismo)
+
+    # Ingesta batch (pipeline por etapas)
+    ingest_ocr_workers: int = 4
+    ingest_chunk_workers: int = 2
+    ingest_embed_concurrency: int = 4
+    ingest_upload_concurrency: int = 2
+    ingest_queue_size: int = 8
+    ingest_job_store_dir: str = ".ingest-jobs"
+    ingest_upload_batch_bytes: int = 4 * 1024 * 1024  # Tamaño (sin comprimir) de cada lote de upload
+    ingest_stream_max_bytes: int = 128 * 1024 * 1024  # Máximo descomprimido por request de /ingest/stream
+    ingest_upload_batch_concurrency: int = 4  # Lotes en vuelo por documento
+    ingest_upload_retries: int = 4
+    ingest_upload_timeout: float = 60.0
+    ingest_gcs_prefetch: int = 4  # Blobs descargados por adelantado
+    ingest_spool_dir: str | None = None  # Ficheros temporales de descarga (None = tmp del sistema)
+    ingest_telemetry_path: str | None = None  # JSON lines por etapa/documento/batch ("-" = stdout)
+    ingest_metrics_port: int | None = None  # Métricas Prometheus del worker
+    ingest_telemetry_sample_interval: float = 1.0  # Segundos entre muestras de colas y memoria
+    ingest_dedup_enabled: bool = True  # Casi duplicados con MinHash/LSH (workers/dedup.py)
+    ingest_dedup_mode: str = "reuse"  # reuse (embedding del canónico) | skip (no indexar)
+    ingest_dedup_threshold: float = 0.85  # Jaccard estimada mínima
+    ingest_dedup_num_perm: int = 128
+    ingest_dedup_bands: int = 16
+    ingest_dedup_vector_cache_mb: int = 256  # Embeddings de canónicos en memoria (LRU)
+    ingest_dedup_max_canonicals: int = 50000  # Firmas de canónicos en memoria (LRU, ~6 KB cada una)
 
     # Límites
     max_documents_per_batch: int = 100
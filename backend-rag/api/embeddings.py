@@ -1,38 +1,47 @@
 """
 Servicio de embeddings con OpenAI
 """
-from openai import AsyncOpenAI
 from typing import List
-import asyncio
 from tenacity import retry, stop_after_attempt, wait_exponential
 from .config import get_settings
+from .quota import estimate_tokens, get_quota_scheduler
 
 
 class EmbeddingService:
     """Servicio para generar embeddings con OpenAI"""
 
     def __init__(self):
+        # Import diferido: el SDK de OpenAI no se carga al importar el módulo
+        from openai import AsyncOpenAI
+
         self.settings = get_settings()
-        self.client = AsyncOpenAI(api_key=self.settings.openai_api_key)
+        self.client = AsyncOpenAI(
+            api_key=self.settings.openai_api_key,
+            base_url=self.settings.openai_base_url
+        )
         self.model = self.settings.openai_embedding_model
+        # Cuota compartida con el resto de procesos (ingesta y API)
+        self.quota = get_quota_scheduler("embeddings")
 
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10)
     )
-    async def embed_text(self, text: str) -> List[float]:
+    async def embed_text(self, text: str, priority: str = "interactive") -> List[float]:
         """
         Generar embedding para un texto
 
         Args:
             text: Texto a embeder
+            priority: Prioridad en la cuota de OpenAI ("interactive" o "bulk")
 
         Returns:
             Vector de embeddings
         """
-        response = await self.client.embeddings.create(
-            model=self.model,
-            input=text
+        response = await self.quota.run(
+            lambda: self.client.embeddings.create(model=self.model, input=text),
+            estimate_tokens(text),
+            priority
         )
         return response.data[0].embedding
 
@@ -40,13 +49,19 @@ class EmbeddingService:
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10)
     )
-    async def embed_batch(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+    async def embed_batch(
+        self,
+        texts: List[str],
+        batch_size: int = 100,
+        priority: str = "bulk"
+    ) -> List[List[float]]:
         """
         Generar embeddings para múltiples textos en batch
 
         Args:
             texts: Lista de textos
             batch_size: Tamaño del batch para la API
+            priority: Prioridad en la cuota de OpenAI (la ingesta cede ante /query)
 
         Returns:
             Lista de vectores de embeddings
@@ -57,19 +72,17 @@ class EmbeddingService:
         for i in range(0, len(texts), batch_size):
             batch = texts[i:i + batch_size]
 
-            response = await self.client.embeddings.create(
-                model=self.model,
-                input=batch
+            # El planificador de cuota marca el ritmo (sin pausas fijas entre batches)
+            response = await self.quota.run(
+                lambda: self.client.embeddings.create(model=self.model, input=batch),
+                estimate_tokens(*batch),
+                priority
             )
 
             # Extraer embeddings en el orden correcto
             batch_embeddings = [item.embedding for item in response.data]
             all_embeddings.extend(batch_embeddings)
 
-            # Small delay para evitar rate limits
-            if i + batch_size < len(texts):
-                await asyncio.sleep(0.1)
-
         return all_embeddings
 
     async def embed_query(self, query: str) -> List[float]:
@@ -0,0 +1,325 @@
+"""
+Formato binario de ingesta en streaming (/ingest/stream)
+
+Evita enviar los embeddings como listas JSON de floats: la metadata de cada
+chunk va como un registro JSON (o msgpack) y el vector como un bloque crudo
+de float32 little-endian. El cuerpo completo puede ir comprimido con zstd o
+gzip (header `Content-Encoding`).
+
+Layout:
+    header:  MAGIC (4 bytes) | version (u8) | meta_format (u8) | dim (u32 LE)
+    record:  meta_len (u32 LE) | meta (meta_len bytes) | vector (dim * 4 bytes)
+    fin:     meta_len == 0
+
+El cuerpo viene de la red: el decodificador acota el tamaño descomprimido
+total, `dim` y `meta_len` antes de reservar memoria, y trata la metadata
+mal formada como stream inválido.
+"""
+import gzip
+import json
+import struct
+import zlib
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
+
+MAGIC = b"SCRB"
+VERSION = 1
+
+META_JSON = 0
+META_MSGPACK = 1
+
+CONTENT_TYPE = "application/x-scriptorium-chunks"
+
+_HEADER = struct.Struct("<4sBBI")
+_LEN = struct.Struct("<I")
+
+# Límites del stream (cuerpo no confiable)
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024  # Tamaño descomprimido total
+MAX_DIM = 16384
+MAX_META_BYTES = 1024 * 1024
+
+# Salida máxima por llamada al descompresor gzip, y entrada por llamada a
+# zstd (su decompressobj no admite max_length; ~32 MB de salida como mucho)
+_GZIP_OUTPUT_CHUNK = 1024 * 1024
+_ZSTD_INPUT_CHUNK = 1024
+
+
+class IngestFormatError(ValueError):
+    """Stream de ingesta mal formado"""
+    pass
+
+
+def _dump_meta(meta: Dict[str, Any], meta_format: int) -> bytes:
+    if meta_format == META_MSGPACK:
+        import msgpack
+        return msgpack.packb(meta, use_bin_type=True)
+    return json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load_meta(data: bytes, meta_format: int) -> Dict[str, Any]:
+    try:
+        if meta_format == META_MSGPACK:
+            import msgpack
+            meta = msgpack.unpackb(data, raw=False)
+        else:
+            meta = json.loads(data)
+    except Exception as e:
+        raise IngestFormatError(f"Invalid chunk metadata: {e}") from e
+    if not isinstance(meta, dict):
+        raise IngestFormatError("Chunk metadata must be an object")
+    return meta
+
+
+def iter_encode(
+    chunks: List[Dict[str, Any]],
+    vectors: np.ndarray,
+    meta_format: int = META_JSON
+) -> Iterator[bytes]:
+    """
+    Codificar chunks + matriz de vectores en frames binarios
+
+    Args:
+        chunks: Metadata de cada chunk (sin el campo "embedding")
+        vectors: Matriz (n_chunks, dim) de embeddings
+        meta_format: META_JSON o META_MSGPACK
+
+    Yields:
+        Fragmentos de bytes del stream (header, un frame por chunk, fin)
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    if vectors.ndim != 2 or vectors.shape[0] != len(chunks):
+        raise IngestFormatError("vectors must be a (n_chunks, dim) matrix")
+
+    yield _HEADER.pack(MAGIC, VERSION, meta_format, vectors.shape[1])
+
+    for chunk, vector in zip(chunks, vectors):
+        meta = {k: v for k, v in chunk.items() if k != "embedding"}
+        meta_bytes = _dump_meta(meta, meta_format)
+        yield _LEN.pack(len(meta_bytes)) + meta_bytes + vector.tobytes()
+
+    yield _LEN.pack(0)
+
+
+def encode(
+    chunks: List[Dict[str, Any]],
+    vectors: np.ndarray,
+    meta_format: int = META_JSON,
+    compression: Optional[str] = None
+) -> bytes:
+    """
+    Codificar el stream completo en memoria
+
+    Args:
+        compression: None, "zstd" o "gzip"
+    """
+    return compress(b"".join(iter_encode(chunks, vectors, meta_format)), compression)
+
+
+def compress(body: bytes, compression: Optional[str]) -> bytes:
+    """Comprimir un stream ya codificado (valor de `Content-Encoding`)"""
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    if compression:
+        raise IngestFormatError(f"Unsupported compression: {compression}")
+    return body
+
+
+class StreamDecoder:
+    """
+    Decodificador incremental del stream binario
+
+    Se alimenta con fragmentos arbitrarios (`feed`) y devuelve batches de
+    registros completos. Los vectores se copian directamente en una matriz
+    float32, sin crear objetos Python por cada float.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 256,
+        compression: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        expected_dim: Optional[int] = None
+    ):
+        """
+        Args:
+            batch_size: Registros por batch devuelto
+            compression: None, "zstd" o "gzip" (`Content-Encoding`)
+            max_bytes: Tamaño máximo del stream descomprimido
+            expected_dim: Dimensión exigida a los vectores (None = cualquiera hasta MAX_DIM)
+        """
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.expected_dim = expected_dim
+        self.dim: Optional[int] = None
+        self.meta_format = META_JSON
+        self.finished = False
+        self.records_decoded = 0
+        self.bytes_decoded = 0
+
+        self._buffer = bytearray()
+        self._pending_meta: List[Dict[str, Any]] = []
+        self._pending_vectors: Optional[np.ndarray] = None
+
+        self._compression = compression
+        if compression == "zstd":
+            import zstandard
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif compression == "gzip":
+            self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        elif compression in (None, "", "identity"):
+            self._decompressor = None
+        else:
+            raise IngestFormatError(f"Unsupported compression: {compression}")
+
+    def feed(self, data: bytes) -> List[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """
+        Procesar un fragmento del stream
+
+        Returns:
+            Lista de batches completos (metadata, matriz de vectores)
+        """
+        batches = []
+        for piece in self._decompress(data):
+            batches.extend(self._consume(piece))
+        return batches
+
+    def _consume(self, piece: bytes) -> List[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """Añadir datos descomprimidos (con el tope de tamaño) y decodificar lo completo"""
+        self.bytes_decoded += len(piece)
+        if self.bytes_decoded > self.max_bytes:
+            raise IngestFormatError(f"Ingest stream exceeds {self.max_bytes} bytes")
+        self._buffer += piece
+        return self._drain()
+
+    def _decompress(self, data: bytes) -> Iterator[bytes]:
+        """Descomprimir en trozos acotados (un cuerpo pequeño puede expandirse a GB)"""
+        if self._decompressor is None:
+            yield data
+        elif self._compression == "gzip":
+            while data:
+                piece = self._decompressor.decompress(data, _GZIP_OUTPUT_CHUNK)
+                data = self._decompressor.unconsumed_tail
+                if piece:
+                    yield piece
+        else:
+            for start in range(0, len(data), _ZSTD_INPUT_CHUNK):
+                piece = self._decompressor.decompress(data[start:start + _ZSTD_INPUT_CHUNK])
+                if piece:
+                    yield piece
+
+    def close(self) -> List[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """
+        Finalizar el stream y devolver el último batch parcial
+
+        Raises:
+            IngestFormatError: Si el stream está truncado
+        """
+        batches = []
+        if self._decompressor is not None:
+            # Lo que el descompresor aún retiene (p. ej. el final del bloque gzip)
+            tail = self._decompressor.flush()
+            if tail:
+                batches.extend(self._consume(tail))
+            if self._compression == "gzip" and not self._decompressor.eof:
+                raise IngestFormatError("Truncated gzip stream")
+        if not self.finished:
+            raise IngestFormatError("Truncated ingest stream")
+        return batches + self._flush()
+
+    def _drain(self) -> List[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        batches = []
+        view = memoryview(self._buffer)
+        pos = 0
+
+        try:
+            if self.dim is None:
+                if len(view) < _HEADER.size:
+                    return batches
+                magic, version, meta_format, dim = _HEADER.unpack_from(view, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise IngestFormatError("Invalid ingest stream header")
+                if meta_format not in (META_JSON, META_MSGPACK):
+                    raise IngestFormatError(f"Unknown metadata format: {meta_format}")
+                if not 0 < dim <= MAX_DIM:
+                    raise IngestFormatError(f"Invalid vector dimension: {dim}")
+                if self.expected_dim is not None and dim != self.expected_dim:
+                    raise IngestFormatError(
+                        f"Embedding dimension mismatch: expected {self.expected_dim}, got {dim}"
+                    )
+                self.dim = dim
+                self.meta_format = meta_format
+                self._pending_vectors = np.empty((self.batch_size, dim), dtype=np.float32)
+                pos = _HEADER.size
+
+            vector_bytes = self.dim * 4
+
+            while not self.finished and len(view) - pos >= _LEN.size:
+                (meta_len,) = _LEN.unpack_from(view, pos)
+                if meta_len == 0:
+                    self.finished = True
+                    pos += _LEN.size
+                    break
+                if meta_len > MAX_META_BYTES:
+                    raise IngestFormatError(f"Chunk metadata too large: {meta_len} bytes")
+
+                frame_end = pos + _LEN.size + meta_len + vector_bytes
+                if len(view) < frame_end:
+                    break
+
+                meta_start = pos + _LEN.size
+                vector_start = meta_start + meta_len
+                meta = _load_meta(bytes(view[meta_start:vector_start]), self.meta_format)
+
+                row = len(self._pending_meta)
+                self._pending_vectors[row] = np.frombuffer(
+                    view[vector_start:frame_end], dtype="<f4"
+                )
+                # NaN/Inf darían scores NaN en todas las búsquedas que tocaran la fila
+                if not np.isfinite(self._pending_vectors[row]).all():
+                    raise IngestFormatError(
+                        f"Non-finite value in embedding of record {self.records_decoded}"
+                    )
+                self._pending_meta.append(meta)
+                self.records_decoded += 1
+                pos = frame_end
+
+                if len(self._pending_meta) == self.batch_size:
+                    batches.extend(self._flush())
+        finally:
+            view.release()
+
+        del self._buffer[:pos]
+
+        if self.finished and self._buffer:
+            raise IngestFormatError("Trailing data after end of ingest stream")
+
+        return batches
+
+    def _flush(self) -> List[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        if not self._pending_meta:
+            return []
+        count = len(self._pending_meta)
+        batch = (self._pending_meta, self._pending_vectors[:count].copy())
+        self._pending_meta = []
+        return [batch]
+
+
+def decode(
+    body: bytes,
+    compression: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Decodificar un stream completo en memoria (útil para tests y tooling)"""
+    decoder = StreamDecoder(batch_size=1024, compression=compression)
+    batches = decoder.feed(body) + decoder.close()
+    metas: List[Dict[str, Any]] = []
+    for batch_meta, _ in batches:
+        metas.extend(batch_meta)
+    if batches:
+        vectors = np.concatenate([v for _, v in batches])
+    else:
+        vectors = np.empty((0, decoder.dim or 0), dtype=np.float32)
+    return metas, vectors
+
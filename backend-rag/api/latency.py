@@ -0,0 +1,129 @@
+"""
+Control de latencia de cola en /query
+
+- `Deadline`: presupuesto de tiempo de una request que se reparte entre
+  embedding, búsqueda y LLM (cada etapa espera como mucho lo que queda).
+- `LatencyTracker`: ventana de latencias recientes para calcular percentiles.
+- `hedged`: lanza una request y, si no ha respondido en un retardo dado
+  (p. ej. el p95 observado), lanza una segunda en paralelo (opcionalmente a
+  otro modelo) y se queda con la primera que termine bien.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class DeadlineExceeded(Exception):
+    """No queda tiempo para completar una etapa"""
+
+
+class Deadline:
+    """Instante límite de una request"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Segundos restantes (0 si ya venció)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    async def run(self, awaitable: Awaitable, stage: str, reserve: float = 0.0) -> Any:
+        """
+        Esperar un awaitable como mucho hasta el deadline
+
+        Args:
+            awaitable: Operación a esperar
+            stage: Nombre de la etapa (para el error)
+            reserve: Segundos que se dejan libres para etapas posteriores
+
+        Raises:
+            DeadlineExceeded: Si no termina a tiempo
+        """
+        budget = self.remaining() - reserve
+        if budget <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(f"No time left for {stage}")
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline exceeded during {stage} ({self.seconds:.1f}s)")
+
+
+class LatencyTracker:
+    """Latencias recientes (segundos) de una operación"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Args:
+            window: Número de muestras que se conservan
+            min_samples: Muestras necesarias antes de fiarse de los percentiles
+        """
+        self.samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        """Percentil `q` (0-100) de las muestras, o `default` si hay pocas"""
+        if len(self.samples) < self.min_samples:
+            return default
+        return float(np.percentile(np.fromiter(self.samples, dtype=np.float64), q))
+
+
+async def hedged(
+    calls: List[Callable[[], Awaitable[Any]]],
+    hedge_delay: float
+) -> Tuple[Any, int]:
+    """
+    Ejecutar `calls[0]` y lanzar la siguiente si no responde en `hedge_delay`
+
+    También se lanza la siguiente en cuanto una falla. Gana la primera que
+    termine sin error; las demás se cancelan. Para acotar el tiempo total,
+    envolver en `Deadline.run`.
+
+    Args:
+        calls: Factories de las requests (primaria, hedge, ...)
+        hedge_delay: Segundos de espera antes de lanzar la siguiente
+
+    Returns:
+        (resultado, índice de la llamada que ganó)
+
+    Raises:
+        La excepción de la última llamada si fallan todas
+    """
+    pending = {}
+    next_call = 0
+    last_error: Optional[BaseException] = None
+
+    def launch() -> None:
+        nonlocal next_call
+        task = asyncio.ensure_future(calls[next_call]())
+        pending[task] = next_call
+        next_call += 1
+
+    launch()
+    try:
+        while pending:
+            timeout = hedge_delay if next_call < len(calls) else None
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                index = pending.pop(task)
+                if task.exception() is None:
+                    return task.result(), index
+                last_error = task.exception()
+
+            # Sin respuesta a tiempo, o las terminadas fallaron: lanzar la siguiente
+            if next_call < len(calls):
+                launch()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
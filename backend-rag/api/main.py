@@ -2,27 +2,151 @@
 Backend RAG - FastAPI Main
 Scriptorium AI - Biblioteca Digital
 """
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-from openai import AsyncOpenAI
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
+from contextlib import asynccontextmanager
+import asyncio
+import re
+import time
 import uuid
 
 from .config import get_settings, Settings
 from .embeddings import get_embedding_service, EmbeddingService
-from .vectordb import get_vector_db, VectorDBInterface
+from .vectordb import get_vector_db, run_cpu_bound, VectorDBInterface
 from .prompts import build_full_prompt
+from .ingest_format import StreamDecoder, IngestFormatError
+from .latency import Deadline, DeadlineExceeded, LatencyTracker, hedged
+from .quota import estimate_tokens, get_quota_scheduler
+
+if TYPE_CHECKING:
+    # El SDK de OpenAI se importa al crear el cliente (en el arranque), no aquí
+    from openai import AsyncOpenAI
+
+settings = get_settings()
+
+
+# ============ CICLO DE VIDA ============
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque: calentar lo que si no pagaría la primera consulta (backend de
+    vectores, SDK y clientes de OpenAI). Parada: publicar el índice
+    pendiente y cerrar conexiones.
+    """
+    print("=" * 60)
+    print("🚀 Scriptorium AI - RAG Backend")
+    print("=" * 60)
+    print(f"Vector DB: {settings.vector_db_backend}, index_mode={settings.index_mode}")
+    print(f"Embeddings: OpenAI {settings.openai_embedding_model}")
+    print(f"LLM: OpenAI {settings.openai_llm_model}")
+    print(f"CORS Origins: {settings.cors_origins}")
+    print("=" * 60)
+
+    app.state.ready = False
+    app.state.warmup_error = None
+    app.state.warmup_ms = {}
+    retry_task = None
+    if not await start_serving(app):
+        # El proceso arranca igualmente (liveness); /ready devuelve 503 hasta
+        # que un reintento (en segundo plano o desde /ready) lo consiga
+        retry_task = asyncio.create_task(_retry_warmup(app))
+
+    yield
+
+    if retry_task is not None:
+        retry_task.cancel()
+    if _index_publisher is not None:
+        await _index_publisher.stop()
+    if app.state.ready:
+        await get_vector_db_dep().close()
+    if _writer_proxy is not None:
+        await _writer_proxy.aclose()
+    if _openai_client is not None:
+        await _openai_client.close()
+
+
+async def start_serving(app: FastAPI) -> bool:
+    """
+    Warmup y, si termina bien, marcar el servicio como listo y arrancar el
+    publicador del índice (modo writer). Idempotente: sin efecto si ya está
+    listo o si hay otro intento en curso.
+
+    Returns:
+        True si el servicio queda listo
+    """
+    global _index_publisher
+    if app.state.ready or _startup_lock.locked():
+        return app.state.ready
+
+    async with _startup_lock:
+        try:
+            app.state.warmup_ms = await warmup()
+        except Exception as e:
+            app.state.warmup_error = str(e)
+            print(f"❌ Warmup failed: {e}")
+            return False
+
+        app.state.warmup_error = None
+        app.state.ready = True
+        print(f"🔥 Warmup: {app.state.warmup_ms}")
+
+        if settings.index_mode == "writer" and _index_publisher is None:
+            from .shared_index import IndexPublisher
+            _index_publisher = IndexPublisher(
+                get_vector_db_dep(),
+                settings.index_dir,
+                interval=settings.index_publish_interval,
+                keep=settings.index_keep_generations,
+                manifest=index_manifest()
+            )
+            _index_publisher.start()
+        return True
+
+
+async def _retry_warmup(app: FastAPI) -> None:
+    """Reintentar el warmup con backoff exponencial hasta que el servicio esté listo"""
+    delay = settings.warmup_retry_interval
+    while not app.state.ready:
+        await asyncio.sleep(delay)
+        await start_serving(app)
+        delay = min(delay * 2, 60.0)
+
+
+async def warmup() -> Dict[str, float]:
+    """
+    Inicializar backends antes de aceptar tráfico
+
+    Returns:
+        Milisegundos por paso
+    """
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    vector_db = get_vector_db_dep()
+    await vector_db.warmup()
+    timings["vector_db"] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    get_embedding_service()
+    get_openai_client()
+    timings["openai_clients"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return timings
+
 
 # App
 app = FastAPI(
     title="Scriptorium AI - RAG Backend",
     description="Backend RAG para consulta de bibliotecas digitales",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
-settings = get_settings()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins.split(","),
@@ -31,6 +155,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Índice compartido: en modo reader las escrituras se reenvían al writer, y
+# también las lecturas que deben ver las escrituras recientes (el diff de
+# re-ingesta no puede basarse en una generación atrasada)
+_INDEX_WRITE_PATH = re.compile(
+    r"^/(ingest(/stream)?|documents/[^/]+(/prune)?|index/(rollback|generations/[^/]+/activate))$"
+)
+_INDEX_FRESH_READ_PATH = re.compile(r"^/documents/[^/]+/chunks$")
+_writer_proxy = None
+_index_publisher = None
+_openai_client = None
+_startup_lock = asyncio.Lock()
+
+# Latencias recientes del LLM: fijan cuándo se lanza la request de respaldo
+_llm_latency = LatencyTracker()
+
+
+@app.middleware("http")
+async def forward_index_writes(request: Request, call_next):
+    """Modo reader: reenviar al writer las requests que modifican el índice"""
+    path = request.url.path
+    if settings.index_mode == "reader" and (
+        (request.method in ("POST", "DELETE") and _INDEX_WRITE_PATH.match(path))
+        or (request.method == "GET" and _INDEX_FRESH_READ_PATH.match(path))
+    ):
+        global _writer_proxy
+        if _writer_proxy is None:
+            from .shared_index import WriterProxy
+            _writer_proxy = WriterProxy(settings.index_writer_url)
+        return await _writer_proxy.forward(request)
+    return await call_next(request)
+
 
 # ============ MODELS ============
 
@@ -54,6 +209,7 @@ class Evidence(BaseModel):
     score: float
     ocr_confidence: Optional[float] = None
     source_url: Optional[str] = None  # URL al visor PDF
+    duplicates: int = 0  # Casi duplicados del mismo texto agrupados en esta evidencia
 
 
 class QueryResponse(BaseModel):
@@ -85,6 +241,32 @@ class IngestResponse(BaseModel):
     message: str
 
 
+class DocumentChunksResponse(BaseModel):
+    """Response con los chunks indexados de un documento"""
+    document_id: str
+    chunk_ids: List[str]
+
+
+class PruneRequest(BaseModel):
+    """Request para reemplazo de documento: chunks que se conservan"""
+    keep_chunk_ids: List[str]
+
+
+class DocumentDeleteResponse(BaseModel):
+    """Response de borrado/poda de chunks de un documento"""
+    success: bool
+    document_id: str
+    chunks_deleted: int
+
+
+class ActivateGenerationRequest(BaseModel):
+    """Request para activar una generación del índice (o volver a la anterior)"""
+    force: bool = Field(
+        False,
+        description="Activar aunque falten documentos del índice en servicio"
+    )
+
+
 class HealthResponse(BaseModel):
     """Response del health check"""
     status: str
@@ -95,9 +277,16 @@ class HealthResponse(BaseModel):
 
 # ============ DEPENDENCIES ============
 
-def get_openai_client() -> AsyncOpenAI:
-    """Dependency: OpenAI client"""
-    return AsyncOpenAI(api_key=settings.openai_api_key)
+def get_openai_client() -> "AsyncOpenAI":
+    """Dependency: OpenAI client (compartido, reutiliza el pool de conexiones)"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url
+        )
+    return _openai_client
 
 
 def get_embedding_service_dep() -> EmbeddingService:
@@ -106,22 +295,54 @@ def get_embedding_service_dep() -> EmbeddingService:
 
 
 def get_vector_db_dep() -> VectorDBInterface:
-    """Dependency: Vector DB"""
-    # Por defecto usar in-memory para desarrollo
-    # En producción cambiar a: get_vector_db(use_in_memory=False)
-    return get_vector_db(use_in_memory=True)
+    """Dependency: Vector DB (VECTOR_DB_BACKEND=vertex en producción)"""
+    return get_vector_db(backend=settings.vector_db_backend)
 
 
 # ============ ENDPOINTS ============
 
 @app.get("/", response_model=HealthResponse)
 async def root():
-    """Health check"""
+    """Health check (liveness: no toca los backends)"""
     return HealthResponse(
         status="operational",
         version="1.0.0",
-        vector_db="in-memory (dev)",  # Cambiar en producción
-        embeddings="OpenAI text-embedding-3-large"
+        vector_db=settings.vector_db_backend,
+        embeddings=f"OpenAI {settings.openai_embedding_model}"
+    )
+
+
+@app.get("/ready")
+async def readiness(request: Request):
+    """
+    Readiness: 200 cuando el arranque terminó y el backend de vectores puede
+    servir consultas; 503 en caso contrario (con el motivo)
+    """
+    state = request.app.state
+    vector_db_status = None
+    if not state.ready:
+        # El warmup del arranque falló: reintentarlo (sin esperar a otro en curso)
+        await start_serving(request.app)
+    if state.ready:
+        vector_db = get_vector_db_dep()
+        vector_db_status = vector_db.status()
+        if not vector_db_status["ready"]:
+            # Reintentar el warmup del backend (p. ej. reader sin generación aún)
+            try:
+                await vector_db.warmup()
+            except Exception as e:
+                state.warmup_error = str(e)
+            vector_db_status = vector_db.status()
+    ready = bool(state.ready and vector_db_status["ready"])
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "index_mode": settings.index_mode,
+            "vector_db": vector_db_status,
+            "warmup_ms": state.warmup_ms,
+            "error": state.warmup_error
+        }
     )
 
 
@@ -130,7 +351,7 @@ async def query_documents(
     request: QueryRequest,
     embedding_service: EmbeddingService = Depends(get_embedding_service_dep),
     vector_db: VectorDBInterface = Depends(get_vector_db_dep),
-    openai_client: AsyncOpenAI = Depends(get_openai_client)
+    openai_client: "AsyncOpenAI" = Depends(get_openai_client)
 ):
     """
     Endpoint principal de consulta RAG
@@ -141,20 +362,43 @@ async def query_documents(
     3. Build prompt con contexto
     4. LLM completion
     5. Retornar respuesta + evidencias
+
+    Toda la consulta tiene un deadline (QUERY_DEADLINE_SECONDS). Si el LLM
+    tarda más que su p95 reciente se lanza una segunda request (hedge); si
+    aun así no llega a tiempo, o falla, se devuelven las evidencias con una
+    respuesta degradada en lugar de un error.
     """
-    import time
     start_time = time.time()
+    deadline = Deadline(settings.query_deadline_seconds)
+    timings_ms: Dict[str, float] = {}
 
     try:
         # 1. Generar embedding de la query
-        query_vector = await embedding_service.embed_query(request.query)
-
-        # 2. Buscar chunks similares en Vector DB
-        results = await vector_db.search(
-            query_vector=query_vector,
-            top_k=request.top_k,
-            filter_metadata=request.scope
+        stage_start = time.perf_counter()
+        query_vector = await deadline.run(
+            embedding_service.embed_query(request.query),
+            "embedding",
+            reserve=settings.llm_min_budget_seconds
         )
+        timings_ms["embedding"] = (time.perf_counter() - stage_start) * 1000
+
+        # 2. Buscar chunks similares en Vector DB (con margen para agrupar duplicados)
+        stage_start = time.perf_counter()
+        search_k = request.top_k * 2 if settings.query_collapse_duplicates else request.top_k
+        results = await deadline.run(
+            vector_db.search(
+                query_vector=query_vector,
+                top_k=search_k,
+                filter_metadata=request.scope
+            ),
+            "search",
+            reserve=settings.llm_min_budget_seconds
+        )
+        duplicates_collapsed = 0
+        if settings.query_collapse_duplicates:
+            results, duplicates_collapsed = collapse_duplicates(results)
+        results = results[:request.top_k]
+        timings_ms["search"] = (time.perf_counter() - stage_start) * 1000
 
         if not results:
             return QueryResponse(
@@ -164,25 +408,27 @@ async def query_documents(
                 evidence=[],
                 metadata={
                     "latency_ms": int((time.time() - start_time) * 1000),
-                    "results_found": 0
+                    "results_found": 0,
+                    "timings_ms": timings_ms
                 }
             )
 
         # 3. Construir prompt
         system_prompt, user_prompt = build_full_prompt(request.query, results)
 
-        # 4. Llamar a LLM
-        completion = await openai_client.chat.completions.create(
-            model=settings.openai_llm_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
+        # 4. Llamar a LLM (con hedge y dentro del deadline)
+        stage_start = time.perf_counter()
+        completion, llm_model, hedged_call, degraded_reason = await complete_with_hedge(
+            openai_client, system_prompt, user_prompt, deadline
         )
+        timings_ms["llm"] = (time.perf_counter() - stage_start) * 1000
 
-        answer = completion.choices[0].message.content
+        if completion is not None:
+            answer = completion.choices[0].message.content
+            tokens_used = completion.usage.total_tokens
+        else:
+            answer = degraded_answer(results)
+            tokens_used = 0
 
         # 5. Construir evidencias
         evidence = [
@@ -194,14 +440,14 @@ async def query_documents(
                 chunk_text=r.get("chunk_text", ""),
                 score=r.get("score", 0.0),
                 ocr_confidence=r.get("ocr_confidence"),
-                source_url=f"/viewer/{r.get('document_id')}?page={r.get('page_number')}"
+                source_url=f"/viewer/{r.get('document_id')}?page={r.get('page_number')}",
+                duplicates=r.get("duplicates", 0)
             )
             for r in results
         ]
 
         # Metadata
         latency_ms = int((time.time() - start_time) * 1000)
-        tokens_used = completion.usage.total_tokens
 
         return QueryResponse(
             query_id=str(uuid.uuid4()),
@@ -211,15 +457,120 @@ async def query_documents(
             metadata={
                 "latency_ms": latency_ms,
                 "results_found": len(results),
+                "duplicates_collapsed": duplicates_collapsed,
                 "tokens_used": tokens_used,
-                "estimated_cost_usd": tokens_used * 0.00001  # Estimación rough
+                "estimated_cost_usd": tokens_used * 0.00001,  # Estimación rough
+                "timings_ms": timings_ms,  # Desglose por etapa (embedding, search, llm)
+                "llm_model": llm_model,
+                "hedged": hedged_call,  # Respondió la request de respaldo
+                "degraded": completion is None,
+                "degraded_reason": degraded_reason,
+                "deadline_s": settings.query_deadline_seconds
             }
         )
 
+    except DeadlineExceeded as e:
+        # Sin evidencias no hay respuesta útil que degradar
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+async def complete_with_hedge(
+    openai_client: "AsyncOpenAI",
+    system_prompt: str,
+    user_prompt: str,
+    deadline: Deadline
+):
+    """
+    Completion del LLM con hedge y acotada por el deadline
+
+    Returns:
+        (completion o None, modelo que respondió, si respondió el hedge,
+        motivo de la degradación o None)
+    """
+    if deadline.remaining() < settings.llm_min_budget_seconds:
+        return None, None, False, "deadline"
+
+    models = [settings.openai_llm_model]
+    if settings.llm_hedge_enabled:
+        models.append(settings.openai_fallback_llm_model or settings.openai_llm_model)
+
+    # Cada llamada (también el hedge) pide cuota; OpenAI cuenta max_tokens entero
+    quota = get_quota_scheduler("llm")
+    max_tokens = 500
+    tokens = estimate_tokens(system_prompt, user_prompt) + max_tokens
+
+    def call(model: str):
+        return lambda: quota.run(
+            lambda: openai_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                max_tokens=max_tokens
+            ),
+            tokens,
+            "interactive",
+            settle=False
+        )
+
+    hedge_delay = max(
+        settings.llm_hedge_min_delay,
+        _llm_latency.percentile(settings.llm_hedge_percentile, settings.llm_hedge_initial_delay)
+    )
+    started = time.perf_counter()
+    try:
+        completion, index = await deadline.run(
+            hedged([call(model) for model in models], hedge_delay), "llm"
+        )
+    except DeadlineExceeded:
+        return None, None, False, "deadline"
+    except Exception as e:
+        print(f"❌ LLM error: {e}")
+        return None, None, False, "llm_error"
+
+    _llm_latency.record(time.perf_counter() - started)
+    return completion, models[index], index > 0, None
+
+
+def collapse_duplicates(results: List[Dict[str, Any]]):
+    """
+    Agrupar casi duplicados (misma fórmula en muchas páginas) en una evidencia
+
+    La ingesta marca cada casi duplicado con `duplicate_of` (su canónico):
+    de cada grupo queda el resultado con más score, con `duplicates` = cuántos
+    se han agrupado. Mantiene el orden por score.
+
+    Returns:
+        (resultados, número de resultados agrupados)
+    """
+    kept: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        key = result.get("duplicate_of") or result.get("chunk_id")
+        best = kept.get(key)
+        if best is None:
+            kept[key] = {**result, "duplicates": 0}
+        else:
+            best["duplicates"] += 1
+    collapsed = list(kept.values())
+    return collapsed, len(results) - len(collapsed)
+
+
+def degraded_answer(results: List[Dict[str, Any]], max_sources: int = 3) -> str:
+    """Respuesta sin LLM: remitir a los fragmentos más relevantes"""
+    sources = "; ".join(
+        f"{r.get('title', 'Documento sin título')}, p. {r.get('page_number', 0)}"
+        for r in results[:max_sources]
+    )
+    return (
+        "No se ha podido generar una respuesta a tiempo. "
+        f"Los fragmentos más relevantes están en: {sources}."
+    )
+
+
 @app.post("/ingest", response_model=IngestResponse)
 async def ingest_document(
     request: IngestRequest,
@@ -270,6 +621,215 @@ async def ingest_document(
         raise HTTPException(status_code=500, detail=f"Error ingesting document: {str(e)}")
 
 
+@app.post("/ingest/stream", response_model=IngestResponse)
+async def ingest_document_stream(
+    document_id: str,
+    request: Request,
+    vector_db: VectorDBInterface = Depends(get_vector_db_dep)
+):
+    """
+    Ingesta en streaming con formato binario (ver api/ingest_format.py)
+
+    El cuerpo se decodifica de forma incremental: los vectores float32 van
+    en batches directamente a matrices, sin parsear listas JSON de floats.
+    Admite `Content-Encoding: zstd|gzip`. La descompresión y el decodificado
+    corren en el pool de CPU del índice.
+
+    Todo el cuerpo (acotado por `INGEST_STREAM_MAX_BYTES`) se valida antes de
+    escribir nada: un registro inválido no deja el documento a medias.
+    """
+    required_fields = ["chunk_id", "chunk_text", "page_number"]
+
+    try:
+        decoder = StreamDecoder(
+            compression=request.headers.get("content-encoding"),
+            max_bytes=settings.ingest_stream_max_bytes,
+            expected_dim=getattr(vector_db, "dim", None)
+        )
+        batches = []
+
+        def validate(decoded) -> None:
+            for chunks, vectors in decoded:
+                for chunk in chunks:
+                    for field in required_fields:
+                        if field not in chunk:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"Missing required field '{field}' in chunk"
+                            )
+                    if chunk.setdefault("document_id", document_id) != document_id:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=(
+                                f"Chunk {chunk['chunk_id']} belongs to document "
+                                f"'{chunk['document_id']}', not '{document_id}'"
+                            )
+                        )
+                batches.append((chunks, vectors))
+
+        async for piece in request.stream():
+            validate(await run_cpu_bound(decoder.feed, piece))
+        validate(await run_cpu_bound(decoder.close))
+
+        chunks_ingested = 0
+        for chunks, vectors in batches:
+            if not await vector_db.upsert_vectors(chunks, vectors):
+                raise HTTPException(
+                    status_code=500,
+                    detail="Failed to insert chunks into vector DB"
+                )
+            chunks_ingested += len(chunks)
+
+        return IngestResponse(
+            success=True,
+            document_id=document_id,
+            chunks_ingested=chunks_ingested,
+            message=f"Successfully ingested {chunks_ingested} chunks"
+        )
+
+    except HTTPException:
+        raise
+    except IngestFormatError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ingest stream: {str(e)}")
+    except ValueError as e:
+        # Dimensión distinta a la del índice (se comprueba antes de escribir)
+        raise HTTPException(status_code=400, detail=f"Invalid ingest stream: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting document: {str(e)}")
+
+
+@app.get("/documents/{document_id}/chunks", response_model=DocumentChunksResponse)
+async def get_document_chunks(
+    document_id: str,
+    vector_db: VectorDBInterface = Depends(get_vector_db_dep)
+):
+    """
+    IDs de los chunks indexados de un documento
+
+    El worker lo usa para re-ingestar solo los chunks que han cambiado
+    (los IDs de chunk son deterministas a partir del contenido). En modo
+    reader se responde desde el writer: la generación publicada puede no
+    incluir aún el último upload del documento.
+    """
+    chunk_ids = await vector_db.get_document_chunk_ids(document_id)
+    return DocumentChunksResponse(document_id=document_id, chunk_ids=chunk_ids)
+
+
+@app.delete("/documents/{document_id}", response_model=DocumentDeleteResponse)
+async def delete_document(
+    document_id: str,
+    vector_db: VectorDBInterface = Depends(get_vector_db_dep)
+):
+    """Eliminar todos los chunks de un documento"""
+    try:
+        deleted = await vector_db.delete_document(document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+
+    return DocumentDeleteResponse(
+        success=True,
+        document_id=document_id,
+        chunks_deleted=deleted
+    )
+
+
+@app.post("/documents/{document_id}/prune", response_model=DocumentDeleteResponse)
+async def prune_document(
+    document_id: str,
+    request: PruneRequest,
+    vector_db: VectorDBInterface = Depends(get_vector_db_dep)
+):
+    """
+    Reemplazo de documento: eliminar los chunks que no están en `keep_chunk_ids`
+
+    Se llama tras subir la nueva versión del documento para retirar los
+    chunks obsoletos de la versión anterior.
+    """
+    try:
+        deleted = await vector_db.prune_document(document_id, request.keep_chunk_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error pruning document: {str(e)}")
+
+    return DocumentDeleteResponse(
+        success=True,
+        document_id=document_id,
+        chunks_deleted=deleted
+    )
+
+
+# ============ GENERACIONES DEL ÍNDICE (blue/green) ============
+
+def index_manifest() -> Dict[str, Any]:
+    """Configuración con la que se construye el índice (manifiesto de generación)"""
+    return {
+        "embedding_model": settings.openai_embedding_model,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap
+    }
+
+
+def _require_index_dir() -> str:
+    if not settings.index_dir:
+        raise HTTPException(status_code=400, detail="Index generations require INDEX_DIR")
+    return settings.index_dir
+
+
+@app.get("/index/generations")
+async def list_index_generations():
+    """Generaciones del índice: en servicio, de rollback, candidatas y antiguas"""
+    from .shared_index import list_generations
+    return {"generations": list_generations(_require_index_dir())}
+
+
+async def _switch_generation(name: str, force: bool) -> Dict[str, Any]:
+    """Cambiar el índice en memoria (writer o local) y el puntero CURRENT"""
+    from .shared_index import GenerationRejected, switch_index
+    from .vectordb import SimpleInMemoryVectorDB
+
+    index_dir = _require_index_dir()
+    vector_db = get_vector_db_dep()
+    if not isinstance(vector_db, SimpleInMemoryVectorDB):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Generation switch not supported by backend {settings.vector_db_backend}"
+        )
+    try:
+        result = await switch_index(
+            vector_db, index_dir, name, keep=settings.index_keep_generations, force=force
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Generation not found: {name}")
+    except GenerationRejected as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if _index_publisher is not None:
+        # El contenido nuevo ya está publicado: no volver a publicarlo
+        _index_publisher.published_version = vector_db.version
+    return result
+
+
+@app.post("/index/generations/{name}/activate")
+async def activate_index_generation(name: str, request: Optional[ActivateGenerationRequest] = None):
+    """
+    Poner en servicio una generación candidata (blue/green)
+
+    En modo reader se reenvía al writer; los readers cambian al ver el nuevo
+    `CURRENT`. La generación anterior queda disponible para `/index/rollback`.
+    """
+    return await _switch_generation(name, request.force if request else False)
+
+
+@app.post("/index/rollback")
+async def rollback_index_generation(request: Optional[ActivateGenerationRequest] = None):
+    """Volver a la generación que estaba en servicio antes de la última activación"""
+    from .shared_index import previous_generation
+
+    previous = previous_generation(_require_index_dir())
+    if previous is None:
+        raise HTTPException(status_code=404, detail="No previous generation to roll back to")
+    return await _switch_generation(previous, request.force if request else False)
+
+
 @app.get("/collections")
 async def list_collections():
     """
@@ -323,25 +883,13 @@ async def get_stats(vector_db: VectorDBInterface = Depends(get_vector_db_dep)):
         "avg_chunk_size": 700,
         "collections": 4,
         "last_update": "2024-01-15T10:30:00Z",
-        "index_health": "healthy"
+        "index_health": "healthy",
+        "openai_quota": {
+            resource: dict(get_quota_scheduler(resource).stats) for resource in ("embeddings", "llm")
+        }
     }
 
 
-# ============ STARTUP ============
-
-@app.on_event("startup")
-async def startup_event():
-    """Inicialización al arrancar"""
-    print("=" * 60)
-    print("🚀 Scriptorium AI - RAG Backend")
-    print("=" * 60)
-    print(f"Vector DB: In-Memory (Development)")
-    print(f"Embeddings: OpenAI {settings.openai_embedding_model}")
-    print(f"LLM: OpenAI {settings.openai_llm_model}")
-    print(f"CORS Origins: {settings.cors_origins}")
-    print("=" * 60)
-
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
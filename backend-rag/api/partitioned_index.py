@@ -0,0 +1,382 @@
+"""
+Índice en memoria particionado por colección
+
+Casi todas las consultas van acotadas a una colección (notarial,
+parroquial...), así que no hace falta tener todas residentes. Cada colección
+es una partición (`SimpleInMemoryVectorDB`) guardada en su propio directorio
+de `PARTITIONS_DIR`:
+
+- Se carga del disco la primera vez que se usa.
+- Las particiones cargadas forman un LRU con un presupuesto de memoria
+  (`PARTITION_MEMORY_BUDGET_MB`); al superarlo se descargan las menos usadas
+  (guardándolas antes si tienen cambios).
+- Las consultas con `collection` solo tocan esa partición; con `book_ids`,
+  las colecciones de esos documentos; sin filtro se reparten entre las
+  particiones cargadas y después se cargan las demás bajo demanda.
+
+Así una instancia puede servir un corpus mayor que su RAM: solo las
+colecciones en uso ocupan memoria.
+
+Disco:
+    PARTITIONS_DIR/manifest.json     colecciones y documento → colección
+    PARTITIONS_DIR/<colección>-<hash>/ partición (formato de SimpleInMemoryVectorDB.save)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+
+import numpy as np
+
+from .vectordb import VectorDBInterface, SimpleInMemoryVectorDB
+
+DEFAULT_COLLECTION = "general"
+MANIFEST_FILE = "manifest.json"
+
+
+def partition_dirname(collection: str) -> str:
+    """Nombre de directorio seguro y estable para una colección"""
+    slug = re.sub(r"[^\w-]", "_", collection)[:40]
+    digest = hashlib.sha1(collection.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+class _Partition:
+    """Partición cargada: índice, cambios pendientes y usos en curso"""
+
+    def __init__(self, collection: str, db: SimpleInMemoryVectorDB):
+        self.collection = collection
+        self.db = db
+        self.dirty = False
+        self.pins = 0  # Operaciones en curso: no se puede descargar
+
+
+class PartitionedVectorDB(VectorDBInterface):
+    """Índice en memoria con una partición por colección, carga diferida y LRU"""
+
+    def __init__(
+        self,
+        root: str,
+        memory_budget_bytes: int = 2 * 1024 ** 3,
+        flush_interval: float = 30.0,
+        text_compression: Optional[str] = None
+    ):
+        """
+        Args:
+            root: Directorio de particiones
+            memory_budget_bytes: Memoria máxima de las particiones cargadas
+            flush_interval: Segundos máximos que un cambio queda sin guardar
+            text_compression: Compresión del texto de los chunks en particiones nuevas
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.flush_interval = flush_interval
+        self.text_compression = text_compression
+
+        # Colecciones persistidas y documento → colección
+        self.collections: Set[str] = set()
+        self.documents: Dict[str, str] = {}
+        self._load_manifest()
+
+        # Particiones cargadas, de menos a más recientemente usada
+        self._loaded: "OrderedDict[str, _Partition]" = OrderedDict()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._flushed_at = time.monotonic()
+
+        # Contadores para /ready y benchmarks
+        self.loads = 0
+        self.evictions = 0
+
+    # ============ MANIFEST ============
+
+    def _load_manifest(self) -> None:
+        path = self.root / MANIFEST_FILE
+        if not path.exists():
+            return
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        self.collections = set(manifest["collections"])
+        self.documents = manifest["documents"]
+
+    def _save_manifest(self) -> None:
+        tmp = self.root / f".{MANIFEST_FILE}.tmp"
+        tmp.write_text(
+            json.dumps(
+                {"collections": sorted(self.collections), "documents": self.documents},
+                ensure_ascii=False
+            ),
+            encoding="utf-8"
+        )
+        os.replace(tmp, self.root / MANIFEST_FILE)
+
+    # ============ CARGA / DESCARGA ============
+
+    def resident_bytes(self) -> int:
+        """Memoria estimada de las particiones cargadas"""
+        return sum(partition.db.nbytes() for partition in self._loaded.values())
+
+    async def _partition(self, collection: str) -> _Partition:
+        """Partición de una colección, cargándola (o creándola) si hace falta"""
+        partition = self._loaded.get(collection)
+        if partition is not None:
+            self._loaded.move_to_end(collection)
+            return partition
+
+        lock = self._load_locks.setdefault(collection, asyncio.Lock())
+        async with lock:
+            partition = self._loaded.get(collection)
+            if partition is None:
+                directory = self.root / partition_dirname(collection)
+                if collection in self.collections and directory.exists():
+                    db = await asyncio.to_thread(SimpleInMemoryVectorDB.load, str(directory))
+                    self.loads += 1
+                else:
+                    db = SimpleInMemoryVectorDB(text_compression=self.text_compression)
+                partition = _Partition(collection, db)
+                self._loaded[collection] = partition
+            self._loaded.move_to_end(collection)
+        return partition
+
+    @asynccontextmanager
+    async def _use(self, collection: str):
+        """Usar una partición impidiendo que se descargue mientras tanto"""
+        partition = await self._partition(collection)
+        partition.pins += 1
+        try:
+            yield partition
+        finally:
+            partition.pins -= 1
+            await self._evict()
+
+    async def _evict(self) -> None:
+        """Descargar particiones LRU hasta volver al presupuesto de memoria"""
+        for collection in list(self._loaded):
+            if self.resident_bytes() <= self.memory_budget_bytes:
+                return
+            # Con el lock de carga: quien la pida mientras se guarda espera
+            # y la vuelve a leer del disco ya completa
+            async with self._load_locks.setdefault(collection, asyncio.Lock()):
+                partition = self._loaded.get(collection)
+                if partition is None or partition.pins:
+                    continue
+                if partition.dirty:
+                    try:
+                        await self._save_partition(partition)
+                    except Exception as e:
+                        # Sigue cargada (y con cambios) hasta que se pueda guardar
+                        print(f"⚠️ Could not save partition {collection}, keeping it loaded: {e}")
+                        continue
+                    # Mientras se guardaba pudo usarse (la ruta rápida de
+                    # `_partition` no toma el lock): se descarta solo si nadie
+                    # la tiene fijada ni ha vuelto a escribir en ella
+                    if partition.pins or partition.dirty:
+                        continue
+                del self._loaded[collection]
+            self.evictions += 1
+
+    async def _save_partition(self, partition: _Partition) -> None:
+        """
+        Guardar una partición (nuevo directorio + rename, nunca a medio escribir)
+
+        `dirty` solo se limpia si la escritura termina; si falla, la versión
+        anterior del disco queda en su sitio y la excepción se propaga.
+        """
+        directory = self.root / partition_dirname(partition.collection)
+        tmp = directory.with_name(directory.name + ".tmp")
+        old = directory.with_name(directory.name + ".old")
+
+        def write() -> None:
+            shutil.rmtree(tmp, ignore_errors=True)
+            try:
+                partition.db.save(str(tmp))
+                if directory.exists():
+                    os.rename(directory, old)
+                try:
+                    os.rename(tmp, directory)
+                except BaseException:
+                    if old.exists() and not directory.exists():
+                        os.rename(old, directory)
+                    raise
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            shutil.rmtree(old, ignore_errors=True)
+
+        async with partition.db.write_lock:
+            await asyncio.to_thread(write)
+            partition.dirty = False
+        if partition.collection not in self.collections:
+            self.collections.add(partition.collection)
+            await asyncio.to_thread(self._save_manifest)
+
+    async def flush(self) -> None:
+        """Guardar las particiones con cambios y el manifest"""
+        for partition in list(self._loaded.values()):
+            if partition.dirty:
+                await self._save_partition(partition)
+        await asyncio.to_thread(self._save_manifest)
+        self._flushed_at = time.monotonic()
+
+    async def _after_write(self) -> None:
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            await self.flush()
+
+    # ============ ESCRITURA ============
+
+    async def upsert(self, chunks: List[Dict[str, Any]]) -> bool:
+        """Guardar chunks en la partición de su colección"""
+        if not chunks:
+            return True
+        vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+        return await self.upsert_vectors(chunks, vectors)
+
+    async def upsert_vectors(self, chunks: List[Dict[str, Any]], vectors: np.ndarray) -> bool:
+        """Repartir los chunks por colección y escribirlos en cada partición"""
+        if not chunks:
+            return True
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        by_collection: Dict[str, List[int]] = {}
+        for idx, chunk in enumerate(chunks):
+            collection = chunk.get("collection") or DEFAULT_COLLECTION
+            by_collection.setdefault(collection, []).append(idx)
+
+        for collection, indices in by_collection.items():
+            # Un documento que cambia de colección se retira de la anterior
+            moved = {
+                chunks[idx].get("document_id") for idx in indices
+                if self.documents.get(chunks[idx].get("document_id"), collection) != collection
+            }
+            for document_id in moved:
+                await self.delete_document(document_id)
+
+            async with self._use(collection) as partition:
+                await partition.db.upsert_vectors([chunks[idx] for idx in indices], vectors[indices])
+                partition.dirty = True
+            for idx in indices:
+                self.documents[chunks[idx].get("document_id")] = collection
+
+        await self._after_write()
+        return True
+
+    async def delete(self, chunk_ids: List[str]) -> bool:
+        """
+        Eliminar chunks por ID
+
+        Los IDs no indican su colección: se buscan primero en las particiones
+        cargadas y, si faltan, en el resto (cargándolas).
+        """
+        pending = set(chunk_ids)
+        loaded = list(self._loaded)
+        for collection in loaded + sorted(self.collections - set(loaded)):
+            if not pending:
+                break
+            async with self._use(collection) as partition:
+                found = [chunk_id for chunk_id in pending if chunk_id in partition.db]
+                if found:
+                    await partition.db.delete(found)
+                    partition.dirty = True
+                    pending.difference_update(found)
+        await self._after_write()
+        return True
+
+    async def delete_document(self, document_id: str) -> int:
+        """Eliminar un documento tocando solo la partición de su colección"""
+        collection = self.documents.get(document_id)
+        if collection is None:
+            return 0
+        async with self._use(collection) as partition:
+            deleted = await partition.db.delete_document(document_id)
+            partition.dirty = True
+        self.documents.pop(document_id, None)
+        await self._after_write()
+        return deleted
+
+    async def prune_document(self, document_id: str, keep_chunk_ids: List[str]) -> int:
+        """Poda de chunks obsoletos en la partición del documento"""
+        collection = self.documents.get(document_id)
+        if collection is None:
+            return 0
+        async with self._use(collection) as partition:
+            deleted = await partition.db.prune_document(document_id, keep_chunk_ids)
+            if deleted:
+                partition.dirty = True
+        await self._after_write()
+        return deleted
+
+    # ============ LECTURA ============
+
+    async def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        collection = self.documents.get(document_id)
+        if collection is None:
+            return []
+        async with self._use(collection) as partition:
+            return await partition.db.get_document_chunk_ids(document_id)
+
+    def _target_collections(self, filter_metadata: Optional[Dict[str, Any]]) -> List[str]:
+        """Colecciones que puede tocar una consulta (cargadas primero)"""
+        if filter_metadata and "collection" in filter_metadata:
+            value = filter_metadata["collection"]
+            targets = set(value if isinstance(value, (list, tuple, set)) else [value])
+        elif filter_metadata and "book_ids" in filter_metadata:
+            targets = {
+                self.documents[document_id]
+                for document_id in filter_metadata["book_ids"]
+                if document_id in self.documents
+            }
+        else:
+            targets = self.collections | set(self._loaded)
+
+        loaded = [collection for collection in reversed(self._loaded) if collection in targets]
+        return loaded + sorted(targets - set(loaded))
+
+    async def search(
+        self,
+        query_vector: List[float],
+        top_k: int = 10,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Buscar en las particiones afectadas y combinar el top-k
+
+        El filtro de colección ya lo resuelve la elección de particiones;
+        dentro de cada una solo se aplica el resto del filtro (book_ids).
+        """
+        inner_filter = {
+            key: value for key, value in (filter_metadata or {}).items() if key != "collection"
+        } or None
+
+        results: List[Dict[str, Any]] = []
+        for collection in self._target_collections(filter_metadata):
+            if collection not in self._loaded and collection not in self.collections:
+                continue
+            async with self._use(collection) as partition:
+                results.extend(await partition.db.search(query_vector, top_k, inner_filter))
+
+        results.sort(key=lambda chunk: chunk["score"], reverse=True)
+        return results[:top_k]
+
+    # ============ ESTADO ============
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": "partitioned",
+            "ready": True,
+            "collections": len(self.collections | set(self._loaded)),
+            "loaded": list(self._loaded),
+            "resident_mb": round(self.resident_bytes() / 1024 ** 2, 1),
+            "budget_mb": round(self.memory_budget_bytes / 1024 ** 2, 1),
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    async def close(self) -> None:
+        """Guardar los cambios pendientes al parar"""
+        await self.flush()
@@ -0,0 +1,300 @@
+"""
+Planificador de cuota de OpenAI (requests/min y tokens/min)
+
+La re-ingesta masiva (`EmbeddingService.embed_batch`) y las consultas
+interactivas (/query) comparten los límites de la cuenta de OpenAI: un batch
+grande acaparaba la cuota y las consultas acababan en 429 y reintentos.
+
+Cada llamada a OpenAI pide antes su cuota a un `QuotaScheduler`:
+
+- Dos token buckets por recurso (embeddings, LLM): requests/min y tokens/min,
+  con capacidad para `burst_seconds` de tráfico.
+- Prioridades: "interactive" puede vaciar el bucket; "bulk" deja siempre una
+  reserva (`bulk_reserve`) y cede mientras haya llamadas interactivas
+  esperando, en este proceso o en otro.
+- Reparto justo: dentro de un proceso, las llamadas de una misma prioridad se
+  atienden por orden de llegada. Solo la primera de la cola consulta los
+  buckets; el resto espera a que cambie el turno.
+- Entre procesos (workers de uvicorn, varias ingestas) el estado de los
+  buckets vive en un fichero JSON pequeño protegido con `flock`; las
+  transacciones sobre el fichero se hacen en un thread para que la espera
+  del `flock` no bloquee el event loop.
+
+Los tokens se estiman antes de la llamada (~4 caracteres por token) y, si la
+respuesta trae `usage`, se corrige la diferencia. Un 429 vacía los buckets
+para que todos los procesos frenen a la vez.
+"""
+import asyncio
+import fcntl
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+PRIORITIES = ["interactive", "bulk"]
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Estimación barata de tokens (~4 caracteres por token)"""
+    return max(1, sum(len(text) for text in texts) // 4)
+
+
+class _MemoryState:
+    """Estado de los buckets en memoria (un solo proceso)"""
+
+    blocking = False
+
+    def __init__(self):
+        self._state: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Dict[str, float]]:
+        with self._lock:
+            yield self._state
+
+
+class _FileState:
+    """Estado de los buckets en un fichero compartido entre procesos"""
+
+    # La transacción puede esperar al `flock` de otro proceso: fuera del event loop
+    blocking = True
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Dict[str, float]]:
+        with self._lock, open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}  # Fichero a medio escribir por un proceso muerto: buckets llenos
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class QuotaScheduler:
+    """Token buckets (RPM + TPM) con prioridades para las llamadas a OpenAI"""
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        state_path: Optional[str] = None,
+        bulk_reserve: float = 0.2,
+        burst_seconds: float = 10.0,
+        max_poll: float = 0.25
+    ):
+        """
+        Args:
+            rpm: Requests por minuto (None = sin límite)
+            tpm: Tokens por minuto (None = sin límite)
+            state_path: Fichero de estado compartido entre procesos (None = en memoria)
+            bulk_reserve: Fracción de cada bucket que "bulk" no puede gastar
+            burst_seconds: Capacidad de los buckets, en segundos de tráfico
+            max_poll: Espera máxima entre reintentos de adquirir cuota
+        """
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.bulk_reserve = bulk_reserve
+        self.burst_seconds = burst_seconds
+        self.max_poll = max_poll
+        self._state = _FileState(state_path) if state_path else _MemoryState()
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        # Se activa (y se sustituye) cada vez que una llamada sale de su cola
+        self._turn = asyncio.Event()
+        self.stats = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits.values())
+
+    def _capacity(self, key: str) -> float:
+        return self.limits[key] / 60.0 * self.burst_seconds
+
+    def _refill(self, state: Dict[str, float], now: float) -> None:
+        elapsed = max(0.0, now - state.get("updated", now))
+        for key, limit in self.limits.items():
+            if limit:
+                capacity = self._capacity(key)
+                state[key] = min(capacity, state.get(key, capacity) + elapsed * limit / 60.0)
+        state["updated"] = now
+
+    async def _transact(self, operation: Callable[..., Any], *args) -> Any:
+        """Ejecutar una operación sobre el estado (en un thread si es el fichero)"""
+        if self._state.blocking:
+            return await asyncio.to_thread(operation, *args)
+        return operation(*args)
+
+    def _try_take(self, need: Dict[str, int], priority: str) -> float:
+        """Descontar la cuota si hay; si no, segundos estimados hasta que la haya"""
+        now = time.time()
+        bulk = priority != "interactive"
+        with self._state.transaction() as state:
+            self._refill(state, now)
+            amounts = {}
+            wait = 0.0
+            for key, amount in need.items():
+                limit = self.limits[key]
+                if not limit:
+                    continue
+                capacity = self._capacity(key)
+                reserve = capacity * self.bulk_reserve if bulk else 0.0
+                # Nunca pedir más que lo que el bucket puede llegar a tener
+                amounts[key] = min(amount, capacity - reserve)
+                missing = amounts[key] + reserve - state[key]
+                if missing > 0:
+                    wait = max(wait, missing / (limit / 60.0))
+
+            if bulk and state.get("interactive_until", 0.0) > now:
+                return max(wait, self.max_poll)
+            if wait == 0.0:
+                for key, amount in amounts.items():
+                    state[key] -= amount
+                return 0.0
+            if not bulk:
+                # Aviso a los "bulk" de todos los procesos: ceder hasta que esto pase
+                state["interactive_until"] = max(
+                    state.get("interactive_until", 0.0), now + wait + self.max_poll
+                )
+            return wait
+
+    async def acquire(self, tokens: int, priority: str = "bulk", requests: int = 1) -> float:
+        """
+        Esperar hasta tener cuota para una llamada
+
+        Args:
+            tokens: Tokens estimados de la llamada
+            priority: "interactive" o "bulk"
+            requests: Requests que consume
+
+        Returns:
+            Segundos de espera
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}")
+        if not self.enabled:
+            return 0.0
+
+        ticket = object()
+        queue = self._waiting[priority]
+        higher = PRIORITIES[:PRIORITIES.index(priority)]
+        queue.append(ticket)
+        started = time.monotonic()
+        try:
+            while True:
+                if queue[0] is ticket and not any(self._waiting[p] for p in higher):
+                    wait = await self._transact(
+                        self._try_take, {"requests": requests, "tokens": tokens}, priority
+                    )
+                    if wait == 0.0:
+                        break
+                    # Jitter para que los "bulk" de varios procesos no despierten a la vez
+                    jitter = random.uniform(0.8, 1.2) if priority == "bulk" else 1.0
+                    await asyncio.sleep(min(wait, self.max_poll) * jitter)
+                else:
+                    # Turno de otra llamada de este proceso: esperar a que salga de su cola
+                    await self._turn.wait()
+        finally:
+            queue.remove(ticket)
+            turn, self._turn = self._turn, asyncio.Event()
+            turn.set()
+
+        waited = time.monotonic() - started
+        self.stats[f"{priority}_calls"] += 1
+        self.stats[f"{priority}_wait_seconds"] += waited
+        return waited
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Corregir el bucket de tokens con el consumo real"""
+        if not self.limits["tokens"] or actual == estimated:
+            return
+        with self._state.transaction() as state:
+            self._refill(state, time.time())
+            state["tokens"] = min(self._capacity("tokens"), state["tokens"] + estimated - actual)
+
+    def throttle(self) -> None:
+        """OpenAI respondió 429: vaciar los buckets (frena a todos los procesos)"""
+        self.stats["rate_limited"] += 1
+        with self._state.transaction() as state:
+            self._refill(state, time.time())
+            for key, limit in self.limits.items():
+                if limit:
+                    state[key] = min(state[key], 0.0)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        tokens: int,
+        priority: str = "bulk",
+        settle: bool = True
+    ) -> Any:
+        """
+        Adquirir cuota y ejecutar una llamada a OpenAI
+
+        Args:
+            call: Factory de la llamada
+            tokens: Tokens estimados
+            priority: "interactive" o "bulk"
+            settle: Corregir con `usage.total_tokens` de la respuesta (no en
+                chat: OpenAI cuenta `max_tokens` completo para el límite)
+        """
+        await self.acquire(tokens, priority)
+        try:
+            response = await call()
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                await self._transact(self.throttle)
+            raise
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if settle and actual is not None:
+            await self._transact(self.settle, tokens, actual)
+        return response
+
+
+# Singletons por recurso
+_schedulers: Dict[str, QuotaScheduler] = {}
+
+
+def get_quota_scheduler(resource: str) -> QuotaScheduler:
+    """
+    Planificador de cuota de un recurso ("embeddings" o "llm")
+
+    Con `OPENAI_QUOTA_STATE_DIR`, todos los procesos que lo comparten
+    (API e ingesta) reparten la misma cuota.
+    """
+    if resource not in _schedulers:
+        from .config import get_settings
+
+        settings = get_settings()
+        limits = {
+            "embeddings": (settings.openai_embedding_rpm, settings.openai_embedding_tpm),
+            "llm": (settings.openai_llm_rpm, settings.openai_llm_tpm),
+        }
+        if resource not in limits:
+            raise ValueError(f"Unknown quota resource '{resource}'. Available: {', '.join(limits)}")
+        rpm, tpm = limits[resource]
+        state_dir = settings.openai_quota_state_dir
+        _schedulers[resource] = QuotaScheduler(
+            rpm=rpm,
+            tpm=tpm,
+            state_path=str(Path(state_dir) / f"{resource}.json") if state_dir else None,
+            bulk_reserve=settings.openai_quota_bulk_reserve,
+            burst_seconds=settings.openai_quota_burst_seconds
+        )
+    return _schedulers[resource]
@@ -0,0 +1,549 @@
+"""
+Índice en memoria compartido entre workers de uvicorn
+
+Con `--workers N` cada proceso tendría su propia copia del índice en memoria
+(N veces la RAM) y cada `/ingest` solo llegaría al worker que lo recibe. En
+modo compartido:
+
+- Un único proceso **writer** (`INDEX_MODE=writer`) es dueño del índice:
+  recibe todas las escrituras y publica periódicamente un snapshot inmutable
+  (una "generación") en `INDEX_DIR`.
+- Los workers **reader** (`INDEX_MODE=reader`) mapean en memoria (mmap) los
+  vectores y las columnas de la generación actual: el page cache del sistema
+  es compartido, así que la memoria no crece con el número de workers. Las
+  escrituras que reciben se reenvían al writer (`INDEX_WRITER_URL`).
+
+Publicación atómica: cada generación se escribe en un directorio temporal,
+se renombra y después se actualiza el puntero `CURRENT` con `os.replace`.
+Los readers comprueban `CURRENT` como mucho cada `INDEX_REFRESH_INTERVAL`
+segundos y cambian de generación con una sola asignación, así que una
+consulta nunca ve un índice a medio escribir. Las generaciones antiguas se
+borran; los readers que aún las tengan mapeadas siguen leyéndolas (POSIX
+mantiene el fichero hasta que se cierra el último mapeo).
+
+Blue/green: `workers/rebuild_index.py` construye una generación candidata
+(`staged-*`, con otro chunking o modelo de embeddings) sin tocar la que está
+en servicio, la valida (recall sobre una muestra) y la activa con
+`activate_generation`: pasa a ser `CURRENT` y la anterior queda en
+`PREVIOUS` para el rollback (ninguna de las dos se poda). Cada generación
+lleva un manifiesto (`generation.json`) con el modelo y el chunking con los
+que se construyó.
+
+Uso:
+    INDEX_MODE=writer INDEX_DIR=/data/index uvicorn api.main:app --port 8001 --workers 1
+    INDEX_MODE=reader INDEX_DIR=/data/index INDEX_WRITER_URL=http://127.0.0.1:8001 \\
+        uvicorn api.main:app --port 8000 --workers 4
+"""
+import asyncio
+import json
+import mmap
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response, JSONResponse
+
+from .chunk_store import ColumnarChunkStore
+from .vectordb import VectorDBInterface, SimpleInMemoryVectorDB, cosine_search, cosine_search_async
+
+CURRENT_FILE = "CURRENT"
+PREVIOUS_FILE = "PREVIOUS"
+MANIFEST_FILE = "generation.json"
+GENERATION_PREFIX = "gen-"
+STAGED_PREFIX = "staged-"
+
+# Cabeceras que no se reenvían al writer (las recalcula httpx)
+_HOP_HEADERS = {"host", "content-length", "connection", "transfer-encoding"}
+
+
+# ============ GENERACIONES ============
+
+def _read_pointer(index_dir: str, pointer: str) -> Optional[str]:
+    try:
+        name = (Path(index_dir) / pointer).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def _write_pointer(root: Path, pointer: str, name: str) -> None:
+    tmp = root / f".{pointer}.tmp"
+    tmp.write_text(name, encoding="utf-8")
+    os.replace(tmp, root / pointer)
+
+
+def current_generation(index_dir: str) -> Optional[str]:
+    """Nombre de la generación publicada (None si aún no hay ninguna)"""
+    return _read_pointer(index_dir, CURRENT_FILE)
+
+
+def previous_generation(index_dir: str) -> Optional[str]:
+    """Generación que estaba en servicio antes de la última activación (rollback)"""
+    return _read_pointer(index_dir, PREVIOUS_FILE)
+
+
+def read_manifest(directory: Path) -> Dict[str, Any]:
+    """Manifiesto de una generación (vacío si es anterior a los manifiestos)"""
+    try:
+        return json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(directory: Path, manifest: Dict[str, Any]) -> None:
+    tmp = directory / f".{MANIFEST_FILE}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, directory / MANIFEST_FILE)
+
+
+def _prune_generations(root: Path, keep: int) -> None:
+    """Borrar generaciones antiguas salvo la vigente y la de rollback"""
+    protected = {current_generation(str(root)), previous_generation(str(root))}
+    # Las generaciones se ordenan por nombre (timestamp con ancho fijo)
+    generations = sorted(p.name for p in root.glob(f"{GENERATION_PREFIX}*") if p.is_dir())
+    for old in generations[:-max(1, keep)]:
+        if old not in protected:
+            shutil.rmtree(root / old, ignore_errors=True)
+
+
+def publish_snapshot(
+    db: SimpleInMemoryVectorDB,
+    index_dir: str,
+    keep: int = 2,
+    manifest: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Publicar el estado actual del índice como una nueva generación
+
+    El llamador debe impedir escrituras mientras tanto (`db.write_lock`).
+
+    Args:
+        db: Índice del writer
+        index_dir: Directorio de generaciones
+        keep: Generaciones que se conservan (incluida la nueva)
+        manifest: Manifiesto si la generación vigente no tiene (se hereda el suyo)
+
+    Returns:
+        Nombre de la generación publicada
+    """
+    root = Path(index_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    generation = f"{GENERATION_PREFIX}{time.time_ns():020d}"
+    tmp = root / f".{generation}.tmp"
+    db.save(str(tmp))
+    current = current_generation(index_dir)
+    inherited = read_manifest(root / current) if current else {}
+    if inherited or manifest:
+        write_manifest(tmp, inherited or manifest)
+    os.rename(tmp, root / generation)
+
+    _write_pointer(root, CURRENT_FILE, generation)
+    _prune_generations(root, keep)
+    return generation
+
+
+def stage_generation(db: SimpleInMemoryVectorDB, index_dir: str, manifest: Dict[str, Any]) -> str:
+    """
+    Guardar un índice reconstruido como generación candidata (sin servirla)
+
+    Returns:
+        Nombre de la candidata (`staged-*`)
+    """
+    root = Path(index_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    name = f"{STAGED_PREFIX}{time.time_ns():020d}"
+    tmp = root / f".{name}.tmp"
+    db.save(str(tmp))
+    write_manifest(tmp, manifest)
+    os.rename(tmp, root / name)
+    return name
+
+
+def activate_generation(index_dir: str, name: str, keep: int = 2) -> str:
+    """
+    Poner en servicio una generación (candidata o anterior) de forma atómica
+
+    Una candidata se renombra como generación publicada; la que estaba en
+    servicio queda en `PREVIOUS` para el rollback. Los readers cambian en su
+    siguiente comprobación de `CURRENT`.
+
+    Returns:
+        Nombre con el que queda publicada
+    """
+    root = Path(index_dir)
+    if not (root / name).is_dir():
+        raise FileNotFoundError(f"Generation not found: {name}")
+
+    published = name
+    if name.startswith(STAGED_PREFIX):
+        published = f"{GENERATION_PREFIX}{time.time_ns():020d}"
+        os.rename(root / name, root / published)
+
+    current = current_generation(index_dir)
+    if current and current != published:
+        _write_pointer(root, PREVIOUS_FILE, current)
+    _write_pointer(root, CURRENT_FILE, published)
+    _prune_generations(root, keep)
+    return published
+
+
+def list_generations(index_dir: str) -> List[Dict[str, Any]]:
+    """Generaciones publicadas y candidatas, con su estado y manifiesto"""
+    root = Path(index_dir)
+    current, previous = current_generation(index_dir), previous_generation(index_dir)
+    generations = []
+    for directory in sorted(root.glob(f"{GENERATION_PREFIX}*")) + sorted(root.glob(f"{STAGED_PREFIX}*")):
+        if not directory.is_dir():
+            continue
+        name = directory.name
+        meta = json.loads((directory / "index.json").read_text(encoding="utf-8"))
+        generations.append({
+            "name": name,
+            "state": (
+                "current" if name == current else "previous" if name == previous
+                else "staged" if name.startswith(STAGED_PREFIX) else "old"
+            ),
+            "chunks": meta["count"],
+            "dim": meta["dim"],
+            "manifest": read_manifest(directory)
+        })
+    return generations
+
+
+class GenerationRejected(Exception):
+    """La generación no cubre los documentos del índice en servicio"""
+
+
+async def switch_index(
+    db: SimpleInMemoryVectorDB,
+    index_dir: str,
+    name: str,
+    keep: int = 2,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    Cambiar el índice en memoria (writer o local) a otra generación
+
+    La carga se hace fuera del event loop; el cambio es un intercambio de
+    referencias bajo `write_lock`, así que las consultas no se detienen.
+
+    Args:
+        db: Índice en servicio
+        index_dir: Directorio de generaciones
+        name: Generación a activar (candidata o anterior)
+        keep: Generaciones publicadas que se conservan
+        force: Activar aunque falten documentos del índice en servicio
+            (p. ej. ingeridos mientras se construía la candidata)
+
+    Raises:
+        GenerationRejected: Si faltan documentos y no se fuerza
+    """
+    replacement = await asyncio.to_thread(SimpleInMemoryVectorDB.load, str(Path(index_dir) / name))
+    async with db.write_lock:
+        missing = sorted(d for d in set(db.documents) - set(replacement.documents) if d is not None)
+        if missing and not force:
+            raise GenerationRejected(
+                f"Generation {name} lacks {len(missing)} indexed documents "
+                f"(e.g. {', '.join(missing[:5])}); use force to activate anyway"
+            )
+        db.replace_contents(replacement)
+        published = await asyncio.to_thread(activate_generation, index_dir, name, keep)
+    print(f"🔀 Índice cambiado a {published} ({len(db):,} chunks)")
+    return {"generation": published, "chunks": len(db), "missing_documents": missing}
+
+
+def load_writer_index(index_dir: str, text_compression: Optional[str] = None) -> SimpleInMemoryVectorDB:
+    """Índice del writer: la última generación publicada, o uno vacío"""
+    generation = current_generation(index_dir)
+    if generation is None:
+        return SimpleInMemoryVectorDB(text_compression=text_compression)
+    db = SimpleInMemoryVectorDB.load(str(Path(index_dir) / generation))
+    print(f"📂 Índice restaurado de {generation}: {len(db):,} chunks")
+    return db
+
+
+class IndexPublisher:
+    """
+    Tarea de fondo del writer: publica una generación cuando hay cambios
+
+    Cada publicación reescribe el snapshot completo bajo `write_lock` (las
+    escrituras esperan; las búsquedas no): el coste es proporcional al
+    tamaño del índice, no al de los cambios. `interval` acota cuántas veces
+    se paga; `last_publish` guarda el tamaño y la duración de la última.
+    """
+
+    def __init__(
+        self,
+        db: SimpleInMemoryVectorDB,
+        index_dir: str,
+        interval: float = 2.0,
+        keep: int = 2,
+        manifest: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            db: Índice del writer
+            index_dir: Directorio de generaciones
+            interval: Segundos entre comprobaciones (agrupa escrituras seguidas)
+            keep: Generaciones que se conservan
+            manifest: Manifiesto de las generaciones si la vigente no tiene
+        """
+        self.db = db
+        self.index_dir = index_dir
+        self.interval = interval
+        self.keep = keep
+        self.manifest = manifest
+        self.published_version = db.version
+        self.last_publish: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self) -> Optional[str]:
+        """Publicar si hay cambios desde la última generación"""
+        if self.db.version == self.published_version:
+            return None
+        async with self.db.write_lock:
+            started = time.perf_counter()
+            version = self.db.version
+            generation = await asyncio.to_thread(
+                publish_snapshot, self.db, self.index_dir, self.keep, self.manifest
+            )
+            elapsed = time.perf_counter() - started
+        self.published_version = version
+        nbytes = sum(
+            p.stat().st_size for p in (Path(self.index_dir) / generation).rglob("*") if p.is_file()
+        )
+        self.last_publish = {
+            "generation": generation,
+            "chunks": len(self.db),
+            "bytes": nbytes,
+            "seconds": elapsed
+        }
+        print(f"📤 Publicada {generation} ({len(self.db):,} chunks, {nbytes / 1e6:.1f} MB en {elapsed:.2f}s)")
+        return generation
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.publish()
+            except Exception as e:
+                print(f"❌ Error publicando el índice: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Parar y publicar los cambios pendientes"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.publish()
+
+
+# ============ READER ============
+
+class _Generation:
+    """Una generación mapeada en memoria (solo lectura)"""
+
+    def __init__(self, directory: Path):
+        self.name = directory.name
+        meta = json.loads((directory / "index.json").read_text(encoding="utf-8"))
+        self.count = meta["count"]
+        self.vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        self.norms = np.load(directory / "norms.npy", mmap_mode="r")
+        self.store = ColumnarChunkStore.load(str(directory / "columns"), mmap=True)
+        self.id_offsets = np.load(directory / "id_offsets.npy", mmap_mode="r")
+        ids_path = directory / "ids.bin"
+        self.ids = (
+            np.memmap(ids_path, dtype=np.uint8, mode="r")
+            if ids_path.stat().st_size else np.zeros(0, dtype=np.uint8)
+        )
+
+    def chunk_id(self, row: int) -> str:
+        start, end = int(self.id_offsets[row]), int(self.id_offsets[row + 1])
+        return bytes(self.ids[start:end]).decode("utf-8")
+
+
+def open_generation(index_dir: str, name: str) -> _Generation:
+    """Mapear una generación en memoria (solo lectura), como la verán los readers"""
+    return _Generation(Path(index_dir) / name)
+
+
+def generation_recall(
+    generation: _Generation,
+    query_vectors: np.ndarray,
+    expected: List[Tuple[str, int]],
+    k: int = 10
+) -> float:
+    """
+    Recall@k de una generación: fracción de consultas para las que la página
+    esperada (document_id, page_number) aparece entre los k primeros
+    """
+    if not expected:
+        return 0.0
+    hits = 0
+    for vector, (document_id, page_number) in zip(query_vectors, expected):
+        results = cosine_search(
+            generation.vectors, generation.norms, generation.store,
+            generation.chunk_id, vector, k
+        )
+        hits += any(
+            r.get("document_id") == document_id and r.get("page_number") == page_number
+            for r in results
+        )
+    return hits / len(expected)
+
+
+class SharedIndexReader(VectorDBInterface):
+    """
+    Índice de solo lectura sobre la generación publicada por el writer
+
+    Las escrituras no se aplican aquí: en modo reader `api/main.py` las
+    reenvía al writer antes de llegar a este objeto.
+    """
+
+    def __init__(self, index_dir: str, refresh_interval: float = 1.0):
+        """
+        Args:
+            index_dir: Directorio de generaciones
+            refresh_interval: Segundos entre comprobaciones del puntero CURRENT
+        """
+        self.index_dir = index_dir
+        self.refresh_interval = refresh_interval
+        self._generation: Optional[_Generation] = None
+        self._checked_at = 0.0
+        self._load_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return self._generation.count if self._generation else 0
+
+    @property
+    def generation(self) -> Optional[str]:
+        """Nombre de la generación que se está sirviendo"""
+        return self._generation.name if self._generation else None
+
+    async def _current(self) -> Optional[_Generation]:
+        """Generación vigente, cambiando a una nueva si se ha publicado"""
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return self._generation
+
+        async with self._load_lock:
+            if time.monotonic() - self._checked_at >= self.refresh_interval:
+                name = current_generation(self.index_dir)
+                if name is not None and (self._generation is None or name != self._generation.name):
+                    try:
+                        self._generation = await asyncio.to_thread(
+                            _Generation, Path(self.index_dir) / name
+                        )
+                    except FileNotFoundError:
+                        # Publicada y podada entre la lectura de CURRENT y la carga:
+                        # se reintenta en la siguiente comprobación
+                        pass
+                self._checked_at = time.monotonic()
+        return self._generation
+
+    async def warmup(self) -> None:
+        """Mapear la generación vigente y pedir al kernel que precargue los vectores"""
+        generation = await self._current()
+        if generation is None:
+            return
+        for array in (generation.vectors, generation.norms):
+            mapped = getattr(array, "_mmap", None)
+            if mapped is not None and hasattr(mmap, "MADV_WILLNEED"):
+                mapped.madvise(mmap.MADV_WILLNEED)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": "shared-reader",
+            "ready": self._generation is not None,
+            "generation": self.generation,
+            "chunks": len(self)
+        }
+
+    async def search(
+        self,
+        query_vector: List[float],
+        top_k: int = 10,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Buscar en la generación vigente"""
+        generation = await self._current()
+        if generation is None:
+            return []
+        return await cosine_search_async(
+            generation.vectors, generation.norms, generation.store,
+            generation.chunk_id, query_vector, top_k, filter_metadata
+        )
+
+    async def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs de los chunks de un documento en la generación vigente"""
+        generation = await self._current()
+        if generation is None:
+            return []
+        rows = generation.store.rows_where("document_id", document_id)
+        return [generation.chunk_id(int(row)) for row in rows]
+
+    async def upsert(self, chunks: List[Dict[str, Any]]) -> bool:
+        raise RuntimeError("Shared index reader is read-only; writes go to INDEX_WRITER_URL")
+
+    async def delete(self, chunk_ids: List[str]) -> bool:
+        raise RuntimeError("Shared index reader is read-only; writes go to INDEX_WRITER_URL")
+
+
+# ============ REENVÍO DE ESCRITURAS ============
+
+class WriterProxy:
+    """Reenvía al writer, tal cual y en streaming, las requests de escritura"""
+
+    def __init__(self, writer_url: Optional[str], timeout: float = 120.0):
+        self.writer_url = writer_url.rstrip("/") if writer_url else None
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def forward(self, request: Request) -> Response:
+        if not self.writer_url:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Index writer not configured (INDEX_WRITER_URL)"}
+            )
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.writer_url, timeout=self.timeout)
+
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS}
+        try:
+            upstream = await self._client.request(
+                request.method,
+                request.url.path,
+                params=request.query_params,
+                content=request.stream(),
+                headers=headers
+            )
+        except httpx.TransportError as e:
+            return JSONResponse(
+                status_code=502,
+                content={"detail": f"Index writer unreachable: {e}"}
+            )
+
+        return Response(
+            content=upstream.content,
+            status_code=upstream.status_code,
+            media_type=upstream.headers.get("content-type")
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -2,9 +2,19 @@
 Interfaz abstracta para Vector DB con implementaciones múltiples
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from google.cloud import aiplatform
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
 from .config import get_settings
+from .chunk_store import ColumnarChunkStore
 
 
 class VectorDBInterface(ABC):
@@ -30,20 +40,254 @@ class VectorDBInterface(ABC):
         """Eliminar chunks por IDs"""
         pass
 
+    @abstractmethod
+    async def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs de los chunks indexados de un documento"""
+        pass
+
+    async def warmup(self) -> None:
+        """Preparar el backend antes de servir la primera consulta (por defecto nada)"""
+        return None
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del backend para el endpoint de readiness"""
+        return {"backend": type(self).__name__, "ready": True}
+
+    async def close(self) -> None:
+        """Liberar recursos / persistir cambios pendientes al parar (por defecto nada)"""
+        return None
+
+    async def delete_document(self, document_id: str) -> int:
+        """
+        Eliminar todos los chunks de un documento
+
+        Returns:
+            Número de chunks eliminados
+        """
+        chunk_ids = await self.get_document_chunk_ids(document_id)
+        if chunk_ids and not await self.delete(chunk_ids):
+            raise RuntimeError(f"Failed to delete document {document_id}")
+        return len(chunk_ids)
+
+    async def prune_document(self, document_id: str, keep_chunk_ids: List[str]) -> int:
+        """
+        Reemplazo de documento: eliminar los chunks que ya no forman parte de él
+
+        Args:
+            document_id: ID del documento
+            keep_chunk_ids: Chunks vigentes del documento
+
+        Returns:
+            Número de chunks eliminados
+        """
+        keep = set(keep_chunk_ids)
+        stale = [
+            chunk_id for chunk_id in await self.get_document_chunk_ids(document_id)
+            if chunk_id not in keep
+        ]
+        if stale and not await self.delete(stale):
+            raise RuntimeError(f"Failed to prune document {document_id}")
+        return len(stale)
+
+    async def upsert_vectors(
+        self,
+        chunks: List[Dict[str, Any]],
+        vectors: np.ndarray
+    ) -> bool:
+        """
+        Insertar chunks con sus embeddings como matriz float32
+
+        Args:
+            chunks: Metadata de cada chunk (sin "embedding")
+            vectors: Matriz (len(chunks), dim)
+
+        Por defecto convierte a listas y delega en `upsert`; los backends
+        con almacenamiento en arrays lo sobrescriben para evitar la copia.
+        """
+        return await self.upsert([
+            {**chunk, "embedding": vector.tolist()}
+            for chunk, vector in zip(chunks, vectors)
+        ])
+
+
+class VertexDocumentIndex:
+    """
+    Índice secundario document_id → chunk_ids del backend Vertex (SQLite)
+
+    Vector Search no permite listar los datapoints de un documento: sin este
+    índice persistente, `prune_document` y la re-ingesta incremental dejarían
+    de funcionar tras un reinicio o en otro worker. SQLite en modo WAL admite
+    varios procesos sobre el mismo fichero (workers de uvicorn); con varias
+    instancias, el fichero debe estar en un volumen compartido.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_id);
+        """)
+
+    def add(self, chunks: List[Dict[str, Any]]) -> None:
+        """Registrar chunks ya escritos en Vertex"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_id) VALUES (?, ?)",
+                [(chunk["chunk_id"], chunk["document_id"]) for chunk in chunks]
+            )
+
+    def remove(self, chunk_ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+
+    def chunk_ids(self, document_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
 
 class VertexAIVectorSearch(VectorDBInterface):
-    """Implementación con Vertex AI Vector Search (GCP)"""
+    """
+    Implementación con Vertex AI Vector Search (GCP)
 
-    def __init__(self):
+    El SDK de aiplatform es síncrono: todas las llamadas bloqueantes se
+    ejecutan en un pool de threads dedicado y acotado para no congelar el
+    event loop. Los handles de índice/endpoint se crean una sola vez.
+    """
+
+    def __init__(self, sdk=None, document_index_path: Optional[str] = None):
+        """
+        Args:
+            sdk: Módulo compatible con `google.cloud.aiplatform` (inyectable)
+            document_index_path: Fichero SQLite del índice document_id → chunk_ids
+                (None = `vertex_ai_document_index_path`)
+        """
+        if sdk is None:
+            # Import diferido: aiplatform tarda segundos en importarse y solo
+            # hace falta cuando se selecciona este backend
+            from google.cloud import aiplatform as sdk
         self.settings = get_settings()
-        aiplatform.init(project=self.settings.google_cloud_project)
+        self.sdk = sdk
+        self.sdk.init(project=self.settings.google_cloud_project)
         self.index_id = self.settings.vertex_ai_index_id
         self.endpoint_id = self.settings.vertex_ai_endpoint_id
+        self.upsert_batch_size = self.settings.vertex_ai_upsert_batch_size
+
+        # Pool dedicado para las llamadas bloqueantes del SDK
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.vertex_ai_max_workers,
+            thread_name_prefix="vertex-ai"
+        )
+
+        # Handles cacheados (su construcción hace RPCs de metadata)
+        self._handles_lock = threading.Lock()
+        self._index = None
+        self._endpoint = None
+
+        # Índice secundario document_id → chunk_ids, persistente y compartido
+        # entre workers (Vector Search no puede listarlos)
+        self.documents = VertexDocumentIndex(
+            document_index_path or self.settings.vertex_ai_document_index_path
+        )
+
+    def _get_index(self):
+        """Obtener handle del índice, creándolo una sola vez"""
+        with self._handles_lock:
+            if self._index is None:
+                self._index = self.sdk.MatchingEngineIndex(self.index_id)
+            return self._index
+
+    def _get_endpoint(self):
+        """Obtener handle del endpoint, creándolo una sola vez"""
+        with self._handles_lock:
+            if self._endpoint is None:
+                self._endpoint = self.sdk.MatchingEngineIndexEndpoint(self.endpoint_id)
+            return self._endpoint
+
+    async def warmup(self) -> None:
+        """Crear el handle del endpoint (RPCs de metadata) antes de la primera búsqueda"""
+        await self._run_blocking(self._get_endpoint)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": "vertex",
+            "ready": self._endpoint is not None,
+            "index_id": self.index_id,
+            "endpoint_id": self.endpoint_id
+        }
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.documents.close()
+
+    async def _run_blocking(self, func: Callable, *args, **kwargs):
+        """Ejecutar una llamada síncrona del SDK en el pool dedicado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def _upsert_batch_sync(self, chunks: List[Dict[str, Any]]) -> None:
+        """Upsert síncrono de un batch (se ejecuta en el pool)"""
+        index = self._get_index()
+
+        # Preparar datos para Vertex AI
+        datapoints = []
+        for chunk in chunks:
+            datapoint = self.sdk.matching_engine.matching_engine_index_config.IndexDatapoint(
+                datapoint_id=chunk["chunk_id"],
+                feature_vector=chunk["embedding"],
+                restricts=[
+                    {"namespace": "document_id", "allow_list": [chunk["document_id"]]},
+                    {"namespace": "collection", "allow_list": [chunk.get("collection", "general")]},
+                ]
+            )
+            datapoints.append(datapoint)
+
+        index.upsert_datapoints(datapoints=datapoints)
+
+    def _find_neighbors_sync(
+        self,
+        query_vector: List[float],
+        top_k: int,
+        restricts: List[Dict[str, Any]]
+    ):
+        """Búsqueda síncrona (se ejecuta en el pool)"""
+        endpoint = self._get_endpoint()
+        return endpoint.find_neighbors(
+            deployed_index_id=self.endpoint_id,
+            queries=[query_vector],
+            num_neighbors=top_k,
+            filter=restricts if restricts else None
+        )
+
+    def _remove_sync(self, chunk_ids: List[str]) -> None:
+        """Borrado síncrono (se ejecuta en el pool)"""
+        index = self._get_index()
+        index.remove_datapoints(datapoint_ids=chunk_ids)
 
     async def upsert(self, chunks: List[Dict[str, Any]]) -> bool:
         """
         Insertar chunks en Vertex AI Vector Search
 
+        Los chunks se dividen en batches de tamaño acotado que se envían
+        en paralelo (limitado por el tamaño del pool). Los batches escritos
+        se registran en el índice de documentos aunque otro falle, para que
+        coincida con lo que hay en Vertex.
+
         Args:
             chunks: Lista de chunks con estructura:
                 {
@@ -56,35 +300,40 @@ class VertexAIVectorSearch(VectorDBInterface):
                     "collection": str,
                     ...metadata...
                 }
-        """
-        try:
-            index = aiplatform.MatchingEngineIndex(self.index_id)
-
-            # Preparar datos para Vertex AI
-            datapoints = []
-            for chunk in chunks:
-                datapoint = aiplatform.matching_engine.matching_engine_index_config.IndexDatapoint(
-                    datapoint_id=chunk["chunk_id"],
-                    feature_vector=chunk["embedding"],
-                    restricts=[
-                        {"namespace": "document_id", "allow_list": [chunk["document_id"]]},
-                        {"namespace": "collection", "allow_list": [chunk.get("collection", "general")]},
-                    ]
-                )
-                datapoints.append(datapoint)
-
-            # Upsert batch
-            index.upsert_datapoints(datapoints=datapoints)
-
-            # Guardar metadata separadamente (Vector Search solo guarda vectores)
-            # Aquí deberías guardar metadata en Firestore o Cloud SQL
-            # Por simplicidad, asumimos que se hace en otro servicio
 
-            return True
-
-        except Exception as e:
-            print(f"Error upserting to Vertex AI: {e}")
-            return False
+        Raises:
+            RuntimeError: Si falla algún batch (los demás quedan registrados)
+        """
+        batches = [
+            chunks[i:i + self.upsert_batch_size]
+            for i in range(0, len(chunks), self.upsert_batch_size)
+        ]
+
+        # Upsert batches en paralelo
+        outcomes = await asyncio.gather(*[
+            self._run_blocking(self._upsert_batch_sync, batch)
+            for batch in batches
+        ], return_exceptions=True)
+
+        written = [
+            chunk
+            for batch, outcome in zip(batches, outcomes)
+            if not isinstance(outcome, BaseException)
+            for chunk in batch
+        ]
+        if written:
+            await self._run_blocking(self.documents.add, written)
+
+        # Guardar metadata separadamente (Vector Search solo guarda vectores)
+        # Aquí deberías guardar metadata en Firestore o Cloud SQL
+        # Por simplicidad, asumimos que se hace en otro servicio
+
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            raise RuntimeError(
+                f"Failed to upsert {len(errors)} of {len(batches)} batches to Vertex AI: {errors[0]}"
+            ) from errors[0]
+        return True
 
     async def search(
         self,
@@ -102,77 +351,223 @@ class VertexAIVectorSearch(VectorDBInterface):
 
         Returns:
             Lista de chunks con metadata y score
-        """
-        try:
-            endpoint = aiplatform.MatchingEngineIndexEndpoint(self.endpoint_id)
-
-            # Construir filtros
-            restricts = []
-            if filter_metadata:
-                if "collection" in filter_metadata:
-                    restricts.append({
-                        "namespace": "collection",
-                        "allow_list": [filter_metadata["collection"]]
-                    })
-                if "book_ids" in filter_metadata:
-                    restricts.append({
-                        "namespace": "document_id",
-                        "allow_list": filter_metadata["book_ids"]
-                    })
-
-            # Query
-            response = endpoint.find_neighbors(
-                deployed_index_id=self.endpoint_id,
-                queries=[query_vector],
-                num_neighbors=top_k,
-                filter=restricts if restricts else None
-            )
 
-            # Extraer resultados
-            results = []
-            for neighbor in response[0]:
-                # Aquí deberías recuperar metadata desde Firestore/SQL
-                # Por ahora retornamos estructura básica
-                results.append({
-                    "chunk_id": neighbor.id,
-                    "score": neighbor.distance,
-                    # Metadata se recuperaría de BD separada
-                    "chunk_text": "[recuperar de metadata store]",
-                    "document_id": "[recuperar]",
-                    "title": "[recuperar]",
-                    "page_number": 0,
+        Los errores del SDK se propagan (la consulta falla en vez de
+        responder como si no hubiera resultados).
+        """
+        # Construir filtros
+        restricts = []
+        if filter_metadata:
+            if "collection" in filter_metadata:
+                restricts.append({
+                    "namespace": "collection",
+                    "allow_list": [filter_metadata["collection"]]
                 })
+            if "book_ids" in filter_metadata:
+                restricts.append({
+                    "namespace": "document_id",
+                    "allow_list": filter_metadata["book_ids"]
+                })
+
+        # Query
+        response = await self._run_blocking(
+            self._find_neighbors_sync, query_vector, top_k, restricts
+        )
 
-            return results
+        # Extraer resultados
+        results = []
+        for neighbor in response[0]:
+            # Aquí deberías recuperar metadata desde Firestore/SQL
+            # Por ahora retornamos estructura básica
+            results.append({
+                "chunk_id": neighbor.id,
+                "score": neighbor.distance,
+                # Metadata se recuperaría de BD separada
+                "chunk_text": "[recuperar de metadata store]",
+                "document_id": "[recuperar]",
+                "title": "[recuperar]",
+                "page_number": 0,
+            })
 
-        except Exception as e:
-            print(f"Error searching Vertex AI: {e}")
-            return []
+        return results
 
     async def delete(self, chunk_ids: List[str]) -> bool:
-        """Eliminar chunks por IDs"""
+        """Eliminar chunks por IDs (los errores del SDK se propagan)"""
+        await self._run_blocking(self._remove_sync, chunk_ids)
+        await self._run_blocking(self.documents.remove, chunk_ids)
+        return True
+
+    async def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs de los chunks de un documento (índice secundario persistente)"""
+        return await self._run_blocking(self.documents.chunk_ids, document_id)
+
+
+# Coste estimado por chunk de los índices en Python (str del ID, entrada en
+# _rows y en el set de su documento)
+_ID_OVERHEAD_BYTES = 256
+
+
+class _SearchGate:
+    """
+    Búsquedas en el pool de CPU frente a escrituras in situ
+
+    Las búsquedas leen la matriz y las columnas desde otros threads; las
+    escrituras que las modifican en su sitio (upsert, delete) esperan a que
+    terminen las búsquedas en vuelo, y las nuevas esperan a la escritura
+    pendiente para que esta no se quede sin turno.
+    """
+
+    def __init__(self):
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._open = asyncio.Event()
+        self._open.set()
+
+    @asynccontextmanager
+    async def search(self):
+        await self._open.wait()
+        self._active += 1
+        self._idle.clear()
         try:
-            index = aiplatform.MatchingEngineIndex(self.index_id)
-            index.remove_datapoints(datapoint_ids=chunk_ids)
-            return True
-        except Exception as e:
-            print(f"Error deleting from Vertex AI: {e}")
-            return False
+            yield
+        finally:
+            self._active -= 1
+            if not self._active:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def mutate(self):
+        """Exclusión frente a búsquedas (el cuerpo no debe hacer await)"""
+        self._open.clear()
+        try:
+            await self._idle.wait()
+            yield
+        finally:
+            self._open.set()
 
 
 class SimpleInMemoryVectorDB(VectorDBInterface):
     """
     Implementación simple en memoria para desarrollo/testing
     NO USAR EN PRODUCCIÓN
+
+    Los vectores se guardan en una matriz float32 contigua (una fila por
+    chunk) y la metadata en un almacén columnar alineado por fila
+    (`ColumnarChunkStore`); los dicts solo se crean para el top-k devuelto.
+
+    El cálculo de scores corre en el pool de CPU (`run_cpu_bound`), no en el
+    event loop.
     """
 
-    def __init__(self):
-        self.chunks: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, text_compression: Optional[str] = None):
+        """
+        Args:
+            text_compression: Compresión del texto de los chunks (None, "zlib" o "zstd")
+        """
+        self.store = ColumnarChunkStore(compression=text_compression)
+        self.dim: Optional[int] = None
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+        # Índice secundario document_id → chunk_ids
+        self.documents: Dict[str, Set[str]] = {}
+
+        # Versión (cambia con cada escritura) y lock de escrituras, para
+        # publicar snapshots consistentes (ver api/shared_index.py)
+        self.version = 0
+        self.write_lock = asyncio.Lock()
+        self._gate = _SearchGate()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    def status(self) -> Dict[str, Any]:
+        return {"backend": "in-memory", "ready": True, "chunks": len(self), "dim": self.dim}
+
+    def nbytes(self) -> int:
+        """Memoria aproximada: matriz y normas reservadas, columnas e IDs"""
+        return (
+            self._vectors.nbytes + self._norms.nbytes + self.store.nbytes()
+            + len(self._ids) * _ID_OVERHEAD_BYTES
+        )
+
+    def get_chunk(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata de un chunk (sin embedding)"""
+        row = self._rows.get(chunk_id)
+        if row is None:
+            return None
+        return self.store.get(row, chunk_id)
+
+    def _reserve(self, extra: int) -> None:
+        """Asegurar capacidad para `extra` filas nuevas (crecimiento geométrico)"""
+        self.store.reserve(extra)
+        needed = len(self._ids) + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        norms = np.empty(new_capacity, dtype=np.float32)
+        count = len(self._ids)
+        if count:
+            vectors[:count] = self._vectors[:count]
+            norms[:count] = self._norms[:count]
+        self._vectors = vectors
+        self._norms = norms
 
     async def upsert(self, chunks: List[Dict[str, Any]]) -> bool:
         """Guardar chunks en memoria"""
-        for chunk in chunks:
-            self.chunks[chunk["chunk_id"]] = chunk
+        if not chunks:
+            return True
+        vectors = await run_cpu_bound(
+            np.asarray, [chunk["embedding"] for chunk in chunks], dtype=np.float32
+        )
+        return await self.upsert_vectors(chunks, vectors)
+
+    async def upsert_vectors(
+        self,
+        chunks: List[Dict[str, Any]],
+        vectors: np.ndarray
+    ) -> bool:
+        """Escribir vectores directamente en la matriz del índice"""
+        if not chunks:
+            return True
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension mismatch: expected {self.dim}, got {vectors.shape[1]}"
+            )
+
+        norms = await run_cpu_bound(np.linalg.norm, vectors, axis=1)
+
+        async with self.write_lock, self._gate.mutate():
+            self._reserve(len(chunks))
+
+            rows = []
+            for chunk in chunks:
+                chunk_id = chunk["chunk_id"]
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = self.store.append(chunk)
+                    self._ids.append(chunk_id)
+                    self._rows[chunk_id] = row
+                else:
+                    self._unlink_document(chunk_id)
+                    self.store.set(row, chunk)
+                rows.append(row)
+                self.documents.setdefault(chunk.get("document_id"), set()).add(chunk_id)
+            self._vectors[rows] = vectors
+            self._norms[rows] = norms
+            self.version += 1
+
         return True
 
     async def search(
@@ -182,53 +577,371 @@ class SimpleInMemoryVectorDB(VectorDBInterface):
         filter_metadata: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Buscar usando similaridad de coseno simple"""
-        import numpy as np
+        async with self._gate.search():
+            # Referencias tomadas al empezar: un cambio de generación
+            # (`replace_contents`) no afecta a esta búsqueda
+            count = len(self._ids)
+            return await cosine_search_async(
+                self._vectors[:count], self._norms[:count], self.store,
+                self._ids.__getitem__, query_vector, top_k, filter_metadata
+            )
 
-        results = []
+    async def delete(self, chunk_ids: List[str]) -> bool:
+        """Eliminar chunks de memoria"""
+        async with self.write_lock, self._gate.mutate():
+            for chunk_id in chunk_ids:
+                row = self._rows.pop(chunk_id, None)
+                if row is None:
+                    continue
+                self._unlink_document(chunk_id, row)
+
+                # Mover la última fila al hueco para mantener la matriz compacta
+                last = len(self._ids) - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    self._vectors[row] = self._vectors[last]
+                    self._norms[row] = self._norms[last]
+                    self.store.move(last, row)
+                    self._ids[row] = moved_id
+                    self._rows[moved_id] = row
+                self._ids.pop()
+                self.store.pop()
+            self.version += 1
+        return True
 
-        for chunk_id, chunk in self.chunks.items():
-            # Filtrar por metadata si se especifica
-            if filter_metadata:
-                if "collection" in filter_metadata:
-                    if chunk.get("collection") != filter_metadata["collection"]:
-                        continue
-                if "book_ids" in filter_metadata:
-                    if chunk.get("document_id") not in filter_metadata["book_ids"]:
-                        continue
-
-            # Calcular similaridad de coseno
-            embedding = chunk["embedding"]
-            similarity = np.dot(query_vector, embedding) / (
-                np.linalg.norm(query_vector) * np.linalg.norm(embedding)
-            )
+    def _unlink_document(self, chunk_id: str, row: Optional[int] = None) -> None:
+        """Quitar un chunk del índice document_id → chunk_ids"""
+        if row is None:
+            row = self._rows[chunk_id]
+        document_id = self.store.value(row, "document_id")
+        document_chunks = self.documents.get(document_id)
+        if document_chunks is not None:
+            document_chunks.discard(chunk_id)
+            if not document_chunks:
+                del self.documents[document_id]
+
+    async def get_document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs de los chunks de un documento"""
+        return list(self.documents.get(document_id, ()))
+
+    def replace_contents(self, other: "SimpleInMemoryVectorDB") -> None:
+        """
+        Adoptar el contenido de otro índice (cambio de generación)
 
-            results.append({
-                **chunk,
-                "score": float(similarity)
-            })
+        Solo reasigna referencias, sin await: para el event loop es atómico.
+        Llamar con `write_lock` tomado.
+        """
+        self.store = other.store
+        self.dim = other.dim
+        self._vectors = other._vectors
+        self._norms = other._norms
+        self._ids = other._ids
+        self._rows = other._rows
+        self.documents = other.documents
+        self.version += 1
+
+    # ============ PERSISTENCIA ============
+
+    def save(self, directory: str) -> None:
+        """
+        Guardar el índice en `directory` (vectores .npy + columnas + IDs)
 
-        # Ordenar por score descendente
-        results.sort(key=lambda x: x["score"], reverse=True)
+        Los IDs se guardan como un blob UTF-8 con offsets para que un lector
+        pueda mapearlos en memoria sin crear un str por chunk.
+        """
+        out = Path(directory)
+        out.mkdir(parents=True, exist_ok=True)
+        count = len(self._ids)
+        dim = self.dim or 0
+
+        np.save(out / "vectors.npy", self._vectors[:count].reshape(count, dim))
+        np.save(out / "norms.npy", self._norms[:count])
+
+        encoded = [chunk_id.encode("utf-8") for chunk_id in self._ids]
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        np.save(out / "id_offsets.npy", offsets)
+        (out / "ids.bin").write_bytes(b"".join(encoded))
+
+        columns = out / "columns"
+        columns.mkdir(exist_ok=True)
+        self.store.save(str(columns))
+        (out / "index.json").write_text(
+            json.dumps({"count": count, "dim": self.dim}), encoding="utf-8"
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "SimpleInMemoryVectorDB":
+        """Cargar en memoria (escribible) un índice guardado con `save`"""
+        src = Path(directory)
+        meta = json.loads((src / "index.json").read_text(encoding="utf-8"))
+
+        db = cls()
+        db.store = ColumnarChunkStore.load(str(src / "columns"))
+        db.dim = meta["dim"]
+        db._vectors = np.load(src / "vectors.npy")
+        db._norms = np.load(src / "norms.npy")
+
+        offsets = np.load(src / "id_offsets.npy")
+        blob = (src / "ids.bin").read_bytes()
+        db._ids = [
+            blob[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        ]
+        db._rows = {chunk_id: row for row, chunk_id in enumerate(db._ids)}
+        for row, chunk_id in enumerate(db._ids):
+            db.documents.setdefault(db.store.value(row, "document_id"), set()).add(chunk_id)
+        return db
+
+
+# ============ BÚSQUEDA POR COSENO ============
+
+SEARCH_BLOCK_ROWS = 16384
+
+_search_workers: Optional[int] = None
+_search_block_rows = SEARCH_BLOCK_ROWS
+_search_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_search(workers: Optional[int] = None, block_rows: int = SEARCH_BLOCK_ROWS) -> None:
+    """
+    Configurar el pool de CPU de los índices en memoria
 
-        return results[:top_k]
+    Args:
+        workers: Threads del pool (None = núcleos disponibles, 0 = en el event loop)
+        block_rows: Filas por bloque de una búsqueda (los bloques van en paralelo)
+    """
+    global _search_workers, _search_block_rows, _search_executor
+    if _search_executor is not None and workers != _search_workers:
+        _search_executor.shutdown(wait=False)
+        _search_executor = None
+    _search_workers = workers
+    _search_block_rows = block_rows
+
+
+def _get_search_executor() -> Optional[ThreadPoolExecutor]:
+    global _search_executor
+    if _search_workers == 0:
+        return None
+    if _search_executor is None:
+        _search_executor = ThreadPoolExecutor(
+            max_workers=_search_workers or os.cpu_count() or 1,
+            thread_name_prefix="vector-search"
+        )
+    return _search_executor
+
+
+async def run_cpu_bound(func: Callable, *args, **kwargs):
+    """
+    Ejecutar trabajo de CPU del índice en el pool acotado
 
-    async def delete(self, chunk_ids: List[str]) -> bool:
-        """Eliminar chunks de memoria"""
-        for chunk_id in chunk_ids:
-            self.chunks.pop(chunk_id, None)
-        return True
+    NumPy suelta el GIL en el producto matriz-vector, las normas y el
+    argpartition: varias búsquedas avanzan en paralelo y el event loop sigue
+    atendiendo el resto de requests.
+    """
+    executor = _get_search_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def _filter_rows(store: ColumnarChunkStore, filter_metadata: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Filas que cumplen el filtro (None = todas)"""
+    if not filter_metadata:
+        return None
+    return np.flatnonzero(store.filter_mask(filter_metadata))
+
+
+def _block_top_k(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    rows: Optional[np.ndarray],
+    query: np.ndarray,
+    start: int,
+    end: int,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k (sin ordenar) de las posiciones [start, end)
 
+    Las posiciones son filas de la matriz, o índices sobre `rows` si hay filtro.
 
-# Factory
-def get_vector_db(use_in_memory: bool = False) -> VectorDBInterface:
+    Returns:
+        (posiciones, scores)
+    """
+    selected = slice(start, end) if rows is None else rows[start:end]
+    scores = vectors[selected] @ query
+    scores /= (norms[selected] * np.linalg.norm(query))
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top + start, scores[top]
+
+
+def _materialize(
+    store: ColumnarChunkStore,
+    chunk_id: Callable[[int], str],
+    rows: Optional[np.ndarray],
+    positions: np.ndarray,
+    scores: np.ndarray,
+    top_k: int
+) -> List[Dict[str, Any]]:
+    """Chunks del top-k por score descendente"""
+    results = []
+    for i in np.argsort(-scores)[:top_k]:
+        position = int(positions[i])
+        row = int(rows[position]) if rows is not None else position
+        chunk = store.get(row, chunk_id(row))
+        chunk["score"] = float(scores[i])
+        results.append(chunk)
+    return results
+
+
+def cosine_search(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    store: ColumnarChunkStore,
+    chunk_id: Callable[[int], str],
+    query_vector: List[float],
+    top_k: int,
+    filter_metadata: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Búsqueda exacta por coseno sobre una matriz de vectores y sus columnas
+
+    Versión síncrona, para código que ya corre fuera del event loop (p. ej.
+    la validación de generaciones); los índices usan `cosine_search_async`.
+
+    Args:
+        vectors: Matriz (n, dim) de vectores
+        norms: Normas de cada fila
+        store: Metadata columnar alineada por fila
+        chunk_id: Función fila → chunk_id
+        query_vector: Vector de la consulta
+        top_k: Número de resultados
+        filter_metadata: Filtro {"collection", "book_ids"}
+
+    Returns:
+        Chunks materializados con "score", por score descendente
+    """
+    if len(vectors) == 0:
+        return []
+
+    # Filtrar por metadata si se especifica (máscara sobre columnas codificadas)
+    rows = _filter_rows(store, filter_metadata)
+    count = len(vectors) if rows is None else len(rows)
+    if count == 0:
+        return []
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    positions, scores = _block_top_k(vectors, norms, rows, query, 0, count, top_k)
+    return _materialize(store, chunk_id, rows, positions, scores, top_k)
+
+
+async def cosine_search_async(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    store: ColumnarChunkStore,
+    chunk_id: Callable[[int], str],
+    query_vector: List[float],
+    top_k: int,
+    filter_metadata: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    `cosine_search` en el pool de CPU
+
+    Compartida por el índice en memoria y por el lector del índice
+    compartido (matrices mapeadas en memoria). Las matrices grandes se
+    recorren en bloques de `block_rows` filas en paralelo; cada bloque
+    devuelve su top-k y aquí se combinan. El llamador garantiza que los
+    arrays no cambian durante la búsqueda.
+    """
+    if len(vectors) == 0:
+        return []
+
+    rows = await run_cpu_bound(_filter_rows, store, filter_metadata) if filter_metadata else None
+    count = len(vectors) if rows is None else len(rows)
+    if count == 0:
+        return []
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    partials = await asyncio.gather(*(
+        run_cpu_bound(
+            _block_top_k, vectors, norms, rows, query,
+            start, min(start + _search_block_rows, count), top_k
+        )
+        for start in range(0, count, _search_block_rows)
+    ))
+    positions = np.concatenate([p for p, _ in partials])
+    scores = np.concatenate([s for _, s in partials])
+    return _materialize(store, chunk_id, rows, positions, scores, top_k)
+
+
+def _create_in_memory_db() -> VectorDBInterface:
+    """Índice en memoria según `index_mode` (local, writer o reader)"""
+    settings = get_settings()
+    compression = settings.in_memory_text_compression
+    if settings.index_mode == "local":
+        return SimpleInMemoryVectorDB(text_compression=compression)
+    if settings.index_mode not in ("writer", "reader"):
+        raise ValueError(f"Unknown index_mode: {settings.index_mode}")
+    if not settings.index_dir:
+        raise ValueError(f"index_mode={settings.index_mode} requires index_dir")
+
+    from .shared_index import SharedIndexReader, load_writer_index
+    if settings.index_mode == "writer":
+        return load_writer_index(settings.index_dir, compression)
+    return SharedIndexReader(settings.index_dir, settings.index_refresh_interval)
+
+
+def _create_partitioned_db() -> VectorDBInterface:
+    """Índice particionado por colección (ver api/partitioned_index.py)"""
+    settings = get_settings()
+    if not settings.partitions_dir:
+        raise ValueError("vector_db_backend=partitioned requires partitions_dir")
+
+    from .partitioned_index import PartitionedVectorDB
+    return PartitionedVectorDB(
+        settings.partitions_dir,
+        memory_budget_bytes=settings.partition_memory_budget_mb * 1024 ** 2,
+        flush_interval=settings.partition_flush_interval,
+        text_compression=settings.in_memory_text_compression
+    )
+
+
+# ============ REGISTRO DE BACKENDS ============
+
+# Nombre → factory. Cada backend importa su SDK al construirse, así que
+# importar este módulo no carga ningún SDK pesado.
+_BACKENDS: Dict[str, Callable[[], VectorDBInterface]] = {
+    "in-memory": _create_in_memory_db,
+    "vertex": VertexAIVectorSearch,
+    "partitioned": _create_partitioned_db,
+}
+
+# Singletons por backend (el índice debe sobrevivir entre requests)
+_instances: Dict[str, VectorDBInterface] = {}
+
+
+def register_backend(name: str, factory: Callable[[], VectorDBInterface]) -> None:
+    """Registrar un backend (p. ej. Pinecone o Qdrant) con su factory"""
+    _BACKENDS[name] = factory
+
+
+def get_vector_db(use_in_memory: bool = False, backend: Optional[str] = None) -> VectorDBInterface:
     """
     Obtener instancia de Vector DB
 
     Args:
         use_in_memory: Si True, usa implementación en memoria para testing
+        backend: Nombre del backend registrado (tiene prioridad sobre use_in_memory)
     """
-    if use_in_memory:
-        return SimpleInMemoryVectorDB()
-    else:
-        # Por defecto usar Vertex AI
-        return VertexAIVectorSearch()
+    name = backend or ("in-memory" if use_in_memory else "vertex")
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown vector DB backend: {name} (available: {sorted(_BACKENDS)})")
+    if name not in _instances:
+        settings = get_settings()
+        configure_search(settings.search_workers, settings.search_block_rows)
+        _instances[name] = _BACKENDS[name]()
+    return _instances[name]
@@ -0,0 +1,99 @@
+"""
+Benchmark de chunking: TextChunker vs. implementación anterior
+
+La implementación anterior tokenizaba página a página y decodificaba cada
+ventana con `encoding.decode`; la actual tokeniza en batch y corta el texto
+original por offsets.
+
+Uso:
+    python -m benchmarks.bench_chunking --pages 2000 --threads 8
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic_pdf import random_page_text
+from workers.chunking import TextChunker, content_hash, make_chunk_id, metadata_hash
+
+
+def legacy_chunk_document(chunker: TextChunker, pages, document_id: str, metadata: dict) -> list:
+    """Algoritmo anterior: encode por página + decode por ventana"""
+    chunks = []
+    step = chunker.chunk_size - chunker.chunk_overlap
+    meta_hash = metadata_hash(metadata)
+    for page in pages:
+        text = page["text"]
+        if not text.strip():
+            continue
+        tokens = chunker.encoding.encode(text)
+        for start in range(0, len(tokens), step):
+            window = tokens[start:start + chunker.chunk_size]
+            chunk_text = chunker.encoding.decode(window).strip()
+            text_hash = content_hash(chunk_text)
+            chunks.append({
+                "chunk_id": make_chunk_id(document_id, page["page_number"], start, text_hash, meta_hash),
+                "content_hash": text_hash,
+                "document_id": document_id,
+                "page_number": page["page_number"],
+                "chunk_text": chunk_text,
+                "token_count": len(window),
+                "start_token": start,
+                "end_token": start + chunker.chunk_size,
+                **metadata
+            })
+    return chunks
+
+
+def timed(label: str, func, n_pages: int) -> float:
+    start = time.perf_counter()
+    chunks = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed:.3f}s  {n_pages / elapsed:>8.0f} págs/s  {len(chunks)} chunks")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de chunking")
+    parser.add_argument("--pages", type=int, default=2000, help="Páginas sintéticas")
+    parser.add_argument("--threads", type=int, default=8, help="Threads de tiktoken")
+    parser.add_argument("--chunk-size", type=int, default=700)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    pages = [
+        {"page_number": i + 1, "text": random_page_text(rng, lines=60)}
+        for i in range(args.pages)
+    ]
+    metadata = {"title": "Protocolo sintético", "collection": "notarial", "language": "es"}
+
+    chunker = TextChunker(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        num_threads=args.threads
+    )
+
+    legacy = timed(
+        "anterior (decode)",
+        lambda: legacy_chunk_document(chunker, pages, "bench", metadata),
+        args.pages
+    )
+    current = timed(
+        "batch + offsets",
+        lambda: chunker.chunk_document(pages, "bench", metadata),
+        args.pages
+    )
+    timed(
+        "streaming (iter)",
+        lambda: list(chunker.iter_chunks(iter(pages), "bench", metadata)),
+        args.pages
+    )
+    print(f"Speedup: {legacy / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+Benchmark de carga end-to-end: ingesta + /query
+
+Con `--spawn` levanta en local el servidor OpenAI falso
+(benchmarks/fake_openai.py) y el API (uvicorn) apuntando a él, genera un
+corpus sintético (benchmarks/synthetic_corpus.py), lo ingiere con
+`IngestPipeline.ingest_batch` y lanza consultas a /query a varios niveles de
+concurrencia. Sin `--spawn` mide contra un API ya levantado (`--api-url`).
+
+Resultados en JSON (commit, entorno, configuración, métricas) para comparar
+entre commits con `--compare`.
+
+Uso:
+    python -m benchmarks.bench_load --spawn --documents 10 --pages 20 \\
+        --concurrency 1 4 16 --requests 200 --out benchmarks/results
+
+    python -m benchmarks.bench_load --spawn --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import httpx
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic_corpus import generate_corpus
+
+ROOT = Path(__file__).parent.parent
+
+
+# ============ PROCESOS LOCALES ============
+
+def _spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    """Esperar a que un servidor responda (o fallar si el proceso muere)"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"Server exited before becoming ready:\n{process.stderr.read().decode()[-2000:]}"
+                )
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise TimeoutError(f"Server not ready after {timeout}s: {url}")
+
+
+def bench_env(fake_url: str) -> Dict[str, str]:
+    """Variables de entorno para API y worker apuntando al OpenAI falso"""
+    env = dict(os.environ)
+    env["OPENAI_BASE_URL"] = fake_url
+    env["OPENAI_API_KEY"] = "fake"
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "bench")
+    env.setdefault("GCS_BUCKET_NAME", "bench")
+    return env
+
+
+# ============ MÉTRICAS ============
+
+def latency_stats(latencies_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, media y máximo en ms"""
+    if not latencies_ms:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(values.mean()), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+# ============ INGESTA ============
+
+async def run_ingest(api_url: str, manifest: Dict[str, Any], work_dir: str) -> Dict[str, Any]:
+    """Ingerir el corpus y medir páginas/s y throughput por etapa"""
+    # Importar tras configurar el entorno: los settings se leen al crear el pipeline
+    from workers.ingest import IngestPipeline
+    from workers.jobstore import JobStore
+
+    job_store = JobStore(os.path.join(work_dir, "jobs"))
+    pipeline = IngestPipeline(
+        api_url=api_url,
+        use_simple_ocr=True,
+        job_store=job_store,
+        use_ocr_cache=False
+    )
+    documents = [
+        {key: doc[key] for key in ("file_path", "document_id", "metadata")}
+        for doc in manifest["documents"]
+    ]
+
+    started = time.perf_counter()
+    try:
+        results = await pipeline.ingest_batch(documents)
+    finally:
+        await pipeline.aclose()
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r and r.get("success")]
+    pages = sum(r["pages_processed"] for r in ok)
+    chunks = sum(r["chunks_created"] for r in ok)
+
+    stages = {}
+    for stage, stats in job_store.throughput().items():
+        stages[stage] = {
+            "busy_seconds": round(stats["seconds"], 3),
+            "items": stats["items"],
+            "items_per_sec": round(stats["items_per_sec"], 1),
+            "mb_per_sec": round(stats["bytes_per_sec"] / 1e6, 2)
+        }
+    job_store.close()
+
+    return {
+        "documents": len(documents),
+        "failed": len(documents) - len(ok),
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "stages": stages,
+        "queue_max": pipeline.telemetry.queue_max,
+        "dedup": pipeline.telemetry.summary()["dedup"],
+        "rss_max_mb": round(pipeline.telemetry.rss_max / 1e6, 1)
+    }
+
+
+# ============ CONSULTAS ============
+
+async def run_queries(
+    api_url: str,
+    queries: List[Dict[str, Any]],
+    concurrency: int,
+    n_requests: int,
+    scoped_ratio: float,
+    top_k: int,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Lanzar `n_requests` consultas con `concurrency` clientes en paralelo"""
+    rng = random.Random(seed)
+    plan = []
+    for idx in range(n_requests):
+        query = queries[idx % len(queries)]
+        body = {"query": query["query"], "top_k": top_k}
+        if rng.random() < scoped_ratio:
+            body["scope"] = {"collection": query["collection"]}
+        plan.append((body, query))
+
+    latencies: List[float] = []
+    server_stages: Dict[str, List[float]] = {}
+    errors = 0
+    successes = 0
+    hits = 0
+    hedged = 0
+    degraded = 0
+    cursor = iter(plan)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal errors, successes, hits, hedged, degraded
+            for body, query in cursor:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{api_url}/query", json=body)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                successes += 1
+                data = response.json()
+                hedged += bool(data["metadata"].get("hedged"))
+                degraded += bool(data["metadata"].get("degraded"))
+                for stage, ms in data["metadata"].get("timings_ms", {}).items():
+                    server_stages.setdefault(stage, []).append(ms)
+                if any(
+                    e["document_id"] == query["document_id"] and e["page_number"] == query["page_number"]
+                    for e in data["evidence"]
+                ):
+                    hits += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "qps": round(n_requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_stats(latencies),
+        "server_stages_ms": {
+            stage: latency_stats(values) for stage, values in server_stages.items()
+        },
+        "hit_rate": round(hits / successes, 3) if successes else 0.0,
+        "hedged": hedged,
+        "degraded": degraded
+    }
+
+
+# ============ COMPARACIÓN ============
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "   n/a"
+    return f"{(new - old) / old:+6.1%}"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Imprimir la variación respecto a un resultado anterior"""
+    print(f"\n🔁 COMPARACIÓN vs {baseline['environment']['git_commit']}")
+    print(f"{'='*60}")
+    if current.get("ingest") and baseline.get("ingest"):
+        new, old = current["ingest"]["pages_per_sec"], baseline["ingest"]["pages_per_sec"]
+        print(f"ingesta        {old:>8.1f} → {new:>8.1f} págs/s  {_delta(new, old)}")
+
+    old_levels = {level["concurrency"]: level for level in baseline.get("query", [])}
+    for level in current.get("query", []):
+        old = old_levels.get(level["concurrency"])
+        if not old:
+            continue
+        print(
+            f"c={level['concurrency']:<4} qps {old['qps']:>7.1f} → {level['qps']:>7.1f} "
+            f"{_delta(level['qps'], old['qps'])}   p95 {old['latency_ms']['p95']:>8.1f} → "
+            f"{level['latency_ms']['p95']:>8.1f} ms {_delta(level['latency_ms']['p95'], old['latency_ms']['p95'])}"
+        )
+    print(f"{'='*60}\n")
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    ingest = results.get("ingest")
+    if ingest:
+        print(f"\n📥 INGESTA")
+        print(f"{'='*60}")
+        print(
+            f"{ingest['documents']} docs, {ingest['pages']} págs, {ingest['chunks']} chunks en "
+            f"{ingest['seconds']:.1f}s → {ingest['pages_per_sec']:.1f} págs/s"
+        )
+        for stage, stats in ingest["stages"].items():
+            print(
+                f"  {stage:<11} {stats['busy_seconds']:>8.2f}s ocupado  "
+                f"{stats['items_per_sec']:>9.1f} items/s  {stats['mb_per_sec']:>6.2f} MB/s"
+            )
+        dedup = ingest.get("dedup")
+        if dedup and dedup["duplicates"]:
+            print(
+                f"  casi duplicados {dedup['duplicates']}: {dedup['tokens_saved']:,} tokens, "
+                f"{dedup['index_bytes_saved'] / 1e6:.2f} MB de índice ahorrados"
+            )
+
+    print(f"\n🔎 /query")
+    print(f"{'='*60}")
+    print(f"{'conc':>5} {'qps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>5} {'hit':>6}")
+    for level in results["query"]:
+        latency = level["latency_ms"]
+        print(
+            f"{level['concurrency']:>5} {level['qps']:>8.1f} {latency['p50']:>9.1f} "
+            f"{latency['p95']:>9.1f} {latency['p99']:>9.1f} {level['errors']:>5} {level['hit_rate']:>6.1%}"
+        )
+        stages = "  ".join(
+            f"{stage} p50 {stats['p50']:.1f}ms" for stage, stats in level["server_stages_ms"].items()
+        )
+        if stages:
+            print(f"      servidor: {stages}")
+        if level.get("hedged") or level.get("degraded"):
+            print(f"      hedge: {level['hedged']}  degradadas: {level['degraded']}")
+    print(f"{'='*60}\n")
+
+
+# ============ MAIN ============
+
+async def run(args) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="scriptorium-bench-")
+    processes: List[subprocess.Popen] = []
+    api_url = args.api_url
+
+    try:
+        if args.spawn:
+            fake_url = f"http://127.0.0.1:{args.fake_port}"
+            env = bench_env(f"{fake_url}/v1")
+            processes.append(_spawn([
+                "-m", "benchmarks.fake_openai",
+                "--port", str(args.fake_port),
+                "--embedding-latency-ms", str(args.embedding_latency_ms),
+                "--chat-latency-ms", str(args.chat_latency_ms),
+                "--chat-tokens-per-sec", str(args.chat_tokens_per_sec),
+                "--chat-stall-rate", str(args.chat_stall_rate),
+                "--chat-stall-ms", str(args.chat_stall_ms)
+            ], env))
+            await _wait_ready(f"{fake_url}/stats", processes[-1])
+
+            processes.append(_spawn([
+                "-m", "uvicorn", "api.main:app",
+                "--port", str(args.api_port),
+                "--workers", str(args.api_workers),
+                "--log-level", "warning"
+            ], env))
+            api_url = f"http://127.0.0.1:{args.api_port}"
+            await _wait_ready(f"{api_url}/", processes[-1])
+
+            # El worker de ingesta corre en este proceso
+            os.environ.update({
+                key: env[key]
+                for key in ("OPENAI_BASE_URL", "OPENAI_API_KEY", "GOOGLE_CLOUD_PROJECT", "GCS_BUCKET_NAME")
+            })
+
+        corpus_dir = args.corpus or os.path.join(work_dir, "corpus")
+        manifest_path = Path(corpus_dir) / "manifest.json"
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        else:
+            manifest = generate_corpus(
+                corpus_dir, args.documents, args.pages, seed=args.seed, boilerplate=args.boilerplate
+            )
+
+        results: Dict[str, Any] = {
+            "benchmark": "bench_load",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment_info(),
+            "config": vars(args),
+            "ingest": None,
+            "query": []
+        }
+
+        if not args.skip_ingest:
+            results["ingest"] = await run_ingest(api_url, manifest, work_dir)
+
+        # Calentamiento: conexiones, cachés y JIT del tokenizer
+        await run_queries(api_url, manifest["queries"], 1, min(5, args.requests), args.scoped_ratio, args.top_k)
+
+        for concurrency in args.concurrency:
+            print(f"🔎 Concurrencia {concurrency}...")
+            results["query"].append(await run_queries(
+                api_url,
+                manifest["queries"],
+                concurrency,
+                args.requests,
+                args.scoped_ratio,
+                args.top_k,
+                seed=args.seed
+            ))
+
+        return results
+
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga end-to-end")
+    parser.add_argument("--spawn", action="store_true", help="Levantar OpenAI falso + API en local")
+    parser.add_argument("--api-url", type=str, default="http://localhost:8000")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--fake-port", type=int, default=8766)
+    parser.add_argument("--embedding-latency-ms", type=float, default=40.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=800.0)
+    parser.add_argument("--chat-tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--chat-stall-rate", type=float, default=0.0, help="Fracción de chats colgados (cola lenta)")
+    parser.add_argument("--chat-stall-ms", type=float, default=10_000.0)
+    parser.add_argument("--corpus", type=str, default=None, help="Directorio de corpus (se genera si no existe)")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--boilerplate", type=float, default=0.0, help="Fracción de páginas de fórmula repetida")
+    parser.add_argument("--skip-ingest", action="store_true", help="No ingerir (índice ya cargado)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Consultas por nivel de concurrencia")
+    parser.add_argument("--scoped-ratio", type=float, default=0.5, help="Fracción de consultas con filtro de colección")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default="benchmarks/results", help="Directorio de resultados JSON")
+    parser.add_argument("--compare", type=str, default=None, help="JSON de un resultado anterior")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_load-{results['timestamp'].replace(':', '')}-{results['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Resultados: {out_path}")
+
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de extracción de páginas con SimplePyPDFOCR
+
+Compara extracción en serie vs. pool de procesos sobre un PDF sintético y
+mide el tiempo hasta la primera página del iterador en streaming.
+
+Uso:
+    python -m benchmarks.bench_pdf_extraction --pages 400 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic_pdf import generate_pdf
+from workers.ocr import SimplePyPDFOCR
+
+
+def run(file_path: str, max_workers: int, pages_per_shard: int) -> dict:
+    ocr = SimplePyPDFOCR(max_workers=max_workers, pages_per_shard=pages_per_shard)
+
+    start = time.perf_counter()
+    first_page_s = None
+    count = 0
+    for _ in ocr.iter_pages(file_path):
+        if first_page_s is None:
+            first_page_s = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "workers": max_workers,
+        "pages": count,
+        "seconds": elapsed,
+        "pages_per_sec": count / elapsed,
+        "first_page_s": first_page_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extracción PDF")
+    parser.add_argument("--pages", type=int, default=400, help="Páginas del PDF sintético")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos")
+    parser.add_argument("--shard", type=int, default=32, help="Páginas por rango")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "synthetic.pdf")
+        generate_pdf(file_path, args.pages)
+        print(f"PDF sintético: {args.pages} páginas, {os.path.getsize(file_path) / 1e6:.1f} MB")
+
+        for workers in (1, args.workers):
+            r = run(file_path, workers, args.shard)
+            print(
+                f"workers={r['workers']:>2}  {r['seconds']:.2f}s  "
+                f"{r['pages_per_sec']:.0f} págs/s  primera página {r['first_page_s'] * 1000:.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
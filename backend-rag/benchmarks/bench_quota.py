@@ -0,0 +1,215 @@
+"""
+Benchmark del planificador de cuota de OpenAI (api/quota.py)
+
+Levanta el servidor OpenAI falso con límites RPM/TPM de embeddings (responde
+429 al superarlos, como OpenAI) y mide la latencia de las consultas
+interactivas (`embed_query`, proceso aparte a ritmo fijo) en tres escenarios:
+
+- solo:           sin ingesta en paralelo (referencia)
+- sin_planificar: un proceso de ingesta (`embed_batch`) satura la cuota y
+                  ambos chocan con los 429 y los reintentos
+- planificado:    los dos procesos comparten los buckets (fichero de estado);
+                  la ingesta deja la reserva a /query y cede cuando hay
+                  consultas esperando
+
+Uso:
+    python -m benchmarks.bench_quota --duration 20 --embedding-tpm 600000 --out benchmarks/results
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.bench_load import ROOT, _spawn, _wait_ready, bench_env, environment_info, latency_stats
+from benchmarks.synthetic_pdf import random_page_text
+
+SCENARIOS = ["solo", "sin_planificar", "planificado"]
+
+
+# ============ ROLES (subprocesos) ============
+
+async def run_bulk(duration: float, concurrency: int, batch_size: int) -> Dict[str, Any]:
+    """Ingesta sintética: `concurrency` bucles de embed_batch hasta `duration`"""
+    from api.embeddings import get_embedding_service
+
+    service = get_embedding_service()
+    rng = random.Random(0)
+    texts = [random_page_text(rng, lines=20) for _ in range(batch_size)]
+    stop_at = time.monotonic() + duration
+    totals = {"batches": 0, "tokens": 0, "errors": 0}
+
+    async def loop():
+        while time.monotonic() < stop_at:
+            try:
+                await service.embed_batch(texts, batch_size=batch_size)
+                totals["batches"] += 1
+                totals["tokens"] += sum(len(text) // 4 for text in texts)
+            except Exception:
+                totals["errors"] += 1
+
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    totals["tokens_per_sec"] = round(totals["tokens"] / duration, 1)
+    totals["quota"] = dict(service.quota.stats)
+    return totals
+
+
+async def run_interactive(duration: float, rate: float) -> Dict[str, Any]:
+    """Consultas `embed_query` a `rate` por segundo durante `duration`"""
+    from api.embeddings import get_embedding_service
+
+    service = get_embedding_service()
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(idx: int):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await service.embed_query(f"escritura de venta de casas en la calle mayor {idx}")
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception:
+            errors += 1
+
+    tasks = []
+    for idx in range(int(duration * rate)):
+        tasks.append(asyncio.create_task(one(idx)))
+        await asyncio.sleep(1.0 / rate)
+    await asyncio.gather(*tasks)
+    return {"queries": len(tasks), "errors": errors, "latency_ms": latency_stats(latencies)}
+
+
+# ============ ORQUESTACIÓN ============
+
+def _role_process(role: str, args, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.bench_quota", "--role", role,
+            "--duration", str(args.duration),
+            "--bulk-concurrency", str(args.bulk_concurrency),
+            "--bulk-batch-size", str(args.bulk_batch_size),
+            "--query-rate", str(args.query_rate)
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def _role_result(process: subprocess.Popen) -> Dict[str, Any]:
+    out, _ = process.communicate()
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+async def run(args) -> Dict[str, Any]:
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake = _spawn([
+        "-m", "benchmarks.fake_openai",
+        "--port", str(args.fake_port),
+        "--embedding-latency-ms", str(args.embedding_latency_ms),
+        "--embedding-rpm", str(args.embedding_rpm),
+        "--embedding-tpm", str(args.embedding_tpm)
+    ], bench_env(f"{fake_url}/v1"))
+    scenarios = {}
+    try:
+        await _wait_ready(f"{fake_url}/stats", fake)
+        for scenario in SCENARIOS:
+            # Buckets del servidor llenos de nuevo entre escenarios
+            await asyncio.sleep(10.0)
+            with tempfile.TemporaryDirectory(prefix="bench-quota-") as state_dir:
+                env = bench_env(f"{fake_url}/v1")
+                if scenario == "planificado":
+                    # Algo por debajo del límite real: margen para jitter de red
+                    env["OPENAI_EMBEDDING_RPM"] = str(int(args.embedding_rpm * args.headroom))
+                    env["OPENAI_EMBEDDING_TPM"] = str(int(args.embedding_tpm * args.headroom))
+                    env["OPENAI_QUOTA_STATE_DIR"] = state_dir
+
+                print(f"▶ {scenario}...")
+                bulk = _role_process("bulk", args, env) if scenario != "solo" else None
+                interactive = _role_process("interactive", args, env)
+                scenarios[scenario] = {
+                    "interactive": _role_result(interactive),
+                    "bulk": _role_result(bulk) if bulk is not None else None
+                }
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    return {
+        "benchmark": "bench_quota",
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "environment": environment_info(),
+        "config": {
+            "duration": args.duration,
+            "embedding_rpm": args.embedding_rpm,
+            "embedding_tpm": args.embedding_tpm,
+            "headroom": args.headroom,
+            "query_rate": args.query_rate,
+            "bulk_concurrency": args.bulk_concurrency,
+            "bulk_batch_size": args.bulk_batch_size
+        },
+        "scenarios": scenarios
+    }
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"\n📊 Cuota OpenAI compartida (RPM {results['config']['embedding_rpm']}, "
+          f"TPM {results['config']['embedding_tpm']:,})")
+    print(f"{'='*72}")
+    print(f"{'escenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>6}"
+          f"{'bulk tok/s':>12}{'bulk err':>10}")
+    for scenario, data in results["scenarios"].items():
+        latency = data["interactive"]["latency_ms"]
+        bulk = data["bulk"] or {}
+        print(
+            f"{scenario:<16}{latency['p50']:>9.0f}{latency['p95']:>9.0f}{latency['p99']:>9.0f}"
+            f"{data['interactive']['errors']:>6}{bulk.get('tokens_per_sec', 0):>12,.0f}{bulk.get('errors', 0):>10}"
+        )
+    print(f"{'='*72}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del planificador de cuota de OpenAI")
+    parser.add_argument("--role", choices=["bulk", "interactive"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos por escenario")
+    parser.add_argument("--fake-port", type=int, default=8767)
+    parser.add_argument("--embedding-latency-ms", type=float, default=40.0)
+    parser.add_argument("--embedding-rpm", type=int, default=600)
+    parser.add_argument("--embedding-tpm", type=int, default=600_000)
+    parser.add_argument("--headroom", type=float, default=0.9, help="Fracción del límite real que usa el planificador")
+    parser.add_argument("--query-rate", type=float, default=4.0, help="Consultas interactivas por segundo")
+    parser.add_argument("--bulk-concurrency", type=int, default=8)
+    parser.add_argument("--bulk-batch-size", type=int, default=4)
+    parser.add_argument("--out", type=str, default="benchmarks/results", help="Directorio de resultados JSON")
+    args = parser.parse_args()
+
+    if args.role == "bulk":
+        print(json.dumps(asyncio.run(run_bulk(args.duration, args.bulk_concurrency, args.bulk_batch_size))))
+        return
+    if args.role == "interactive":
+        print(json.dumps(asyncio.run(run_interactive(args.duration, args.query_rate))))
+        return
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_quota-{results['timestamp'].replace(':', '')}-{results['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Resultados: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
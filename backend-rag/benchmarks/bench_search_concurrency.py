@@ -0,0 +1,271 @@
+"""
+Benchmark de búsqueda concurrente: event loop libre y escalado con núcleos
+
+Dos partes:
+
+- throughput: en este proceso, un índice en memoria con `--vectors` vectores
+  y `--concurrency` búsquedas en paralelo durante `--duration` segundos, para
+  cada tamaño del pool de CPU (`--workers`; 0 = búsqueda en el event loop,
+  como antes). Mide QPS, latencia y el retraso del event loop (lo que espera
+  cualquier otra request del worker).
+- api: levanta el OpenAI falso y el API (writer) con el mismo índice y lanza
+  /query en paralelo mientras un cliente sondea el health check `/`, con
+  SEARCH_WORKERS=0 y con el pool. Mide la latencia de `/` bajo carga.
+
+Uso:
+    python -m benchmarks.bench_search_concurrency --vectors 200000 --dim 768 --workers 0 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.bench_load import _spawn, _wait_ready, bench_env, environment_info, latency_stats
+from benchmarks.bench_vectordb import ClusteredCorpus
+
+
+# ============ THROUGHPUT (en proceso) ============
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.005) -> List[float]:
+    """Retraso (ms) con el que el event loop despierta a una tarea que duerme `interval`"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+    return lags
+
+
+async def run_throughput(db, corpus: ClusteredCorpus, workers: Optional[int], args) -> Dict[str, Any]:
+    """Búsquedas concurrentes con un pool de `workers` threads"""
+    from api.vectordb import configure_search
+
+    configure_search(workers, args.block_rows)
+    queries = corpus.queries(256, seed=11)
+    await db.search(queries[0]["vector"].tolist(), args.k)  # Arranca los threads del pool
+
+    latencies: List[float] = []
+    stop_at = time.monotonic() + args.duration
+    stop = asyncio.Event()
+
+    async def client(offset: int):
+        idx = offset
+        while time.monotonic() < stop_at:
+            query = queries[idx % len(queries)]
+            started = time.perf_counter()
+            await db.search(query["vector"].tolist(), args.k, query["scope"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            idx += args.concurrency
+
+    lag_task = asyncio.create_task(_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+
+    return {
+        "workers": workers,
+        "searches": len(latencies),
+        "qps": round(len(latencies) / elapsed, 1),
+        "latency_ms": latency_stats(latencies),
+        "loop_lag_ms": latency_stats(lags)
+    }
+
+
+# ============ API (health check bajo carga) ============
+
+async def run_api(index_dir: str, workers: Optional[int], args) -> Dict[str, Any]:
+    """Health check `/` mientras `--concurrency` clientes lanzan /query"""
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    env = bench_env(f"{fake_url}/v1")
+    env.update({
+        "INDEX_MODE": "writer",
+        "INDEX_DIR": index_dir,
+        "SEARCH_BLOCK_ROWS": str(args.block_rows)
+    })
+    if workers is not None:
+        env["SEARCH_WORKERS"] = str(workers)
+
+    processes = [_spawn([
+        "-m", "benchmarks.fake_openai",
+        "--port", str(args.fake_port),
+        "--dim", str(args.dim),
+        "--embedding-latency-ms", "2",
+        "--chat-latency-ms", "2",
+        "--chat-tokens-per-sec", "100000"
+    ], env)]
+    try:
+        await _wait_ready(f"{fake_url}/stats", processes[-1])
+        processes.append(_spawn([
+            "-m", "uvicorn", "api.main:app",
+            "--port", str(args.api_port),
+            "--workers", "1",
+            "--log-level", "warning"
+        ], env))
+        await _wait_ready(f"{api_url}/", processes[-1], timeout=300.0)
+
+        stop_at = time.monotonic() + args.duration
+        query_latencies: List[float] = []
+        health_latencies: List[float] = []
+        errors = 0
+        limits = httpx.Limits(max_connections=args.concurrency + 1)
+
+        async with httpx.AsyncClient(base_url=api_url, timeout=60.0, limits=limits) as client:
+            await client.post("/query", json={"query": "calentamiento", "top_k": args.k})
+
+            async def query_client(offset: int):
+                nonlocal errors
+                idx = offset
+                while time.monotonic() < stop_at:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/query", json={"query": f"escritura de venta número {idx}", "top_k": args.k}
+                    )
+                    if response.status_code == 200:
+                        query_latencies.append((time.perf_counter() - started) * 1000)
+                    else:
+                        errors += 1
+                    idx += args.concurrency
+
+            async def health_client():
+                while time.monotonic() < stop_at:
+                    started = time.perf_counter()
+                    await client.get("/")
+                    health_latencies.append((time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(1.0 / args.health_rate)
+
+            started = time.perf_counter()
+            await asyncio.gather(health_client(), *(query_client(i) for i in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    return {
+        "workers": workers,
+        "queries": len(query_latencies),
+        "query_errors": errors,
+        "queries_per_sec": round(len(query_latencies) / elapsed, 1),
+        "query_latency_ms": latency_stats(query_latencies),
+        "health_latency_ms": latency_stats(health_latencies)
+    }
+
+
+# ============ MAIN ============
+
+async def build_corpus(args):
+    from api.vectordb import SimpleInMemoryVectorDB
+
+    corpus = ClusteredCorpus(args.vectors, dim=args.dim, seed=args.seed)
+    db = SimpleInMemoryVectorDB()
+    for start, vectors, docs in corpus.blocks():
+        await db.upsert_vectors(corpus.chunk_metadata(start, docs), vectors)
+    return corpus, db
+
+
+async def run(args) -> Dict[str, Any]:
+    from api.shared_index import publish_snapshot
+
+    workers_list = [None if w < 0 else w for w in args.workers]
+    print(f"⏳ Índice de {args.vectors:,} vectores de dimensión {args.dim}...")
+    corpus, db = await build_corpus(args)
+
+    throughput = []
+    for workers in workers_list:
+        result = await run_throughput(db, corpus, workers, args)
+        throughput.append(result)
+        print(f"   pool {_label(workers):>6}: {result['qps']:>8.1f} búsquedas/s, "
+              f"p95 {result['latency_ms']['p95']:.1f} ms, lag del loop p99 {result['loop_lag_ms']['p99']:.1f} ms")
+
+    api = []
+    if not args.skip_api:
+        index_dir = tempfile.mkdtemp(prefix="bench-search-")
+        try:
+            publish_snapshot(db, index_dir)
+            del db
+            for workers in (0, None):
+                print(f"▶ API con pool {_label(workers)}...")
+                api.append(await run_api(index_dir, workers, args))
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "bench_search_concurrency",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "config": vars(args),
+        "throughput": throughput,
+        "api": api
+    }
+
+
+def _label(workers: Optional[int]) -> str:
+    if workers is None:
+        return f"{os.cpu_count()} (auto)"
+    return "loop" if workers == 0 else str(workers)
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"\n📊 Búsqueda concurrente ({results['config']['vectors']:,} × {results['config']['dim']}, "
+          f"{results['config']['concurrency']} clientes, {results['environment']['cpu_count']} núcleos)")
+    print(f"{'='*72}")
+    print(f"{'pool':<12}{'búsq/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'lag p50':>10}{'lag p99':>10}")
+    for row in results["throughput"]:
+        print(f"{_label(row['workers']):<12}{row['qps']:>10.1f}{row['latency_ms']['p50']:>9.1f}"
+              f"{row['latency_ms']['p95']:>9.1f}{row['loop_lag_ms']['p50']:>10.1f}{row['loop_lag_ms']['p99']:>10.1f}")
+    if results["api"]:
+        print(f"\n{'API pool':<12}{'query/s':>10}{'query p95':>11}{'/ p50':>9}{'/ p95':>9}{'/ p99':>9}")
+        for row in results["api"]:
+            health = row["health_latency_ms"]
+            print(f"{_label(row['workers']):<12}{row['queries_per_sec']:>10.1f}"
+                  f"{row['query_latency_ms']['p95']:>11.1f}{health['p50']:>9.1f}{health['p95']:>9.1f}{health['p99']:>9.1f}")
+    print(f"{'='*72}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda concurrente (pool de CPU)")
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="Tamaños del pool a medir (0 = en el event loop, -1 = núcleos)")
+    parser.add_argument("--block-rows", type=int, default=16384)
+    parser.add_argument("--concurrency", type=int, default=8, help="Búsquedas (o /query) en paralelo")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por medición")
+    parser.add_argument("--health-rate", type=float, default=20.0, help="Health checks por segundo")
+    parser.add_argument("--skip-api", action="store_true", help="Solo la parte en proceso")
+    parser.add_argument("--fake-port", type=int, default=8768)
+    parser.add_argument("--api-port", type=int, default=8769)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default="benchmarks/results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_search_concurrency-{results['timestamp'].replace(':', '')}-"
+        f"{results['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"💾 Resultados: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Memoria del índice en memoria según el número de workers
+
+Publica una generación del índice (api/shared_index.py) con un corpus
+sintético y arranca N procesos que la cargan como lo haría cada worker de
+uvicorn, en dos modos:
+
+- copy:   cada proceso carga su propia copia (`SimpleInMemoryVectorDB.load`),
+          como el índice en memoria sin compartir.
+- shared: cada proceso la mapea en solo lectura (`SharedIndexReader`).
+
+Tras una pasada de búsquedas sin filtro (que toca todos los vectores) se
+suma la PSS de los procesos (/proc/<pid>/smaps_rollup, Linux): las páginas
+compartidas se reparten entre quienes las mapean, así que la suma es la
+memoria real del conjunto.
+
+Uso:
+    python -m benchmarks.bench_shared_index --vectors 50000 --dim 1024 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.bench_load import environment_info
+from benchmarks.bench_vectordb import ClusteredCorpus
+
+MODES = ["copy", "shared"]
+
+
+def process_memory_bytes(pid: int) -> Dict[str, int]:
+    """PSS y RSS de un proceso (kB de smaps_rollup → bytes)"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1]) * 1024
+    return values
+
+
+async def build_index(index_dir: str, n: int, dim: int, seed: int) -> float:
+    """Publicar una generación con `n` vectores. Devuelve los segundos empleados"""
+    from api.vectordb import SimpleInMemoryVectorDB
+    from api.shared_index import publish_snapshot
+
+    corpus = ClusteredCorpus(n, dim=dim, seed=seed)
+    db = SimpleInMemoryVectorDB()
+    started = time.perf_counter()
+    for start, vectors, docs in corpus.blocks():
+        await db.upsert_vectors(corpus.chunk_metadata(start, docs), vectors)
+    publish_snapshot(db, index_dir)
+    return time.perf_counter() - started
+
+
+async def attach(index_dir: str, mode: str, dim: int, searches: int) -> None:
+    """Proceso hijo: cargar el índice, buscar y esperar a que el padre mida"""
+    from api.vectordb import SimpleInMemoryVectorDB
+    from api.shared_index import SharedIndexReader, current_generation
+
+    if mode == "shared":
+        db = SharedIndexReader(index_dir, refresh_interval=0)
+    else:
+        db = SimpleInMemoryVectorDB.load(str(Path(index_dir) / current_generation(index_dir)))
+
+    rng = np.random.default_rng(os.getpid())
+    started = time.perf_counter()
+    for _ in range(searches):
+        await db.search(rng.standard_normal(dim).tolist(), top_k=10)
+    print(json.dumps({"search_ms": (time.perf_counter() - started) * 1000 / searches}), flush=True)
+    sys.stdin.readline()
+
+
+def measure(index_dir: str, mode: str, workers: int, args) -> Dict[str, Any]:
+    """Arrancar `workers` procesos en un modo y sumar su memoria"""
+    command = [
+        sys.executable, "-m", "benchmarks.bench_shared_index",
+        "--attach", index_dir, "--mode", mode,
+        "--dim", str(args.dim), "--searches", str(args.searches)
+    ]
+    processes = [
+        subprocess.Popen(
+            command, cwd=Path(__file__).parent.parent,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    try:
+        search_ms = [json.loads(p.stdout.readline())["search_ms"] for p in processes]
+        memory = [process_memory_bytes(p.pid) for p in processes]
+    finally:
+        for p in processes:
+            p.stdin.close()
+        for p in processes:
+            p.wait()
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "total_pss_mb": round(sum(m["pss"] for m in memory) / 1e6, 1),
+        "total_rss_mb": round(sum(m["rss"] for m in memory) / 1e6, 1),
+        "search_ms": round(float(np.mean(search_ms)), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria del índice compartido vs copias por worker")
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default="benchmarks/results")
+    parser.add_argument("--attach", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, default="shared", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.attach:
+        asyncio.run(attach(args.attach, args.mode, args.dim, args.searches))
+        return
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        sys.exit("Este benchmark necesita /proc/<pid>/smaps_rollup (Linux)")
+
+    with tempfile.TemporaryDirectory(prefix="bench-shared-index-") as index_dir:
+        print(f"⏳ Publicando {args.vectors:,} vectores de dim {args.dim}...")
+        build_seconds = asyncio.run(build_index(index_dir, args.vectors, args.dim, args.seed))
+        vector_mb = args.vectors * args.dim * 4 / 1e6
+        print(f"   {build_seconds:.1f}s · vectores {vector_mb:,.0f} MB")
+
+        results = []
+        for workers in args.workers:
+            for mode in MODES:
+                result = measure(index_dir, mode, workers, args)
+                results.append(result)
+                print(
+                    f"   {mode:<6} × {workers:>2} workers  PSS {result['total_pss_mb']:>8,.0f} MB  "
+                    f"RSS {result['total_rss_mb']:>8,.0f} MB  búsqueda {result['search_ms']:.1f} ms"
+                )
+
+    report = {
+        "benchmark": "bench_shared_index",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "config": vars(args),
+        "results": results
+    }
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_shared_index-{report['timestamp'].replace(':', '')}-"
+        f"{report['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n💾 Resultados: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Benchmark de arranque en frío del API
+
+Mide lo que paga una instancia nueva (p. ej. Cloud Run escalando desde cero):
+
+- Import: tiempo de `import api.main` en un proceso nuevo, módulos más caros
+  según `python -X importtime` y qué SDKs pesados quedan cargados.
+- Arranque: desde lanzar uvicorn hasta que `/` responde (liveness) y hasta
+  que `/ready` devuelve 200 (warmup terminado).
+- Primera consulta: latencia de la primera `/query` frente a las siguientes,
+  contra el servidor OpenAI falso (benchmarks/fake_openai.py) con latencias
+  mínimas para que la diferencia sea coste propio del proceso.
+
+Uso:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.bench_load import ROOT, _spawn, _wait_ready, bench_env, environment_info
+
+# SDKs cuyo import cuesta segundos (no deberían cargarse al importar el API)
+HEAVY_MODULES = ["openai", "google.cloud.aiplatform", "google.cloud.documentai_v1", "tiktoken"]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+# ============ IMPORT ============
+
+def measure_import(env: Dict[str, str]) -> Dict[str, Any]:
+    """Tiempo de `import api.main` y SDKs pesados cargados, en un proceso nuevo"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import api.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'import_ms': elapsed * 1000, 'heavy_modules': heavy}))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env: Dict[str, str], top: int = 10) -> List[Dict[str, Any]]:
+    """Paquetes de primer nivel con más tiempo de import acumulado (-X importtime)"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    packages: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, module = int(match.group(1)), match.group(4)
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    ranking = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "self_ms": round(us / 1000, 1)} for name, us in ranking]
+
+
+# ============ ARRANQUE ============
+
+async def measure_cold_start(args, env: Dict[str, str]) -> Dict[str, Any]:
+    """Lanzar uvicorn y medir liveness, readiness y primeras consultas"""
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    started = time.perf_counter()
+    process = _spawn(["-m", "uvicorn", "api.main:app", "--port", str(args.api_port), "--log-level", "warning"], env)
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            await _wait_ready(f"{api_url}/", process)
+            live_ms = (time.perf_counter() - started) * 1000
+
+            while True:
+                response = await client.get(f"{api_url}/ready")
+                if response.status_code == 200:
+                    break
+                await asyncio.sleep(0.05)
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            await client.post(f"{api_url}/ingest", json={
+                "document_id": "bench_startup",
+                "chunks": [{
+                    "chunk_id": "bench_startup_0",
+                    "document_id": "bench_startup",
+                    "title": "Protocolo de prueba",
+                    "page_number": 1,
+                    "chunk_text": "Carta de venta otorgada ante el escribano",
+                    "embedding": [1.0] * args.dim
+                }]
+            })
+
+            query_ms = []
+            for _ in range(args.queries):
+                query_started = time.perf_counter()
+                response = await client.post(f"{api_url}/query", json={"query": "¿Ante qué escribano?"})
+                response.raise_for_status()
+                query_ms.append((time.perf_counter() - query_started) * 1000)
+
+            warmup = (await client.get(f"{api_url}/ready")).json().get("warmup_ms", {})
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    return {
+        "live_ms": round(live_ms, 1),
+        "ready_ms": round(ready_ms, 1),
+        "first_query_ms": round(query_ms[0], 1),
+        "steady_query_ms": round(statistics.median(query_ms[1:]), 1) if len(query_ms) > 1 else None,
+        "warmup_ms": warmup
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    env = bench_env(f"{fake_url}/v1")
+    fake = _spawn([
+        "-m", "benchmarks.fake_openai",
+        "--port", str(args.fake_port),
+        "--dim", str(args.dim),
+        "--embedding-latency-ms", "1",
+        "--embedding-latency-per-input-ms", "0",
+        "--chat-latency-ms", "1",
+        "--chat-tokens-per-sec", "0",
+        "--jitter", "0"
+    ], env)
+    try:
+        await _wait_ready(f"{fake_url}/stats", fake)
+
+        imports = [measure_import(env) for _ in range(args.runs)]
+        starts = []
+        for run_idx in range(args.runs):
+            print(f"⏳ Arranque {run_idx + 1}/{args.runs}...")
+            starts.append(await measure_cold_start(args, env))
+        profile = import_profile(env)
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    def median(rows: List[Dict[str, Any]], key: str) -> float:
+        values = [row[key] for row in rows if row[key] is not None]
+        return round(statistics.median(values), 1) if values else None
+
+    return {
+        "benchmark": "bench_startup",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "config": vars(args),
+        "import": {
+            "import_ms": median(imports, "import_ms"),
+            "heavy_modules": imports[-1]["heavy_modules"],
+            "top_packages": profile
+        },
+        "cold_start": {
+            key: median(starts, key)
+            for key in ("live_ms", "ready_ms", "first_query_ms", "steady_query_ms")
+        },
+        "runs": starts
+    }
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    imports = results["import"]
+    cold = results["cold_start"]
+    print(f"\n{'='*60}")
+    print(f"📦 import api.main: {imports['import_ms']:.0f} ms (mediana)")
+    print(f"   SDKs pesados cargados: {', '.join(imports['heavy_modules']) or 'ninguno'}")
+    for row in imports["top_packages"]:
+        print(f"   {row['package']:<24} {row['self_ms']:>8.1f} ms")
+    print(f"\n🚀 Arranque en frío (mediana de {len(results['runs'])})")
+    print(f"   liveness (/)       {cold['live_ms']:>8.0f} ms")
+    print(f"   readiness (/ready) {cold['ready_ms']:>8.0f} ms")
+    print(f"   primera /query     {cold['first_query_ms']:>8.1f} ms")
+    if cold["steady_query_ms"] is not None:
+        print(f"   /query estable     {cold['steady_query_ms']:>8.1f} ms")
+    print(f"{'='*60}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de import y arranque en frío del API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=5, help="Consultas tras cada arranque")
+    parser.add_argument("--dim", type=int, default=256, help="Dimensión de los embeddings falsos")
+    parser.add_argument("--api-port", type=int, default=8767)
+    parser.add_argument("--fake-port", type=int, default=8768)
+    parser.add_argument("--out", type=str, default="benchmarks/results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_startup-{results['timestamp'].replace(':', '')}-{results['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"💾 Resultados: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
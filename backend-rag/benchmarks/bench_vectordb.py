@@ -0,0 +1,374 @@
+"""
+Microbenchmark de búsqueda vectorial y recall por backend y tamaño de corpus
+
+Genera corpus sintéticos agrupados (cada documento es un "tema": sus chunks
+son ruido alrededor de un centro), con `collection` y `document_id`
+repartidos como en producción (colecciones sesgadas, libros de tamaño
+log-normal). Carga el corpus en el backend de `get_vector_db` y mide tiempo
+de construcción, memoria (RSS), latencia, QPS y recall@k contra búsqueda
+exacta, con consultas sin filtro, por colección y por documentos.
+
+Cada tamaño corre en un subproceso nuevo para que la memoria medida sea
+solo la de ese índice. El corpus se genera por bloques deterministas: la
+verdad exacta se calcula regenerándolos, sin guardar la matriz completa.
+
+Uso:
+    python -m benchmarks.bench_vectordb --sizes 10000 100000 --queries 200 --k 10
+    python -m benchmarks.bench_vectordb --backend vertex --sizes 10000 --settle-seconds 120
+    python -m benchmarks.bench_vectordb --backend partitioned --sizes 100000 --memory-budget-mb 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.bench_load import environment_info, latency_stats
+from benchmarks.synthetic_corpus import COLLECTIONS, COLLECTION_WEIGHTS
+
+BLOCK_SIZE = 10_000
+FILTER_KINDS = ["none", "collection", "book_ids"]
+
+
+# ============ CORPUS SINTÉTICO ============
+
+class ClusteredCorpus:
+    """
+    Corpus determinista de `n` vectores de dimensión `dim`
+
+    Los documentos ocupan rangos contiguos de filas (los chunks de un libro
+    van seguidos) y cada uno se asigna a un cluster y a una colección.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        dim: int = 3072,
+        n_clusters: Optional[int] = None,
+        noise: float = 0.8,
+        mean_doc_chunks: int = 200,
+        seed: int = 42
+    ):
+        self.n = n
+        self.dim = dim
+        self.noise = noise
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        self.n_clusters = n_clusters or max(16, n // 2000)
+        self.centers = rng.standard_normal((self.n_clusters, dim), dtype=np.float32)
+
+        # Libros de tamaño log-normal hasta cubrir n filas
+        sizes = []
+        total = 0
+        while total < n:
+            size = int(max(1, rng.lognormal(np.log(mean_doc_chunks), 0.7)))
+            size = min(size, n - total)
+            sizes.append(size)
+            total += size
+        self.doc_starts = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        n_docs = len(sizes)
+
+        weights = np.asarray(COLLECTION_WEIGHTS, dtype=np.float64)
+        self.doc_collection = rng.choice(len(COLLECTIONS), size=n_docs, p=weights / weights.sum())
+        self.doc_cluster = rng.integers(0, self.n_clusters, size=n_docs)
+
+    @property
+    def n_documents(self) -> int:
+        return len(self.doc_starts) - 1
+
+    def row_documents(self, start: int, end: int) -> np.ndarray:
+        """Índice de documento de las filas [start, end)"""
+        return np.searchsorted(self.doc_starts, np.arange(start, end), side="right") - 1
+
+    def block(self, block_idx: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Bloque `block_idx`: (fila inicial, vectores normalizados, documento por fila)"""
+        start = block_idx * BLOCK_SIZE
+        end = min(start + BLOCK_SIZE, self.n)
+        docs = self.row_documents(start, end)
+
+        rng = np.random.default_rng([self.seed, block_idx])
+        vectors = self.centers[self.doc_cluster[docs]]
+        vectors = vectors + self.noise * rng.standard_normal((end - start, self.dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return start, vectors, docs
+
+    def blocks(self) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        for block_idx in range((self.n + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            yield self.block(block_idx)
+
+    def document_id(self, doc: int) -> str:
+        return f"doc_{doc:06d}"
+
+    def chunk_metadata(self, start: int, docs: np.ndarray) -> List[Dict[str, Any]]:
+        return [
+            {
+                "chunk_id": f"v{start + offset}",
+                "document_id": self.document_id(doc),
+                "collection": COLLECTIONS[self.doc_collection[doc]],
+                "title": f"Libro {doc}",
+                "page_number": int(start + offset - self.doc_starts[doc]) // 4 + 1,
+                "chunk_text": ""
+            }
+            for offset, doc in enumerate(docs.tolist())
+        ]
+
+    def queries(self, n_queries: int, seed: int = 7) -> List[Dict[str, Any]]:
+        """
+        Consultas: ruido alrededor del cluster de un documento al azar,
+        repartidas entre sin filtro, por colección y por 1-3 documentos
+        """
+        rng = np.random.default_rng([self.seed, seed])
+        queries = []
+        for idx in range(n_queries):
+            doc = int(rng.integers(0, self.n_documents))
+            vector = self.centers[self.doc_cluster[doc]] + self.noise * rng.standard_normal(self.dim, dtype=np.float32)
+            vector /= np.linalg.norm(vector)
+
+            kind = FILTER_KINDS[idx % len(FILTER_KINDS)]
+            if kind == "collection":
+                scope = {"collection": COLLECTIONS[self.doc_collection[doc]]}
+            elif kind == "book_ids":
+                extra = rng.integers(0, self.n_documents, size=int(rng.integers(0, 3)))
+                scope = {"book_ids": sorted({self.document_id(d) for d in [doc, *extra.tolist()]})}
+            else:
+                scope = None
+            queries.append({"kind": kind, "vector": vector.astype(np.float32), "scope": scope})
+        return queries
+
+
+def exact_top_k(corpus: ClusteredCorpus, queries: List[Dict[str, Any]], k: int) -> List[List[str]]:
+    """Top-k exacto (coseno) con los mismos filtros, regenerando el corpus por bloques"""
+    matrix = np.stack([q["vector"] for q in queries])
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+    # Máscaras de filtro por consulta a nivel de documento
+    doc_masks = []
+    for query in queries:
+        scope = query["scope"]
+        if scope is None:
+            doc_masks.append(None)
+        elif "collection" in scope:
+            doc_masks.append(corpus.doc_collection == COLLECTIONS.index(scope["collection"]))
+        else:
+            mask = np.zeros(corpus.n_documents, dtype=bool)
+            mask[[int(d.split("_")[1]) for d in scope["book_ids"]]] = True
+            doc_masks.append(mask)
+
+    for start, vectors, docs in corpus.blocks():
+        scores = matrix @ vectors.T  # (n_queries, block)
+        for qi, doc_mask in enumerate(doc_masks):
+            if doc_mask is not None:
+                scores[qi, ~doc_mask[docs]] = -np.inf
+        rows = np.arange(start, start + len(docs))
+
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+    truth = []
+    for scores, rows in zip(best_scores, best_rows):
+        truth.append([f"v{row}" for row, score in zip(rows, scores) if np.isfinite(score)])
+    return truth
+
+
+# ============ MEDICIÓN ============
+
+def current_rss_bytes() -> int:
+    """RSS actual (Linux) o pico de RSS como aproximación"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def bench_size(args, n: int) -> Dict[str, Any]:
+    """Construir el índice de `n` vectores y medir búsqueda y recall"""
+    from api.vectordb import get_vector_db
+
+    corpus = ClusteredCorpus(n, dim=args.dim, seed=args.seed)
+    queries = corpus.queries(args.queries)
+
+    partitions_dir = None
+    if args.backend == "partitioned":
+        # Particiones en un directorio temporal, con el presupuesto pedido
+        partitions_dir = tempfile.mkdtemp(prefix="bench-partitions-")
+        os.environ["PARTITIONS_DIR"] = partitions_dir
+        os.environ["PARTITION_MEMORY_BUDGET_MB"] = str(args.memory_budget_mb)
+
+    rss_before = current_rss_bytes()
+    db = get_vector_db(backend=args.backend)
+
+    build_started = time.perf_counter()
+    for start, vectors, docs in corpus.blocks():
+        if not await db.upsert_vectors(corpus.chunk_metadata(start, docs), vectors):
+            raise RuntimeError(f"Upsert failed at row {start}")
+    build_seconds = time.perf_counter() - build_started
+    index_bytes = current_rss_bytes() - rss_before
+
+    if args.settle_seconds:
+        await asyncio.sleep(args.settle_seconds)  # Backends con actualización asíncrona
+
+    truth = exact_top_k(corpus, queries, args.k)
+    query_lists = [q["vector"].tolist() for q in queries]
+
+    # Calentamiento
+    for vector, query in list(zip(query_lists, queries))[:5]:
+        await db.search(vector, top_k=args.k, filter_metadata=query["scope"])
+
+    latencies: Dict[str, List[float]] = {kind: [] for kind in FILTER_KINDS}
+    recalls: Dict[str, List[float]] = {kind: [] for kind in FILTER_KINDS}
+
+    started = time.perf_counter()
+    for vector, query, expected in zip(query_lists, queries, truth):
+        query_started = time.perf_counter()
+        results = await db.search(vector, top_k=args.k, filter_metadata=query["scope"])
+        latencies[query["kind"]].append((time.perf_counter() - query_started) * 1000)
+        if expected:
+            found = {r["chunk_id"] for r in results}
+            recalls[query["kind"]].append(len(found & set(expected)) / len(expected))
+    serial_seconds = time.perf_counter() - started
+
+    concurrent_qps = None
+    if args.concurrency > 1:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(vector, query):
+            async with semaphore:
+                await db.search(vector, top_k=args.k, filter_metadata=query["scope"])
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(v, q) for v, q in zip(query_lists, queries)])
+        concurrent_qps = len(queries) / (time.perf_counter() - started)
+
+    backend_status = db.status()
+    if partitions_dir:
+        shutil.rmtree(partitions_dir, ignore_errors=True)
+
+    return {
+        "backend": args.backend,
+        "vectors": n,
+        "dim": args.dim,
+        "documents": corpus.n_documents,
+        "clusters": corpus.n_clusters,
+        "build_seconds": round(build_seconds, 3),
+        "build_vectors_per_sec": round(n / build_seconds, 1) if build_seconds else 0.0,
+        "index_rss_mb": round(index_bytes / 1e6, 1),
+        "bytes_per_vector": round(index_bytes / n, 1),
+        "qps": round(len(queries) / serial_seconds, 2) if serial_seconds else 0.0,
+        "concurrent_qps": round(concurrent_qps, 2) if concurrent_qps else None,
+        "concurrency": args.concurrency,
+        "backend_status": backend_status,
+        "by_filter": {
+            kind: {
+                "queries": len(latencies[kind]),
+                "latency_ms": latency_stats(latencies[kind]),
+                f"recall@{args.k}": round(float(np.mean(recalls[kind])), 4) if recalls[kind] else None
+            }
+            for kind in FILTER_KINDS
+        }
+    }
+
+
+def run_in_subprocess(args, n: int) -> Dict[str, Any]:
+    """Medir un tamaño en un proceso nuevo (memoria aislada)"""
+    command = [
+        sys.executable, "-m", "benchmarks.bench_vectordb",
+        "--single-size", str(n),
+        "--backend", args.backend,
+        "--dim", str(args.dim),
+        "--queries", str(args.queries),
+        "--k", str(args.k),
+        "--concurrency", str(args.concurrency),
+        "--settle-seconds", str(args.settle_seconds),
+        "--memory-budget-mb", str(args.memory_budget_mb),
+        "--seed", str(args.seed)
+    ]
+    completed = subprocess.run(
+        command, cwd=Path(__file__).parent.parent, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark for {n} vectors failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_result(result: Dict[str, Any], k: int) -> None:
+    print(
+        f"\n📐 {result['backend']} · {result['vectors']:,} vectores · {result['documents']} docs\n"
+        f"   build {result['build_seconds']:.1f}s ({result['build_vectors_per_sec']:,.0f} vec/s)  "
+        f"RSS {result['index_rss_mb']:,.0f} MB ({result['bytes_per_vector']:,.0f} B/vec)  "
+        f"{result['qps']:.1f} QPS"
+        + (f"  ({result['concurrent_qps']:.1f} QPS con {result['concurrency']} en paralelo)"
+           if result["concurrent_qps"] else "")
+    )
+    for kind, stats in result["by_filter"].items():
+        latency = stats["latency_ms"]
+        recall = stats[f"recall@{k}"]
+        print(
+            f"   {kind:<11} p50 {latency['p50']:>8.2f}  p95 {latency['p95']:>8.2f}  "
+            f"p99 {latency['p99']:>8.2f} ms  recall@{k} {recall if recall is not None else 'n/a'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de búsqueda vectorial")
+    parser.add_argument("--backend", choices=["in-memory", "partitioned", "vertex"], default="in-memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=300, help="Consultas por tamaño (1/3 de cada tipo de filtro)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Consultas en paralelo para QPS concurrente")
+    parser.add_argument("--settle-seconds", type=float, default=0.0, help="Espera tras cargar (índices remotos)")
+    parser.add_argument("--memory-budget-mb", type=int, default=2048, help="Presupuesto del backend particionado")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default="benchmarks/results")
+    parser.add_argument("--single-size", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_size:
+        # Subproceso: una línea JSON por stdout
+        result = asyncio.run(bench_size(args, args.single_size))
+        sys.stdout.write(json.dumps(result) + "\n")
+        return
+
+    results = {
+        "benchmark": "bench_vectordb",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "config": vars(args),
+        "sizes": []
+    }
+    for n in args.sizes:
+        print(f"⏳ {n:,} vectores...")
+        result = run_in_subprocess(args, n)
+        results["sizes"].append(result)
+        print_result(result, args.k)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / (
+        f"bench_vectordb-{args.backend}-{results['timestamp'].replace(':', '')}-"
+        f"{results['environment']['git_commit']}.json"
+    )
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\n💾 Resultados: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
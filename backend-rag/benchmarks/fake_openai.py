@@ -0,0 +1,311 @@
+"""
+Servidor local compatible con la API de OpenAI para benchmarks
+
+Implementa `/v1/embeddings` y `/v1/chat/completions` (con y sin streaming)
+con latencia configurable, sin coste ni red. Los embeddings son un
+bag-of-words con hashing normalizado: deterministas y con similitud real
+entre textos que comparten palabras, así que la recuperación tiene sentido.
+
+Uso:
+    python -m benchmarks.fake_openai --port 8100 --embedding-latency-ms 40 --chat-latency-ms 800
+
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake uvicorn api.main:app
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class FakeOpenAIConfig:
+    """Latencias simuladas (ms) y dimensión de los embeddings"""
+
+    def __init__(
+        self,
+        dim: int = 3072,
+        embedding_latency_ms: float = 40.0,
+        embedding_latency_per_input_ms: float = 0.5,
+        chat_latency_ms: float = 800.0,
+        chat_tokens_per_sec: float = 60.0,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        chat_stall_rate: float = 0.0,
+        chat_stall_ms: float = 10_000.0,
+        embedding_rpm: Optional[int] = None,
+        embedding_tpm: Optional[int] = None,
+        seed: int = 0
+    ):
+        """
+        Args:
+            dim: Dimensión por defecto de los embeddings
+            embedding_latency_ms: Latencia base por request de embeddings
+            embedding_latency_per_input_ms: Latencia extra por texto del batch
+            chat_latency_ms: Latencia hasta el primer token del chat
+            chat_tokens_per_sec: Velocidad de generación (streaming y total)
+            jitter: Variación relativa aleatoria de las latencias (0.2 = ±20%)
+            error_rate: Fracción de requests que devuelven 500
+            chat_stall_rate: Fracción de requests de chat que se quedan colgadas (cola lenta)
+            chat_stall_ms: Latencia extra de las requests colgadas
+            embedding_rpm: Límite de requests/min de embeddings (429 al superarlo)
+            embedding_tpm: Límite de tokens/min de embeddings (429 al superarlo)
+            seed: Semilla del generador de jitter/errores
+        """
+        self.dim = dim
+        self.embedding_latency_ms = embedding_latency_ms
+        self.embedding_latency_per_input_ms = embedding_latency_per_input_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.chat_tokens_per_sec = chat_tokens_per_sec
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chat_stall_rate = chat_stall_rate
+        self.chat_stall_ms = chat_stall_ms
+        self.embedding_limit = RateLimit(embedding_rpm, embedding_tpm)
+        self.rng = random.Random(seed)
+
+    def delay(self, ms: float) -> float:
+        """Segundos de espera con jitter"""
+        factor = 1.0 + self.rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, ms * factor) / 1000.0
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+    def should_stall(self) -> bool:
+        return self.chat_stall_rate > 0 and self.rng.random() < self.chat_stall_rate
+
+
+class RateLimit:
+    """Límite RPM/TPM como el de OpenAI: token buckets con 10 s de ráfaga"""
+
+    def __init__(self, rpm: Optional[int], tpm: Optional[int], burst_seconds: float = 10.0):
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.burst_seconds = burst_seconds
+        self.levels = {key: limit / 60.0 * burst_seconds for key, limit in self.limits.items() if limit}
+        self.updated = time.monotonic()
+
+    def allow(self, tokens: int) -> bool:
+        """Descontar una request de `tokens` tokens, o False si supera el límite"""
+        now = time.monotonic()
+        need = {"requests": 1, "tokens": tokens}
+        for key in self.levels:
+            rate = self.limits[key] / 60.0
+            self.levels[key] = min(rate * self.burst_seconds, self.levels[key] + (now - self.updated) * rate)
+        self.updated = now
+        if any(self.levels[key] < need[key] for key in self.levels):
+            return False
+        for key in self.levels:
+            self.levels[key] -= need[key]
+        return True
+
+
+def hashed_embedding(text: str, dim: int) -> np.ndarray:
+    """Embedding determinista: bag-of-words con hashing y norma 1"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dim] += 1.0 if (value >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+def _count_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token)"""
+    return max(1, len(text) // 4)
+
+
+def _fake_answer(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Respuesta con citas tomadas del contexto del prompt"""
+    prompt = messages[-1].get("content", "") if messages else ""
+    sources = re.findall(r"Fuente: ([^\n\[]+? — p\. \d+)", prompt)[:3]
+    answer = "Según los documentos consultados, la información aparece en los protocolos indicados"
+    if sources:
+        answer += " " + " ".join(f"[Fuente: {source}]" for source in sources)
+    words = answer.split()
+    return " ".join(words[:max(1, max_tokens)]) + "."
+
+
+def create_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    """Crear la app del servidor falso"""
+    config = config or FakeOpenAIConfig()
+    app = FastAPI(title="Fake OpenAI")
+    app.state.config = config
+    app.state.requests = {
+        "embeddings": 0, "embedding_inputs": 0, "embeddings_rate_limited": 0, "chat": 0, "chat_stalled": 0
+    }
+
+    def error_response() -> JSONResponse:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Simulated failure", "type": "server_error"}}
+        )
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        tokens = sum(_count_tokens(str(text)) for text in inputs)
+        if not config.embedding_limit.allow(tokens):
+            app.state.requests["embeddings_rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}
+            )
+
+        app.state.requests["embeddings"] += 1
+        app.state.requests["embedding_inputs"] += len(inputs)
+
+        await asyncio.sleep(config.delay(
+            config.embedding_latency_ms + config.embedding_latency_per_input_ms * len(inputs)
+        ))
+        if config.should_fail():
+            return error_response()
+
+        dim = body.get("dimensions") or config.dim
+        as_base64 = body.get("encoding_format") == "base64"
+
+        data = []
+        for idx, text in enumerate(inputs):
+            vector = hashed_embedding(str(text), dim)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": idx, "embedding": embedding})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        max_tokens = body.get("max_tokens") or 200
+        model = body.get("model", "fake-chat")
+
+        app.state.requests["chat"] += 1
+
+        answer = _fake_answer(messages, max_tokens)
+        words = answer.split(" ")
+        prompt_tokens = sum(_count_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = len(words)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        token_delay = 1.0 / config.chat_tokens_per_sec if config.chat_tokens_per_sec else 0.0
+
+        await asyncio.sleep(config.delay(config.chat_latency_ms))
+        if config.should_stall():
+            app.state.requests["chat_stalled"] += 1
+            await asyncio.sleep(config.chat_stall_ms / 1000.0)
+        if config.should_fail():
+            return error_response()
+
+        if body.get("stream"):
+            async def events():
+                for idx, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": word if idx == 0 else " " + word},
+                            "finish_reason": None
+                        }]
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(token_delay)
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(token_delay * completion_tokens)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.requests
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para benchmarks")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency-ms", type=float, default=40.0)
+    parser.add_argument("--embedding-latency-per-input-ms", type=float, default=0.5)
+    parser.add_argument("--chat-latency-ms", type=float, default=800.0)
+    parser.add_argument("--chat-tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chat-stall-rate", type=float, default=0.0)
+    parser.add_argument("--chat-stall-ms", type=float, default=10_000.0)
+    parser.add_argument("--embedding-rpm", type=int, default=None)
+    parser.add_argument("--embedding-tpm", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(
+        dim=args.dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_latency_per_input_ms=args.embedding_latency_per_input_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        chat_tokens_per_sec=args.chat_tokens_per_sec,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        chat_stall_rate=args.chat_stall_rate,
+        chat_stall_ms=args.chat_stall_ms,
+        embedding_rpm=args.embedding_rpm,
+        embedding_tpm=args.embedding_tpm
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
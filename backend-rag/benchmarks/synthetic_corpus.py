@@ -0,0 +1,210 @@
+"""
+Corpus sintético de documentos históricos en español
+
+Genera libros (PDF con capa de texto) repartidos en colecciones con una
+distribución sesgada como la real (pocas colecciones grandes y una cola de
+pequeñas). Cada página es una escritura con otorgante, escribano, lugar,
+fecha e importe; de esos hechos salen las consultas de prueba, con el
+documento y la página donde está la respuesta.
+
+Con `--boilerplate` una fracción de las páginas es una fórmula notarial
+fija (invocación y cláusulas) con solo el nombre del otorgante cambiado,
+como las que se repiten en los protocolos reales.
+
+Uso:
+    python -m benchmarks.synthetic_corpus --out /tmp/corpus --documents 20 --pages 30
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import List, Dict, Any
+
+from benchmarks.synthetic_pdf import write_pdf
+
+COLLECTIONS = ["notarial", "parroquial", "municipal", "judicial", "inquisicion", "hacienda"]
+# Peso relativo de cada colección (cola larga)
+COLLECTION_WEIGHTS = [45, 20, 15, 10, 6, 4]
+
+_NOMBRES = [
+    "Pedro", "Juan", "Alonso", "Diego", "Francisco", "Gonzalo", "Hernando", "Rodrigo",
+    "Catalina", "María", "Isabel", "Leonor", "Beatriz", "Inés", "Ana", "Juana"
+]
+_APELLIDOS = [
+    "de Mendoza", "de Ávila", "de Medina", "Ruiz", "Fernández", "de Toledo", "Pacheco",
+    "de Guzmán", "Sánchez", "de Herrera", "Ortiz", "de Vargas", "Núñez", "de Salazar"
+]
+_LUGARES = [
+    "Madrid", "Sevilla", "Toledo", "Valladolid", "Burgos", "Salamanca", "Córdoba",
+    "Granada", "Segovia", "Cuenca", "Zamora", "Medina del Campo"
+]
+_CALLES = [
+    "la calle Mayor", "la calle de la Feria", "la plaza de San Salvador", "la calle de Francos",
+    "la collación de Santa María", "el arrabal de San Lorenzo", "la calle de la Sierpe"
+]
+_ACTOS = [
+    ("carta de venta", "vende y da en venta real unas casas principales"),
+    ("carta de obligación", "se obliga a pagar"),
+    ("testamento", "manda que su cuerpo sea sepultado en la iglesia"),
+    ("carta de dote", "recibe en dote y casamiento"),
+    ("poder general", "otorga todo su poder cumplido"),
+    ("carta de arrendamiento", "da en arrendamiento una heredad de pan llevar"),
+]
+_MESES = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+    "septiembre", "octubre", "noviembre", "diciembre"
+]
+_RELLENO = (
+    "y para lo cumplir obligo su persona y bienes muebles y raíces habidos y por haber "
+    "y dio poder a las justicias de su majestad para que se lo hagan cumplir como por "
+    "sentencia pasada en cosa juzgada y renunció las leyes de su favor en testimonio de "
+    "lo cual lo otorgó ante mí el presente escribano y los testigos de yuso escritos"
+).split()
+_FORMULA = (
+    "En el nombre de Dios Todopoderoso y de la gloriosa Virgen Santa María su bendita madre "
+    "a quien tengo por señora y abogada en todos mis hechos sepan cuantos esta carta vieren "
+    "como yo {persona} vecino que soy de esta ciudad estando sano de la voluntad y en mi "
+    "buen seso y entendimiento natural tal cual Dios nuestro señor fue servido de me dar "
+    "creyendo como firmemente creo en el misterio de la Santísima Trinidad Padre Hijo y "
+    "Espíritu Santo tres personas y un solo Dios verdadero y en todo aquello que tiene y "
+    "cree la santa madre Iglesia católica de Roma"
+)
+
+
+def _persona(rng: random.Random) -> str:
+    return f"{rng.choice(_NOMBRES)} {rng.choice(_APELLIDOS)}"
+
+
+def _page(rng: random.Random, year: int, lines: int) -> Dict[str, Any]:
+    """Una escritura: texto de la página y sus hechos"""
+    acto, verbo = rng.choice(_ACTOS)
+    fact = {
+        "acto": acto,
+        "otorgante": _persona(rng),
+        "escribano": _persona(rng),
+        "lugar": rng.choice(_LUGARES),
+        "calle": rng.choice(_CALLES),
+        "year": year,
+        "importe": rng.randrange(50, 5000, 50),
+    }
+    header = [
+        f"{acto.capitalize()} otorgada por {fact['otorgante']}",
+        f"En la ciudad de {fact['lugar']} a {rng.randint(1, 28)} días del mes de "
+        f"{rng.choice(_MESES)} de {year} años ante mí {fact['escribano']} escribano",
+        f"público pareció presente {fact['otorgante']} vecino de esta ciudad en "
+        f"{fact['calle']} y dijo que {verbo}",
+        f"por precio y cuantía de {fact['importe']} ducados de oro",
+    ]
+    body = [
+        " ".join(rng.choice(_RELLENO) for _ in range(12))
+        for _ in range(max(0, lines - len(header)))
+    ]
+    return {"text": "\n".join(header + body), "fact": fact}
+
+
+def _formula_page(rng: random.Random, lines: int) -> str:
+    """Página de fórmula: el mismo texto salvo el nombre del otorgante"""
+    words = _FORMULA.format(persona=_persona(rng)).split()
+    n_words = max(1, lines) * 12
+    body = [words[i % len(words)] for i in range(n_words)]
+    return "\n".join(" ".join(body[i:i + 12]) for i in range(0, n_words, 12))
+
+
+def _queries_for(fact: Dict[str, Any], document_id: str, page_number: int) -> List[Dict[str, Any]]:
+    expected = {"document_id": document_id, "page_number": page_number}
+    return [
+        {
+            "query": f"¿Ante qué escribano otorgó {fact['otorgante']} la {fact['acto']} en {fact['lugar']}?",
+            **expected
+        },
+        {
+            "query": f"¿Por cuántos ducados fue la {fact['acto']} de {fact['otorgante']} en {fact['year']}?",
+            **expected
+        },
+    ]
+
+
+def generate_corpus(
+    out_dir: str,
+    n_documents: int = 20,
+    pages_per_document: int = 30,
+    lines_per_page: int = 40,
+    seed: int = 42,
+    boilerplate: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Generar el corpus en `out_dir`
+
+    Args:
+        boilerplate: Fracción de páginas que son una fórmula repetida (sin consultas)
+
+    Returns:
+        Manifest: {"documents": [{file_path, document_id, metadata, pages}],
+                   "queries": [{query, collection, document_id, page_number}]}
+        (también se guarda en out_dir/manifest.json)
+    """
+    rng = random.Random(seed)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    documents = []
+    queries = []
+    for idx in range(n_documents):
+        collection = rng.choices(COLLECTIONS, weights=COLLECTION_WEIGHTS)[0]
+        year = rng.randint(1480, 1750)
+        document_id = f"{collection}_{year}_{idx:04d}"
+        pages = [
+            {"text": _formula_page(rng, lines_per_page), "fact": None}
+            if boilerplate and rng.random() < boilerplate else _page(rng, year, lines_per_page)
+            for _ in range(pages_per_document)
+        ]
+
+        file_path = out / f"{document_id}.pdf"
+        write_pdf(str(file_path), [page["text"] for page in pages])
+
+        documents.append({
+            "file_path": str(file_path),
+            "document_id": document_id,
+            "metadata": {
+                "title": f"Protocolo {collection} {year} vol. {idx + 1}",
+                "collection": collection,
+                "language": "es",
+                "year": year
+            },
+            "pages": pages_per_document
+        })
+        for page_number, page in enumerate(pages, 1):
+            if page["fact"] is None:
+                continue
+            for query in _queries_for(page["fact"], document_id, page_number):
+                queries.append({**query, "collection": collection})
+
+    rng.shuffle(queries)
+    manifest = {"seed": seed, "documents": documents, "queries": queries}
+    (out / "manifest.json").write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generar corpus sintético")
+    parser.add_argument("--out", type=str, required=True, help="Directorio de salida")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=30, help="Páginas por documento")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--boilerplate", type=float, default=0.0, help="Fracción de páginas de fórmula repetida")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(
+        args.out, args.documents, args.pages, seed=args.seed, boilerplate=args.boilerplate
+    )
+    print(
+        f"📚 {len(manifest['documents'])} documentos, "
+        f"{sum(d['pages'] for d in manifest['documents'])} páginas, "
+        f"{len(manifest['queries'])} consultas → {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
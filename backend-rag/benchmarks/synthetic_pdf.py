@@ -0,0 +1,77 @@
+"""
+Generador de PDFs sintéticos con capa de texto para benchmarks
+
+Escribe el PDF a mano (objetos, streams y xref) para no depender de
+librerías de generación; el texto imita protocolos notariales.
+"""
+import random
+from typing import List
+
+_WORDS = (
+    "en la villa de madrid a veinte dias del mes de marzo año del señor "
+    "ante mi el escribano publico y testigos parecio presente don pedro "
+    "de mendoza vecino de esta villa otorgo que vende y da en venta real "
+    "para siempre jamas unas casas principales con su corral y huerta "
+    "sitas en la calle mayor linde con casas de juan de avila y de la "
+    "parroquia de santa maria por precio de mil ducados de oro"
+).split()
+
+
+def random_page_text(rng: random.Random, lines: int = 45, words_per_line: int = 12) -> str:
+    """Texto de una página: `lines` líneas de palabras aleatorias"""
+    return "\n".join(
+        " ".join(rng.choice(_WORDS) for _ in range(words_per_line))
+        for _ in range(lines)
+    )
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages_text: List[str]) -> None:
+    """Escribir un PDF con una página por texto (fuente Helvetica estándar)"""
+    n_pages = len(pages_text)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n_pages))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+
+    for i, text in enumerate(pages_text):
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        lines = " ".join(f"({_escape(line)}) '" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 40 770 Td 12 TL {lines} ET".encode("cp1252", "replace")
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_pdf(path: str, n_pages: int, seed: int = 42) -> List[str]:
+    """Generar un PDF sintético de `n_pages` páginas y devolver sus textos"""
+    rng = random.Random(seed)
+    pages_text = [random_page_text(rng) for _ in range(n_pages)]
+    write_pdf(path, pages_text)
+    return pages_text
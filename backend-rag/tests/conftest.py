@@ -0,0 +1,15 @@
+"""
+Configuración común de los tests
+
+Las settings exigen credenciales; los tests no llaman a servicios externos,
+así que basta con valores ficticios.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test")
+os.environ.setdefault("GCS_BUCKET_NAME", "test")
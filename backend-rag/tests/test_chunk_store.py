@@ -0,0 +1,158 @@
+"""
+Almacén columnar de chunks: ida y vuelta por fila, valores ausentes en cada
+tipo de columna, filtros y persistencia (con y sin compresión del texto)
+"""
+import numpy as np
+import pytest
+
+from api.chunk_store import ColumnarChunkStore
+
+COMPRESSIONS = [None, "zlib", "zstd"]
+
+
+def make_store(compression=None):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    return ColumnarChunkStore(compression=compression)
+
+
+def make_chunk(i):
+    return {
+        "document_id": f"prot_{i // 10:02d}",
+        "collection": "notarial" if i % 3 else "parroquial",
+        "title": f"Protocolo {i // 10}",
+        "page_number": i % 7 + 1,
+        "ocr_confidence": 0.5 + i / 1000,
+        "content_hash": f"{i:016x}",
+        "chunk_text": f"Sepan cuantos esta carta vieren ñ {i} " * 3,
+        "entities": ["Sevilla", f"testigo {i}"]
+    }
+
+
+def fill(store, n):
+    store.reserve(n)
+    for i in range(n):
+        store.append(make_chunk(i))
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_rows_round_trip(compression):
+    store = make_store(compression)
+    fill(store, 30)
+
+    assert len(store) == 30
+    for i in (0, 11, 29):
+        assert store.get(i, chunk_id=f"c{i}") == {"chunk_id": f"c{i}", **make_chunk(i)}
+    assert store.value(11, "page_number") == 5
+    assert store.value(11, "chunk_text") == make_chunk(11)["chunk_text"]
+    assert store.value(11, "entities") == ["Sevilla", "testigo 11"]
+
+    # Sobrescribir una fila reemplaza todos sus campos
+    store.set(3, {"document_id": "otro", "chunk_text": "nuevo"})
+    assert store.get(3) == {"document_id": "otro", "chunk_text": "nuevo"}
+
+
+def test_missing_values_per_column_type():
+    store = make_store()
+    fill(store, 2)
+    store.append({"chunk_text": "solo texto"})
+    row = store.append({"document_id": "prot_09"})
+
+    # Categórica (código -1), int (centinela), float (NaN), hash, texto, extras
+    assert store.get(2) == {"chunk_text": "solo texto"}
+    assert store.get(row) == {"document_id": "prot_09"}
+    for name in ("collection", "page_number", "ocr_confidence", "content_hash", "chunk_text", "entities"):
+        assert store.value(row, name) is None
+
+    # Un tipo que no cuadra con la columna (o un NaN) se guarda tal cual en extras
+    row = store.append({"page_number": "12v", "ocr_confidence": float("nan"), "year": 1582})
+    chunk = store.get(row)
+    assert chunk["page_number"] == "12v"
+    assert np.isnan(chunk["ocr_confidence"])
+    assert chunk["year"] == 1582
+    assert store.value(0, "year") is None
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_swap_remove_with_move_and_pop(compression):
+    store = make_store(compression)
+    fill(store, 10)
+
+    # Borrar la fila 2: la última ocupa su lugar
+    store.move(9, 2)
+    store.pop()
+    assert len(store) == 9
+    assert store.get(2) == make_chunk(9)
+    assert [store.get(i) for i in (0, 1, 3, 8)] == [make_chunk(i) for i in (0, 1, 3, 8)]
+    assert store._live_text_bytes == sum(int(n) for n in store._text_lengths[:9])
+
+    # La fila liberada vuelve vacía al reutilizarse
+    row = store.append({"chunk_text": "fila nueva"})
+    assert row == 9
+    assert store.get(row) == {"chunk_text": "fila nueva"}
+
+
+def test_text_blob_is_compacted_when_mostly_garbage():
+    store = make_store()
+    rows, width = 600, 4004
+    store.reserve(rows)
+    for i in range(rows):
+        store.append({"document_id": "prot_01", "chunk_text": f"{i:04d}" + "x" * (width - 4)})
+
+    # Cada reescritura deja basura en el blob; al pasar de la mitad se compacta
+    for i in range(rows):
+        store.set(i, {"document_id": "prot_01", "chunk_text": f"{i:04d}" + "y" * (width - 4)})
+    assert len(store._blob) < 2 * rows * width
+    assert store._live_text_bytes == rows * width
+    assert all(store.text(i) == f"{i:04d}" + "y" * (width - 4) for i in range(rows))
+
+    # Al borrar la mitad de las filas, el blob se queda solo con el texto vivo
+    for _ in range(rows // 2):
+        store.pop()
+    assert len(store._blob) == store._live_text_bytes == len(store) * width
+    assert all(store.text(i) == f"{i:04d}" + "y" * (width - 4) for i in range(len(store)))
+
+
+def test_filter_mask_and_rows_where():
+    store = make_store()
+    fill(store, 30)
+
+    mask = store.filter_mask({"collection": "parroquial"})
+    assert np.flatnonzero(mask).tolist() == list(range(0, 30, 3))
+
+    mask = store.filter_mask({"collection": "notarial", "book_ids": ["prot_00", "prot_02", "prot_99"]})
+    expected = [i for i in range(30) if i % 3 and i // 10 in (0, 2)]
+    assert np.flatnonzero(mask).tolist() == expected
+
+    assert not store.filter_mask({"book_ids": ["prot_99"]}).any()
+    assert not store.filter_mask({"collection": "desconocida"}).any()
+    assert store.filter_mask({"language": "es"}).all()
+
+    assert store.rows_where("document_id", "prot_01").tolist() == list(range(10, 20))
+    assert store.rows_where("document_id", "prot_99").tolist() == []
+    assert store.rows_where("inexistente", "x").tolist() == []
+    assert store.distinct("document_id") == {"prot_00", "prot_01", "prot_02"}
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_and_load(tmp_path, compression, mmap):
+    store = make_store(compression)
+    fill(store, 25)
+    store.append({"chunk_text": "sin metadata"})
+    store.move(25, 4)
+    store.pop()
+    store.save(str(tmp_path))
+
+    loaded = ColumnarChunkStore.load(str(tmp_path), mmap=mmap)
+    assert loaded.compression == compression
+    assert len(loaded) == 25
+    assert [loaded.get(i) for i in range(25)] == [store.get(i) for i in range(25)]
+    assert loaded.get(4) == {"chunk_text": "sin metadata"}
+    assert np.flatnonzero(loaded.filter_mask({"collection": "parroquial"})).tolist() == \
+        np.flatnonzero(store.filter_mask({"collection": "parroquial"})).tolist()
+
+    if not mmap:
+        # Copia en memoria: admite escrituras
+        loaded.append(make_chunk(40))
+        assert loaded.get(25) == make_chunk(40)
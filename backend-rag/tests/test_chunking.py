@@ -0,0 +1,121 @@
+"""
+IDs deterministas de chunks y plan de re-ingesta (qué se embebe, qué se poda)
+"""
+import pytest
+
+from workers.chunking import create_chunker, make_chunk_id, metadata_hash
+from workers.ingest import IngestPipeline
+
+PAGES = [
+    {"page_number": 1, "text": " ".join(f"escritura{i} de venta" for i in range(300))},
+    {"page_number": 2, "text": " ".join(f"testigo{i} presente" for i in range(300))},
+]
+METADATA = {"title": "Protocolo 1582", "collection": "notarial", "book_id": "prot_01"}
+
+
+def chunk_ids(pages=PAGES, metadata=METADATA, document_id="prot_01"):
+    chunker = create_chunker(chunk_size=100, chunk_overlap=20)
+    return [c["chunk_id"] for c in chunker.chunk_document(pages, document_id, metadata)]
+
+
+def test_chunk_ids_are_deterministic():
+    first = chunk_ids()
+    assert len(first) > 4
+    assert len(set(first)) == len(first)
+    assert chunk_ids() == first
+    # El orden de las claves de la metadata no cuenta
+    assert chunk_ids(metadata=dict(reversed(list(METADATA.items())))) == first
+
+
+def test_text_change_only_changes_affected_chunks():
+    edited = [PAGES[0], {"page_number": 2, "text": PAGES[1]["text"].replace("testigo299", "testigo_x")}]
+    before, after = chunk_ids(), chunk_ids(pages=edited)
+    changed = [a for a, b in zip(before, after) if a != b]
+    assert len(before) == len(after)
+    assert 1 <= len(changed) <= 2
+
+
+def test_metadata_change_changes_every_chunk_id():
+    before = chunk_ids()
+    after = chunk_ids(metadata={**METADATA, "collection": "parroquial"})
+    assert not set(before) & set(after)
+
+
+def test_ids_without_metadata_keep_previous_format():
+    assert metadata_hash(None) == metadata_hash({}) == ""
+    assert make_chunk_id("doc", 1, 0, "abc") == make_chunk_id("doc", 1, 0, "abc", "")
+    assert make_chunk_id("doc", 1, 0, "abc") != make_chunk_id("doc", 1, 0, "abc", metadata_hash(METADATA))
+
+
+class FakeEmbeddingService:
+    def __init__(self):
+        self.texts = []
+
+    async def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+
+def make_pipeline(indexed_ids):
+    pipeline = IngestPipeline(dedup=False, skip_unchanged=True)
+    pipeline.embedding_service = FakeEmbeddingService()
+
+    async def fetch(document_id):
+        return list(indexed_ids)
+
+    pipeline._fetch_document_chunk_ids = fetch
+    return pipeline
+
+
+def make_job(pages=PAGES, metadata=METADATA):
+    chunker = create_chunker(chunk_size=100, chunk_overlap=20)
+    return {
+        "document_id": "prot_01",
+        "chunks": chunker.chunk_document(pages, "prot_01", metadata),
+        "pages": [{"page_number": p["page_number"], "confidence": 0.9} for p in pages]
+    }
+
+
+@pytest.mark.asyncio
+async def test_reingest_embeds_only_changed_chunks_and_prunes_stale():
+    previous = chunk_ids()
+    edited = [PAGES[0], {"page_number": 2, "text": PAGES[1]["text"] + " fecho en Sevilla"}]
+    pipeline = make_pipeline(previous)
+    job = make_job(pages=edited)
+
+    await pipeline._embed_job(job)
+
+    current = [c["chunk_id"] for c in job["chunks"]]
+    new_ids = [c["chunk_id"] for c in job["new_chunks"]]
+    assert job["current_ids"] == set(current)
+    assert new_ids == [chunk_id for chunk_id in current if chunk_id not in previous]
+    assert 1 <= len(new_ids) < len(current)
+    assert job["existing_count"] == len(previous)
+    assert job["stale_count"] == len(set(previous) - set(current))
+    assert job["stale_count"] >= 1
+    assert len(pipeline.embedding_service.texts) == len(new_ids)
+
+
+@pytest.mark.asyncio
+async def test_reingest_with_new_metadata_replaces_every_chunk():
+    previous = chunk_ids()
+    pipeline = make_pipeline(previous)
+    job = make_job(metadata={**METADATA, "collection": "parroquial"})
+
+    await pipeline._embed_job(job)
+
+    assert len(job["new_chunks"]) == len(job["chunks"])
+    assert all(c["collection"] == "parroquial" for c in job["new_chunks"])
+    assert job["stale_count"] == len(previous)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_document_embeds_nothing():
+    pipeline = make_pipeline(chunk_ids())
+    job = make_job()
+
+    await pipeline._embed_job(job)
+
+    assert job["new_chunks"] == []
+    assert job["stale_count"] == 0
+    assert pipeline.embedding_service.texts == []
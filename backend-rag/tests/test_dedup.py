@@ -0,0 +1,108 @@
+"""
+Casi duplicados: memoria acotada del índice LSH y modo "skip" conservador
+(solo se omite un duplicado si su canónico es del mismo documento o ya está
+indexado)
+"""
+import pytest
+
+from workers.dedup import NearDuplicateIndex
+from workers.ingest import IngestPipeline
+
+FORMULA = (
+    "En el nombre de Dios Todopoderoso y de la gloriosa Virgen Santa María su "
+    "bendita madre sepan cuantos esta carta de venta vieren como yo el otorgante "
+    "vecino de esta ciudad otorgo y conozco por esta presente carta"
+)
+
+
+def chunk(document_id, idx, text):
+    return {
+        "chunk_id": f"{document_id}_{idx}",
+        "document_id": document_id,
+        "chunk_text": text,
+        "page_number": 1,
+        "token_count": len(text.split())
+    }
+
+
+def unique_text(seed):
+    return " ".join(f"palabra{seed}_{i}" for i in range(30))
+
+
+def test_canonicals_are_bounded_with_lru_eviction():
+    index = NearDuplicateIndex(max_canonicals=3)
+    index.assign([chunk("a", 0, FORMULA)])
+    index.remember_vector("a_0", [0.1] * 4)
+    index.mark_indexed(["a_0"])
+
+    # La fórmula se vuelve a ver: es la más reciente y sobrevive a la expulsión
+    for idx in range(1, 4):
+        index.assign([chunk("b", idx, unique_text(idx))])
+        assert index.assign([chunk("c", idx, FORMULA + f" {idx}")]) == 1
+
+    assert len(index) == 3
+    assert index.evictions == 1
+    assert "a_0" in index._signatures
+    assert "b_1" not in index._signatures
+    assert all("b_1" not in bucket for bucket in index._buckets.values())
+    assert sum(len(bucket) for bucket in index._buckets.values()) == 3 * index.bands
+
+    # Al expulsar un canónico se va también su embedding y su marca de indexado
+    for idx in range(4, 8):
+        index.assign([chunk("b", idx, unique_text(idx))])
+    assert len(index) == 3
+    assert index.vector("a_0") is None
+    assert not index.is_indexed("a_0")
+    assert index._vector_bytes == 0
+    assert index.assign([chunk("d", 0, FORMULA)]) == 0
+
+
+class FakeEmbeddingService:
+    def __init__(self):
+        self.texts = []
+
+    async def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts]
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = IngestPipeline(dedup=True, skip_unchanged=False)
+    pipeline.dedup_mode = "skip"
+    pipeline.embedding_service = FakeEmbeddingService()
+    return pipeline
+
+
+def make_job(pipeline, document_id, texts):
+    chunks = [chunk(document_id, idx, text) for idx, text in enumerate(texts)]
+    pipeline.dedup.assign(chunks)
+    return {
+        "document_id": document_id,
+        "chunks": chunks,
+        "pages": [{"page_number": 1, "confidence": 0.9}]
+    }
+
+
+@pytest.mark.asyncio
+async def test_skip_mode_only_skips_confirmed_canonicals(pipeline):
+    # Duplicado dentro del mismo documento: se omite
+    first = make_job(pipeline, "prot_01", [FORMULA, unique_text(1), FORMULA + " amén"])
+    await pipeline._embed_job(first)
+    assert [c["chunk_id"] for c in first["new_chunks"]] == ["prot_01_0", "prot_01_1"]
+    assert first["dedup"]["skipped"] == 1
+
+    # Canónico de otro documento aún sin subir: no se omite (reutiliza su embedding)
+    second = make_job(pipeline, "prot_02", [unique_text(2), FORMULA + " fecho"])
+    assert second["chunks"][1]["duplicate_of"] == "prot_01_0"
+    await pipeline._embed_job(second)
+    assert [c["chunk_id"] for c in second["new_chunks"]] == ["prot_02_0", "prot_02_1"]
+    assert (second["dedup"]["skipped"], second["dedup"]["reused"]) == (0, 1)
+    assert FORMULA + " fecho" not in pipeline.embedding_service.texts
+
+    # Con el primer documento ya subido, sus canónicos constan como indexados
+    pipeline.dedup.mark_indexed(c["chunk_id"] for c in first["chunks"] if not c.get("duplicate_of"))
+    third = make_job(pipeline, "prot_03", [unique_text(3), FORMULA + " testigos"])
+    await pipeline._embed_job(third)
+    assert [c["chunk_id"] for c in third["new_chunks"]] == ["prot_03_0"]
+    assert third["dedup"]["skipped"] == 1
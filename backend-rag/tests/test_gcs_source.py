@@ -0,0 +1,125 @@
+"""
+Descargas con prefetch de GCSDocumentSource sobre LocalFilesystemStorageClient:
+orden de listado, errores por posición y limpieza de temporales
+"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from workers.gcs_source import GCSDocumentSource, LocalFilesystemStorageClient, _LocalBlob
+
+BUCKET = "fondos"
+
+
+class SlowStorageClient(LocalFilesystemStorageClient):
+    """
+    Cliente local cuyas descargas tardan más cuanto antes van en el listado
+    (terminan desordenadas) y que cuenta las descargas simultáneas
+    """
+
+    def __init__(self, root: str, delays):
+        super().__init__(root)
+        self.delays = delays
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def bucket(self, name: str):
+        client = self
+        bucket = super().bucket(name)
+
+        class SlowBlob(_LocalBlob):
+            def download_to_file(self, file_obj) -> None:
+                with client._lock:
+                    client.in_flight += 1
+                    client.max_in_flight = max(client.max_in_flight, client.in_flight)
+                try:
+                    time.sleep(client.delays.get(self.name, 0.0))
+                    super().download_to_file(file_obj)
+                finally:
+                    with client._lock:
+                        client.in_flight -= 1
+
+        bucket.blob = lambda blob_name: SlowBlob(client.root, name, blob_name)
+        return bucket
+
+
+@pytest.fixture
+def bucket_root(tmp_path):
+    root = tmp_path / "gcs"
+    (root / BUCKET / "notarial").mkdir(parents=True)
+    for idx in range(6):
+        (root / BUCKET / "notarial" / f"prot_{idx:02d}.pdf").write_bytes(b"%PDF" + bytes([idx]) * 100)
+    return root
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    return spool
+
+
+def make_source(root, spool_dir, prefetch=3):
+    names = [f"notarial/prot_{idx:02d}.pdf" for idx in range(6)]
+    delays = {name: 0.05 * (len(names) - idx) for idx, name in enumerate(names)}
+    client = SlowStorageClient(str(root), delays)
+    return GCSDocumentSource(storage_client=client, prefetch=prefetch, spool_dir=str(spool_dir)), client
+
+
+def test_downloads_are_yielded_in_listing_order_with_bounded_prefetch(bucket_root, spool_dir):
+    source, client = make_source(bucket_root, spool_dir, prefetch=3)
+    uris = source.list_uris(f"gs://{BUCKET}/notarial/")
+
+    seen = []
+    for document in source.iter_downloads(uris):
+        with document:
+            with open(document.path, "rb") as f:
+                seen.append((document.gcs_uri, f.read()[4]))
+
+    assert [uri for uri, _ in seen] == uris
+    assert [marker for _, marker in seen] == list(range(6))
+    assert 1 < client.max_in_flight <= 3
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_return_exceptions_keeps_failed_download_in_place(bucket_root, spool_dir):
+    source, _ = make_source(bucket_root, spool_dir, prefetch=2)
+    uris = source.list_uris(f"gs://{BUCKET}/notarial/")
+    uris.insert(2, f"gs://{BUCKET}/notarial/missing.pdf")
+
+    results = list(source.iter_downloads(uris, return_exceptions=True))
+
+    assert isinstance(results[2], FileNotFoundError)
+    assert [r.gcs_uri for i, r in enumerate(results) if i != 2] == [u for i, u in enumerate(uris) if i != 2]
+    for document in results:
+        if not isinstance(document, Exception):
+            document.cleanup()
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_failed_download_raises_without_return_exceptions(bucket_root, spool_dir):
+    source, _ = make_source(bucket_root, spool_dir, prefetch=2)
+    uris = [f"gs://{BUCKET}/notarial/missing.pdf"] + source.list_uris(f"gs://{BUCKET}/notarial/")
+
+    with pytest.raises(FileNotFoundError):
+        for document in source.iter_downloads(uris):
+            document.cleanup()
+
+    # Ni el fallido ni los prefetch en vuelo dejan temporales
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_abandoned_iterator_cleans_up_prefetched_files(bucket_root, spool_dir):
+    source, _ = make_source(bucket_root, spool_dir, prefetch=3)
+    downloads = source.iter_downloads(source.list_uris(f"gs://{BUCKET}/notarial/"))
+
+    first = next(downloads)
+    downloads.close()
+
+    # Solo queda el documento entregado al consumidor, que es quien lo limpia
+    assert [p.name for p in spool_dir.iterdir()] == [Path(first.path).name]
+    first.cleanup()
+    assert list(spool_dir.iterdir()) == []
@@ -0,0 +1,153 @@
+"""
+Generaciones blue/green: activar una candidata, servir consultas desde ella,
+volver a la anterior con /index/rollback, rechazar una candidata a la que le
+faltan documentos (salvo con force) y nunca validar una candidata vacía
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api import main
+from api.shared_index import (
+    GenerationRejected,
+    SharedIndexReader,
+    current_generation,
+    previous_generation,
+    publish_snapshot,
+    stage_generation,
+    switch_index,
+)
+from api.vectordb import SimpleInMemoryVectorDB
+from workers import rebuild_index
+from workers.rebuild_index import passes, validate_generation
+
+DIM = 8
+MANIFEST = {"embedding_model": "test-embedding", "chunk_size": 400, "chunk_overlap": 50}
+
+
+def make_chunks(document_id, n, tag, seed=0):
+    chunks = [
+        {
+            "chunk_id": f"{document_id}_{tag}_{i}",
+            "document_id": document_id,
+            "collection": "notarial",
+            "chunk_text": f"texto {tag} {i}",
+            "page_number": i + 1
+        }
+        for i in range(n)
+    ]
+    return chunks, np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+async def build_db(documents, tag):
+    db = SimpleInMemoryVectorDB()
+    for seed, document_id in enumerate(documents):
+        await db.upsert_vectors(*make_chunks(document_id, 4, tag, seed=seed))
+    return db
+
+
+async def serve(index_dir):
+    """Índice en servicio (prot_01, prot_02) publicado en INDEX_DIR"""
+    db = await build_db(["prot_01", "prot_02"], "v1")
+    generation = publish_snapshot(db, str(index_dir), manifest=MANIFEST)
+    return db, generation
+
+
+@pytest.mark.asyncio
+async def test_activate_candidate_and_serve_from_it(tmp_path):
+    db, first = await serve(tmp_path)
+    candidate = await build_db(["prot_01", "prot_02"], "v2")
+    staged = stage_generation(candidate, str(tmp_path), MANIFEST)
+    assert current_generation(str(tmp_path)) == first
+
+    reader = SharedIndexReader(str(tmp_path), refresh_interval=0.0)
+    await reader.warmup()
+    assert reader.generation == first
+
+    result = await switch_index(db, str(tmp_path), staged)
+    assert result["missing_documents"] == []
+    assert current_generation(str(tmp_path)) == result["generation"]
+    assert previous_generation(str(tmp_path)) == first
+    assert not (tmp_path / staged).exists()
+
+    # Writer y readers responden desde la nueva generación
+    query = make_chunks("prot_02", 4, "v2", seed=1)[1][2].tolist()
+    assert (await db.search(query, top_k=1))[0]["chunk_id"] == "prot_02_v2_2"
+    assert (await reader.search(query, top_k=1))[0]["chunk_id"] == "prot_02_v2_2"
+    assert reader.generation == result["generation"]
+    assert sorted(await db.get_document_chunk_ids("prot_01")) == [f"prot_01_v2_{i}" for i in range(4)]
+
+
+@pytest.mark.asyncio
+async def test_candidate_missing_documents_needs_force(tmp_path):
+    db, first = await serve(tmp_path)
+    staged = stage_generation(await build_db(["prot_01"], "v2"), str(tmp_path), MANIFEST)
+
+    with pytest.raises(GenerationRejected, match="prot_02"):
+        await switch_index(db, str(tmp_path), staged)
+    # Nada cambia: ni el índice en memoria ni los punteros
+    assert current_generation(str(tmp_path)) == first
+    assert len(await db.get_document_chunk_ids("prot_02")) == 4
+    assert (tmp_path / staged).is_dir()
+
+    result = await switch_index(db, str(tmp_path), staged, force=True)
+    assert result["missing_documents"] == ["prot_02"]
+    assert await db.get_document_chunk_ids("prot_02") == []
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    db = SimpleInMemoryVectorDB()
+    monkeypatch.setattr(main.settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(main, "get_vector_db_dep", lambda: db)
+    monkeypatch.setattr(main, "_index_publisher", None)
+    return TestClient(main.app), db
+
+
+@pytest.mark.asyncio
+async def test_activate_and_rollback_endpoints(tmp_path, client):
+    client, db = client
+    assert client.post("/index/rollback").status_code == 404
+
+    first = stage_generation(await build_db(["prot_01", "prot_02"], "v1"), str(tmp_path), MANIFEST)
+    response = client.post(f"/index/generations/{first}/activate")
+    assert response.status_code == 200
+    first = response.json()["generation"]
+
+    # Candidata incompleta: 409 sin force, activada con force
+    second = stage_generation(await build_db(["prot_01"], "v2"), str(tmp_path), MANIFEST)
+    response = client.post(f"/index/generations/{second}/activate")
+    assert response.status_code == 409
+    assert current_generation(str(tmp_path)) == first
+    response = client.post(f"/index/generations/{second}/activate", json={"force": True})
+    assert response.status_code == 200
+    assert response.json()["missing_documents"] == ["prot_02"]
+    assert await db.get_document_chunk_ids("prot_02") == []
+
+    # Rollback: vuelve la generación anterior, con todos sus documentos
+    response = client.post("/index/rollback")
+    assert response.status_code == 200
+    assert response.json()["generation"] == first
+    assert current_generation(str(tmp_path)) == first
+    assert sorted(await db.get_document_chunk_ids("prot_02")) == [f"prot_02_v1_{i}" for i in range(4)]
+
+    assert client.post("/index/generations/staged-0/activate").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_empty_candidate_is_rejected(tmp_path, monkeypatch):
+    await serve(tmp_path)
+
+    class FailingEmbeddingService:
+        async def embed_batch(self, texts):
+            raise AssertionError("an empty candidate must not be embedded")
+
+    monkeypatch.setattr(rebuild_index, "get_embedding_service", lambda: FailingEmbeddingService())
+    staged = stage_generation(SimpleInMemoryVectorDB(), str(tmp_path), MANIFEST)
+
+    validation = await validate_generation(str(tmp_path), staged)
+    assert validation["empty"] is True
+    assert validation["sample"] == 0
+    assert validation["missing_documents"] == ["prot_01", "prot_02"]
+    # Ni con --allow-missing ni sin exigir recall
+    assert passes(validation, min_recall=0.0, max_recall_drop=1.0, allow_missing=True)
@@ -0,0 +1,163 @@
+"""
+Stream binario de /ingest/stream: límites frente a cuerpos no confiables y
+validación completa antes de escribir en el índice
+"""
+import gzip
+import struct
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api.ingest_format import (
+    MAGIC, MAX_DIM, VERSION, CONTENT_TYPE, IngestFormatError, StreamDecoder, decode, encode
+)
+from api.main import app, get_vector_db_dep
+from api.vectordb import SimpleInMemoryVectorDB
+
+
+def make_chunks(document_id, n, dim=8):
+    chunks = [
+        {"chunk_id": f"{document_id}_{i}", "document_id": document_id, "chunk_text": f"texto {i}", "page_number": 1}
+        for i in range(n)
+    ]
+    return chunks, np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_roundtrip(compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    chunks, vectors = make_chunks("doc", 600)
+    metas, decoded = decode(encode(chunks, vectors, compression=compression), compression=compression)
+    assert metas == chunks
+    np.testing.assert_array_equal(decoded, vectors)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_decompression_bomb_is_capped(compression):
+    # Stream válido de 256 MB (registros de ceros) que comprime a < 2 MB
+    frame = struct.pack("<I", 2) + b"{}" + bytes(4096 * 4)
+    bomb = struct.pack("<4sBBI", MAGIC, VERSION, 0, 4096) + frame * 16384
+    if compression == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        body = zstandard.ZstdCompressor(level=19).compress(bomb)
+    else:
+        body = gzip.compress(bomb, 9)
+    assert len(body) < 2 * 1024 * 1024
+
+    decoder = StreamDecoder(compression=compression, max_bytes=16 * 1024 * 1024)
+    with pytest.raises(IngestFormatError, match="exceeds"):
+        decoder.feed(body)
+    # Se corta poco después del límite, sin descomprimir el cuerpo entero
+    assert decoder.bytes_decoded < 64 * 1024 * 1024
+
+
+def test_header_dim_is_bounded():
+    header = struct.pack("<4sBBI", MAGIC, VERSION, 0, MAX_DIM + 1)
+    with pytest.raises(IngestFormatError, match="dimension"):
+        StreamDecoder().feed(header)
+
+    header = struct.pack("<4sBBI", MAGIC, VERSION, 0, 16)
+    with pytest.raises(IngestFormatError, match="mismatch"):
+        StreamDecoder(expected_dim=8).feed(header)
+
+
+def test_meta_len_is_bounded():
+    body = struct.pack("<4sBBI", MAGIC, VERSION, 0, 8) + struct.pack("<I", 2 ** 31)
+    with pytest.raises(IngestFormatError, match="too large"):
+        StreamDecoder().feed(body)
+
+
+@pytest.mark.parametrize("meta", [b"{not json", b"[1, 2]"])
+def test_malformed_meta(meta):
+    body = (
+        struct.pack("<4sBBI", MAGIC, VERSION, 0, 2) + struct.pack("<I", len(meta)) + meta
+        + np.zeros(2, dtype="<f4").tobytes()
+    )
+    with pytest.raises(IngestFormatError, match="metadata"):
+        StreamDecoder().feed(body)
+
+
+@pytest.fixture
+def client():
+    db = SimpleInMemoryVectorDB()
+    app.dependency_overrides[get_vector_db_dep] = lambda: db
+    yield TestClient(app), db
+    app.dependency_overrides.clear()
+
+
+def post_stream(client, document_id, body):
+    return client.post(
+        f"/ingest/stream?document_id={document_id}",
+        content=body,
+        headers={"Content-Type": CONTENT_TYPE}
+    )
+
+
+def test_stream_endpoint_ingests(client):
+    http, db = client
+    chunks, vectors = make_chunks("doc", 600)
+    response = post_stream(http, "doc", encode(chunks, vectors))
+    assert response.status_code == 200
+    assert response.json()["chunks_ingested"] == 600
+    assert len(db) == 600
+
+
+def test_invalid_record_leaves_no_partial_document(client):
+    http, db = client
+    chunks, vectors = make_chunks("doc", 600)
+    del chunks[-1]["page_number"]  # Último batch inválido
+    response = post_stream(http, "doc", encode(chunks, vectors))
+    assert response.status_code == 400
+    assert len(db) == 0
+
+
+def test_document_id_mismatch_is_rejected(client):
+    http, db = client
+    chunks, vectors = make_chunks("doc", 3)
+    chunks[1]["document_id"] = "other"
+    response = post_stream(http, "doc", encode(chunks, vectors))
+    assert response.status_code == 400
+    assert len(db) == 0
+
+
+def test_client_errors_are_4xx(client):
+    http, db = client
+    chunks, vectors = make_chunks("doc", 3)
+    assert post_stream(http, "doc", encode(chunks, vectors)).status_code == 200
+
+    # Dimensión distinta a la del índice
+    chunks, vectors = make_chunks("doc2", 3, dim=16)
+    assert post_stream(http, "doc2", encode(chunks, vectors)).status_code == 400
+
+    # Metadata mal formada
+    body = struct.pack("<4sBBI", MAGIC, VERSION, 0, 8) + struct.pack("<I", 5) + b"{bad}" + bytes(32)
+    assert post_stream(http, "doc3", body + struct.pack("<I", 0)).status_code == 400
+    assert len(db) == 3
+
+
+def test_truncated_gzip_stream_is_rejected():
+    chunks, vectors = make_chunks("doc", 10)
+    body = encode(chunks, vectors, compression="gzip")
+    decoder = StreamDecoder(compression="gzip")
+    decoder.feed(body[:-6])  # Sin el trailer gzip (CRC + tamaño)
+    with pytest.raises(IngestFormatError, match="Truncated"):
+        decoder.close()
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_non_finite_vectors_are_rejected(value):
+    chunks, vectors = make_chunks("doc", 10)
+    vectors[7, 3] = value
+    with pytest.raises(IngestFormatError, match="Non-finite"):
+        decode(encode(chunks, vectors))
+
+
+def test_stream_endpoint_rejects_non_finite_vectors(client):
+    http, db = client
+    chunks, vectors = make_chunks("doc", 300)
+    vectors[299, 0] = np.nan
+    response = post_stream(http, "doc", encode(chunks, vectors))
+    assert response.status_code == 400
+    assert len(db) == 0
@@ -0,0 +1,93 @@
+"""
+Pipeline de ingesta por etapas: con colas mínimas, un documento que falla en
+cualquier etapa no atasca a los demás y todos terminan con un resultado
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from workers import ingest
+from workers.ingest import IngestPipeline
+
+DOCUMENTS = 8
+FAILURES = {"doc_2": "ocr", "doc_4": "embeddings", "doc_6": "upload"}
+
+
+def fake_ocr(file_path):
+    """OCR falso: el texto de cada página lleva el id del documento"""
+    document_id = file_path.split("/")[-1].removesuffix(".pdf")
+    if FAILURES.get(document_id) == "ocr":
+        raise RuntimeError("PDF ilegible")
+    return [
+        {
+            "page_number": page,
+            "text": " ".join(f"{document_id} palabra{page}_{i}" for i in range(120)),
+            "confidence": 0.95
+        }
+        for page in (1, 2)
+    ]
+
+
+class FakeEmbeddingService:
+    async def embed_batch(self, texts):
+        await asyncio.sleep(0.001)
+        if any(text.startswith("doc_4 ") for text in texts):
+            raise RuntimeError("Vertex AI no disponible")
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    # El pool de procesos del OCR se sustituye por threads (sin inicializador)
+    monkeypatch.setattr(
+        ingest, "ProcessPoolExecutor",
+        lambda max_workers, initializer=None, initargs=(): ThreadPoolExecutor(max_workers=max_workers)
+    )
+    monkeypatch.setattr(ingest, "_run_ocr", fake_ocr)
+
+    pipeline = IngestPipeline(dedup=False, skip_unchanged=False)
+    pipeline.settings = pipeline.settings.model_copy(update={
+        "ingest_queue_size": 1,
+        "ingest_ocr_workers": 2,
+        "ingest_chunk_workers": 1,
+        "ingest_embed_concurrency": 2,
+        "ingest_upload_concurrency": 1
+    })
+    pipeline.embedding_service = FakeEmbeddingService()
+    pipeline.uploaded = []
+
+    async def upload_chunks(document_id, chunks):
+        if FAILURES.get(document_id) == "upload":
+            raise RuntimeError("503 Service Unavailable")
+        pipeline.uploaded.append(document_id)
+        return {"chunks_ingested": len(chunks), "bytes_sent": 100 * len(chunks)}
+
+    pipeline._upload_chunks = upload_chunks
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_failures_do_not_stall_the_pipeline(pipeline):
+    documents = [
+        {"file_path": f"/tmp/doc_{i}.pdf", "document_id": f"doc_{i}", "metadata": {"collection": "notarial"}}
+        for i in range(DOCUMENTS)
+    ]
+
+    # Un atasco en las colas dejaría el batch esperando indefinidamente
+    results = await asyncio.wait_for(pipeline.ingest_batch(documents), timeout=30)
+
+    assert len(results) == DOCUMENTS
+    assert all(result is not None for result in results)
+    for doc, result in zip(documents, results):
+        document_id = doc["document_id"]
+        assert result["document_id"] == document_id
+        if document_id in FAILURES:
+            assert result["success"] is False
+            assert result["stage"] == FAILURES[document_id]
+        else:
+            assert result["success"] is True
+            assert result["chunks_embedded"] == result["chunks_created"] > 0
+
+    expected = {doc["document_id"] for doc in documents} - set(FAILURES)
+    assert sorted(pipeline.uploaded) == sorted(expected)
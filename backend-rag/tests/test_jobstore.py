@@ -0,0 +1,88 @@
+"""
+Job store: reanudar con la misma huella, empezar de cero si cambia, y
+artefactos (páginas, embeddings) que sobreviven a un reinicio
+"""
+import numpy as np
+import pytest
+
+from workers.jobstore import STAGES, JobStore
+
+PAGES = [
+    {"page_number": 1, "text": "Sepan cuantos esta carta vieren", "confidence": 0.93},
+    {"page_number": 2, "text": "ante mí el escribano público", "confidence": 0.88, "source": "ocr"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs"))
+    yield store
+    store.close()
+
+
+def test_same_fingerprint_resumes_from_last_stage(store):
+    assert store.start_job("prot_01", "prot_01.pdf", "abc", {"collection": "notarial"}) is None
+    store.save_pages("prot_01", PAGES)
+    store.complete_stage("prot_01", "ocr", 0.0, items=2)
+    store.complete_stage("prot_01", "chunking", 0.0, items=5)
+    store.fail_job("prot_01", "embeddings", "timeout")
+    assert store.status()[0]["status"] == "failed"
+
+    assert store.start_job("prot_01", "prot_01.pdf", "abc", {"collection": "notarial"}) == "chunking"
+    job = store.status()[0]
+    assert (job["status"], job["error"]) == ("running", None)
+    assert store.load_pages("prot_01") == PAGES
+
+
+def test_changed_fingerprint_discards_checkpoints(store):
+    store.start_job("prot_01", "prot_01.pdf", "abc", {})
+    store.save_pages("prot_01", PAGES)
+    store.complete_stage("prot_01", "ocr", 0.0, items=2)
+    store.complete_upload_batch("prot_01", "batch-0", items=10)
+
+    assert store.start_job("prot_01", "prot_01.pdf", "def", {}) is None
+    assert store.throughput() == {}
+    assert store.completed_upload_batches("prot_01") == set()
+    with pytest.raises(FileNotFoundError):
+        store.load_pages("prot_01")
+
+
+def test_last_stage_marks_done_and_clears_upload_batches(store):
+    store.start_job("prot_01", "prot_01.pdf", "abc", {"collection": "notarial"})
+    for stage in STAGES[:-1]:
+        store.complete_stage("prot_01", stage, 0.0, items=1)
+    store.complete_upload_batch("prot_01", "batch-0", items=10, nbytes=1000)
+    store.complete_upload_batch("prot_01", "batch-1", items=10, nbytes=1000)
+    assert store.completed_upload_batches("prot_01") == {"batch-0", "batch-1"}
+    assert store.done_jobs() == []
+
+    store.complete_stage("prot_01", STAGES[-1], 0.0, items=20)
+    assert store.completed_upload_batches("prot_01") == set()
+    assert store.done_jobs() == [
+        {"document_id": "prot_01", "file_path": "prot_01.pdf", "metadata": {"collection": "notarial"}}
+    ]
+
+
+def test_artifacts_survive_reopening(tmp_path):
+    root = str(tmp_path / "jobs")
+    store = JobStore(root)
+    store.start_job("prot_01", "prot_01.pdf", "abc", {})
+    embeddings = np.random.default_rng(0).standard_normal((3, 8)).tolist()
+    plan = {"existing_count": 4, "stale_count": 1, "current_ids": ["c0", "c1", "c2"]}
+    nbytes = store.save_embeddings("prot_01", ["c0", "c1", "c2"], embeddings, plan)
+    store.save_pages("prot_01", PAGES)
+    store.close()
+
+    store = JobStore(root)
+    loaded = store.load_embeddings("prot_01")
+    assert nbytes == 3 * 8 * 4
+    assert loaded["chunk_ids"] == ["c0", "c1", "c2"]
+    assert {k: loaded[k] for k in plan} == plan
+    assert loaded["embeddings"].dtype == np.float32
+    np.testing.assert_allclose(loaded["embeddings"], np.asarray(embeddings, dtype=np.float32))
+    assert store.load_pages("prot_01") == PAGES
+
+    store.discard_embeddings("prot_01")
+    with pytest.raises(FileNotFoundError):
+        store.load_embeddings("prot_01")
+    store.close()
@@ -0,0 +1,114 @@
+"""
+Expulsión LRU de la caché OCR: los aciertos renuevan el último uso, también
+en GCS (donde leer un objeto no cambia `updated`)
+"""
+import time
+from datetime import datetime, timezone
+
+from workers.ocr_cache import GCSCacheStorage, LocalCacheStorage, OCRCache
+
+PAGES = [{"page_number": 1, "text": "x" * 2000, "confidence": 0.9, "width": 1.0, "height": 1.0}]
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+
+    @property
+    def _stored(self):
+        return self.bucket.objects[self.name]
+
+    @property
+    def size(self):
+        return len(self._stored["data"])
+
+    @property
+    def updated(self):
+        return datetime.fromtimestamp(self._stored["updated"], tz=timezone.utc)
+
+    def download_as_bytes(self):
+        from google.api_core.exceptions import NotFound
+
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        return self._stored["data"]
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.objects[self.name] = {"data": data, "updated": time.time(), "metadata": {}}
+
+    def patch(self):
+        self._stored["metadata"] = dict(self.metadata or {})
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix):
+        blobs = []
+        for name in sorted(self.objects):
+            if name.startswith(prefix):
+                blob = FakeBlob(self, name)
+                blob.metadata = self.objects[name]["metadata"]
+                blobs.append(blob)
+        return blobs
+
+
+def fill_and_reuse(cache):
+    """a, b, c en orden; reusar a; d obliga a expulsar una entrada"""
+    for name in ("a", "b", "c"):
+        cache.put(name * 64, "documentai", "v1", PAGES)
+    assert cache.get("a" * 64, "documentai", "v1") is not None
+    cache.put("d" * 64, "documentai", "v1", PAGES)
+
+
+def test_gcs_cache_hit_refreshes_last_access():
+    bucket = FakeBucket()
+    storage = GCSCacheStorage("cache", bucket=bucket, touch_interval=0.0)
+    cache = OCRCache(storage, max_bytes=10 ** 9)
+    cache.put("x" * 64, "documentai", "v1", PAGES)
+    entry_size = storage.list("ocr-cache")[0][1]
+    storage.delete(storage.list("ocr-cache")[0][0])
+
+    cache = OCRCache(storage, max_bytes=entry_size * 3 + entry_size // 2)
+    fill_and_reuse(cache)
+
+    # "a" se escribió primero pero se acaba de usar: se expulsa "b" (FIFO expulsaría "a")
+    assert cache.get("a" * 64, "documentai", "v1") is not None
+    assert cache.get("b" * 64, "documentai", "v1") is None
+
+
+def test_gcs_touch_is_throttled():
+    bucket = FakeBucket()
+    storage = GCSCacheStorage("cache", bucket=bucket, touch_interval=3600.0)
+    cache = OCRCache(storage)
+    cache.put("a" * 64, "documentai", "v1", PAGES)
+    key = OCRCache.key_for("a" * 64, "documentai", "v1")
+
+    cache.get("a" * 64, "documentai", "v1")
+    first = bucket.objects[key]["metadata"]["last_access"]
+    time.sleep(0.01)
+    cache.get("a" * 64, "documentai", "v1")
+    assert bucket.objects[key]["metadata"]["last_access"] == first
+
+
+def test_cached_pages_keep_their_routing_source(tmp_path):
+    cache = OCRCache(LocalCacheStorage(str(tmp_path)))
+    routed = [
+        {**PAGES[0], "page_number": 1, "source": "text_layer"},
+        {**PAGES[0], "page_number": 2, "source": "ocr"}
+    ]
+    cache.put("r" * 64, "routed-documentai", "v1", routed)
+    cache.put("p" * 64, "pypdf", "v1", PAGES)
+
+    assert [p["source"] for p in cache.get("r" * 64, "routed-documentai", "v1")] == ["text_layer", "ocr"]
+    # Sin enrutado no se inventa un origen
+    assert "source" not in cache.get("p" * 64, "pypdf", "v1")[0]
@@ -0,0 +1,40 @@
+"""
+Recuento de páginas por origen en la ingesta: solo las marcadas por el
+enrutado cuentan como capa de texto u OCR; sin marca, origen desconocido
+"""
+from workers.ingest import IngestPipeline
+
+
+def make_job(sources):
+    pages = []
+    for idx, source in enumerate(sources):
+        page = {"page_number": idx + 1, "text": "x", "confidence": 0.9}
+        if source is not None:
+            page["source"] = source
+        pages.append(page)
+    return {
+        "document_id": "doc",
+        "pages": pages,
+        "chunks": [],
+        "new_chunks": [],
+        "chunks_removed": 0
+    }
+
+
+def stats_for(sources):
+    pipeline = IngestPipeline(dedup=False)
+    job = make_job(sources)
+    pipeline._check_ocr(job)
+    return job["ocr_routing"], pipeline._job_stats(job)
+
+
+def test_routed_pages_are_counted_by_source():
+    routing, stats = stats_for(["text_layer", "ocr", "text_layer", None])
+    assert routing == {"text_layer": 2, "ocr": 1, "unknown": 1}
+    assert (stats["pages_text_layer"], stats["pages_ocr"], stats["pages_source_unknown"]) == (2, 1, 1)
+
+
+def test_untagged_pages_are_not_counted_as_ocr():
+    routing, stats = stats_for([None, None, None])
+    assert routing is None
+    assert (stats["pages_text_layer"], stats["pages_ocr"], stats["pages_source_unknown"]) == (0, 0, 3)
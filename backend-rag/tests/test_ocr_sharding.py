@@ -0,0 +1,139 @@
+"""
+Sharding de PDFs en OCRService: cada shard va en su propia request a Document
+AI y las páginas vuelven con su `page_number` global y en orden, aunque los
+shards terminen desordenados
+"""
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from workers import ocr
+from workers.ocr import OCRService, _batch_location
+
+BASE_WIDTH = 100
+
+
+class FakeDocumentAIClient:
+    """
+    Cliente de Document AI falso: devuelve una página por cada página del PDF
+    recibido, con el ancho del PDF (que identifica la página original). Los
+    primeros shards tardan más, así que terminan después que los últimos.
+    """
+
+    def __init__(self, fail_first: int = 0):
+        self.requests = []
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+
+    def processor_path(self, project_id, location, processor_id):
+        return f"projects/{project_id}/locations/{location}/processors/{processor_id}"
+
+    def process_document(self, request):
+        reader = pypdf.PdfReader(io.BytesIO(request.raw_document.content))
+        widths = [float(page.mediabox.width) for page in reader.pages]
+
+        with self._lock:
+            self.requests.append(widths)
+            fail = self.fail_first > 0
+            self.fail_first -= 1
+        if fail:
+            raise RuntimeError("503 Service Unavailable")
+
+        # Cuanto antes empieza el shard, más tarda en terminar
+        time.sleep(max(0.0, 0.2 - (widths[0] - BASE_WIDTH) * 0.01))
+
+        pages = [
+            SimpleNamespace(blocks=[], dimension=SimpleNamespace(width=width, height=200.0))
+            for width in widths
+        ]
+        return SimpleNamespace(document=SimpleNamespace(text="", pages=pages))
+
+
+@pytest.fixture(autouse=True)
+def fake_documentai(monkeypatch):
+    """Tipos de request mínimos (el SDK no hace falta para el cliente falso)"""
+    monkeypatch.setattr(ocr, "documentai", SimpleNamespace(
+        RawDocument=lambda content, mime_type: SimpleNamespace(content=content, mime_type=mime_type),
+        ProcessRequest=lambda name, raw_document: SimpleNamespace(name=name, raw_document=raw_document)
+    ))
+
+
+def make_pdf(page_count: int) -> bytes:
+    """PDF cuya página i mide BASE_WIDTH + i de ancho"""
+    writer = pypdf.PdfWriter()
+    for idx in range(page_count):
+        writer.add_blank_page(width=BASE_WIDTH + idx, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def make_service(client, **kwargs) -> OCRService:
+    return OCRService(project_id="p", processor_id="proc", client=client, **kwargs)
+
+
+def test_large_pdf_is_split_into_shards_and_merged_in_order():
+    client = FakeDocumentAIClient()
+    service = make_service(client, pages_per_shard=3, max_concurrency=4)
+
+    pages = service.process_document(file_content=make_pdf(10), mime_type="application/pdf")
+
+    # Una request por shard de como mucho 3 páginas
+    assert sorted(len(shard) for shard in client.requests) == [1, 3, 3, 3]
+    assert [page["page_number"] for page in pages] == list(range(1, 11))
+    assert [page["width"] for page in pages] == [BASE_WIDTH + idx for idx in range(10)]
+
+
+def test_small_pdf_goes_in_a_single_request():
+    client = FakeDocumentAIClient()
+    service = make_service(client, pages_per_shard=15)
+
+    pages = service.process_document(file_content=make_pdf(4), mime_type="application/pdf")
+
+    assert len(client.requests) == 1
+    assert [page["page_number"] for page in pages] == [1, 2, 3, 4]
+
+
+def test_failed_shard_is_retried():
+    client = FakeDocumentAIClient(fail_first=1)
+    service = make_service(client, pages_per_shard=2, max_concurrency=1, shard_retries=2)
+
+    pages = service.process_document(file_content=make_pdf(4), mime_type="application/pdf")
+
+    assert len(client.requests) == 3
+    assert [page["page_number"] for page in pages] == [1, 2, 3, 4]
+
+
+def test_process_pages_restores_original_page_numbers(tmp_path):
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(make_pdf(12))
+    client = FakeDocumentAIClient()
+    service = make_service(client, pages_per_shard=2, max_concurrency=3)
+
+    pages = service.process_pages(str(pdf_path), [1, 4, 5, 9, 11])
+
+    assert sorted(len(shard) for shard in client.requests) == [1, 2, 2]
+    assert [page["page_number"] for page in pages] == [2, 5, 6, 10, 12]
+    assert [page["width"] for page in pages] == [BASE_WIDTH + idx for idx in (1, 4, 5, 9, 11)]
+
+
+@pytest.mark.parametrize("gcs_prefix, expected", [
+    ("gs://bucket", ("bucket", "")),
+    ("gs://bucket/", ("bucket", "")),
+    ("gs://bucket/docai", ("bucket", "docai/")),
+    ("gs://bucket/docai/batch/", ("bucket", "docai/batch/")),
+])
+def test_batch_location_accepts_bare_bucket(gcs_prefix, expected):
+    assert _batch_location(gcs_prefix) == expected
+
+
+def test_batch_location_rejects_invalid_prefix():
+    with pytest.raises(ValueError):
+        _batch_location("gs://")
+    with pytest.raises(ValueError):
+        _batch_location("bucket/docai")
@@ -0,0 +1,104 @@
+"""
+Guardado de particiones: un fallo al escribir no pierde cambios ni descarga
+la partición, la versión anterior del disco sigue siendo válida, y una
+escritura concurrente con la expulsión no se pierde
+"""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from api.partitioned_index import PartitionedVectorDB, partition_dirname
+from api.vectordb import SimpleInMemoryVectorDB
+
+
+def make_chunks(collection, document_id, n, dim=8, seed=0):
+    chunks = [
+        {
+            "chunk_id": f"{document_id}_{i}",
+            "document_id": document_id,
+            "collection": collection,
+            "chunk_text": f"texto {i}",
+            "page_number": 1
+        }
+        for i in range(n)
+    ]
+    return chunks, np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.mark.asyncio
+async def test_failed_save_keeps_partition_loaded_and_dirty(tmp_path, monkeypatch):
+    db = PartitionedVectorDB(str(tmp_path), memory_budget_bytes=10 ** 9, flush_interval=3600)
+    await db.upsert_vectors(*make_chunks("notarial", "prot_01", 20))
+    await db.flush()
+
+    await db.upsert_vectors(*make_chunks("notarial", "prot_02", 20, seed=1))
+    partition = db._loaded["notarial"]
+    assert partition.dirty
+
+    def failing_save(self, directory):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(SimpleInMemoryVectorDB, "save", failing_save)
+
+    # Presupuesto agotado: la expulsión no puede guardar y la conserva
+    db.memory_budget_bytes = 0
+    await db._evict()
+    assert "notarial" in db._loaded
+    assert partition.dirty
+    assert db.evictions == 0
+    with pytest.raises(OSError):
+        await db.flush()
+    assert partition.dirty
+
+    # La versión anterior sigue en el disco, sin temporales
+    directory = tmp_path / partition_dirname("notarial")
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [directory.name]
+    on_disk = SimpleInMemoryVectorDB.load(str(directory))
+    assert len(await on_disk.get_document_chunk_ids("prot_01")) == 20
+    assert await on_disk.get_document_chunk_ids("prot_02") == []
+
+    # Con el disco de vuelta se guarda, se descarga y se recarga completa
+    monkeypatch.undo()
+    await db._evict()
+    assert "notarial" not in db._loaded
+    assert db.evictions == 1
+
+    assert len(await db.get_document_chunk_ids("prot_01")) == 20
+    assert len(await db.get_document_chunk_ids("prot_02")) == 20
+
+
+@pytest.mark.asyncio
+async def test_write_during_eviction_save_is_not_lost(tmp_path, monkeypatch):
+    db = PartitionedVectorDB(str(tmp_path), memory_budget_bytes=10 ** 9, flush_interval=3600)
+    await db.upsert_vectors(*make_chunks("notarial", "prot_01", 20))
+
+    # El guardado de la expulsión se detiene hasta que la escritura concurrente
+    # ya tiene la partición fijada y espera al write_lock
+    started, release = threading.Event(), threading.Event()
+    save = SimpleInMemoryVectorDB.save
+
+    def slow_save(self, directory):
+        started.set()
+        release.wait(5)
+        save(self, directory)
+
+    monkeypatch.setattr(SimpleInMemoryVectorDB, "save", slow_save)
+
+    db.memory_budget_bytes = 0
+    eviction = asyncio.create_task(db._evict())
+    assert await asyncio.to_thread(started.wait, 5)
+    write = asyncio.create_task(db.upsert_vectors(*make_chunks("notarial", "prot_02", 20, seed=1)))
+    await asyncio.sleep(0.05)
+    assert db._loaded["notarial"].pins == 1
+    release.set()
+    await asyncio.gather(eviction, write)
+
+    # La escritura llegó a la partición que sigue en servicio (o a su copia en disco)
+    db.memory_budget_bytes = 10 ** 9
+    assert len(await db.get_document_chunk_ids("prot_01")) == 20
+    assert len(await db.get_document_chunk_ids("prot_02")) == 20
+    await db.flush()
+    on_disk = SimpleInMemoryVectorDB.load(str(tmp_path / partition_dirname("notarial")))
+    assert len(await on_disk.get_document_chunk_ids("prot_02")) == 20
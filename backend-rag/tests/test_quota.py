@@ -0,0 +1,165 @@
+"""
+Planificador de cuota: con los buckets saturados por llamadas "bulk", una
+llamada interactiva pasa la primera, y un 429 frena las siguientes. Las
+llamadas en cola esperan su turno sin sondear, y el `flock` del estado
+compartido no bloquea el event loop
+
+Reloj falso: `time` y `asyncio.sleep` del módulo avanzan un contador, así que
+el orden de admisión y las esperas no dependen de la máquina.
+"""
+import asyncio
+import fcntl
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from api import quota
+from api.quota import QuotaScheduler, _MemoryState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = 0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps += 1
+        self.now += seconds
+        await _real_sleep(0)
+
+
+_real_sleep = asyncio.sleep
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(quota, "time", clock)
+    monkeypatch.setattr(
+        quota, "asyncio",
+        SimpleNamespace(sleep=clock.sleep, Event=asyncio.Event, to_thread=asyncio.to_thread)
+    )
+    monkeypatch.setattr(quota, "random", SimpleNamespace(uniform=lambda low, high: 1.0))
+    return clock
+
+
+def make_scheduler(bulk_reserve: float = 0.0) -> QuotaScheduler:
+    # 60 requests/min y ventana de 5 s: 5 requests de ráfaga, 1 más por segundo
+    scheduler = QuotaScheduler(rpm=60, burst_seconds=5.0, bulk_reserve=bulk_reserve, max_poll=0.1)
+    assert isinstance(scheduler._state, _MemoryState)
+    return scheduler
+
+
+@pytest.mark.asyncio
+async def test_interactive_is_admitted_before_waiting_bulk(clock):
+    scheduler = make_scheduler()
+    admitted = []
+
+    async def call(name: str, priority: str):
+        await scheduler.acquire(1, priority)
+        admitted.append(name)
+
+    # 12 "bulk" vacían el bucket y se quedan esperando
+    bulk = [asyncio.create_task(call(f"bulk-{i}", "bulk")) for i in range(12)]
+    while len(admitted) < 5:
+        await _real_sleep(0)
+    assert admitted == [f"bulk-{i}" for i in range(5)]
+
+    interactive = asyncio.create_task(call("interactive", "interactive"))
+    await asyncio.gather(interactive, *bulk)
+
+    # La siguiente cuota que se libera es para la interactiva; después, los
+    # "bulk" en orden de llegada
+    assert admitted[5] == "interactive"
+    assert admitted[6:] == [f"bulk-{i}" for i in range(5, 12)]
+    assert scheduler.stats["interactive_calls"] == 1
+    assert scheduler.stats["bulk_calls"] == 12
+
+
+@pytest.mark.asyncio
+async def test_bulk_leaves_reserve_for_interactive(clock):
+    scheduler = make_scheduler(bulk_reserve=0.4)
+
+    # "bulk" solo puede gastar 3 de las 5 requests de ráfaga
+    for _ in range(3):
+        assert await scheduler.acquire(1, "bulk") == 0.0
+    pending = asyncio.create_task(scheduler.acquire(1, "bulk"))
+    await _real_sleep(0)
+    assert not pending.done()
+
+    # La reserva es para las interactivas: pasan sin esperar
+    assert await scheduler.acquire(1, "interactive") == 0.0
+    assert await scheduler.acquire(1, "interactive") == 0.0
+    await pending
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_response_throttles_following_calls(clock):
+    scheduler = make_scheduler()
+    assert await scheduler.acquire(1, "interactive") == 0.0
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    async def rejected():
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        await scheduler.run(rejected, 1, "interactive")
+    assert scheduler.stats["rate_limited"] == 1
+
+    # Buckets vacíos: la siguiente llamada espera a que se recargue una request (1 s)
+    waited = await scheduler.acquire(1, "interactive")
+    assert waited == pytest.approx(1.0, abs=0.11)
+
+
+@pytest.mark.asyncio
+async def test_queued_calls_wait_for_their_turn_without_polling(clock):
+    scheduler = make_scheduler()
+    for _ in range(5):
+        await scheduler.acquire(1, "bulk")
+
+    # 20 llamadas esperan 20 s de recarga: solo la primera de la cola duerme
+    # (max_poll = 0.1 s); el resto espera a que cambie el turno
+    await asyncio.gather(*(scheduler.acquire(1, "bulk") for _ in range(20)))
+    assert clock.now == pytest.approx(1020.0, abs=0.2)
+    assert clock.sleeps <= 20 * 11
+
+
+@pytest.mark.asyncio
+async def test_file_state_lock_does_not_block_event_loop(tmp_path):
+    path = tmp_path / "quota" / "embeddings.json"
+    scheduler = QuotaScheduler(rpm=60, state_path=str(path))
+    await scheduler.acquire(1, "interactive")
+
+    # Otro proceso tiene el fichero bloqueado
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with open(path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            locked.set()
+            release.wait(5)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    assert await asyncio.to_thread(locked.wait, 5)
+
+    # Mientras espera al flock, el event loop sigue atendiendo otras tareas
+    acquire = asyncio.create_task(scheduler.acquire(1, "interactive"))
+    for _ in range(20):
+        await _real_sleep(0.01)
+    assert not acquire.done()
+
+    release.set()
+    await acquire
+    holder.join()
+    assert scheduler.stats["interactive_calls"] == 2
@@ -0,0 +1,37 @@
+"""
+Readiness: si el warmup del arranque falla, el servicio no se queda para
+siempre en 503; /ready (o el reintento en segundo plano) lo vuelve a intentar
+"""
+from fastapi.testclient import TestClient
+
+from api import main
+from api.vectordb import SimpleInMemoryVectorDB
+
+
+def test_ready_retries_failed_warmup(monkeypatch):
+    db = SimpleInMemoryVectorDB()
+    attempts = []
+
+    async def flaky_warmup():
+        attempts.append(1)
+        if len(attempts) <= 2:
+            raise RuntimeError("endpoint unavailable")
+        return {"vector_db": 1.0}
+
+    monkeypatch.setattr(main, "warmup", flaky_warmup)
+    monkeypatch.setattr(main, "get_vector_db_dep", lambda: db)
+
+    with TestClient(main.app) as client:
+        # Falló en el arranque (intento 1) y en este /ready (intento 2)
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["error"] == "endpoint unavailable"
+
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["error"] is None
+        assert response.json()["warmup_ms"] == {"vector_db": 1.0}
+
+        # Ya listo: no se repite el warmup
+        assert client.get("/ready").status_code == 200
+        assert len(attempts) == 3
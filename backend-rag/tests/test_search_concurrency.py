@@ -0,0 +1,125 @@
+"""
+Búsqueda en el pool de CPU: las búsquedas concurrentes no bloquean el event
+loop, dan el mismo resultado que la búsqueda síncrona y conviven con
+escrituras in situ
+"""
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from api import vectordb
+from api.vectordb import SimpleInMemoryVectorDB, configure_search, cosine_search, cosine_search_async
+
+DIM = 32
+ROWS = 6000
+
+
+async def heartbeat_ticks(operation, interval=0.01):
+    """Ejecutar `operation` contando cuántas veces despierta una tarea que duerme `interval`"""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def beat():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(interval)
+            ticks += 1
+
+    task = asyncio.create_task(beat())
+    try:
+        result = await operation
+    finally:
+        done.set()
+        await task
+    return ticks, result
+
+
+@pytest.fixture
+def search_pool():
+    """Pool de 2 threads y bloques pequeños (varios bloques por búsqueda)"""
+    previous = (vectordb._search_workers, vectordb._search_block_rows)
+    configure_search(2, 1024)
+    yield
+    configure_search(*previous)
+
+
+def make_chunks(start, n, seed=0):
+    chunks = [
+        {
+            "chunk_id": f"doc_{(start + i) // 100}_{start + i}",
+            "document_id": f"doc_{(start + i) // 100}",
+            "collection": "notarial" if (start + i) % 3 else "parroquial",
+            "chunk_text": f"texto {start + i}",
+            "page_number": 1
+        }
+        for i in range(n)
+    ]
+    return chunks, np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def db():
+    db = SimpleInMemoryVectorDB()
+    asyncio.run(db.upsert_vectors(*make_chunks(0, ROWS)))
+    return db
+
+
+def queries(n, seed=1):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32).tolist()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_keep_event_loop_responsive(db, search_pool, monkeypatch):
+    # Cada bloque tarda 50 ms fuera del GIL: en el event loop no habría ticks
+    block_top_k = vectordb._block_top_k
+
+    def slow_block_top_k(*args):
+        time.sleep(0.05)
+        return block_top_k(*args)
+
+    monkeypatch.setattr(vectordb, "_block_top_k", slow_block_top_k)
+
+    async def searches():
+        return await asyncio.gather(*(db.search(query, top_k=5) for query in queries(8)))
+
+    ticks, results = await heartbeat_ticks(searches())
+    assert [len(r) for r in results] == [5] * 8
+    # 8 búsquedas × 6 bloques de 50 ms en 2 threads ≈ 1.2 s
+    assert ticks >= 20
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("filter_metadata", [None, {"collection": "parroquial"}, {"book_ids": ["doc_3", "doc_42"]}])
+async def test_pool_search_matches_sync_search(db, search_pool, filter_metadata):
+    count = len(db._ids)
+    args = (db._vectors[:count], db._norms[:count], db.store, db._ids.__getitem__)
+
+    for query in queries(4):
+        expected = cosine_search(*args, query, 10, filter_metadata)
+        results = await cosine_search_async(*args, query, 10, filter_metadata)
+        assert [r["chunk_id"] for r in results] == [r["chunk_id"] for r in expected]
+        np.testing.assert_allclose(
+            [r["score"] for r in results], [r["score"] for r in expected], rtol=1e-5
+        )
+
+
+@pytest.mark.asyncio
+async def test_searches_run_alongside_writes(db, search_pool):
+    async def writer():
+        for batch in range(10):
+            await db.upsert_vectors(*make_chunks(ROWS + batch * 200, 200, seed=batch + 10))
+            await db.delete([f"doc_{batch}_{batch * 100 + i}" for i in range(50)])
+            await asyncio.sleep(0)
+
+    async def reader(seed):
+        for query in queries(10, seed=seed):
+            results = await db.search(query, top_k=10, filter_metadata={"collection": "notarial"})
+            assert len(results) == 10
+            assert all(r["collection"] == "notarial" for r in results)
+
+    await asyncio.gather(writer(), *(reader(seed) for seed in range(4)))
+
+    assert len(db._ids) == ROWS + 10 * 200 - 10 * 50
+    assert len(await db.get_document_chunk_ids("doc_0")) == 50
@@ -0,0 +1,141 @@
+"""
+Índice compartido: el writer publica generaciones solo cuando hay cambios,
+los readers las mapean y cambian a la nueva al refrescar, y en modo reader
+la lista de chunks de un documento se pide al writer (no a una generación
+atrasada)
+"""
+import numpy as np
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from api import main
+from api.shared_index import (
+    IndexPublisher,
+    SharedIndexReader,
+    current_generation,
+    load_writer_index,
+)
+from api.vectordb import SimpleInMemoryVectorDB
+
+DIM = 8
+
+
+def make_chunks(document_id, n, seed=0):
+    chunks = [
+        {
+            "chunk_id": f"{document_id}_{i}",
+            "document_id": document_id,
+            "collection": "notarial",
+            "chunk_text": f"texto {i}",
+            "page_number": i + 1
+        }
+        for i in range(n)
+    ]
+    return chunks, np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def generations(index_dir):
+    return sorted(p.name for p in index_dir.iterdir() if p.is_dir())
+
+
+@pytest.mark.asyncio
+async def test_publish_only_when_changed_and_prune(tmp_path):
+    db = SimpleInMemoryVectorDB()
+    publisher = IndexPublisher(db, str(tmp_path), keep=2)
+    assert await publisher.publish() is None
+    assert current_generation(str(tmp_path)) is None
+
+    published = []
+    for seed in range(3):
+        await db.upsert_vectors(*make_chunks(f"prot_{seed}", 5, seed=seed))
+        published.append(await publisher.publish())
+        assert current_generation(str(tmp_path)) == published[-1]
+        assert await publisher.publish() is None
+
+    # Se conservan las dos últimas, sin temporales
+    assert generations(tmp_path) == published[1:]
+    assert publisher.last_publish["chunks"] == 15
+    assert publisher.last_publish["bytes"] > 15 * DIM * 4
+
+    # Al reiniciar, el writer restaura la última generación
+    restored = load_writer_index(str(tmp_path))
+    assert len(restored) == 15
+    assert sorted(await restored.get_document_chunk_ids("prot_2")) == [f"prot_2_{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_reader_attaches_and_refreshes(tmp_path):
+    db = SimpleInMemoryVectorDB()
+    publisher = IndexPublisher(db, str(tmp_path))
+    reader = SharedIndexReader(str(tmp_path), refresh_interval=0.0)
+
+    # Sin generaciones publicadas: vacío, no error
+    assert await reader.search([1.0] * DIM) == []
+    assert reader.status()["ready"] is False
+
+    chunks, vectors = make_chunks("prot_01", 6)
+    await db.upsert_vectors(chunks, vectors)
+    first = await publisher.publish()
+    await reader.warmup()
+    assert reader.generation == first
+    assert len(reader) == 6
+
+    results = await reader.search(vectors[3].tolist(), top_k=3)
+    assert results[0]["chunk_id"] == "prot_01_3"
+    assert results[0]["page_number"] == 4
+    assert results == await db.search(vectors[3].tolist(), top_k=3)
+
+    # Nueva generación: el reader cambia en la siguiente comprobación
+    await db.upsert_vectors(*make_chunks("prot_02", 4, seed=1))
+    await db.delete(["prot_01_0"])
+    second = await publisher.publish()
+    assert sorted(await reader.get_document_chunk_ids("prot_02")) == [f"prot_02_{i}" for i in range(4)]
+    assert reader.generation == second
+    assert len(reader) == 9
+    assert "prot_01_0" not in await reader.get_document_chunk_ids("prot_01")
+
+    with pytest.raises(RuntimeError):
+        await reader.upsert(chunks)
+
+
+@pytest.mark.asyncio
+async def test_reader_keeps_generation_until_refresh_interval(tmp_path):
+    db = SimpleInMemoryVectorDB()
+    publisher = IndexPublisher(db, str(tmp_path))
+    await db.upsert_vectors(*make_chunks("prot_01", 3))
+    first = await publisher.publish()
+
+    reader = SharedIndexReader(str(tmp_path), refresh_interval=3600)
+    await reader.warmup()
+    await db.upsert_vectors(*make_chunks("prot_02", 3, seed=1))
+    await publisher.publish()
+
+    assert reader.generation == first
+    assert await reader.get_document_chunk_ids("prot_02") == []
+
+
+class FakeWriterProxy:
+    def __init__(self):
+        self.requests = []
+
+    async def forward(self, request):
+        self.requests.append((request.method, request.url.path))
+        return JSONResponse({"document_id": "prot_01", "chunk_ids": ["from_writer"]})
+
+
+def test_reader_mode_asks_writer_for_document_chunks(monkeypatch):
+    db = SimpleInMemoryVectorDB()
+    proxy = FakeWriterProxy()
+    monkeypatch.setattr(main, "get_vector_db_dep", lambda: db)
+    monkeypatch.setattr(main, "_writer_proxy", proxy)
+    client = TestClient(main.app)
+
+    # En modo local responde el propio proceso
+    assert client.get("/documents/prot_01/chunks").json()["chunk_ids"] == []
+    assert proxy.requests == []
+
+    monkeypatch.setattr(main.settings, "index_mode", "reader")
+    assert client.get("/documents/prot_01/chunks").json()["chunk_ids"] == ["from_writer"]
+    client.post("/documents/prot_01/prune", json={"keep_chunk_ids": []})
+    assert proxy.requests == [("GET", "/documents/prot_01/chunks"), ("POST", "/documents/prot_01/prune")]
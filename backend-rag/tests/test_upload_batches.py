@@ -0,0 +1,123 @@
+"""
+Upload por lotes: claves de lote estables entre ejecuciones, reanudación sin
+reenviar los lotes aceptados y reintentos solo ante errores transitorios
+"""
+import json
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+from workers import ingest
+from workers.ingest import IngestPipeline, UploadError, _upload_batch_key
+from workers.jobstore import JobStore
+
+DIM = 16
+
+
+def make_chunks(document_id, n):
+    return [
+        {
+            "chunk_id": f"{document_id}:1:{i * 100}:{i:08x}",
+            "document_id": document_id,
+            "chunk_text": f"texto del chunk {i} " * 20,
+            "page_number": 1,
+            "embedding": [float(i)] * DIM
+        }
+        for i in range(n)
+    ]
+
+
+class FakeAPI:
+    """Endpoint /ingest falso: responde con los códigos de `script` por orden de llegada"""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []
+
+    def __call__(self, request):
+        payload = json.loads(request.content)
+        self.requests.append([c["chunk_id"] for c in payload["chunks"]])
+        status = self.script.pop(0) if self.script else 200
+        if status != 200:
+            return httpx.Response(status, text="error")
+        return httpx.Response(200, json={"chunks_ingested": len(payload["chunks"])})
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingest, "wait_exponential", lambda **kwargs: wait_none())
+
+
+def make_pipeline(api, job_store=None):
+    pipeline = IngestPipeline(ingest_format="json", compression=None, job_store=job_store, dedup=False)
+    # ~6 chunks por lote, un lote en vuelo cada vez (orden de llegada determinista)
+    pipeline.settings = pipeline.settings.model_copy(update={
+        "ingest_upload_batch_bytes": 6 * (700 + DIM * 20),
+        "ingest_upload_batch_concurrency": 1,
+        "ingest_upload_retries": 3
+    })
+    pipeline._client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(api))
+    return pipeline
+
+
+def test_batch_keys_are_stable_across_runs():
+    chunks = make_chunks("prot_01", 20)
+    first = [_upload_batch_key(b) for b in make_pipeline(FakeAPI())._split_upload_batches(chunks)]
+    second = [_upload_batch_key(b) for b in make_pipeline(FakeAPI())._split_upload_batches(list(chunks))]
+
+    assert len(first) > 2
+    assert first == second
+    assert len(set(first)) == len(first)
+
+    # Un chunk con otro texto (otro chunk_id) cambia solo la clave de su lote
+    edited = chunks[:-1] + [{**chunks[-1], "chunk_id": chunks[-1]["chunk_id"][:-8] + "ffffffff"}]
+    third = [_upload_batch_key(b) for b in make_pipeline(FakeAPI())._split_upload_batches(edited)]
+    assert third[:-1] == first[:-1]
+    assert third[-1] != first[-1]
+
+
+@pytest.mark.asyncio
+async def test_resumed_upload_skips_accepted_batches(tmp_path):
+    store = JobStore(str(tmp_path / "jobs"))
+    store.start_job("prot_01", "prot_01.pdf", "abc", {})
+    chunks = make_chunks("prot_01", 20)
+
+    # El tercer lote es rechazado (400, no se reintenta): el upload falla
+    api = FakeAPI(script=[200, 200, 400])
+    pipeline = make_pipeline(api, job_store=store)
+    batches = pipeline._split_upload_batches(chunks)
+    with pytest.raises(UploadError):
+        await pipeline._upload_chunks("prot_01", chunks)
+    accepted = store.completed_upload_batches("prot_01")
+    assert accepted == {_upload_batch_key(b) for b in batches if b is not batches[2]}
+
+    # Al reanudar solo se reenvía el lote que faltaba
+    api = FakeAPI()
+    result = await make_pipeline(api, job_store=store)._upload_chunks("prot_01", chunks)
+    assert api.requests == [[c["chunk_id"] for c in batches[2]]]
+    assert result["chunks_ingested"] == len(chunks)
+    assert result["batches_skipped"] == len(batches) - 1
+    store.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [429, 500, 503])
+async def test_transient_errors_are_retried(status):
+    chunks = make_chunks("prot_01", 4)
+    api = FakeAPI(script=[status, status])
+    result = await make_pipeline(api)._upload_chunks("prot_01", chunks)
+
+    assert len(api.requests) == 3
+    assert result["chunks_ingested"] == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [400, 413, 422])
+async def test_client_errors_are_not_retried(status):
+    api = FakeAPI(script=[status])
+    with pytest.raises(UploadError) as error:
+        await make_pipeline(api)._upload_chunks("prot_01", make_chunks("prot_01", 4))
+
+    assert error.value.status_code == status
+    assert len(api.requests) == 1
@@ -0,0 +1,141 @@
+"""
+VertexAIVectorSearch con un SDK falso: event loop libre, índice de
+documentos persistente y upserts parcialmente fallidos
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api.vectordb import VertexAIVectorSearch
+
+SDK_LATENCY = 0.2
+
+
+class FakeIndex:
+    def __init__(self, fail_ids=()):
+        self.datapoints = {}
+        self.fail_ids = set(fail_ids)
+
+    def upsert_datapoints(self, datapoints):
+        time.sleep(SDK_LATENCY)  # RPC bloqueante
+        if any(d.datapoint_id in self.fail_ids for d in datapoints):
+            raise ConnectionError("upsert failed")
+        for datapoint in datapoints:
+            self.datapoints[datapoint.datapoint_id] = datapoint
+
+    def remove_datapoints(self, datapoint_ids):
+        time.sleep(SDK_LATENCY)
+        for datapoint_id in datapoint_ids:
+            self.datapoints.pop(datapoint_id, None)
+
+
+class FakeEndpoint:
+    def __init__(self, index):
+        self.index = index
+
+    def find_neighbors(self, deployed_index_id, queries, num_neighbors, filter=None):
+        time.sleep(SDK_LATENCY)
+        ids = sorted(self.index.datapoints)[:num_neighbors]
+        return [[SimpleNamespace(id=datapoint_id, distance=0.5) for datapoint_id in ids]]
+
+
+def fake_sdk(index):
+    return SimpleNamespace(
+        init=lambda **kwargs: None,
+        MatchingEngineIndex=lambda index_id: index,
+        MatchingEngineIndexEndpoint=lambda endpoint_id: FakeEndpoint(index),
+        matching_engine=SimpleNamespace(
+            matching_engine_index_config=SimpleNamespace(IndexDatapoint=SimpleNamespace)
+        )
+    )
+
+
+def make_chunks(document_id, n):
+    return [
+        {"chunk_id": f"{document_id}_{i}", "document_id": document_id, "embedding": [0.1, 0.2]}
+        for i in range(n)
+    ]
+
+
+async def heartbeat_ticks(operation, interval=0.01):
+    """Ejecutar `operation` contando cuántas veces despierta una tarea que duerme `interval`"""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def beat():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(interval)
+            ticks += 1
+
+    task = asyncio.create_task(beat())
+    try:
+        result = await operation
+    finally:
+        done.set()
+        await task
+    return ticks, result
+
+
+@pytest.mark.asyncio
+async def test_sdk_calls_do_not_block_event_loop(tmp_path):
+    db = VertexAIVectorSearch(sdk=fake_sdk(FakeIndex()), document_index_path=str(tmp_path / "docs.sqlite"))
+    db.upsert_batch_size = 2
+
+    ticks, ok = await heartbeat_ticks(db.upsert(make_chunks("doc", 4)))
+    assert ok
+    # Con el SDK en el loop no habría ningún tick durante los 0.2 s de cada batch
+    assert ticks >= 10
+
+    ticks, results = await heartbeat_ticks(db.search([0.1, 0.2], top_k=3))
+    assert [r["chunk_id"] for r in results] == ["doc_0", "doc_1", "doc_2"]
+    assert ticks >= 10
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_document_index_survives_restart(tmp_path):
+    path = str(tmp_path / "docs.sqlite")
+    index = FakeIndex()
+    db = VertexAIVectorSearch(sdk=fake_sdk(index), document_index_path=path)
+    await db.upsert(make_chunks("doc", 3))
+    await db.close()
+
+    # Otro proceso/worker con el mismo fichero ve el documento
+    restarted = VertexAIVectorSearch(sdk=fake_sdk(index), document_index_path=path)
+    assert sorted(await restarted.get_document_chunk_ids("doc")) == ["doc_0", "doc_1", "doc_2"]
+    assert await restarted.prune_document("doc", ["doc_0"]) == 2
+    assert await restarted.get_document_chunk_ids("doc") == ["doc_0"]
+    assert sorted(index.datapoints) == ["doc_0"]
+    await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_partial_upsert_failure_records_written_batches(tmp_path):
+    index = FakeIndex(fail_ids={"doc_3"})
+    db = VertexAIVectorSearch(sdk=fake_sdk(index), document_index_path=str(tmp_path / "docs.sqlite"))
+    db.upsert_batch_size = 2
+
+    with pytest.raises(RuntimeError, match="1 of 2 batches"):
+        await db.upsert(make_chunks("doc", 4))
+
+    # El índice local coincide con lo que quedó escrito en Vertex
+    assert sorted(await db.get_document_chunk_ids("doc")) == sorted(index.datapoints) == ["doc_0", "doc_1"]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_search_errors_propagate(tmp_path):
+    index = FakeIndex()
+    sdk = fake_sdk(index)
+
+    def broken_endpoint(endpoint_id):
+        raise ConnectionError("endpoint unavailable")
+
+    sdk.MatchingEngineIndexEndpoint = broken_endpoint
+    db = VertexAIVectorSearch(sdk=sdk, document_index_path=str(tmp_path / "docs.sqlite"))
+    with pytest.raises(ConnectionError):
+        await db.search([0.1, 0.2])
+    await db.close()
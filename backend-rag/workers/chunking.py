@@ -2,21 +2,77 @@
 Chunking de texto con overlap
 """
 import tiktoken
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import hashlib
+import json
 import uuid
+import numpy as np
+
+# Namespace para IDs deterministas de chunks (uuid5)
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2a4e-8d3b-5e7f-9a10-2b4c6d8e0f12")
+
+
+def content_hash(text: str) -> str:
+    """Hash corto y estable del texto de un chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def metadata_hash(metadata: Optional[Dict[str, Any]]) -> str:
+    """Hash corto y estable de la metadata del documento (independiente del orden de claves)"""
+    if not metadata:
+        return ""
+    encoded = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(
+    document_id: str,
+    page_number: int,
+    start_token: int,
+    text_hash: str,
+    meta_hash: str = ""
+) -> str:
+    """
+    ID determinista de chunk derivado de su contenido y de la metadata indexada
+
+    Re-ingestar el mismo texto con la misma metadata produce el mismo ID, de
+    modo que los chunks sin cambios se reconocen y no se duplican en el
+    índice. Si solo cambia la metadata (colección, book_id, fechas...) cambian
+    los IDs y la re-ingesta reemplaza los chunks en lugar de saltárselos.
+    """
+    key = f"{document_id}:{page_number}:{start_token}:{text_hash}"
+    if meta_hash:
+        key += f":{meta_hash}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
 
 
 class TextChunker:
-    """Chunker de texto con overlap usando tiktoken"""
+    """
+    Chunker de texto con overlap usando tiktoken
+
+    Tokeniza las páginas en batch (multi-thread en tiktoken) y obtiene el
+    texto de cada chunk cortando el string original con offsets
+    token → carácter, sin decodificar cada ventana.
+    """
 
-    def __init__(self, chunk_size: int = 700, chunk_overlap: int = 100):
+    def __init__(
+        self,
+        chunk_size: int = 700,
+        chunk_overlap: int = 100,
+        num_threads: int = 8,
+        pages_per_batch: int = 64
+    ):
         """
         Args:
             chunk_size: Tamaño máximo del chunk en tokens
             chunk_overlap: Overlap entre chunks en tokens
+            num_threads: Threads de tiktoken para tokenizar en batch
+            pages_per_batch: Páginas tokenizadas por batch en modo streaming
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.num_threads = num_threads
+        self.pages_per_batch = pages_per_batch
         self.encoding = tiktoken.get_encoding("cl100k_base")  # Para OpenAI
 
     def chunk_text(
@@ -41,39 +97,129 @@ class TextChunker:
         if not text or not text.strip():
             return []
 
-        # Tokenizar texto completo
-        tokens = self.encoding.encode(text)
+        tokens = self.encoding.encode_ordinary(text)
+        return self._chunk_tokens(text, tokens, document_id, page_number, metadata)
 
-        chunks = []
-        start_idx = 0
+    def _chunk_tokens(
+        self,
+        text: str,
+        tokens: List[int],
+        document_id: str,
+        page_number: int,
+        metadata: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """Trocear un texto ya tokenizado en ventanas con overlap"""
+        n_tokens = len(tokens)
+        if n_tokens == 0:
+            return []
 
-        while start_idx < len(tokens):
-            # Extraer chunk
-            end_idx = start_idx + self.chunk_size
-            chunk_tokens = tokens[start_idx:end_idx]
+        step = self.chunk_size - self.chunk_overlap
+        starts = list(range(0, n_tokens, step))
+        ends = [min(start + self.chunk_size, n_tokens) for start in starts]
+
+        # Offsets de carácter solo para los límites de las ventanas
+        char_offsets = self._char_offsets(text, tokens, starts + ends)
+        char_starts = char_offsets[:len(starts)]
+        char_ends = char_offsets[len(starts):]
+
+        chunks = []
+        meta_hash = metadata_hash(metadata)
 
-            # Decodificar a texto
-            chunk_text = self.encoding.decode(chunk_tokens)
+        for start_idx, end_idx, char_start, char_end in zip(starts, ends, char_starts, char_ends):
+            # Cortar el texto original (sin decodificar tokens)
+            chunk_text = text[char_start:char_end].strip()
+            text_hash = content_hash(chunk_text)
 
             # Crear chunk con metadata
             chunk = {
-                "chunk_id": str(uuid.uuid4()),
+                "chunk_id": make_chunk_id(document_id, page_number, start_idx, text_hash, meta_hash),
+                "content_hash": text_hash,
                 "document_id": document_id,
                 "page_number": page_number,
-                "chunk_text": chunk_text.strip(),
-                "token_count": len(chunk_tokens),
+                "chunk_text": chunk_text,
+                "token_count": end_idx - start_idx,
                 "start_token": start_idx,
-                "end_token": end_idx,
+                "end_token": start_idx + self.chunk_size,
                 **(metadata or {})
             }
 
             chunks.append(chunk)
 
-            # Avanzar con overlap
-            start_idx += self.chunk_size - self.chunk_overlap
-
         return chunks
 
+    def _char_offsets(self, text: str, tokens: List[int], token_positions: List[int]) -> List[int]:
+        """
+        Convertir posiciones de token en offsets de carácter del texto
+
+        Se obtienen los offsets en bytes UTF-8 decodificando a bytes solo los
+        tramos entre límites consecutivos (cada byte una vez, en Rust); si el
+        texto no es ASCII se traducen a caracteres contando los bytes que
+        inician carácter (los que no son de continuación 10xxxxxx).
+        """
+        boundaries = sorted(set(token_positions))
+        byte_at = {}
+        byte_offset = 0
+        previous = 0
+        for position in boundaries:
+            if position > previous:
+                byte_offset += len(self.encoding.decode_bytes(tokens[previous:position]))
+            byte_at[position] = byte_offset
+            previous = position
+
+        byte_offsets = [byte_at[position] for position in token_positions]
+
+        if text.isascii():
+            return byte_offsets
+
+        raw = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        char_starts = np.concatenate(([0], np.cumsum((raw & 0xC0) != 0x80)))
+        return char_starts[byte_offsets].tolist()
+
+    def iter_chunks(
+        self,
+        pages: Iterable[Dict[str, Any]],
+        document_id: str,
+        metadata: Dict[str, Any] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generar chunks en streaming a partir de un iterador de páginas
+
+        Las páginas se agrupan en batches de `pages_per_batch` que se
+        tokenizan juntas, así el chunking puede empezar mientras la
+        extracción/OCR sigue produciendo páginas.
+        """
+        batch: List[Dict[str, Any]] = []
+
+        for page in pages:
+            batch.append(page)
+            if len(batch) >= self.pages_per_batch:
+                yield from self._chunk_page_batch(batch, document_id, metadata)
+                batch = []
+
+        if batch:
+            yield from self._chunk_page_batch(batch, document_id, metadata)
+
+    def _chunk_page_batch(
+        self,
+        pages: List[Dict[str, Any]],
+        document_id: str,
+        metadata: Dict[str, Any] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Tokenizar un batch de páginas en paralelo y trocearlas"""
+        texts = [page.get("text", "") or "" for page in pages]
+        token_lists = self.encoding.encode_ordinary_batch(texts, num_threads=self.num_threads)
+
+        for page, text, tokens in zip(pages, texts, token_lists):
+            if not text.strip():
+                continue
+            yield from self._chunk_tokens(
+                text=text,
+                tokens=tokens,
+                document_id=document_id,
+                page_number=page.get("page_number", 0),
+                metadata=metadata
+            )
+
     def chunk_document(
         self,
         pages: List[Dict[str, Any]],
@@ -95,22 +241,7 @@ class TextChunker:
         Returns:
             Lista de todos los chunks del documento
         """
-        all_chunks = []
-
-        for page in pages:
-            page_number = page.get("page_number", 0)
-            text = page.get("text", "")
-
-            chunks = self.chunk_text(
-                text=text,
-                document_id=document_id,
-                page_number=page_number,
-                metadata=metadata
-            )
-
-            all_chunks.extend(chunks)
-
-        return all_chunks
+        return list(self.iter_chunks(pages, document_id, metadata))
 
 
 def create_chunker(chunk_size: int = 700, chunk_overlap: int = 100) -> TextChunker:
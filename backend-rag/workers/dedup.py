@@ -0,0 +1,218 @@
+"""
+Detección de chunks casi duplicados (MinHash + LSH)
+
+Los protocolos notariales y los libros parroquiales repiten fórmulas largas
+("En el nombre de Dios Todopoderoso...") en miles de páginas. Cada copia se
+embebía, se guardaba y se recuperaba por separado, desplazando evidencias
+útiles de la respuesta.
+
+Tras el chunking, cada chunk se resume en una firma MinHash de sus shingles
+(n-gramas de palabras normalizadas). Con LSH (la firma partida en bandas)
+solo se comparan los chunks que coinciden en alguna banda, y se confirma el
+duplicado si la similitud de Jaccard estimada supera el umbral. El primer
+chunk visto de cada grupo es el canónico; los demás se marcan con
+`duplicate_of` y reutilizan su embedding (o, en modo "skip", no se indexan).
+
+El índice vive en el proceso de ingesta: detecta duplicados dentro de un
+documento y entre los documentos de un mismo batch. Su memoria está acotada:
+los canónicos forman un LRU (`max_canonicals`) y al expulsar uno se retiran su
+firma, sus entradas LSH y su embedding.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+DEDUP_MODES = ["reuse", "skip"]
+
+# Primo de Mersenne 2^31 - 1: a * x + b cabe en uint64 sin desbordar
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """Hashes (uint64) de los n-gramas de palabras normalizadas del texto"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) & _PRIME for gram in grams),
+        dtype=np.uint64,
+        count=len(grams)
+    ))
+
+
+class MinHasher:
+    """Firmas MinHash con `num_perm` permutaciones (a·x + b) mod p"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Firma (uint32) del texto, o None si no tiene palabras"""
+        hashes = shingles(text, self.shingle_size)
+        if len(hashes) == 0:
+            return None
+        return ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Similitud de Jaccard estimada: fracción de posiciones iguales"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """
+    Índice LSH de firmas MinHash con los embeddings de los canónicos
+
+    Thread-safe: el chunking del pipeline batch corre en varios threads.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 16,
+        vector_cache_bytes: int = 256 * 1024 ** 2,
+        max_canonicals: int = 50_000
+    ):
+        """
+        Args:
+            threshold: Jaccard estimada mínima para considerar duplicado
+            num_perm: Permutaciones MinHash (longitud de la firma)
+            bands: Bandas LSH (num_perm / bands filas por banda)
+            vector_cache_bytes: Memoria máxima de embeddings de canónicos (LRU)
+            max_canonicals: Canónicos recordados (LRU, ~6 KB cada uno); el resto se olvida
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.vector_cache_bytes = vector_cache_bytes
+        self.max_canonicals = max(1, max_canonicals)
+
+        # Canónicos de menos a más recientemente usado (insertado o emparejado)
+        self._signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, bytes], Dict[str, None]] = {}
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._vector_bytes = 0
+        self._indexed: Set[str] = set()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def assign(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Marcar los chunks casi duplicados de otro ya visto
+
+        Cada duplicado recibe `duplicate_of` (chunk_id del canónico) y
+        `duplicate_similarity`; los que no lo son pasan a ser canónicos.
+
+        Returns:
+            Número de duplicados encontrados
+        """
+        signatures = [self.hasher.signature(chunk["chunk_text"]) for chunk in chunks]
+        duplicates = 0
+        with self._lock:
+            for chunk, signature in zip(chunks, signatures):
+                chunk.pop("duplicate_of", None)
+                chunk.pop("duplicate_similarity", None)
+                if signature is None:
+                    continue
+                chunk_id = chunk["chunk_id"]
+                if chunk_id in self._signatures:
+                    continue  # Ya es canónico (re-ingesta del mismo chunk)
+
+                keys = self._band_keys(signature)
+                best, best_similarity = None, 0.0
+                seen = set()
+                for key in keys:
+                    for candidate in self._buckets.get(key, ()):
+                        if candidate in seen:
+                            continue
+                        seen.add(candidate)
+                        similarity = estimated_jaccard(signature, self._signatures[candidate])
+                        if similarity > best_similarity:
+                            best, best_similarity = candidate, similarity
+
+                if best is not None and best_similarity >= self.threshold:
+                    chunk["duplicate_of"] = best
+                    chunk["duplicate_similarity"] = round(best_similarity, 3)
+                    self._signatures.move_to_end(best)
+                    duplicates += 1
+                    continue
+
+                self._signatures[chunk_id] = signature
+                for key in keys:
+                    self._buckets.setdefault(key, {})[chunk_id] = None
+                while len(self._signatures) > self.max_canonicals:
+                    self._evict_oldest()
+        return duplicates
+
+    def _evict_oldest(self) -> None:
+        """Olvidar el canónico menos usado: firma, entradas LSH y embedding (con el lock)"""
+        chunk_id, signature = self._signatures.popitem(last=False)
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.pop(chunk_id, None)
+                if not bucket:
+                    del self._buckets[key]
+        vector = self._vectors.pop(chunk_id, None)
+        if vector is not None:
+            self._vector_bytes -= len(vector) * 4
+        self._indexed.discard(chunk_id)
+        self.evictions += 1
+
+    def mark_indexed(self, chunk_ids: Iterable[str]) -> None:
+        """Registrar canónicos ya guardados en el índice (el modo skip puede omitir sus duplicados)"""
+        with self._lock:
+            self._indexed.update(
+                chunk_id for chunk_id in chunk_ids if chunk_id in self._signatures
+            )
+
+    def is_indexed(self, chunk_id: str) -> bool:
+        """Si el canónico consta como guardado en el índice"""
+        with self._lock:
+            return chunk_id in self._indexed
+
+    def remember_vector(self, chunk_id: str, vector: List[float]) -> None:
+        """Guardar el embedding de un canónico para reutilizarlo en sus duplicados"""
+        with self._lock:
+            if chunk_id not in self._signatures:
+                return
+            if chunk_id in self._vectors:
+                self._vectors.move_to_end(chunk_id)
+                return
+            self._vectors[chunk_id] = vector
+            self._vector_bytes += len(vector) * 4
+            while self._vector_bytes > self.vector_cache_bytes and self._vectors:
+                _, evicted = self._vectors.popitem(last=False)
+                self._vector_bytes -= len(evicted) * 4
+
+    def vector(self, chunk_id: str) -> Optional[List[float]]:
+        """Embedding de un canónico (None si aún no se ha calculado o se descartó)"""
+        with self._lock:
+            vector = self._vectors.get(chunk_id)
+            if vector is not None:
+                self._vectors.move_to_end(chunk_id)
+            return vector
@@ -0,0 +1,238 @@
+"""
+Descarga en streaming de documentos desde GCS
+
+Cada blob se descarga por trozos a un fichero temporal (nunca entero en
+memoria) y se expone como ruta local o mmap para el paso de OCR. Mientras se
+procesa un documento, los siguientes N se descargan en segundo plano.
+
+`LocalFilesystemStorageClient` imita el subconjunto del cliente de
+google-cloud-storage que se usa aquí sobre un directorio local
+(<root>/<bucket>/<path>), para desarrollo y tests sin GCP.
+"""
+import mmap
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Iterable, Iterator, Optional, Tuple, Union
+
+
+def parse_gcs_uri(gcs_uri: str) -> Tuple[str, str]:
+    """Separar gs://bucket/path en (bucket, path)"""
+    if not gcs_uri.startswith("gs://"):
+        raise ValueError("GCS URI must start with gs://")
+    path = gcs_uri[5:]
+    bucket_name, _, blob_path = path.partition("/")
+    return bucket_name, blob_path
+
+
+def document_id_for_uri(gcs_uri: str, prefix_uri: str) -> str:
+    """
+    ID de documento estable a partir de la ruta del blob bajo el prefijo
+
+    gs://b/fondos/notarial/1582/prot_01.pdf con prefijo gs://b/fondos/
+    → notarial_1582_prot_01
+    """
+    relative = gcs_uri[len(prefix_uri):] if gcs_uri.startswith(prefix_uri) else gcs_uri[5:]
+    stem = str(Path(relative.strip("/")).with_suffix(""))
+    return stem.replace("/", "_")
+
+
+class LocalDocument:
+    """Documento descargado a un fichero temporal local"""
+
+    def __init__(self, gcs_uri: str, path: str, size: int, generation: Optional[str] = None):
+        self.gcs_uri = gcs_uri
+        self.path = path
+        self.size = size
+        self.generation = generation
+
+    @property
+    def version(self) -> str:
+        """Identificador de versión del blob (para checkpoints y cachés)"""
+        return f"{self.gcs_uri}#{self.generation or self.size}"
+
+    @contextmanager
+    def open_mmap(self) -> Iterator[mmap.mmap]:
+        """Mapear el fichero en memoria (solo lectura)"""
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    def cleanup(self) -> None:
+        """Borrar el fichero temporal"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "LocalDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+
+class GCSDocumentSource:
+    """Lista y descarga documentos de GCS con prefetch acotado"""
+
+    def __init__(
+        self,
+        storage_client=None,
+        project_id: Optional[str] = None,
+        prefetch: int = 4,
+        spool_dir: Optional[str] = None,
+        chunk_size: int = 8 * 1024 * 1024
+    ):
+        """
+        Args:
+            storage_client: Cliente de GCS (o LocalFilesystemStorageClient)
+            project_id: GCP Project ID si hay que crear el cliente
+            prefetch: Documentos descargados por adelantado
+            spool_dir: Directorio para los ficheros temporales
+            chunk_size: Tamaño de cada trozo de descarga
+        """
+        if storage_client is None:
+            from google.cloud import storage
+            storage_client = storage.Client(project=project_id)
+        self.client = storage_client
+        self.prefetch = max(1, prefetch)
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+
+    def list_uris(self, prefix_uri: str, suffixes: Tuple[str, ...] = (".pdf",)) -> List[str]:
+        """
+        Listar los blobs bajo un prefijo
+
+        Args:
+            prefix_uri: gs://bucket/prefijo/
+            suffixes: Extensiones aceptadas (en minúsculas)
+        """
+        bucket_name, prefix = parse_gcs_uri(prefix_uri)
+        return [
+            f"gs://{bucket_name}/{blob.name}"
+            for blob in self.client.list_blobs(bucket_name, prefix=prefix)
+            if blob.name.lower().endswith(suffixes)
+        ]
+
+    def download(self, gcs_uri: str) -> LocalDocument:
+        """Descargar un blob por trozos a un fichero temporal"""
+        bucket_name, blob_path = parse_gcs_uri(gcs_uri)
+        blob = self.client.bucket(bucket_name).blob(blob_path)
+        blob.chunk_size = self.chunk_size
+        suffix = Path(blob_path).suffix
+
+        fd, path = tempfile.mkstemp(prefix="scriptorium-", suffix=suffix, dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                blob.download_to_file(f)
+                size = f.tell()
+        except BaseException:
+            os.unlink(path)
+            raise
+
+        generation = getattr(blob, "generation", None)
+        return LocalDocument(gcs_uri, path, size, str(generation) if generation else None)
+
+    def iter_downloads(
+        self,
+        uris: Iterable[str],
+        return_exceptions: bool = False
+    ) -> Iterator[Union[LocalDocument, Exception]]:
+        """
+        Descargar en orden con `prefetch` descargas en vuelo
+
+        El consumidor debe llamar a `cleanup()` (o usar `with`) al terminar
+        con cada documento.
+
+        Args:
+            uris: URIs gs:// a descargar
+            return_exceptions: Si True, una descarga fallida se devuelve como
+                excepción en su posición en lugar de cortar la iteración
+        """
+        uris = iter(uris)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix="gcs-download") as executor:
+            try:
+                for uri in uris:
+                    pending.append(executor.submit(self.download, uri))
+                    if len(pending) >= self.prefetch:
+                        break
+
+                while pending:
+                    future = pending.popleft()
+                    if return_exceptions and future.exception() is not None:
+                        document = future.exception()
+                    else:
+                        document = future.result()
+                    next_uri = next(uris, None)
+                    if next_uri is not None:
+                        pending.append(executor.submit(self.download, next_uri))
+                    yield document
+            finally:
+                # Consumidor abandonado o error: limpiar descargas pendientes
+                for future in pending:
+                    if not future.cancel():
+                        try:
+                            future.result().cleanup()
+                        except Exception:
+                            pass
+
+
+# ============ STAND-IN LOCAL ============
+
+class _LocalBlob:
+    def __init__(self, root: Path, bucket_name: str, name: str):
+        self.name = name
+        self.chunk_size = None
+        self._path = root / bucket_name / name
+
+    @property
+    def size(self) -> int:
+        return self._path.stat().st_size
+
+    @property
+    def generation(self) -> int:
+        return self._path.stat().st_mtime_ns
+
+    def download_to_file(self, file_obj) -> None:
+        with open(self._path, "rb") as f:
+            shutil.copyfileobj(f, file_obj, self.chunk_size or 1024 * 1024)
+
+    def download_as_bytes(self) -> bytes:
+        return self._path.read_bytes()
+
+
+class _LocalBucket:
+    def __init__(self, root: Path, name: str):
+        self._root = root
+        self.name = name
+
+    def blob(self, name: str) -> _LocalBlob:
+        return _LocalBlob(self._root, self.name, name)
+
+
+class LocalFilesystemStorageClient:
+    """Sustituto de `storage.Client` respaldado por <root>/<bucket>/<path>"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def bucket(self, name: str) -> _LocalBucket:
+        return _LocalBucket(self.root, name)
+
+    def list_blobs(self, bucket_name: str, prefix: str = "") -> Iterator[_LocalBlob]:
+        base = self.root / bucket_name
+        for path in sorted(base.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(base).as_posix()
+            if name.startswith(prefix):
+                yield _LocalBlob(self.root, bucket_name, name)
@@ -3,20 +3,33 @@ Worker de ingesta completo
 Orquesta: OCR → Chunking → Embeddings → Vector DB
 """
 import asyncio
+import hashlib
+import json
 import sys
 import os
+import time
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 import httpx
+import numpy as np
 from dotenv import load_dotenv
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
 
 # Agregar api al path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from api.embeddings import get_embedding_service
 from api.config import get_settings
-from workers.ocr import create_ocr_service
+from api import ingest_format
+from workers.ocr import create_ocr_service, OCR_ENGINES
+from workers.ocr_cache import create_ocr_cache
 from workers.chunking import create_chunker
+from workers.gcs_source import GCSDocumentSource, LocalFilesystemStorageClient, document_id_for_uri
+from workers.jobstore import JobStore, STAGES, file_fingerprint, source_fingerprint
+from workers.telemetry import IngestTelemetry, SamplingProfiler
+from workers.dedup import NearDuplicateIndex
 
 load_dotenv()
 
@@ -27,22 +40,58 @@ class IngestPipeline:
     def __init__(
         self,
         api_url: str = "http://localhost:8000",
-        use_simple_ocr: bool = True
+        use_simple_ocr: bool = True,
+        ingest_format: str = "binary",
+        compression: Optional[str] = "gzip",
+        skip_unchanged: bool = True,
+        job_store: Optional[JobStore] = None,
+        use_ocr_cache: bool = True,
+        telemetry: Optional[IngestTelemetry] = None,
+        dedup: Optional[bool] = None,
+        ocr_engine: Optional[str] = None,
+        route_pages: Optional[bool] = None
     ):
         """
         Args:
             api_url: URL del backend API
             use_simple_ocr: Si True, usa PyPDF; si False, usa Document AI
+            ingest_format: "binary" (/ingest/stream) o "json" (/ingest)
+            compression: Compresión del stream binario (None, "gzip" o "zstd")
+            skip_unchanged: Si True, solo embebe y sube los chunks nuevos o
+                modificados respecto a lo ya indexado para el documento
+            job_store: Job store para reanudar desde la última etapa completada
+            use_ocr_cache: Si True, reutiliza resultados OCR por hash de contenido
+            telemetry: Telemetría por etapa (por defecto solo acumula, sin salida)
+            dedup: Detectar chunks casi duplicados (None = INGEST_DEDUP_ENABLED)
+            ocr_engine: "documentai", "pypdf" o "tesseract" (None = OCR_ENGINE
+                o, si no está, según use_simple_ocr)
+            route_pages: Capa de texto primero y OCR solo para las páginas
+                escaneadas (None = OCR_ROUTE_PAGES)
         """
         self.api_url = api_url
+        self.ingest_format = ingest_format
+        self.compression = compression
+        self.skip_unchanged = skip_unchanged
+        self.job_store = job_store
+        self.telemetry = telemetry or IngestTelemetry()
         self.settings = get_settings()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop = None
 
         # Servicios
-        self.ocr_service = create_ocr_service(
-            project_id=self.settings.google_cloud_project if not use_simple_ocr else None,
-            processor_id=self.settings.document_ai_processor_id if not use_simple_ocr else None,
-            use_simple=use_simple_ocr
+        engine = (
+            ocr_engine
+            or self.settings.ocr_engine
+            or ("pypdf" if use_simple_ocr else "documentai")
         )
+        self._ocr_config = (
+            self.settings.google_cloud_project if engine == "documentai" else None,
+            self.settings.document_ai_processor_id if engine == "documentai" else None,
+            engine,
+            use_ocr_cache,
+            route_pages
+        )
+        self.ocr_service = _build_ocr_service(*self._ocr_config)
 
         self.chunker = create_chunker(
             chunk_size=self.settings.chunk_size,
@@ -51,6 +100,18 @@ class IngestPipeline:
 
         self.embedding_service = get_embedding_service()
 
+        # Casi duplicados (fórmulas repetidas): MinHash/LSH tras el chunking
+        self.dedup_mode = self.settings.ingest_dedup_mode
+        self.dedup: Optional[NearDuplicateIndex] = None
+        if self.settings.ingest_dedup_enabled if dedup is None else dedup:
+            self.dedup = NearDuplicateIndex(
+                threshold=self.settings.ingest_dedup_threshold,
+                num_perm=self.settings.ingest_dedup_num_perm,
+                bands=self.settings.ingest_dedup_bands,
+                vector_cache_bytes=self.settings.ingest_dedup_vector_cache_mb * 1024 ** 2,
+                max_canonicals=self.settings.ingest_dedup_max_canonicals
+            )
+
     async def ingest_document(
         self,
         file_path: str,
@@ -78,135 +139,960 @@ class IngestPipeline:
         print(f"📄 Ingesta: {metadata.get('title', document_id)}")
         print(f"{'='*60}")
 
-        # 1. OCR
-        print("🔍 Paso 1: OCR...")
-        pages = self.ocr_service.process_document(file_path)
-        print(f"   ✓ {len(pages)} páginas procesadas")
+        job = {"file_path": file_path, "document_id": document_id, "metadata": metadata}
+        self.telemetry.reset()
+        await asyncio.to_thread(self._open_job, job)
+
+        try:
+            # 1. OCR (síncrono: fuera del event loop)
+            print("🔍 Paso 1: OCR...")
+            job["stage"] = "ocr"
+            if "ocr" in job["completed"]:
+                print("   ↺ Reanudado desde checkpoint")
+            else:
+                started_at = time.time()
+                job["pages"] = await asyncio.to_thread(self.ocr_service.process_document, file_path)
+                await self._checkpoint(job, "ocr", started_at)
+            self._check_ocr(job)
+            print(f"   ✓ {len(job['pages'])} páginas procesadas")
+            if job["ocr_routing"]:
+                routing = job["ocr_routing"]
+                print(
+                    f"   ↳ {routing['text_layer']} con capa de texto, "
+                    f"{routing['ocr']} por OCR"
+                    + (f", {routing['unknown']} de origen desconocido" if routing["unknown"] else "")
+                )
+            if job["low_confidence_pages"]:
+                print(f"   ⚠ {job['low_confidence_pages']} páginas con confianza baja")
+
+            # 2. Chunking
+            print("✂️  Paso 2: Chunking...")
+            job["stage"] = "chunking"
+            if "chunking" in job["completed"]:
+                print("   ↺ Reanudado desde checkpoint")
+            else:
+                started_at = time.time()
+                job["chunks"] = await asyncio.to_thread(self._chunk_job, job)
+                await self._checkpoint(job, "chunking", started_at)
+            print(f"   ✓ {len(job['chunks'])} chunks creados")
+            duplicates = sum(1 for c in job["chunks"] if c.get("duplicate_of"))
+            if duplicates:
+                print(f"   ≈ {duplicates} casi duplicados de chunks ya vistos")
+
+            # 3. Embeddings (solo chunks nuevos o modificados)
+            print("🧮 Paso 3: Generando embeddings...")
+            job["stage"] = "embeddings"
+            if "embeddings" in job["completed"]:
+                print("   ↺ Reanudado desde checkpoint")
+            else:
+                started_at = time.time()
+                await self._embed_job(job)
+                await self._checkpoint(job, "embeddings", started_at)
+            if job["existing_count"]:
+                print(
+                    f"   ↺ {len(job['chunks']) - len(job['new_chunks'])} sin cambios, "
+                    f"{len(job['new_chunks'])} nuevos/modificados, {job['stale_count']} obsoletos"
+                )
+            print(f"   ✓ {len(job['new_chunks'])} embeddings generados")
+            dedup = job.get("dedup")
+            if dedup and dedup["duplicates"]:
+                print(
+                    f"   ≈ {dedup['reused'] + dedup['skipped']} duplicados sin embeber "
+                    f"({dedup['tokens_saved']:,} tokens, {dedup['index_bytes_saved'] / 1e6:.2f} MB de índice ahorrados)"
+                )
+
+            # 4. Enviar a API para insertar en Vector DB
+            print("📤 Paso 4: Insertando en Vector DB...")
+            job["stage"] = "upload"
+            started_at = time.time()
+            await self._upload_job(job)
+            await self._checkpoint(job, "upload", started_at)
+            if job["new_chunks"]:
+                print(f"   ✓ {job['chunks_ingested']} chunks insertados")
+            else:
+                print("   ✓ Sin cambios, nada que insertar")
+            if job["stale_count"]:
+                print(f"   ✓ {job['chunks_removed']} chunks obsoletos eliminados")
+
+        except Exception as e:
+            self._fail_job(job, job["stage"], e)
+            raise
+
+        stats = self._job_stats(job)
+        self.telemetry.document(document_id, True)
+        self.telemetry.finish_batch()
+
+        print(f"\n✅ Ingesta completada")
+        print(f"   • Páginas: {stats['pages_processed']}")
+        print(f"   • Chunks: {stats['chunks_created']}")
+        print(f"   • Confianza OCR: {stats['avg_ocr_confidence']:.1%}")
+        print(f"{'='*60}\n")
+
+        return stats
+
+    # ============ ETAPAS ============
+    # Cada etapa recibe y completa un dict `job` con el estado del documento.
+    # Las usan tanto `ingest_document` (en serie) como `ingest_batch` (en pipeline).
+
+    def _open_job(self, job: Dict[str, Any]) -> None:
+        """
+        Registrar el job en el job store y cargar los checkpoints existentes
+
+        Deja en `job["completed"]` las etapas que no hace falta repetir. Un
+        documento ya ingerido por completo reutiliza OCR y chunks, y vuelve a
+        calcular el diff de re-ingesta contra el índice (barato si no cambió).
+        """
+        job["completed"] = set()
+        if self.job_store is None:
+            return
 
-        # Validar confianza mínima de OCR
-        low_confidence_pages = [
-            p for p in pages
+        document_id = job["document_id"]
+        extra = (
+            f"{self.chunker.chunk_size}:{self.chunker.chunk_overlap}:"
+            f"{self.settings.openai_embedding_model}"
+        )
+        # Documentos de GCS: el fichero local es temporal, la huella es la del blob
+        if "download" in job:
+            source_path = job["download"].gcs_uri
+            fingerprint = source_fingerprint(job["download"].version, extra=extra)
+        else:
+            source_path = job["file_path"]
+            fingerprint = file_fingerprint(source_path, extra=extra)
+        last_stage = self.job_store.start_job(
+            document_id, source_path, fingerprint, job["metadata"]
+        )
+        if last_stage is None:
+            return
+
+        if last_stage == STAGES[-1]:
+            last_stage = "chunking"
+        completed = STAGES[:STAGES.index(last_stage) + 1]
+
+        if "ocr" in completed:
+            job["pages"] = self.job_store.load_pages(document_id)
+        if "chunking" in completed:
+            job["chunks"] = self.job_store.load_chunks(document_id)
+        if "embeddings" in completed:
+            saved = self.job_store.load_embeddings(document_id)
+            by_id = {c["chunk_id"]: c for c in job["chunks"]}
+            new_chunks = [by_id[chunk_id] for chunk_id in saved["chunk_ids"]]
+            for chunk, vector in zip(new_chunks, saved["embeddings"]):
+                chunk["embedding"] = vector.tolist()
+            self._set_ocr_confidence(job, new_chunks)
+            job["new_chunks"] = new_chunks
+            job["current_ids"] = set(saved["current_ids"])
+            job["existing_count"] = saved["existing_count"]
+            job["stale_count"] = saved["stale_count"]
+            job["dedup"] = saved.get("dedup")
+
+        job["completed"] = set(completed)
+
+    async def _checkpoint(self, job: Dict[str, Any], stage: str, started_at: float) -> None:
+        """Registrar una etapa completada (telemetría) y persistir su resultado en el job store"""
+        job["completed"].add(stage)
+        items, volume = _stage_volume(job, stage)
+        self.telemetry.stage(job["document_id"], stage, time.time() - started_at, items, volume)
+        if self.job_store is None:
+            return
+
+        store = self.job_store
+        document_id = job["document_id"]
+        nbytes = 0
+
+        if stage == "ocr":
+            items = len(job["pages"])
+            nbytes = await asyncio.to_thread(store.save_pages, document_id, job["pages"])
+        elif stage == "chunking":
+            items = len(job["chunks"])
+            nbytes = await asyncio.to_thread(store.save_chunks, document_id, job["chunks"])
+        elif stage == "embeddings":
+            items = len(job["new_chunks"])
+            nbytes = await asyncio.to_thread(
+                store.save_embeddings,
+                document_id,
+                [c["chunk_id"] for c in job["new_chunks"]],
+                [c["embedding"] for c in job["new_chunks"]],
+                {
+                    "current_ids": sorted(job["current_ids"]),
+                    "existing_count": job["existing_count"],
+                    "stale_count": job["stale_count"],
+                    "dedup": job["dedup"],
+                }
+            )
+        else:
+            items = job["chunks_ingested"]
+            await asyncio.to_thread(store.discard_embeddings, document_id)
+
+        store.complete_stage(document_id, stage, started_at, items, nbytes)
+
+    def _fail_job(self, job: Dict[str, Any], stage: str, error: Exception) -> None:
+        """Registrar el fallo de un documento (los checkpoints se conservan)"""
+        self.telemetry.document(job["document_id"], False, stage=stage, error=str(error))
+        if self.job_store is not None:
+            self.job_store.fail_job(job["document_id"], stage, str(error))
+
+    def _check_ocr(self, job: Dict[str, Any]) -> None:
+        """Validar confianza mínima de OCR y contar páginas por origen"""
+        job["low_confidence_pages"] = sum(
+            1 for p in job["pages"]
             if p.get("confidence", 0) < self.settings.min_ocr_confidence
-        ]
-        if low_confidence_pages:
-            print(f"   ⚠ {len(low_confidence_pages)} páginas con confianza baja")
+        )
+        # Solo con enrutado por página (PageRouterOCR marca `source`); una
+        # página sin marca no se cuenta como OCR sino como origen desconocido
+        sources = Counter(p.get("source", "unknown") for p in job["pages"])
+        job["ocr_routing"] = (
+            {"text_layer": sources["text_layer"], "ocr": sources["ocr"], "unknown": sources["unknown"]}
+            if set(sources) - {"unknown"} else None
+        )
+        if job["ocr_routing"]:
+            self.telemetry.ocr_routing(job["document_id"], job["ocr_routing"])
 
-        # 2. Chunking
-        print("✂️  Paso 2: Chunking...")
+    def _chunk_job(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Chunking del documento y marcado de casi duplicados (síncrono, apto para un thread)"""
         chunks = self.chunker.chunk_document(
-            pages=pages,
-            document_id=document_id,
-            metadata=metadata
+            pages=job["pages"],
+            document_id=job["document_id"],
+            metadata=job["metadata"]
         )
-        print(f"   ✓ {len(chunks)} chunks creados")
+        if self.dedup is not None:
+            self.dedup.assign(chunks)
+        return chunks
+
+    async def _embed_job(self, job: Dict[str, Any]) -> None:
+        """Calcular qué chunks han cambiado y generar sus embeddings"""
+        chunks = job["chunks"]
+
+        # Modo "skip": los casi duplicados no se indexan (su canónico los
+        # representa), pero solo si el canónico es de este documento o ya
+        # consta como indexado; si no (otro documento del batch aún en vuelo
+        # o que falló), se indexan como en "reuse"
+        skipped = []
+        if self.dedup_mode == "skip" and self.dedup is not None:
+            own_ids = {c["chunk_id"] for c in chunks if not c.get("duplicate_of")}
+            skipped = [
+                c for c in chunks
+                if c.get("duplicate_of")
+                and (c["duplicate_of"] in own_ids or self.dedup.is_indexed(c["duplicate_of"]))
+            ]
+            skipped_ids = {c["chunk_id"] for c in skipped}
+            chunks = [c for c in chunks if c["chunk_id"] not in skipped_ids]
 
-        # 3. Embeddings
-        print("🧮 Paso 3: Generando embeddings...")
-        chunk_texts = [c["chunk_text"] for c in chunks]
-        embeddings = await self.embedding_service.embed_batch(chunk_texts)
-        print(f"   ✓ {len(embeddings)} embeddings generados")
+        # Re-ingesta: los IDs de chunk son deterministas, así que los ya
+        # indexados con el mismo contenido no se vuelven a embeber
+        existing_ids = set()
+        if self.skip_unchanged:
+            existing_ids = set(await self._fetch_document_chunk_ids(job["document_id"]))
+        current_ids = {c["chunk_id"] for c in chunks}
+        new_chunks = [c for c in chunks if c["chunk_id"] not in existing_ids]
+
+        # Modo "reuse": los casi duplicados toman el embedding de su canónico,
+        # si es de este mismo lote o ya se calculó en este proceso
+        pending_ids = {c["chunk_id"] for c in new_chunks if not c.get("duplicate_of")}
+        canonical_vectors: Dict[str, List[float]] = {}
+        to_embed, reused = [], []
+        for chunk in new_chunks:
+            canonical = chunk.get("duplicate_of")
+            if canonical and canonical not in pending_ids and self.dedup is not None:
+                vector = self.dedup.vector(canonical)
+                if vector is not None:
+                    canonical_vectors[canonical] = vector
+            if canonical and (canonical in pending_ids or canonical in canonical_vectors):
+                reused.append(chunk)
+            else:
+                to_embed.append(chunk)
+
+        embeddings = await self.embedding_service.embed_batch(
+            [c["chunk_text"] for c in to_embed]
+        )
 
         # Agregar embeddings a chunks
-        for chunk, embedding in zip(chunks, embeddings):
+        for chunk, embedding in zip(to_embed, embeddings):
             chunk["embedding"] = embedding
+            if self.dedup is not None and not chunk.get("duplicate_of"):
+                self.dedup.remember_vector(chunk["chunk_id"], embedding)
+                canonical_vectors[chunk["chunk_id"]] = embedding
+        for chunk in reused:
+            chunk["embedding"] = canonical_vectors[chunk["duplicate_of"]]
 
-        # Agregar confianza OCR por página
-        page_confidences = {p["page_number"]: p["confidence"] for p in pages}
+        self._set_ocr_confidence(job, new_chunks)
+
+        job["new_chunks"] = new_chunks
+        job["current_ids"] = current_ids
+        job["existing_count"] = len(existing_ids)
+        job["stale_count"] = len(existing_ids - current_ids)
+
+        # Ahorro: tokens no embebidos y, en modo skip, filas que no ocupan índice
+        dim = len(embeddings[0]) if embeddings else len(next(iter(canonical_vectors.values()), []))
+        job["dedup"] = {
+            "duplicates": len(skipped) + sum(1 for c in chunks if c.get("duplicate_of")),
+            "reused": len(reused),
+            "skipped": len(skipped),
+            "tokens_saved": sum(c["token_count"] for c in reused + skipped),
+            "index_bytes_saved": sum(
+                dim * 4 + len(c["chunk_text"].encode("utf-8")) + 256 for c in skipped
+            )
+        }
+        self.telemetry.dedup(job["document_id"], job["dedup"])
+
+    def _set_ocr_confidence(self, job: Dict[str, Any], chunks: List[Dict[str, Any]]) -> None:
+        """Agregar confianza OCR por página"""
+        page_confidences = {p["page_number"]: p["confidence"] for p in job["pages"]}
         for chunk in chunks:
             chunk["ocr_confidence"] = page_confidences.get(chunk["page_number"], 0.0)
 
-        # 4. Enviar a API para insertar en Vector DB
-        print("📤 Paso 4: Insertando en Vector DB...")
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.api_url}/ingest",
-                json={
-                    "document_id": document_id,
-                    "chunks": chunks
-                }
-            )
+    async def _upload_job(self, job: Dict[str, Any]) -> None:
+        """Insertar chunks nuevos y retirar los obsoletos"""
+        job["chunks_ingested"] = 0
+        job["chunks_removed"] = 0
+        job["bytes_sent"] = 0
 
-            if response.status_code != 200:
-                raise Exception(f"API error: {response.text}")
+        if job["new_chunks"]:
+            result = await self._upload_chunks(job["document_id"], job["new_chunks"])
+            job["chunks_ingested"] = result["chunks_ingested"]
+            job["bytes_sent"] = result["bytes_sent"]
 
-            result = response.json()
-            print(f"   ✓ {result['chunks_ingested']} chunks insertados")
+        # Reemplazo de documento: retirar chunks de la versión anterior
+        if job["stale_count"]:
+            job["chunks_removed"] = await self._prune_document(
+                job["document_id"], list(job["current_ids"])
+            )
+
+        # Los canónicos del documento ya están en el índice
+        if self.dedup is not None:
+            self.dedup.mark_indexed(
+                c["chunk_id"] for c in job["chunks"] if not c.get("duplicate_of")
+            )
 
-        # Estadísticas
-        stats = {
-            "document_id": document_id,
+    def _job_stats(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Estadísticas finales de un documento"""
+        pages = job["pages"]
+        chunks = job["chunks"]
+        dedup = job.get("dedup") or {}
+        routing = job["ocr_routing"] or {"unknown": len(pages)}
+        return {
+            "document_id": job["document_id"],
             "success": True,
             "pages_processed": len(pages),
             "chunks_created": len(chunks),
+            "chunks_embedded": len(job["new_chunks"]),
+            "chunks_unchanged": len(chunks) - len(job["new_chunks"]) - dedup.get("skipped", 0),
+            "chunks_removed": job["chunks_removed"],
             "avg_ocr_confidence": sum(p["confidence"] for p in pages) / len(pages),
-            "low_confidence_pages": len(low_confidence_pages),
-            "total_tokens": sum(c["token_count"] for c in chunks)
+            "low_confidence_pages": job["low_confidence_pages"],
+            "pages_text_layer": routing.get("text_layer", 0),
+            "pages_ocr": routing.get("ocr", 0),
+            "pages_source_unknown": routing.get("unknown", 0),
+            "total_tokens": sum(c["token_count"] for c in chunks),
+            "chunks_duplicate": dedup.get("duplicates", 0),
+            "embedding_tokens_saved": dedup.get("tokens_saved", 0),
+            "index_bytes_saved": dedup.get("index_bytes_saved", 0)
         }
 
-        print(f"\n✅ Ingesta completada")
-        print(f"   • Páginas: {stats['pages_processed']}")
-        print(f"   • Chunks: {stats['chunks_created']}")
-        print(f"   • Confianza OCR: {stats['avg_ocr_confidence']:.1%}")
-        print(f"{'='*60}\n")
+    # ============ HTTP ============
 
-        return stats
+    def _client(self) -> httpx.AsyncClient:
+        """
+        Cliente HTTP compartido por todo el pipeline
+
+        Un único pool de conexiones keep-alive para lotes de upload, diffs y
+        podas (se recrea si cambia el event loop).
+        """
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            connections = (
+                self.settings.ingest_upload_concurrency
+                * self.settings.ingest_upload_batch_concurrency + 2
+            )
+            self._http = httpx.AsyncClient(
+                timeout=self.settings.ingest_upload_timeout,
+                limits=httpx.Limits(
+                    max_connections=connections,
+                    max_keepalive_connections=connections
+                )
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        """Cerrar el pool de conexiones HTTP"""
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def _upload_chunks(
+        self,
+        document_id: str,
+        chunks: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Enviar chunks con embeddings al endpoint de ingesta del API
+
+        Los chunks se reparten en lotes acotados por tamaño, que se comprimen
+        y se envían en paralelo por el pool compartido. Cada lote se reintenta
+        por separado: el upsert por `chunk_id` determinista es idempotente.
+        Con job store, los lotes ya aceptados de un intento anterior no se
+        reenvían.
+        """
+        batches = self._split_upload_batches(chunks)
+        done = set()
+        if self.job_store is not None:
+            done = await asyncio.to_thread(self.job_store.completed_upload_batches, document_id)
+
+        semaphore = asyncio.Semaphore(self.settings.ingest_upload_batch_concurrency)
+        started = time.perf_counter()
+
+        async def send(idx: int, batch: List[Dict[str, Any]]) -> Dict[str, int]:
+            batch_key = _upload_batch_key(batch)
+            if batch_key in done:
+                print(f"   ↺ Lote {idx + 1}/{len(batches)} ya subido ({len(batch)} chunks)")
+                return {"chunks_ingested": len(batch), "bytes": 0, "skipped": 1}
+
+            async with semaphore:
+                batch_started = time.perf_counter()
+                url, params, body, headers, raw_bytes = await asyncio.to_thread(
+                    self._encode_upload_batch, document_id, batch
+                )
+                result = await self._post_upload_batch(url, params, body, headers)
+                elapsed = time.perf_counter() - batch_started
+
+            if self.job_store is not None:
+                await asyncio.to_thread(
+                    self.job_store.complete_upload_batch,
+                    document_id, batch_key, len(batch), len(body)
+                )
+            print(
+                f"   ⬆️  Lote {idx + 1}/{len(batches)}: {len(batch)} chunks, "
+                f"{raw_bytes / 1e6:.2f} → {len(body) / 1e6:.2f} MB en {elapsed:.2f}s "
+                f"({len(body) / 1e6 / elapsed if elapsed else 0.0:.1f} MB/s)"
+            )
+            return {"chunks_ingested": result["chunks_ingested"], "bytes": len(body), "skipped": 0}
+
+        # Esperar a todos los lotes antes de propagar un error: los que
+        # terminan quedan registrados y no se reenvían al reanudar
+        results = await asyncio.gather(
+            *[send(idx, batch) for idx, batch in enumerate(batches)],
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - started
+        sent_bytes = sum(r["bytes"] for r in results)
+        if len(batches) > 1:
+            print(
+                f"   ⏱️  {len(batches)} lotes en {elapsed:.2f}s "
+                f"({len(chunks) / elapsed if elapsed else 0.0:.0f} chunks/s, "
+                f"{sent_bytes / 1e6 / elapsed if elapsed else 0.0:.1f} MB/s)"
+            )
+
+        return {
+            "chunks_ingested": sum(r["chunks_ingested"] for r in results),
+            "batches": len(batches),
+            "batches_skipped": sum(r["skipped"] for r in results),
+            "bytes_sent": sent_bytes
+        }
+
+    def _split_upload_batches(self, chunks: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Repartir chunks en lotes de ~`ingest_upload_batch_bytes` sin comprimir
+
+        El reparto es determinista (mismo orden, mismos lotes), así que las
+        claves de lote de un intento anterior siguen siendo válidas.
+        """
+        limit = self.settings.ingest_upload_batch_bytes
+        # Bytes por float: 4 en binario, ~20 como texto JSON
+        float_bytes = 20 if self.ingest_format == "json" else 4
+
+        batches: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_bytes = 0
+        for chunk in chunks:
+            size = (
+                len(chunk["chunk_text"].encode("utf-8"))
+                + len(chunk["embedding"]) * float_bytes
+                + 256  # metadata
+            )
+            if current and current_bytes + size > limit:
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(chunk)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def _encode_upload_batch(
+        self,
+        document_id: str,
+        batch: List[Dict[str, Any]]
+    ) -> tuple:
+        """Serializar (y comprimir) un lote. Devuelve url, params, body, headers y bytes sin comprimir"""
+        if self.ingest_format == "json":
+            body = json.dumps(
+                {"document_id": document_id, "chunks": batch},
+                ensure_ascii=False
+            ).encode("utf-8")
+            return f"{self.api_url}/ingest", None, body, {"Content-Type": "application/json"}, len(body)
+
+        vectors = np.asarray([c["embedding"] for c in batch], dtype=np.float32)
+        raw = ingest_format.encode(batch, vectors)
+        body = ingest_format.compress(raw, self.compression)
+        headers = {"Content-Type": ingest_format.CONTENT_TYPE}
+        if self.compression:
+            headers["Content-Encoding"] = self.compression
+        return f"{self.api_url}/ingest/stream", {"document_id": document_id}, body, headers, len(raw)
+
+    async def _post_upload_batch(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]],
+        body: bytes,
+        headers: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """POST de un lote con reintentos ante errores transitorios (red, 429, 5xx)"""
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.settings.ingest_upload_retries),
+            wait=wait_exponential(multiplier=1, min=1, max=20),
+            retry=retry_if_exception(_is_retryable_upload_error),
+            reraise=True
+        ):
+            with attempt:
+                response = await self._client().post(
+                    url, params=params, content=body, headers=headers
+                )
+                if response.status_code != 200:
+                    raise UploadError(response.status_code, response.text)
+                return response.json()
+
+    async def _fetch_document_chunk_ids(self, document_id: str) -> List[str]:
+        """Chunks ya indexados del documento según el API"""
+        response = await self._client().get(f"{self.api_url}/documents/{document_id}/chunks")
+
+        if response.status_code != 200:
+            raise Exception(f"API error: {response.text}")
+
+        return response.json()["chunk_ids"]
+
+    async def _prune_document(self, document_id: str, keep_chunk_ids: List[str]) -> int:
+        """Eliminar del índice los chunks del documento que ya no existen"""
+        response = await self._client().post(
+            f"{self.api_url}/documents/{document_id}/prune",
+            json={"keep_chunk_ids": keep_chunk_ids},
+            timeout=120.0
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"API error: {response.text}")
+
+        return response.json()["chunks_deleted"]
+
+    def create_gcs_source(self, local_root: Optional[str] = None) -> GCSDocumentSource:
+        """
+        Crear la fuente de documentos GCS del pipeline
+
+        Args:
+            local_root: Directorio que hace de GCS (<root>/<bucket>/<path>);
+                None para usar el bucket real
+        """
+        client = LocalFilesystemStorageClient(local_root) if local_root else None
+        return GCSDocumentSource(
+            storage_client=client,
+            project_id=self.settings.google_cloud_project,
+            prefetch=self.settings.ingest_gcs_prefetch,
+            spool_dir=self.settings.ingest_spool_dir
+        )
+
+    async def ingest_gcs_prefix(
+        self,
+        prefix_uri: str,
+        metadata: Dict[str, Any],
+        source: Optional[GCSDocumentSource] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Ingestar todos los PDFs bajo un prefijo de GCS
+
+        Cada blob se descarga en streaming a un fichero temporal mientras los
+        anteriores avanzan por el pipeline de `ingest_batch`, y se borra en
+        cuanto termina su OCR.
+
+        Args:
+            prefix_uri: gs://bucket/prefijo/
+            metadata: Metadata común (el título por defecto es el nombre del fichero)
+            source: Fuente GCS (por defecto `create_gcs_source()`)
+
+        Returns:
+            Lista de resultados (en orden de listado)
+        """
+        source = source or self.create_gcs_source()
+        uris = await asyncio.to_thread(source.list_uris, prefix_uri)
+        print(f"\n☁️  {len(uris)} documentos en {prefix_uri}")
+
+        documents = [
+            {
+                "gcs_uri": uri,
+                "document_id": document_id_for_uri(uri, prefix_uri),
+                "metadata": {"title": Path(uri).stem, **metadata, "source_uri": uri}
+            }
+            for uri in uris
+        ]
+        return await self.ingest_batch(documents, source=source)
 
     async def ingest_batch(
         self,
-        documents: List[Dict[str, Any]]
+        documents: List[Dict[str, Any]],
+        source: Optional[GCSDocumentSource] = None
     ) -> List[Dict[str, Any]]:
         """
         Ingestar múltiples documentos en batch
 
+        Los documentos avanzan por un pipeline de etapas concurrentes
+        (OCR en pool de procesos → chunking en threads → embeddings async →
+        upload) unidas por colas acotadas que dan backpressure. Mientras un
+        documento se embebe, el siguiente ya está en OCR. Un error en un
+        documento no afecta al resto.
+
         Args:
             documents: Lista de documentos:
                 [
                     {
-                        "file_path": "path/to/doc.pdf",
+                        "file_path": "path/to/doc.pdf",  # o "gcs_uri": "gs://..."
                         "document_id": "doc_001",
                         "metadata": {...}
                     },
                     ...
                 ]
+            source: Fuente para los documentos con `gcs_uri` (descarga con prefetch)
 
         Returns:
-            Lista de resultados
+            Lista de resultados (en el mismo orden que `documents`)
         """
         print(f"\n🚀 Ingesta batch: {len(documents)} documentos\n")
+        self.telemetry.reset()
 
-        results = []
-        for idx, doc in enumerate(documents, 1):
-            print(f"[{idx}/{len(documents)}] ", end="")
+        total = len(documents)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+        queue_size = self.settings.ingest_queue_size
 
-            try:
-                result = await self.ingest_document(
-                    file_path=doc["file_path"],
-                    document_id=doc["document_id"],
-                    metadata=doc["metadata"]
-                )
-                results.append(result)
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                results.append({
+        ocr_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        upload_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        ocr_workers = self.settings.ingest_ocr_workers
+        chunk_workers = self.settings.ingest_chunk_workers
+        embed_workers = self.settings.ingest_embed_concurrency
+        upload_workers = self.settings.ingest_upload_concurrency
+
+        loop = asyncio.get_running_loop()
+        ocr_executor = ProcessPoolExecutor(
+            max_workers=ocr_workers,
+            initializer=_init_ocr_worker,
+            initargs=self._ocr_config
+        )
+        chunk_executor = ThreadPoolExecutor(
+            max_workers=chunk_workers,
+            thread_name_prefix="ingest-chunk"
+        )
+
+        def fail(job: Dict[str, Any], stage: str, error: Exception) -> None:
+            print(f"[{job['index'] + 1}/{total}] ❌ {job['document_id']} ({stage}): {error}")
+            self._fail_job(job, stage, error)
+            results[job["index"]] = {
+                "document_id": job["document_id"],
+                "success": False,
+                "stage": stage,
+                "error": str(error)
+            }
+
+        async def ocr_stage() -> None:
+            while True:
+                job = await ocr_queue.get()
+                if job is None:
+                    return
+                try:
+                    await asyncio.to_thread(self._open_job, job)
+                    if "ocr" not in job["completed"]:
+                        started_at = time.time()
+                        job["pages"] = await loop.run_in_executor(
+                            ocr_executor, _run_ocr, job["file_path"]
+                        )
+                        await self._checkpoint(job, "ocr", started_at)
+                    self._check_ocr(job)
+                except Exception as e:
+                    fail(job, "ocr", e)
+                    continue
+                finally:
+                    # El fichero descargado solo hace falta para el OCR
+                    if "download" in job:
+                        await asyncio.to_thread(job.pop("download").cleanup)
+                await chunk_queue.put(job)
+
+        async def chunk_stage() -> None:
+            while True:
+                job = await chunk_queue.get()
+                if job is None:
+                    return
+                try:
+                    if "chunking" not in job["completed"]:
+                        started_at = time.time()
+                        job["chunks"] = await loop.run_in_executor(
+                            chunk_executor, self._chunk_job, job
+                        )
+                        await self._checkpoint(job, "chunking", started_at)
+                except Exception as e:
+                    fail(job, "chunking", e)
+                    continue
+                await embed_queue.put(job)
+
+        async def embed_stage() -> None:
+            while True:
+                job = await embed_queue.get()
+                if job is None:
+                    return
+                try:
+                    if "embeddings" not in job["completed"]:
+                        started_at = time.time()
+                        await self._embed_job(job)
+                        await self._checkpoint(job, "embeddings", started_at)
+                except Exception as e:
+                    fail(job, "embeddings", e)
+                    continue
+                await upload_queue.put(job)
+
+        async def upload_stage() -> None:
+            while True:
+                job = await upload_queue.get()
+                if job is None:
+                    return
+                try:
+                    started_at = time.time()
+                    await self._upload_job(job)
+                    await self._checkpoint(job, "upload", started_at)
+                    results[job["index"]] = self._job_stats(job)
+                    self.telemetry.document(job["document_id"], True)
+                    print(
+                        f"[{job['index'] + 1}/{total}] ✅ {job['document_id']}: "
+                        f"{len(job['pages'])} páginas, {len(job['chunks'])} chunks, "
+                        f"{len(job['new_chunks'])} embebidos"
+                    )
+                except Exception as e:
+                    fail(job, "upload", e)
+
+        async def run_stage(
+            worker,
+            count: int,
+            next_queue: Optional[asyncio.Queue] = None,
+            next_count: int = 0
+        ) -> None:
+            # Al terminar todos los workers de una etapa, propagar el fin a la siguiente
+            await asyncio.gather(*[worker() for _ in range(count)])
+            for _ in range(next_count):
+                await next_queue.put(None)
+
+        gcs_uris = [doc["gcs_uri"] for doc in documents if "gcs_uri" in doc]
+        if gcs_uris and source is None:
+            source = self.create_gcs_source()
+        downloads = source.iter_downloads(gcs_uris, return_exceptions=True) if gcs_uris else None
+
+        async def feed() -> None:
+            for idx, doc in enumerate(documents):
+                job = {
+                    "index": idx,
+                    "file_path": doc.get("file_path"),
                     "document_id": doc["document_id"],
-                    "success": False,
-                    "error": str(e)
-                })
+                    "metadata": doc["metadata"]
+                }
+                if "gcs_uri" in doc:
+                    # Los siguientes blobs ya se están descargando en segundo plano
+                    download = await asyncio.to_thread(next, downloads)
+                    if isinstance(download, Exception):
+                        fail(job, "download", download)
+                        continue
+                    job["download"] = download
+                    job["file_path"] = download.path
+                await ocr_queue.put(job)
+            for _ in range(ocr_workers):
+                await ocr_queue.put(None)
+
+        # Profundidad de colas y memoria mientras dura el batch
+        sampler = asyncio.create_task(self.telemetry.sample_loop({
+            "ocr": ocr_queue,
+            "chunking": chunk_queue,
+            "embeddings": embed_queue,
+            "upload": upload_queue
+        }))
+
+        try:
+            await asyncio.gather(
+                feed(),
+                run_stage(ocr_stage, ocr_workers, chunk_queue, chunk_workers),
+                run_stage(chunk_stage, chunk_workers, embed_queue, embed_workers),
+                run_stage(embed_stage, embed_workers, upload_queue, upload_workers),
+                run_stage(upload_stage, upload_workers),
+            )
+        finally:
+            sampler.cancel()
+            ocr_executor.shutdown(wait=False, cancel_futures=True)
+            chunk_executor.shutdown(wait=False, cancel_futures=True)
+            if downloads is not None:
+                try:
+                    downloads.close()  # Borra las descargas adelantadas no consumidas
+                except ValueError:
+                    pass  # feed() cancelado mientras esperaba una descarga
 
         # Resumen
-        successful = sum(1 for r in results if r.get("success"))
+        successful = sum(1 for r in results if r and r.get("success"))
         print(f"\n📊 RESUMEN BATCH")
         print(f"{'='*60}")
         print(f"Total documentos: {len(documents)}")
         print(f"Exitosos: {successful}")
         print(f"Fallidos: {len(documents) - successful}")
+        summary = self.telemetry.finish_batch()
+        for stage, stats in summary["stages"].items():
+            print(
+                f"  {stage:<11} {stats['busy_seconds']:>8.2f}s  {stats['items_per_sec']:>8.1f} items/s  "
+                f"{stats['bytes_per_sec'] / 1e6:>6.2f} MB/s  cola máx {summary['queue_max'].get(stage, 0)}"
+            )
+        print(f"  RSS máx {summary['rss_max_bytes'] / 1e6:.0f} MB")
+        routing = summary["ocr_routing"]
+        if routing["text_layer"] + routing["ocr"]:
+            print(
+                f"  Enrutado OCR: {routing['text_layer']} páginas con capa de texto, "
+                f"{routing['ocr']} por OCR ({routing['ocr_saved_ratio']:.0%} menos OCR)"
+                + (f", {routing['unknown']} de origen desconocido" if routing["unknown"] else "")
+            )
+        dedup = summary["dedup"]
+        if dedup["duplicates"]:
+            print(
+                f"  Casi duplicados: {dedup['duplicates']} · {dedup['tokens_saved']:,} tokens de embedding "
+                f"y {dedup['index_bytes_saved'] / 1e6:.2f} MB de índice ahorrados"
+            )
         print(f"{'='*60}\n")
 
         return results
 
 
+def _stage_volume(job: Dict[str, Any], stage: str) -> tuple:
+    """Items y bytes que produjo una etapa (para la telemetría)"""
+    if stage == "ocr":
+        return len(job["pages"]), sum(len(p["text"].encode("utf-8")) for p in job["pages"])
+    if stage == "chunking":
+        return len(job["chunks"]), sum(len(c["chunk_text"].encode("utf-8")) for c in job["chunks"])
+    if stage == "embeddings":
+        return len(job["new_chunks"]), sum(len(c["embedding"]) * 4 for c in job["new_chunks"])
+    return job["chunks_ingested"], job.get("bytes_sent", 0)
+
+
+# ============ UPLOAD POR LOTES ============
+
+class UploadError(Exception):
+    """Respuesta de error del API a un lote de upload"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"API error {status_code}: {detail}")
+        self.status_code = status_code
+
+
+def _is_retryable_upload_error(error: BaseException) -> bool:
+    """Errores de red, timeouts, 429 y 5xx se reintentan; el resto no"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, UploadError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _upload_batch_key(batch: List[Dict[str, Any]]) -> str:
+    """Clave de un lote: hash de sus chunk_ids (que ya incluyen el hash del texto)"""
+    digest = hashlib.sha256()
+    for chunk in batch:
+        digest.update(chunk["chunk_id"].encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+# ============ OCR EN POOL DE PROCESOS ============
+
+_worker_ocr_service = None
+
+
+def _build_ocr_service(
+    project_id: Optional[str],
+    processor_id: Optional[str],
+    engine: str,
+    use_cache: bool,
+    route_pages: Optional[bool] = None,
+    max_workers: Optional[int] = None
+):
+    """Crear el servicio de OCR del pipeline (con caché según configuración)"""
+    settings = get_settings()
+    cache = None
+    if use_cache:
+        cache = create_ocr_cache(
+            cache_dir=settings.ocr_cache_dir,
+            gcs_bucket=settings.ocr_cache_gcs_bucket,
+            max_bytes=settings.ocr_cache_max_bytes,
+            project_id=settings.google_cloud_project
+        )
+    return create_ocr_service(
+        project_id=project_id,
+        processor_id=processor_id,
+        max_workers=max_workers,
+        cache=cache,
+        engine=engine,
+        route_pages=route_pages
+    )
+
+
+def _init_ocr_worker(
+    project_id: Optional[str],
+    processor_id: Optional[str],
+    engine: str,
+    use_cache: bool,
+    route_pages: Optional[bool]
+) -> None:
+    """Inicializador de cada proceso del pool: crea su propio servicio de OCR"""
+    global _worker_ocr_service
+    load_dotenv()
+    # El pool ya paraleliza entre documentos: extracción en serie dentro de cada proceso
+    _worker_ocr_service = _build_ocr_service(
+        project_id, processor_id, engine, use_cache, route_pages, max_workers=1
+    )
+
+
+def _run_ocr(file_path: str) -> List[Dict[str, Any]]:
+    """OCR de un documento dentro de un proceso del pool"""
+    return _worker_ocr_service.process_document(file_path)
+
+
 # ============ CLI ============
 
+def print_job_status(job_store: JobStore) -> None:
+    """Imprimir estado de los jobs y throughput agregado por etapa"""
+    jobs = job_store.status()
+    print(f"\n📋 JOBS DE INGESTA ({len(jobs)})")
+    print(f"{'='*60}")
+    icons = {"done": "✅", "running": "⏳", "failed": "❌"}
+    for job in jobs:
+        line = f"{icons.get(job['status'], '•')} {job['document_id']:<24} etapa: {job['stage'] or '-'}"
+        if job["error"]:
+            line += f"  ({job['error']})"
+        print(line)
+
+    print(f"\n⏱️  THROUGHPUT POR ETAPA")
+    print(f"{'='*60}")
+    throughput = job_store.throughput()
+    for stage in STAGES:
+        stats = throughput.get(stage)
+        if not stats:
+            continue
+        print(
+            f"{stage:<11} {stats['runs']:>4} docs  {stats['items']:>8} items  "
+            f"{stats['items_per_sec']:>8.1f} items/s  {stats['bytes_per_sec'] / 1e6:>6.2f} MB/s"
+        )
+    print(f"{'='*60}\n")
+
+
 async def main():
     """CLI para ingest"""
     import argparse
@@ -218,9 +1104,89 @@ async def main():
     parser.add_argument("--collection", type=str, default="general", help="Colección")
     parser.add_argument("--api-url", type=str, default="http://localhost:8000", help="URL del API")
     parser.add_argument("--simple-ocr", action="store_true", help="Usar PyPDF en lugar de Document AI")
+    parser.add_argument("--ocr-engine", choices=OCR_ENGINES, default=None, help="Motor de OCR (tiene prioridad sobre --simple-ocr)")
+    parser.add_argument("--no-page-routing", action="store_true", help="OCR de todas las páginas aunque tengan capa de texto")
+    parser.add_argument("--json-ingest", action="store_true", help="Enviar chunks como JSON a /ingest (formato antiguo)")
+    parser.add_argument("--zstd", action="store_true", help="Comprimir el stream binario con zstd (por defecto gzip)")
+    parser.add_argument("--no-compress", action="store_true", help="Enviar el stream binario sin comprimir")
+    parser.add_argument("--force", action="store_true", help="Re-embeber todos los chunks aunque no hayan cambiado")
+    parser.add_argument("--job-store", type=str, default=None, help="Directorio del job store (checkpoints por etapa)")
+    parser.add_argument("--no-resume", action="store_true", help="No usar job store ni reanudar checkpoints")
+    parser.add_argument("--status", action="store_true", help="Mostrar estado de jobs y throughput por etapa")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="No reutilizar resultados OCR cacheados")
+    parser.add_argument("--gcs-prefix", type=str, default=None, help="Ingestar todos los PDFs bajo gs://bucket/prefijo/")
+    parser.add_argument("--local-gcs-root", type=str, default=None, help="Directorio local que hace de GCS (<root>/<bucket>/<path>)")
+    parser.add_argument("--no-dedup", action="store_true", help="No detectar chunks casi duplicados")
+    parser.add_argument("--telemetry", type=str, default=None, help="Fichero JSON lines de telemetría por etapa ('-' = stdout)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Exponer métricas Prometheus en este puerto")
+    parser.add_argument("--profile", type=str, default=None, help="Perfilar por muestreo y escribir pilas folded (flamegraph)")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="Segundos entre muestras del profiler")
 
     args = parser.parse_args()
 
+    settings = get_settings()
+    telemetry = IngestTelemetry(
+        path=args.telemetry or settings.ingest_telemetry_path,
+        prometheus_port=args.metrics_port or settings.ingest_metrics_port,
+        sample_interval=settings.ingest_telemetry_sample_interval
+    )
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(interval=args.profile_interval)
+        profiler.start()
+
+    try:
+        await run_cli(args, parser, telemetry)
+    finally:
+        telemetry.close()
+        if profiler is not None:
+            profiler.stop()
+            profiler.write_folded(args.profile)
+            print(f"\n🔥 Perfil: {profiler.total} muestras → {args.profile}")
+            print("   (flamegraph.pl o https://www.speedscope.app)")
+            for function, count in profiler.top_functions(10):
+                print(f"   {count / max(1, profiler.total):>6.1%}  {function}")
+
+
+async def run_cli(args, parser, telemetry: IngestTelemetry) -> None:
+    """Ejecutar el comando pedido en la CLI"""
+    job_store_dir = args.job_store or get_settings().ingest_job_store_dir
+
+    if args.status:
+        print_job_status(JobStore(job_store_dir))
+        return
+
+    job_store = None if args.no_resume else JobStore(job_store_dir)
+
+    if args.gcs_prefix:
+        pipeline = IngestPipeline(
+            api_url=args.api_url,
+            use_simple_ocr=args.simple_ocr,
+            ingest_format="json" if args.json_ingest else "binary",
+            compression=None if args.no_compress else ("zstd" if args.zstd else "gzip"),
+            skip_unchanged=not args.force,
+            job_store=job_store,
+            use_ocr_cache=not args.no_ocr_cache,
+            telemetry=telemetry,
+            dedup=False if args.no_dedup else None,
+            ocr_engine=args.ocr_engine,
+            route_pages=False if args.no_page_routing else None
+        )
+        metadata = {"collection": args.collection, "language": "es"}
+        if args.title:
+            metadata["title"] = args.title
+        try:
+            results = await pipeline.ingest_gcs_prefix(
+                args.gcs_prefix,
+                metadata,
+                source=pipeline.create_gcs_source(args.local_gcs_root)
+            )
+        finally:
+            await pipeline.aclose()
+        if not all(r and r.get("success") for r in results):
+            sys.exit(1)
+        return
+
     if not args.file or not args.doc_id or not args.title:
         print("❌ Error: Debes proporcionar --file, --doc-id y --title")
         parser.print_help()
@@ -234,7 +1200,16 @@ async def main():
     # Crear pipeline
     pipeline = IngestPipeline(
         api_url=args.api_url,
-        use_simple_ocr=args.simple_ocr
+        use_simple_ocr=args.simple_ocr,
+        ingest_format="json" if args.json_ingest else "binary",
+        compression=None if args.no_compress else ("zstd" if args.zstd else "gzip"),
+        skip_unchanged=not args.force,
+        job_store=job_store,
+        use_ocr_cache=not args.no_ocr_cache,
+        telemetry=telemetry,
+        dedup=False if args.no_dedup else None,
+        ocr_engine=args.ocr_engine,
+        route_pages=False if args.no_page_routing else None
     )
 
     # Metadata
@@ -261,6 +1236,8 @@ async def main():
     except Exception as e:
         print(f"❌ Error fatal: {e}")
         sys.exit(1)
+    finally:
+        await pipeline.aclose()
 
 
 if __name__ == "__main__":
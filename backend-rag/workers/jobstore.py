@@ -0,0 +1,316 @@
+"""
+Job store local (SQLite) para ingesta reanudable
+
+Registra el progreso de cada documento por etapa y guarda los artefactos
+intermedios en disco para no repetir OCR ni embeddings tras un fallo:
+
+    <root>/jobs.sqlite                     estado de jobs y etapas
+    <root>/artifacts/<doc>/pages.jsonl.gz  páginas OCR
+    <root>/artifacts/<doc>/chunks.jsonl.gz chunks (sin embeddings)
+    <root>/artifacts/<doc>/embeddings.npy  matriz float32 de chunks nuevos
+    <root>/artifacts/<doc>/embeddings.json IDs de esos chunks + plan de re-ingesta
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# Etapas en orden de ejecución
+STAGES = ["ocr", "chunking", "embeddings", "upload"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    document_id TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stage_runs (
+    document_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    items INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (document_id, stage)
+);
+CREATE TABLE IF NOT EXISTS upload_batches (
+    document_id TEXT NOT NULL,
+    batch_key TEXT NOT NULL,
+    items INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (document_id, batch_key)
+);
+"""
+
+
+def file_fingerprint(file_path: str, extra: str = "") -> str:
+    """Huella barata del fichero (tamaño + mtime) y de la configuración"""
+    stat = os.stat(file_path)
+    key = f"{stat.st_size}:{stat.st_mtime_ns}:{extra}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def source_fingerprint(version: str, extra: str = "") -> str:
+    """Huella de un documento remoto (URI + generación del blob) y de la configuración"""
+    key = f"{version}:{extra}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class JobStore:
+    """Persistencia de jobs de ingesta y sus checkpoints por etapa"""
+
+    def __init__(self, root: str = ".ingest-jobs"):
+        """
+        Args:
+            root: Directorio raíz del job store
+        """
+        self.root = Path(root)
+        self.artifacts_dir = self.root / "artifacts"
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.root / "jobs.sqlite",
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _doc_dir(self, document_id: str) -> Path:
+        safe = hashlib.sha1(document_id.encode("utf-8")).hexdigest()[:12]
+        return self.artifacts_dir / safe
+
+    # ============ JOBS ============
+
+    def start_job(
+        self,
+        document_id: str,
+        file_path: str,
+        fingerprint: str,
+        metadata: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Registrar (o retomar) el job de un documento
+
+        Si el fichero o la configuración han cambiado desde el último
+        intento, se descartan los checkpoints y se empieza de cero.
+
+        Returns:
+            Última etapa completada (None si no hay nada que reanudar)
+        """
+        now = time.time()
+        rows = self._execute(
+            "SELECT fingerprint, stage FROM jobs WHERE document_id = ?",
+            (document_id,)
+        )
+
+        if rows and rows[0]["fingerprint"] == fingerprint:
+            self._execute(
+                "UPDATE jobs SET status = 'running', error = NULL, updated_at = ? "
+                "WHERE document_id = ?",
+                (now, document_id)
+            )
+            return rows[0]["stage"]
+
+        self.reset_job(document_id)
+        self._execute(
+            "INSERT INTO jobs (document_id, file_path, fingerprint, metadata, status, "
+            "stage, error, created_at, updated_at) VALUES (?, ?, ?, ?, 'running', NULL, NULL, ?, ?)",
+            (document_id, file_path, fingerprint, json.dumps(metadata, ensure_ascii=False), now, now)
+        )
+        return None
+
+    def reset_job(self, document_id: str) -> None:
+        """Eliminar job, métricas y artefactos de un documento"""
+        self._execute("DELETE FROM jobs WHERE document_id = ?", (document_id,))
+        self._execute("DELETE FROM stage_runs WHERE document_id = ?", (document_id,))
+        self._execute("DELETE FROM upload_batches WHERE document_id = ?", (document_id,))
+        shutil.rmtree(self._doc_dir(document_id), ignore_errors=True)
+
+    def complete_stage(
+        self,
+        document_id: str,
+        stage: str,
+        started_at: float,
+        items: int,
+        nbytes: int = 0
+    ) -> None:
+        """Marcar una etapa como completada y registrar su throughput"""
+        now = time.time()
+        status = "done" if stage == STAGES[-1] else "running"
+        self._execute(
+            "UPDATE jobs SET stage = ?, status = ?, updated_at = ? WHERE document_id = ?",
+            (stage, status, now, document_id)
+        )
+        self._execute(
+            "INSERT OR REPLACE INTO stage_runs (document_id, stage, started_at, finished_at, "
+            "items, bytes) VALUES (?, ?, ?, ?, ?, ?)",
+            (document_id, stage, started_at, now, items, nbytes)
+        )
+        if stage == STAGES[-1]:
+            # Documento indexado: los lotes ya no sirven para reanudar
+            self._execute("DELETE FROM upload_batches WHERE document_id = ?", (document_id,))
+
+    def complete_upload_batch(
+        self,
+        document_id: str,
+        batch_key: str,
+        items: int,
+        nbytes: int = 0
+    ) -> None:
+        """Registrar un lote de upload aceptado por el API"""
+        self._execute(
+            "INSERT OR REPLACE INTO upload_batches (document_id, batch_key, items, bytes, "
+            "finished_at) VALUES (?, ?, ?, ?, ?)",
+            (document_id, batch_key, items, nbytes, time.time())
+        )
+
+    def completed_upload_batches(self, document_id: str) -> set:
+        """Claves de los lotes ya subidos de un upload interrumpido"""
+        rows = self._execute(
+            "SELECT batch_key FROM upload_batches WHERE document_id = ?",
+            (document_id,)
+        )
+        return {row["batch_key"] for row in rows}
+
+    def fail_job(self, document_id: str, stage: str, error: str) -> None:
+        """Registrar un fallo (los checkpoints previos se conservan)"""
+        self._execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE document_id = ?",
+            (f"{stage}: {error}", time.time(), document_id)
+        )
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Estado de todos los jobs, del más reciente al más antiguo"""
+        rows = self._execute(
+            "SELECT document_id, file_path, status, stage, error, updated_at "
+            "FROM jobs ORDER BY updated_at DESC"
+        )
+        return [dict(row) for row in rows]
+
+    def done_jobs(self) -> List[Dict[str, Any]]:
+        """Documentos indexados (con sus páginas OCR guardadas) y su metadata"""
+        rows = self._execute(
+            "SELECT document_id, file_path, metadata FROM jobs WHERE status = 'done' "
+            "ORDER BY document_id"
+        )
+        return [
+            {"document_id": row["document_id"], "file_path": row["file_path"],
+             "metadata": json.loads(row["metadata"])}
+            for row in rows
+        ]
+
+    def throughput(self) -> Dict[str, Dict[str, float]]:
+        """Throughput agregado por etapa (items/s y bytes/s)"""
+        rows = self._execute(
+            "SELECT stage, COUNT(*) AS runs, SUM(items) AS items, SUM(bytes) AS bytes, "
+            "SUM(finished_at - started_at) AS seconds FROM stage_runs GROUP BY stage"
+        )
+        stats = {}
+        for row in rows:
+            seconds = row["seconds"] or 0.0
+            stats[row["stage"]] = {
+                "runs": row["runs"],
+                "items": row["items"],
+                "seconds": seconds,
+                "items_per_sec": row["items"] / seconds if seconds else 0.0,
+                "bytes_per_sec": row["bytes"] / seconds if seconds else 0.0,
+            }
+        return stats
+
+    # ============ ARTEFACTOS ============
+
+    def _write_jsonl(self, path: Path, records: List[Dict[str, Any]]) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+        os.replace(tmp, path)
+        return path.stat().st_size
+
+    def _read_jsonl(self, path: Path) -> List[Dict[str, Any]]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def save_pages(self, document_id: str, pages: List[Dict[str, Any]]) -> int:
+        """Guardar páginas OCR (JSONL comprimido). Devuelve bytes escritos"""
+        return self._write_jsonl(self._doc_dir(document_id) / "pages.jsonl.gz", pages)
+
+    def load_pages(self, document_id: str) -> List[Dict[str, Any]]:
+        return self._read_jsonl(self._doc_dir(document_id) / "pages.jsonl.gz")
+
+    def save_chunks(self, document_id: str, chunks: List[Dict[str, Any]]) -> int:
+        """Guardar chunks sin embeddings (JSONL comprimido)"""
+        records = [{k: v for k, v in c.items() if k != "embedding"} for c in chunks]
+        return self._write_jsonl(self._doc_dir(document_id) / "chunks.jsonl.gz", records)
+
+    def load_chunks(self, document_id: str) -> List[Dict[str, Any]]:
+        return self._read_jsonl(self._doc_dir(document_id) / "chunks.jsonl.gz")
+
+    def save_embeddings(
+        self,
+        document_id: str,
+        chunk_ids: List[str],
+        embeddings: List[List[float]],
+        plan: Dict[str, Any]
+    ) -> int:
+        """
+        Guardar embeddings de los chunks nuevos como matriz float32 (.npy)
+
+        Args:
+            chunk_ids: IDs de los chunks embebidos (orden de las filas)
+            embeddings: Vectores
+            plan: Plan de re-ingesta (existing_count, stale_count, current_ids)
+        """
+        doc_dir = self._doc_dir(document_id)
+        doc_dir.mkdir(parents=True, exist_ok=True)
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        tmp = doc_dir / "embeddings.tmp.npy"
+        np.save(tmp, matrix)
+        os.replace(tmp, doc_dir / "embeddings.npy")
+
+        index_path = doc_dir / "embeddings.json"
+        tmp = doc_dir / "embeddings.json.tmp"
+        tmp.write_text(json.dumps({"chunk_ids": chunk_ids, **plan}), encoding="utf-8")
+        os.replace(tmp, index_path)
+
+        return matrix.nbytes
+
+    def load_embeddings(self, document_id: str) -> Dict[str, Any]:
+        """Cargar embeddings (mmap) y plan de re-ingesta"""
+        doc_dir = self._doc_dir(document_id)
+        index = json.loads((doc_dir / "embeddings.json").read_text(encoding="utf-8"))
+        index["embeddings"] = np.load(doc_dir / "embeddings.npy", mmap_mode="r")
+        return index
+
+    def discard_embeddings(self, document_id: str) -> None:
+        """Borrar la matriz de embeddings una vez subida (es el artefacto más grande)"""
+        doc_dir = self._doc_dir(document_id)
+        for name in ("embeddings.npy", "embeddings.json"):
+            (doc_dir / name).unlink(missing_ok=True)
@@ -3,8 +3,17 @@ OCR con Google Document AI
 """
 from google.cloud import documentai_v1 as documentai
 from google.cloud import storage
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import mmap
 import os
+import uuid
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+from workers.gcs_source import GCSDocumentSource, parse_gcs_uri
+from workers.ocr_cache import OCRCache, hash_bytes, hash_file
 
 
 class OCRService:
@@ -14,20 +23,44 @@ class OCRService:
         self,
         project_id: str,
         processor_id: str,
-        location: str = "us"
+        location: str = "us",
+        processor_version: str = "default",
+        cache: Optional[OCRCache] = None,
+        pages_per_shard: int = 15,
+        max_concurrency: int = 4,
+        shard_retries: int = 3,
+        batch_threshold_pages: Optional[int] = None,
+        batch_gcs_prefix: Optional[str] = None,
+        client=None
     ):
         """
         Args:
             project_id: GCP Project ID
             processor_id: Document AI Processor ID
             location: Región del processor
+            processor_version: Versión del processor (forma parte de la clave de caché)
+            cache: Caché OCR por hash de contenido
+            pages_per_shard: Páginas por request online (límite del processor)
+            max_concurrency: Shards procesados en paralelo
+            shard_retries: Intentos por shard antes de fallar
+            batch_threshold_pages: A partir de este nº de páginas se usa la
+                API batch (requiere batch_gcs_prefix)
+            batch_gcs_prefix: Prefijo gs:// para entrada/salida de la API batch
+            client: Cliente de Document AI (inyectable para tests)
         """
         self.project_id = project_id
         self.processor_id = processor_id
         self.location = location
+        self.processor_version = processor_version
+        self.cache = cache
+        self.pages_per_shard = pages_per_shard
+        self.max_concurrency = max_concurrency
+        self.shard_retries = shard_retries
+        self.batch_threshold_pages = batch_threshold_pages
+        self.batch_gcs_prefix = batch_gcs_prefix
 
         # Cliente Document AI
-        self.client = documentai.DocumentProcessorServiceClient()
+        self.client = client or documentai.DocumentProcessorServiceClient()
 
         # Nombre completo del processor
         self.processor_name = self.client.processor_path(
@@ -44,7 +77,7 @@ class OCRService:
         Procesar documento con OCR
 
         Args:
-            file_path: Ruta al archivo local
+            file_path: Ruta al archivo local (se mapea en memoria, sin copiarlo)
             file_content: Contenido del archivo en bytes
             mime_type: Tipo MIME del documento
 
@@ -61,17 +94,140 @@ class OCRService:
                 ...
             ]
         """
-        # Leer contenido si se provee path
+        # Mapear el fichero si se provee path: el hash, pypdf y el split en
+        # shards leen del mmap sin cargar el PDF entero en el heap
         if file_path and not file_content:
             with open(file_path, "rb") as f:
-                file_content = f.read()
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise ValueError(f"Empty file: {file_path}")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return self.process_document(file_content=mapped, mime_type=mime_type)
 
         if not file_content:
             raise ValueError("Must provide either file_path or file_content")
 
+        # Caché por hash de contenido: sin llamadas de red si ya se procesó
+        content_hash = None
+        if self.cache is not None:
+            content_hash = hash_bytes(file_content)
+            cached = self.cache.get(content_hash, self.processor_id, self.processor_version)
+            if cached is not None:
+                return cached
+
+        pages = self._process_content(file_content, mime_type)
+
+        if self.cache is not None:
+            self.cache.put(content_hash, self.processor_id, self.processor_version, pages)
+
+        return pages
+
+    def _process_content(self, file_content: bytes, mime_type: str) -> List[Dict[str, Any]]:
+        """
+        Enviar el contenido a Document AI y extraer las páginas
+
+        Los PDFs que superan el límite de páginas de la API online se dividen
+        en shards por rango de páginas que se procesan en paralelo (con
+        reintento por shard) y se fusionan con su `page_number` global. Los
+        muy grandes pueden ir por la API batch.
+        """
+        if mime_type != "application/pdf":
+            return self._process_request(file_content, mime_type)
+
+        from pypdf import PdfReader
+
+        reader = PdfReader(_as_stream(file_content))
+        page_count = len(reader.pages)
+
+        if (
+            self.batch_threshold_pages
+            and self.batch_gcs_prefix
+            and page_count >= self.batch_threshold_pages
+        ):
+            return self._process_batch(file_content, mime_type)
+
+        if page_count <= self.pages_per_shard:
+            return self._process_request(file_content, mime_type)
+
+        shards = [
+            (start, min(start + self.pages_per_shard, page_count))
+            for start in range(0, page_count, self.pages_per_shard)
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="docai-shard"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    self._process_shard,
+                    _split_pdf(reader, start, end),
+                    mime_type,
+                    start
+                )
+                for start, end in shards
+            ]
+            pages = []
+            for future in futures:
+                pages.extend(future.result())
+
+        return pages
+
+    def process_pages(self, file_path: str, page_indices: List[int]) -> List[Dict[str, Any]]:
+        """
+        OCR de un subconjunto de páginas de un PDF (las que no tienen capa de texto)
+
+        Las páginas se agrupan en PDFs de hasta `pages_per_shard` páginas que
+        se procesan en paralelo; cada página recupera su `page_number` original.
+        """
+        from pypdf import PdfReader
+
+        reader = PdfReader(file_path)
+        shards = [
+            page_indices[start:start + self.pages_per_shard]
+            for start in range(0, len(page_indices), self.pages_per_shard)
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="docai-shard"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    self._process_shard,
+                    _pdf_with_pages(reader, shard),
+                    "application/pdf",
+                    0
+                )
+                for shard in shards
+            ]
+            pages = []
+            for shard, future in zip(shards, futures):
+                for page in future.result():
+                    page["page_number"] = shard[page["page_number"] - 1] + 1
+                    pages.append(page)
+
+        return pages
+
+    def _process_shard(self, shard_content: bytes, mime_type: str, page_offset: int) -> List[Dict[str, Any]]:
+        """Procesar un shard con reintentos (backoff exponencial)"""
+        for attempt in Retrying(
+            stop=stop_after_attempt(self.shard_retries),
+            wait=wait_exponential(multiplier=1, min=1, max=10),
+            reraise=True
+        ):
+            with attempt:
+                return self._process_request(shard_content, mime_type, page_offset)
+
+    def _process_request(
+        self,
+        file_content: bytes,
+        mime_type: str,
+        page_offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Una request online a Document AI"""
         # Crear request
         raw_document = documentai.RawDocument(
-            content=file_content,
+            content=bytes(file_content),
             mime_type=mime_type
         )
 
@@ -82,9 +238,65 @@ class OCRService:
 
         # Procesar
         result = self.client.process_document(request=request)
-        document = result.document
+        return self._parse_document(result.document, page_offset)
 
-        # Extraer texto por página
+    def _process_batch(self, file_content: bytes, mime_type: str) -> List[Dict[str, Any]]:
+        """
+        Procesar con la API batch (sin límite de páginas online)
+
+        Sube el documento a `batch_gcs_prefix`, lanza la operación de larga
+        duración y lee los `Document` JSON de salida, que pueden venir
+        divididos en varios ficheros (`shard_info.page_offset`).
+        """
+        storage_client = storage.Client(project=self.project_id)
+        bucket_name, prefix = _batch_location(self.batch_gcs_prefix)
+        bucket = storage_client.bucket(bucket_name)
+
+        job_id = uuid.uuid4().hex
+        input_blob = bucket.blob(f"{prefix}input/{job_id}.pdf")
+        input_blob.upload_from_file(_as_stream(file_content), content_type=mime_type)
+        output_prefix = f"{prefix}output/{job_id}/"
+
+        request = documentai.BatchProcessRequest(
+            name=self.processor_name,
+            input_documents=documentai.BatchDocumentsInputConfig(
+                gcs_documents=documentai.GcsDocuments(documents=[
+                    documentai.GcsDocument(
+                        gcs_uri=f"gs://{bucket_name}/{input_blob.name}",
+                        mime_type=mime_type
+                    )
+                ])
+            ),
+            document_output_config=documentai.DocumentOutputConfig(
+                gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
+                    gcs_uri=f"gs://{bucket_name}/{output_prefix}"
+                )
+            )
+        )
+
+        try:
+            operation = self.client.batch_process_documents(request=request)
+            operation.result(timeout=3600)
+
+            pages = []
+            for blob in bucket.list_blobs(prefix=output_prefix):
+                if not blob.name.endswith(".json"):
+                    continue
+                document = documentai.Document.from_json(
+                    blob.download_as_bytes(), ignore_unknown_fields=True
+                )
+                pages.extend(
+                    self._parse_document(document, int(document.shard_info.page_offset))
+                )
+                blob.delete()
+        finally:
+            input_blob.delete()
+
+        pages.sort(key=lambda p: p["page_number"])
+        return pages
+
+    def _parse_document(self, document, page_offset: int = 0) -> List[Dict[str, Any]]:
+        """Extraer texto por página de un `Document` de Document AI"""
         pages = []
 
         for page_idx, page in enumerate(document.pages):
@@ -95,7 +307,7 @@ class OCRService:
             confidence = self._calculate_page_confidence(page)
 
             pages.append({
-                "page_number": page_idx + 1,
+                "page_number": page_offset + page_idx + 1,
                 "text": page_text,
                 "confidence": confidence,
                 "width": page.dimension.width,
@@ -142,71 +354,532 @@ class OCRService:
     def process_from_gcs(
         self,
         gcs_uri: str,
-        mime_type: str = "application/pdf"
+        mime_type: str = "application/pdf",
+        source=None
     ) -> List[Dict[str, Any]]:
         """
         Procesar documento desde Google Cloud Storage
 
+        El blob se descarga por trozos a un fichero temporal y se procesa
+        mapeado en memoria, sin cargarlo entero en el heap.
+
         Args:
             gcs_uri: URI de GCS (gs://bucket/path/to/file.pdf)
             mime_type: Tipo MIME
+            source: GCSDocumentSource (por defecto uno del proyecto)
 
         Returns:
             Lista de páginas procesadas
         """
-        # Para batch processing, usar batch_process_documents
-        # Por simplicidad, aquí descargar y procesar
-        storage_client = storage.Client(project=self.project_id)
+        if source is None:
+            source = GCSDocumentSource(project_id=self.project_id)
 
-        # Parsear GCS URI
-        if not gcs_uri.startswith("gs://"):
-            raise ValueError("GCS URI must start with gs://")
+        with source.download(gcs_uri) as document:
+            return self.process_document(file_path=document.path, mime_type=mime_type)
 
-        path = gcs_uri[5:]  # Remove gs://
-        bucket_name, blob_path = path.split("/", 1)
+    def process_gcs_prefix(
+        self,
+        prefix_uri: str,
+        mime_type: str = "application/pdf",
+        source=None
+    ) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Procesar todos los PDFs bajo un prefijo de GCS
 
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
+        Mientras se procesa un documento, los siguientes se descargan en
+        segundo plano (`source.prefetch`).
 
-        # Descargar contenido
-        file_content = blob.download_as_bytes()
+        Yields:
+            (gcs_uri, páginas) en orden de listado
+        """
+        if source is None:
+            source = GCSDocumentSource(project_id=self.project_id)
+
+        for document in source.iter_downloads(source.list_uris(prefix_uri)):
+            with document:
+                yield document.gcs_uri, self.process_document(
+                    file_path=document.path, mime_type=mime_type
+                )
+
+
+def _batch_location(gcs_prefix: str) -> Tuple[str, str]:
+    """
+    (bucket, prefijo) de `batch_gcs_prefix`; el prefijo acaba en "/" o es
+    vacío, así que `gs://bucket` sin ruta también es válido
+    """
+    bucket_name, prefix = parse_gcs_uri(gcs_prefix)
+    if not bucket_name:
+        raise ValueError(f"Invalid batch GCS prefix: {gcs_prefix}")
+    prefix = prefix.strip("/")
+    return bucket_name, f"{prefix}/" if prefix else ""
+
+
+def _as_stream(content) -> io.RawIOBase:
+    """Stream posicionado al inicio sobre bytes o un mmap (sin copiar el mmap)"""
+    if isinstance(content, mmap.mmap):
+        content.seek(0)
+        return content
+    return io.BytesIO(content)
 
-        # Procesar
-        return self.process_document(file_content=file_content, mime_type=mime_type)
+
+def _split_pdf(reader, start: int, end: int) -> bytes:
+    """Extraer las páginas [start, end) de un PDF como un nuevo PDF en memoria"""
+    return _pdf_with_pages(reader, range(start, end))
+
+
+def _pdf_with_pages(reader, page_indices) -> bytes:
+    """Nuevo PDF en memoria con las páginas indicadas (en ese orden)"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for page_idx in page_indices:
+        writer.add_page(reader.pages[page_idx])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
 
 
 class SimplePyPDFOCR:
     """
     Alternativa simple con PyPDF para PDFs con texto extraíble
     (no es OCR real, solo extracción de texto)
+
+    Los documentos grandes se dividen en rangos de páginas que se extraen
+    en un pool de procesos; cada proceso abre el PDF por su cuenta.
     """
 
+    PROCESSOR = "pypdf"
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        pages_per_shard: int = 32,
+        cache: Optional[OCRCache] = None
+    ):
+        """
+        Args:
+            max_workers: Procesos para la extracción (None = núcleos disponibles,
+                1 = extracción en serie en el proceso actual)
+            pages_per_shard: Páginas por rango enviado a cada proceso
+            cache: Caché de páginas por hash de contenido
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_shard = pages_per_shard
+        self.cache = cache
+
     def process_document(self, file_path: str) -> List[Dict[str, Any]]:
         """Extraer texto de PDF usando PyPDF"""
+        return list(self.iter_pages(file_path))
+
+    def iter_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Extraer páginas en streaming
+
+        Genera las páginas en orden a medida que se completan sus rangos, de
+        modo que el chunking puede empezar antes de que acabe la extracción.
+        Como mucho hay `2 * max_workers` rangos en vuelo para acotar memoria.
+        """
+        if self.cache is None:
+            yield from self._extract_pages(file_path)
+            return
+
+        import pypdf
+
+        content_hash = hash_file(file_path)
+        cached = self.cache.get(content_hash, self.PROCESSOR, pypdf.__version__)
+        if cached is not None:
+            yield from cached
+            return
+
+        pages = []
+        for page in self._extract_pages(file_path):
+            pages.append(page)
+            yield page
+        self.cache.put(content_hash, self.PROCESSOR, pypdf.__version__, pages)
+
+    def _extract_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Extracción en serie o por rangos en un pool de procesos"""
         from pypdf import PdfReader
 
-        reader = PdfReader(file_path)
+        page_count = len(PdfReader(file_path).pages)
+
+        if self.max_workers == 1 or page_count <= self.pages_per_shard:
+            yield from _iter_page_range(file_path, 0, page_count)
+            return
+
+        shards = [
+            (start, min(start + self.pages_per_shard, page_count))
+            for start in range(0, page_count, self.pages_per_shard)
+        ]
+        max_in_flight = 2 * self.max_workers
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            next_shard = 0
+
+            while pending or next_shard < len(shards):
+                while next_shard < len(shards) and len(pending) < max_in_flight:
+                    start, end = shards[next_shard]
+                    pending.append(executor.submit(_extract_page_range, file_path, start, end))
+                    next_shard += 1
+
+                yield from pending.popleft().result()
+
+
+def _iter_page_range(file_path: str, start: int, end: int) -> Iterator[Dict[str, Any]]:
+    """Extraer las páginas [start, end) de un PDF una a una"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+
+    for page_idx in range(start, end):
+        page = reader.pages[page_idx]
+        text = page.extract_text()
+
+        yield {
+            "page_number": page_idx + 1,
+            "text": text,
+            "confidence": 1.0,  # No es OCR, es extracción directa
+            "width": float(page.mediabox.width),
+            "height": float(page.mediabox.height)
+        }
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Extraer las páginas [start, end) de un PDF (ejecutable en otro proceso)"""
+    return list(_iter_page_range(file_path, start, end))
+
+
+class TesseractOCR:
+    """
+    OCR local con Tesseract para PDFs escaneados (sin capa de texto)
+
+    Cada página se rasteriza (pypdfium2) y se reconoce con Tesseract dentro
+    de un proceso del pool, así la imagen nunca cruza entre procesos. El
+    proceso padre solo reparte números de página: como mucho
+    `max_in_flight` páginas están encargadas a la vez, de modo que la
+    memoria (imágenes de ~25 MB a 300 dpi) no crece con el tamaño del PDF.
+    """
+
+    PROCESSOR = "tesseract"
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        lang: str = "spa",
+        dpi: int = 300,
+        max_in_flight: Optional[int] = None,
+        tesseract_config: str = "--oem 1 --psm 3",
+        cache: Optional[OCRCache] = None
+    ):
+        """
+        Args:
+            max_workers: Procesos de OCR (None = núcleos disponibles,
+                1 = OCR en serie en el proceso actual)
+            lang: Idiomas de Tesseract (p. ej. "spa+lat")
+            dpi: Resolución de rasterizado
+            max_in_flight: Páginas encargadas a la vez (None = 2 * max_workers)
+            tesseract_config: Opciones extra de Tesseract (motor, segmentación)
+            cache: Caché de páginas por hash de contenido
+        """
+        self.max_workers = max_workers or _available_cpus()
+        self.lang = lang
+        self.dpi = dpi
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+        self.tesseract_config = tesseract_config
+        self.cache = cache
+
+    def _version(self) -> str:
+        """Versión para la clave de caché (motor + parámetros que cambian el texto)"""
+        import pytesseract
+
+        return f"{pytesseract.get_tesseract_version()}:{self.lang}:{self.dpi}:{self.tesseract_config}"
+
+    def process_document(self, file_path: str) -> List[Dict[str, Any]]:
+        """OCR de todas las páginas de un PDF"""
+        return list(self.iter_pages(file_path))
+
+    def iter_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        OCR en streaming: genera las páginas en orden a medida que terminan
+        """
+        if self.cache is None:
+            yield from self._ocr_pages(file_path)
+            return
+
+        content_hash = hash_file(file_path)
+        version = self._version()
+        cached = self.cache.get(content_hash, self.PROCESSOR, version)
+        if cached is not None:
+            yield from cached
+            return
+
         pages = []
+        for page in self._ocr_pages(file_path):
+            pages.append(page)
+            yield page
+        self.cache.put(content_hash, self.PROCESSOR, version, pages)
 
-        for page_idx, page in enumerate(reader.pages):
-            text = page.extract_text()
+    def process_pages(self, file_path: str, page_indices: List[int]) -> Iterator[Dict[str, Any]]:
+        """OCR de un subconjunto de páginas (en orden, en streaming)"""
+        return self._ocr_pages(file_path, page_indices)
 
-            pages.append({
-                "page_number": page_idx + 1,
-                "text": text,
-                "confidence": 1.0,  # No es OCR, es extracción directa
-                "width": float(page.mediabox.width),
-                "height": float(page.mediabox.height)
-            })
+    def _ocr_pages(
+        self,
+        file_path: str,
+        page_indices: Optional[List[int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """OCR en serie o página a página en un pool de procesos (ventana acotada)"""
+        if page_indices is None:
+            page_indices = list(range(_page_count(file_path)))
+        options = (self.lang, self.dpi, self.tesseract_config)
+
+        if self.max_workers == 1 or len(page_indices) <= 1:
+            try:
+                for page_idx in page_indices:
+                    yield _tesseract_page(file_path, page_idx, *options)
+            finally:
+                _close_tesseract_pdf()
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(page_indices)),
+            initializer=_init_tesseract_worker
+        ) as executor:
+            pending = deque()
+            remaining = iter(page_indices)
+
+            for page_idx in remaining:
+                pending.append(executor.submit(_tesseract_page, file_path, page_idx, *options))
+                if len(pending) >= self.max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def _available_cpus() -> int:
+    """Núcleos que puede usar este proceso (respeta cgroups/affinity)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _page_count(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def _init_tesseract_worker() -> None:
+    """Un hilo por proceso de Tesseract: el pool ya usa todos los núcleos"""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+# PDF abierto en cada proceso del pool (se reutiliza entre páginas del mismo fichero)
+_tesseract_pdf: Optional[Tuple[str, Any]] = None
+
+
+def _close_tesseract_pdf() -> None:
+    global _tesseract_pdf
+    if _tesseract_pdf is not None:
+        _tesseract_pdf[1].close()
+        _tesseract_pdf = None
+
+
+def _tesseract_page(
+    file_path: str,
+    page_idx: int,
+    lang: str,
+    dpi: int,
+    tesseract_config: str
+) -> Dict[str, Any]:
+    """Rasterizar y reconocer una página (ejecutable en otro proceso)"""
+    global _tesseract_pdf
+    import pypdfium2 as pdfium
+    import pytesseract
+
+    if _tesseract_pdf is None or _tesseract_pdf[0] != file_path:
+        _close_tesseract_pdf()
+        _tesseract_pdf = (file_path, pdfium.PdfDocument(file_path))
+    page = _tesseract_pdf[1][page_idx]
+    width, height = page.get_size()
+    image = page.render(scale=dpi / 72).to_pil()
+    page.close()
+
+    data = pytesseract.image_to_data(
+        image, lang=lang, config=tesseract_config, output_type=pytesseract.Output.DICT
+    )
+    image.close()
+    text, confidence = _parse_tesseract_data(data)
+
+    return {
+        "page_number": page_idx + 1,
+        "text": text,
+        "confidence": confidence,
+        "width": float(width),
+        "height": float(height)
+    }
+
+
+def _parse_tesseract_data(data: Dict[str, List[Any]]) -> Tuple[str, float]:
+    """
+    Texto por líneas y confianza de una página a partir de `image_to_data`
 
-        return pages
+    La confianza es la media de las palabras ponderada por su longitud
+    (Tesseract da 0-100 por palabra y -1 en las cajas que no son texto).
+    """
+    lines: List[str] = []
+    current_line = None
+    current_paragraph = None
+    words: List[str] = []
+    weighted = 0.0
+    total_chars = 0
+
+    for word, conf, block, paragraph, line in zip(
+        data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]
+    ):
+        word = word.strip()
+        conf = float(conf)
+        if not word or conf < 0:
+            continue
+        if (block, paragraph, line) != current_line:
+            if words:
+                lines.append(" ".join(words))
+            if current_paragraph is not None and (block, paragraph) != current_paragraph:
+                lines.append("")
+            current_line = (block, paragraph, line)
+            current_paragraph = (block, paragraph)
+            words = []
+        words.append(word)
+        weighted += conf * len(word)
+        total_chars += len(word)
+    if words:
+        lines.append(" ".join(words))
+
+    confidence = weighted / total_chars / 100 if total_chars else 0.0
+    return "\n".join(lines), round(confidence, 4)
+
+
+# ============ ENRUTADO POR PÁGINA ============
+
+def text_layer_usable(text: str, min_chars: int = 40, min_alpha_ratio: float = 0.6) -> bool:
+    """
+    ¿La capa de texto de una página sirve tal cual?
+
+    Descarta páginas sin texto (escaneadas), con muy poco texto (solo
+    foliación o un sello), con texto basura (símbolos, caracteres de
+    sustitución o de uso privado de fuentes sin mapa Unicode) o extraídas
+    letra a letra ("C a r t a  d e  v e n t a").
+    """
+    compact = "".join(text.split())
+    if len(compact) < min_chars:
+        return False
+    letters = sum(1 for c in compact if c.isalpha())
+    if letters / len(compact) < min_alpha_ratio:
+        return False
+    garbage = sum(1 for c in compact if c == "\ufffd" or "\ue000" <= c <= "\uf8ff")
+    if garbage / len(compact) > 0.05:
+        return False
+    words = text.split()
+    single = sum(1 for word in words if len(word) == 1)
+    return single / len(words) < 0.5
+
+
+class PageRouterOCR:
+    """
+    OCR por página: capa de texto si sirve, motor de OCR solo si no
+
+    Los PDFs mixtos (inventarios mecanografiados junto a folios escaneados)
+    ya no pasan enteros por el OCR: se extrae la capa de texto de cada
+    página con pypdf (barato) y solo las páginas sin texto utilizable van al
+    motor (Document AI o Tesseract) en un único lote. El resultado se
+    fusiona en orden de página; cada página indica su origen en `source`
+    ("text_layer" u "ocr").
+    """
+
+    def __init__(
+        self,
+        engine,
+        min_chars: int = 40,
+        min_alpha_ratio: float = 0.6,
+        cache: Optional[OCRCache] = None
+    ):
+        """
+        Args:
+            engine: Motor para las páginas sin capa de texto (con `process_pages`)
+            min_chars: Caracteres mínimos para aceptar la capa de texto
+            min_alpha_ratio: Fracción mínima de letras en la capa de texto
+            cache: Caché del resultado fusionado por hash de contenido
+        """
+        self.engine = engine
+        self.min_chars = min_chars
+        self.min_alpha_ratio = min_alpha_ratio
+        self.cache = cache
+        self.PROCESSOR = f"routed-{getattr(engine, 'PROCESSOR', None) or engine.processor_id}"
+
+    def _version(self) -> str:
+        import pypdf
+
+        engine_version = (
+            self.engine._version() if hasattr(self.engine, "_version")
+            else getattr(self.engine, "processor_version", "")
+        )
+        # "src": entradas que guardan el origen de cada página (las anteriores no)
+        return f"{pypdf.__version__}:{self.min_chars}:{self.min_alpha_ratio}:{engine_version}:src"
+
+    def process_document(self, file_path: str) -> List[Dict[str, Any]]:
+        """Páginas del PDF, cada una por la vía más barata que sirva"""
+        return list(self.iter_pages(file_path))
+
+    def iter_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Páginas en orden; las de capa de texto salen sin esperar al OCR de las demás"""
+        if self.cache is None:
+            yield from self._route_pages(file_path)
+            return
+
+        content_hash = hash_file(file_path)
+        version = self._version()
+        cached = self.cache.get(content_hash, self.PROCESSOR, version)
+        if cached is not None:
+            yield from cached
+            return
+
+        pages = []
+        for page in self._route_pages(file_path):
+            pages.append(page)
+            yield page
+        self.cache.put(content_hash, self.PROCESSOR, version, pages)
+
+    def _route_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        text_pages = {}
+        ocr_indices = []
+        for page in _iter_page_range(file_path, 0, _page_count(file_path)):
+            page_idx = page["page_number"] - 1
+            if text_layer_usable(page["text"] or "", self.min_chars, self.min_alpha_ratio):
+                text_pages[page_idx] = {**page, "source": "text_layer"}
+            else:
+                ocr_indices.append(page_idx)
+
+        ocr_pages = iter(self.engine.process_pages(file_path, ocr_indices) if ocr_indices else ())
+        for page_idx in range(len(text_pages) + len(ocr_indices)):
+            if page_idx in text_pages:
+                yield text_pages[page_idx]
+            else:
+                yield {**next(ocr_pages), "source": "ocr"}
+
+
+OCR_ENGINES = ["documentai", "pypdf", "tesseract"]
 
 
 def create_ocr_service(
     project_id: str = None,
     processor_id: str = None,
-    use_simple: bool = False
-) -> OCRService | SimplePyPDFOCR:
+    use_simple: bool = False,
+    max_workers: Optional[int] = None,
+    cache: Optional[OCRCache] = None,
+    engine: Optional[str] = None,
+    route_pages: Optional[bool] = None
+) -> OCRService | SimplePyPDFOCR | TesseractOCR | PageRouterOCR:
     """
     Factory para crear servicio de OCR
 
@@ -214,10 +887,56 @@ def create_ocr_service(
         project_id: GCP Project ID
         processor_id: Document AI Processor ID
         use_simple: Si True, usa PyPDF simple en lugar de Document AI
+        max_workers: Procesos para extraer páginas en paralelo (PyPDF y Tesseract)
+        cache: Caché OCR por hash de contenido
+        engine: "documentai", "pypdf" o "tesseract" (tiene prioridad sobre use_simple)
+        route_pages: Capa de texto primero y OCR solo para las páginas que lo
+            necesiten (None = según settings.ocr_route_pages; no aplica a pypdf)
     """
-    if use_simple:
-        return SimplePyPDFOCR()
+    engine = engine or ("pypdf" if use_simple else "documentai")
+    if engine not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine '{engine}'. Available: {', '.join(OCR_ENGINES)}")
+
+    if engine == "pypdf":
+        return SimplePyPDFOCR(max_workers=max_workers, cache=cache)
+
+    from api.config import get_settings
+
+    settings = get_settings()
+    if route_pages is None:
+        route_pages = settings.ocr_route_pages
+    if route_pages:
+        # La caché guarda el resultado fusionado, no el del motor
+        inner = create_ocr_service(
+            project_id, processor_id,
+            max_workers=max_workers,
+            engine=engine,
+            route_pages=False
+        )
+        return PageRouterOCR(
+            inner,
+            min_chars=settings.ocr_text_layer_min_chars,
+            min_alpha_ratio=settings.ocr_text_layer_min_alpha_ratio,
+            cache=cache
+        )
+
+    if engine == "tesseract":
+        return TesseractOCR(
+            max_workers=max_workers or settings.tesseract_workers,
+            lang=settings.tesseract_lang,
+            dpi=settings.tesseract_dpi,
+            max_in_flight=settings.tesseract_max_in_flight_pages,
+            cache=cache
+        )
     else:
         if not project_id or not processor_id:
             raise ValueError("Must provide project_id and processor_id for Document AI")
-        return OCRService(project_id, processor_id)
+        return OCRService(
+            project_id,
+            processor_id,
+            cache=cache,
+            pages_per_shard=settings.document_ai_pages_per_shard,
+            max_concurrency=settings.document_ai_max_concurrency,
+            batch_threshold_pages=settings.document_ai_batch_threshold_pages,
+            batch_gcs_prefix=settings.document_ai_batch_gcs_prefix
+        )
@@ -0,0 +1,250 @@
+"""
+Caché de resultados OCR por hash de contenido
+
+Evita re-enviar a Document AI un PDF ya procesado. La clave combina el
+SHA-256 del fichero con el processor y su versión:
+
+    ocr-cache/v1/<processor>/<version>/<hash[:2]>/<hash>.json.gz
+
+El layout es de prefijos estilo GCS; un directorio local hace de bucket
+(`LocalCacheStorage`) y `GCSCacheStorage` usa uno real. Cada entrada guarda
+por página texto, confianza y dimensiones en JSON comprimido con gzip.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+CACHE_PREFIX = "ocr-cache/v1"
+
+# Campos por página que se guardan en caché (`source` solo con enrutado por página)
+_PAGE_FIELDS = ("page_number", "text", "confidence", "width", "height", "source")
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 de un fichero leído por bloques"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_bytes(content: bytes) -> str:
+    """SHA-256 de un contenido en memoria"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class LocalCacheStorage:
+    """Almacenamiento de caché en un directorio local (mismo layout que GCS)"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # Marca de uso reciente para el LRU
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list(self, prefix: str) -> List[Tuple[str, int, float]]:
+        """Entradas bajo `prefix` como (key, tamaño, último uso)"""
+        base = self._path(prefix)
+        if not base.exists():
+            return []
+        entries = []
+        for path in base.rglob("*.json.gz"):
+            stat = path.stat()
+            entries.append((path.relative_to(self.root).as_posix(), stat.st_size, stat.st_mtime))
+        return entries
+
+
+class GCSCacheStorage:
+    """
+    Almacenamiento de caché en un bucket de GCS
+
+    GCS no actualiza `updated` al leer un objeto: cada acierto escribe el
+    último uso en la metadata del blob (`last_access`), como mucho una vez
+    por `touch_interval` segundos y clave, y la expulsión ordena por ella.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        project_id: Optional[str] = None,
+        touch_interval: float = 3600.0,
+        bucket=None
+    ):
+        """
+        Args:
+            bucket_name: Bucket de la caché
+            project_id: GCP Project ID
+            touch_interval: Segundos mínimos entre actualizaciones de `last_access`
+            bucket: Bucket compatible con `google.cloud.storage.Bucket` (inyectable)
+        """
+        if bucket is None:
+            from google.cloud import storage
+
+            bucket = storage.Client(project=project_id).bucket(bucket_name)
+        self.bucket = bucket
+        self.touch_interval = touch_interval
+        self._touched: Dict[str, float] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(key)
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return None
+
+        now = time.time()
+        if now - self._touched.get(key, 0.0) >= self.touch_interval:
+            # Marca de uso reciente para el LRU (best effort)
+            try:
+                blob.metadata = {"last_access": str(now)}
+                blob.patch()
+                self._touched[key] = now
+            except NotFound:
+                pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.bucket.blob(key).upload_from_string(data, content_type="application/gzip")
+
+    def delete(self, key: str) -> None:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(key).delete()
+        except NotFound:
+            pass
+
+    def list(self, prefix: str) -> List[Tuple[str, int, float]]:
+        """Entradas bajo `prefix` como (key, tamaño, último uso)"""
+        entries = []
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            last_access = (blob.metadata or {}).get("last_access")
+            if last_access is not None:
+                used = float(last_access)
+            else:
+                used = blob.updated.timestamp() if blob.updated else 0.0
+            entries.append((blob.name, blob.size or 0, used))
+        return entries
+
+
+class OCRCache:
+    """Caché de páginas OCR con expulsión por tamaño (LRU)"""
+
+    def __init__(self, storage, max_bytes: int = 2 * 1024 ** 3):
+        """
+        Args:
+            storage: LocalCacheStorage o GCSCacheStorage
+            max_bytes: Tamaño máximo total de la caché
+        """
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    @staticmethod
+    def key_for(content_hash: str, processor: str, version: str) -> str:
+        return f"{CACHE_PREFIX}/{processor}/{version}/{content_hash[:2]}/{content_hash}.json.gz"
+
+    def get(self, content_hash: str, processor: str, version: str) -> Optional[List[Dict[str, Any]]]:
+        """Páginas cacheadas o None si no hay entrada"""
+        data = self.storage.get(self.key_for(content_hash, processor, version))
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(gzip.decompress(data))["pages"]
+
+    def put(
+        self,
+        content_hash: str,
+        processor: str,
+        version: str,
+        pages: List[Dict[str, Any]]
+    ) -> None:
+        """Guardar páginas y expulsar entradas antiguas si se supera el límite"""
+        record = {
+            "processor": processor,
+            "version": version,
+            "created_at": time.time(),
+            "pages": [
+                {field: page[field] for field in _PAGE_FIELDS if field in page} for page in pages
+            ],
+        }
+        data = gzip.compress(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            compresslevel=6
+        )
+        self.storage.put(self.key_for(content_hash, processor, version), data)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Expulsar las entradas usadas hace más tiempo hasta caber en `max_bytes`"""
+        if self._total_bytes is not None and self._total_bytes <= self.max_bytes:
+            return
+
+        entries = self.storage.list(CACHE_PREFIX)
+        total = sum(size for _, size, _ in entries)
+
+        for key, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            self.storage.delete(key)
+            total -= size
+
+        self._total_bytes = total
+
+
+def create_ocr_cache(
+    cache_dir: Optional[str] = None,
+    gcs_bucket: Optional[str] = None,
+    max_bytes: int = 2 * 1024 ** 3,
+    project_id: Optional[str] = None
+) -> Optional[OCRCache]:
+    """
+    Factory para crear la caché OCR
+
+    Args:
+        cache_dir: Directorio local (hace de bucket)
+        gcs_bucket: Bucket de GCS (tiene prioridad sobre cache_dir)
+        max_bytes: Tamaño máximo total
+        project_id: GCP Project ID para el cliente de GCS
+    """
+    if gcs_bucket:
+        return OCRCache(GCSCacheStorage(gcs_bucket, project_id), max_bytes=max_bytes)
+    if cache_dir:
+        return OCRCache(LocalCacheStorage(cache_dir), max_bytes=max_bytes)
+    return None
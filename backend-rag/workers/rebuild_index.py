@@ -0,0 +1,325 @@
+"""
+Reconstrucción del índice en una generación nueva (blue/green)
+
+Cambiar `chunk_size`/`chunk_overlap` o el modelo de embeddings obliga a
+reconstruir el índice entero. En vez de vaciarlo y re-ingerir (con /query
+respondiendo sobre un índice a medias), este proceso:
+
+1. Re-chunkea con la configuración actual las páginas OCR guardadas en el job
+   store (sin repetir OCR).
+2. Reutiliza los embeddings de la generación en servicio para los chunks que
+   no cambian (mismo chunk_id y mismo modelo) y embebe el resto con prioridad
+   "bulk" (ver api/quota.py: /query conserva su cuota).
+3. Guarda el resultado como generación candidata (`staged-*`) en INDEX_DIR.
+4. La valida: recall@k de la página de origen para una muestra de consultas
+   (fragmentos de chunks), comparado con la generación en servicio cuando
+   comparten modelo, y cobertura de documentos.
+5. Si pasa y se pide `--activate`, el writer (o el API local) la pone en
+   servicio de forma atómica; la anterior queda para `/index/rollback`.
+
+Uso:
+    python -m workers.rebuild_index --index-dir /data/index
+    python -m workers.rebuild_index --index-dir /data/index --activate --api-url http://127.0.0.1:8001
+"""
+import asyncio
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from api.config import get_settings
+from api.embeddings import get_embedding_service
+from api.shared_index import (
+    current_generation, generation_recall, open_generation, read_manifest,
+    stage_generation, write_manifest
+)
+from api.vectordb import SimpleInMemoryVectorDB
+from workers.chunking import create_chunker
+from workers.dedup import NearDuplicateIndex
+from workers.jobstore import JobStore
+
+load_dotenv()
+
+
+def _current_vectors(index_dir: str, embedding_model: str) -> Dict[str, np.ndarray]:
+    """
+    Vectores reutilizables de la generación en servicio (chunk_id → vector)
+
+    Solo si se construyó con el mismo modelo de embeddings; las generaciones
+    sin manifiesto (anteriores a blue/green) no se reutilizan.
+    """
+    name = current_generation(index_dir)
+    if name is None:
+        return {}
+    manifest = read_manifest(Path(index_dir) / name)
+    if manifest.get("embedding_model") != embedding_model:
+        return {}
+    generation = open_generation(index_dir, name)
+    return {generation.chunk_id(row): generation.vectors[row] for row in range(generation.count)}
+
+
+async def build_generation(
+    job_store: JobStore,
+    index_dir: str,
+    dedup: Optional[bool] = None
+) -> Dict[str, Any]:
+    """
+    Construir la generación candidata a partir del job store
+
+    Returns:
+        Manifiesto de la candidata (incluye su nombre en "name")
+    """
+    settings = get_settings()
+    chunker = create_chunker(chunk_size=settings.chunk_size, chunk_overlap=settings.chunk_overlap)
+    embedding_service = get_embedding_service()
+    dedup_index = None
+    if settings.ingest_dedup_enabled if dedup is None else dedup:
+        dedup_index = NearDuplicateIndex(
+            threshold=settings.ingest_dedup_threshold,
+            num_perm=settings.ingest_dedup_num_perm,
+            bands=settings.ingest_dedup_bands,
+            max_canonicals=settings.ingest_dedup_max_canonicals
+        )
+    skip_duplicates = dedup_index is not None and settings.ingest_dedup_mode == "skip"
+
+    started = time.perf_counter()
+    cached = await asyncio.to_thread(_current_vectors, index_dir, settings.openai_embedding_model)
+    jobs = job_store.done_jobs()
+    if not jobs:
+        print("⚠️  El job store no tiene documentos terminados: la candidata quedará vacía")
+    print(f"🏗️  Reconstruyendo {len(jobs)} documentos (chunk_size={settings.chunk_size}, "
+          f"overlap={settings.chunk_overlap}, {settings.openai_embedding_model})")
+    print(f"   {len(cached):,} embeddings reutilizables de la generación en servicio")
+
+    db = SimpleInMemoryVectorDB(text_compression=settings.in_memory_text_compression)
+    totals = {"documents": 0, "chunks": 0, "reused": 0, "embedded": 0, "duplicates": 0}
+
+    for job in jobs:
+        document_id = job["document_id"]
+        pages = await asyncio.to_thread(job_store.load_pages, document_id)
+        chunks = chunker.chunk_document(pages=pages, document_id=document_id, metadata=job["metadata"])
+        if dedup_index is not None:
+            totals["duplicates"] += dedup_index.assign(chunks)
+            if skip_duplicates:
+                chunks = [c for c in chunks if not c.get("duplicate_of")]
+        if not chunks:
+            continue
+
+        page_confidences = {p["page_number"]: p["confidence"] for p in pages}
+        vectors: Dict[str, Any] = {}
+        to_embed = []
+        for chunk in chunks:
+            chunk["ocr_confidence"] = page_confidences.get(chunk["page_number"], 0.0)
+            chunk_id = chunk["chunk_id"]
+            canonical = chunk.get("duplicate_of")
+            if chunk_id in cached:
+                vectors[chunk_id] = cached[chunk_id]
+            elif canonical and canonical in cached:
+                vectors[chunk_id] = cached[canonical]
+            elif not canonical:
+                to_embed.append(chunk)
+
+        embeddings = await embedding_service.embed_batch([c["chunk_text"] for c in to_embed])
+        embedded = len(to_embed)
+        for chunk, embedding in zip(to_embed, embeddings):
+            vectors[chunk["chunk_id"]] = embedding
+        # Casi duplicados: el embedding de su canónico (de este documento o de uno anterior)
+        for chunk in chunks:
+            if chunk["chunk_id"] not in vectors:
+                canonical_vector = vectors.get(chunk["duplicate_of"])
+                if canonical_vector is None and dedup_index is not None:
+                    canonical_vector = dedup_index.vector(chunk["duplicate_of"])
+                if canonical_vector is None:
+                    # Canónico expulsado de la caché de vectores: embeber el propio chunk
+                    canonical_vector = await embedding_service.embed_text(chunk["chunk_text"], priority="bulk")
+                    embedded += 1
+                vectors[chunk["chunk_id"]] = canonical_vector
+            if dedup_index is not None and not chunk.get("duplicate_of"):
+                dedup_index.remember_vector(chunk["chunk_id"], vectors[chunk["chunk_id"]])
+
+        await db.upsert_vectors(chunks, np.asarray([vectors[c["chunk_id"]] for c in chunks]))
+        totals["documents"] += 1
+        totals["chunks"] += len(chunks)
+        totals["embedded"] += embedded
+        totals["reused"] += len(chunks) - embedded
+
+    manifest = {
+        "embedding_model": settings.openai_embedding_model,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - started, 1),
+        "source": "job_store",
+        **totals
+    }
+    manifest["name"] = await asyncio.to_thread(stage_generation, db, index_dir, manifest)
+    print(f"   ✓ {manifest['name']}: {totals['chunks']:,} chunks de {totals['documents']} documentos "
+          f"({totals['reused']:,} embeddings reutilizados, {totals['embedded']:,} nuevos)")
+    return manifest
+
+
+def _query_window(text: str, rng: random.Random, words: int = 24) -> str:
+    """Fragmento de un chunk usado como consulta (no el chunk entero)"""
+    tokens = text.split()
+    if len(tokens) <= words:
+        return text
+    start = rng.randrange(len(tokens) - words)
+    return " ".join(tokens[start:start + words])
+
+
+async def validate_generation(
+    index_dir: str,
+    name: str,
+    sample: int = 200,
+    k: int = 10,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Recall@k de la candidata y, si comparten modelo, de la generación en servicio
+
+    Las consultas son fragmentos de chunks de la candidata; un acierto es
+    recuperar un chunk de la misma página (document_id, page_number). Una
+    candidata vacía (sin jobs terminados en el job store) se marca como
+    `empty` sin validar nada más: `passes` la rechaza siempre.
+    """
+    staged = await asyncio.to_thread(open_generation, index_dir, name)
+    current_name = current_generation(index_dir)
+    current = await asyncio.to_thread(open_generation, index_dir, current_name) if current_name else None
+
+    if staged.count == 0:
+        return {
+            "sample": 0,
+            "k": k,
+            "recall": 0.0,
+            "baseline_generation": current_name,
+            "baseline_recall": None,
+            "missing_documents": sorted(current.store.distinct("document_id")) if current else [],
+            "empty": True
+        }
+
+    rng = random.Random(seed)
+    rows = rng.sample(range(staged.count), min(sample, staged.count))
+    queries, expected = [], []
+    for row in rows:
+        queries.append(_query_window(staged.store.text(row) or "", rng))
+        expected.append((staged.store.value(row, "document_id"), staged.store.value(row, "page_number")))
+
+    query_vectors = np.asarray(await get_embedding_service().embed_batch(queries), dtype=np.float32)
+    recall = await asyncio.to_thread(generation_recall, staged, query_vectors, expected, k)
+
+    baseline_recall = None
+    missing_documents: List[str] = []
+    if current is not None:
+        same_model = (
+            read_manifest(Path(index_dir) / current_name).get("embedding_model")
+            == read_manifest(Path(index_dir) / name).get("embedding_model")
+            and current.vectors.shape[1:] == staged.vectors.shape[1:]
+        )
+        if same_model:
+            baseline_recall = await asyncio.to_thread(
+                generation_recall, current, query_vectors, expected, k
+            )
+        missing_documents = sorted(
+            current.store.distinct("document_id") - staged.store.distinct("document_id")
+        )
+
+    return {
+        "sample": len(rows),
+        "k": k,
+        "recall": round(recall, 4),
+        "baseline_generation": current_name,
+        "baseline_recall": round(baseline_recall, 4) if baseline_recall is not None else None,
+        "missing_documents": missing_documents,
+        "empty": False
+    }
+
+
+def passes(validation: Dict[str, Any], min_recall: float, max_recall_drop: float, allow_missing: bool) -> List[str]:
+    """Motivos de rechazo (lista vacía si la candidata es válida)"""
+    if validation["empty"]:
+        # Nunca se activa un índice vacío, ni con --allow-missing
+        return ["candidate has no chunks (no finished jobs in the job store)"]
+    reasons = []
+    if validation["recall"] < min_recall:
+        reasons.append(f"recall@{validation['k']} {validation['recall']:.3f} < {min_recall}")
+    baseline = validation["baseline_recall"]
+    if baseline is not None and validation["recall"] < baseline - max_recall_drop:
+        reasons.append(f"recall drops from {baseline:.3f} to {validation['recall']:.3f}")
+    if validation["missing_documents"] and not allow_missing:
+        reasons.append(f"{len(validation['missing_documents'])} documents missing")
+    return reasons
+
+
+async def main():
+    """CLI de reconstrucción blue/green"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reconstruir el índice en una generación nueva (blue/green)")
+    parser.add_argument("--index-dir", type=str, default=None, help="Directorio de generaciones (INDEX_DIR)")
+    parser.add_argument("--job-store", type=str, default=None, help="Job store con las páginas OCR (INGEST_JOB_STORE_DIR)")
+    parser.add_argument("--sample", type=int, default=200, help="Consultas de la validación de recall")
+    parser.add_argument("--k", type=int, default=10, help="k del recall")
+    parser.add_argument("--min-recall", type=float, default=0.8, help="Recall@k mínimo de la candidata")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02, help="Caída máxima frente a la generación en servicio")
+    parser.add_argument("--allow-missing", action="store_true", help="Aceptar aunque falten documentos del índice en servicio")
+    parser.add_argument("--no-dedup", action="store_true", help="No detectar chunks casi duplicados")
+    parser.add_argument("--activate", action="store_true", help="Activar la candidata si pasa la validación")
+    parser.add_argument("--api-url", type=str, default="http://localhost:8000", help="API writer (o local) que la activa")
+    parser.add_argument("--keep-rejected", action="store_true", help="No borrar la candidata si no pasa la validación")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    index_dir = args.index_dir or settings.index_dir
+    if not index_dir:
+        print("❌ Error: Debes proporcionar --index-dir (o INDEX_DIR)")
+        sys.exit(2)
+
+    job_store = JobStore(args.job_store or settings.ingest_job_store_dir)
+    manifest = await build_generation(job_store, index_dir, dedup=False if args.no_dedup else None)
+    name = manifest.pop("name")
+
+    print(f"🔎 Validando {name} ({args.sample} consultas, recall@{args.k})...")
+    validation = await validate_generation(index_dir, name, args.sample, args.k)
+    reasons = passes(validation, args.min_recall, args.max_recall_drop, args.allow_missing)
+    manifest["validation"] = {**validation, "passed": not reasons}
+    write_manifest(Path(index_dir) / name, manifest)
+
+    baseline = validation["baseline_recall"]
+    print(f"   recall@{args.k}: {validation['recall']:.3f}"
+          + (f" (en servicio: {baseline:.3f})" if baseline is not None else ""))
+    if validation["missing_documents"]:
+        print(f"   ⚠ {len(validation['missing_documents'])} documentos del índice en servicio no están en la candidata")
+
+    if reasons:
+        print(f"❌ Candidata rechazada: {'; '.join(reasons)}")
+        if not args.keep_rejected:
+            shutil.rmtree(Path(index_dir) / name, ignore_errors=True)
+        sys.exit(1)
+    print(f"✅ Candidata válida: {name}")
+
+    if args.activate:
+        async with httpx.AsyncClient(timeout=300.0) as client:
+            response = await client.post(
+                f"{args.api_url}/index/generations/{name}/activate",
+                json={"force": args.allow_missing}
+            )
+        if response.status_code != 200:
+            print(f"❌ Error activando {name}: {response.status_code} {response.text}")
+            sys.exit(1)
+        result = response.json()
+        print(f"🔀 En servicio: {result['generation']} ({result['chunks']:,} chunks); "
+              f"rollback con POST {args.api_url}/index/rollback")
+    else:
+        print(f"   Activar: POST {args.api_url}/index/generations/{name}/activate")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
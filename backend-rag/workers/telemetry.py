@@ -0,0 +1,316 @@
+"""
+Telemetría del pipeline de ingesta
+
+`IngestTelemetry` recoge, por documento y por batch:
+
+- Tiempo, items y bytes de cada etapa (OCR, chunking, embeddings, upload).
+- Muestras periódicas de la profundidad de las colas entre etapas.
+- Picos de memoria (RSS) del proceso y de los procesos hijos (pool de OCR).
+
+Los eventos se escriben como JSON lines (una línea por evento) y, si hay
+`prometheus_client` y un puerto, se exponen también como métricas.
+
+`SamplingProfiler` muestrea periódicamente las pilas de todos los threads
+del proceso y escribe un informe en formato "folded stacks" (una pila por
+línea con su número de muestras), apto para `flamegraph.pl` o speedscope.
+
+Eventos (campo `event`):
+    stage     documento, etapa, segundos, items, bytes, items/s y bytes/s
+    document  resultado de un documento (ok o fallo en una etapa)
+    sample    profundidad de colas y memoria
+    dedup     casi duplicados de un documento y ahorro (tokens, bytes de índice)
+    ocr_route páginas de un documento resueltas por capa de texto o por OCR
+    batch     resumen por etapa al terminar un batch
+"""
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, Optional, TextIO
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> Optional[int]:
+    """RSS actual del proceso (None fuera de Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> Dict[str, int]:
+    """Pico de RSS del proceso y del mayor de sus hijos terminados"""
+    # ru_maxrss: kB en Linux, bytes en macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    }
+
+
+class _PrometheusMetrics:
+    """Métricas de ingesta para Prometheus (solo si está instalado)"""
+
+    def __init__(self, port: int):
+        from prometheus_client import Counter as PromCounter, Gauge, Histogram, start_http_server
+
+        self.stage_seconds = Histogram(
+            "scriptorium_ingest_stage_seconds", "Duración de una etapa por documento", ["stage"]
+        )
+        self.stage_items = PromCounter(
+            "scriptorium_ingest_stage_items", "Items procesados por etapa", ["stage"]
+        )
+        self.stage_bytes = PromCounter(
+            "scriptorium_ingest_stage_bytes", "Bytes procesados por etapa", ["stage"]
+        )
+        self.documents = PromCounter(
+            "scriptorium_ingest_documents", "Documentos terminados", ["status"]
+        )
+        self.queue_depth = Gauge(
+            "scriptorium_ingest_queue_depth", "Documentos esperando en cada cola", ["queue"]
+        )
+        self.rss_bytes = Gauge("scriptorium_ingest_rss_bytes", "RSS actual del worker")
+        self.peak_rss_bytes = Gauge(
+            "scriptorium_ingest_peak_rss_bytes", "Pico de RSS", ["process"]
+        )
+        start_http_server(port)
+
+
+class IngestTelemetry:
+    """Contadores por etapa y eventos JSON lines del pipeline de ingesta"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        prometheus_port: Optional[int] = None,
+        sample_interval: float = 1.0
+    ):
+        """
+        Args:
+            path: Fichero JSON lines (se añade al final); "-" para stdout; None sin salida
+            prometheus_port: Puerto del endpoint de métricas (None = sin Prometheus)
+            sample_interval: Segundos entre muestras de colas y memoria
+        """
+        self.sample_interval = sample_interval
+        self._out: Optional[TextIO] = None
+        if path == "-":
+            self._out = sys.stdout
+        elif path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._out = open(path, "a", encoding="utf-8", buffering=1)
+
+        self._prometheus: Optional[_PrometheusMetrics] = None
+        if prometheus_port:
+            try:
+                self._prometheus = _PrometheusMetrics(prometheus_port)
+                print(f"📈 Métricas Prometheus en :{prometheus_port}/metrics")
+            except ImportError:
+                print("⚠️  prometheus_client no instalado: métricas solo en JSON lines")
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Empezar a acumular un nuevo batch"""
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.queue_max: Dict[str, int] = {}
+        self.rss_max = 0
+        self.documents = Counter()
+        self.dedup_totals = Counter()
+        self.ocr_routing_totals = Counter()
+        self.started = time.perf_counter()
+
+    # ============ EVENTOS ============
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Escribir un evento JSON lines"""
+        if self._out is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False)
+        with self._lock:
+            self._out.write(line + "\n")
+
+    def stage(self, document_id: str, stage: str, seconds: float, items: int, nbytes: int) -> None:
+        """Registrar una etapa completada de un documento"""
+        totals = self.stages.setdefault(stage, {"runs": 0, "seconds": 0.0, "items": 0, "bytes": 0})
+        totals["runs"] += 1
+        totals["seconds"] += seconds
+        totals["items"] += items
+        totals["bytes"] += nbytes
+
+        self.emit(
+            "stage",
+            document_id=document_id,
+            stage=stage,
+            seconds=round(seconds, 4),
+            items=items,
+            bytes=nbytes,
+            items_per_sec=round(items / seconds, 2) if seconds else None,
+            bytes_per_sec=round(nbytes / seconds, 1) if seconds else None
+        )
+        if self._prometheus is not None:
+            self._prometheus.stage_seconds.labels(stage).observe(seconds)
+            self._prometheus.stage_items.labels(stage).inc(items)
+            self._prometheus.stage_bytes.labels(stage).inc(nbytes)
+
+    def document(self, document_id: str, success: bool, stage: Optional[str] = None,
+                 error: Optional[str] = None) -> None:
+        """Registrar el resultado de un documento"""
+        status = "ok" if success else "failed"
+        self.documents[status] += 1
+        self.emit("document", document_id=document_id, status=status, stage=stage, error=error)
+        if self._prometheus is not None:
+            self._prometheus.documents.labels(status).inc()
+
+    def dedup(self, document_id: str, stats: Dict[str, int]) -> None:
+        """Registrar los casi duplicados de un documento"""
+        self.dedup_totals.update(stats)
+        self.emit("dedup", document_id=document_id, **stats)
+
+    def ocr_routing(self, document_id: str, pages: Dict[str, int]) -> None:
+        """Registrar cuántas páginas de un documento evitaron el OCR"""
+        self.ocr_routing_totals.update(pages)
+        self.emit("ocr_route", document_id=document_id, **pages)
+
+    def sample(self, queues: Optional[Dict[str, asyncio.Queue]] = None) -> Dict[str, Any]:
+        """Muestrear profundidad de colas y memoria"""
+        depths = {name: queue.qsize() for name, queue in (queues or {}).items()}
+        for name, depth in depths.items():
+            self.queue_max[name] = max(self.queue_max.get(name, 0), depth)
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.rss_max = max(self.rss_max, rss)
+        peak = peak_rss_bytes()
+
+        self.emit("sample", queues=depths, rss_bytes=rss, peak_rss_bytes=peak)
+        if self._prometheus is not None:
+            for name, depth in depths.items():
+                self._prometheus.queue_depth.labels(name).set(depth)
+            if rss is not None:
+                self._prometheus.rss_bytes.set(rss)
+            for process, value in peak.items():
+                self._prometheus.peak_rss_bytes.labels(process).set(value)
+        return depths
+
+    async def sample_loop(self, queues: Dict[str, asyncio.Queue]) -> None:
+        """Tarea de fondo: muestrear cada `sample_interval` hasta que se cancele"""
+        while True:
+            self.sample(queues)
+            await asyncio.sleep(self.sample_interval)
+
+    # ============ RESUMEN ============
+
+    def summary(self) -> Dict[str, Any]:
+        """Totales por etapa del batch actual"""
+        stages = {}
+        for stage, totals in self.stages.items():
+            seconds = totals["seconds"]
+            stages[stage] = {
+                "runs": totals["runs"],
+                "busy_seconds": round(seconds, 3),
+                "items": totals["items"],
+                "bytes": totals["bytes"],
+                "items_per_sec": round(totals["items"] / seconds, 2) if seconds else 0.0,
+                "bytes_per_sec": round(totals["bytes"] / seconds, 1) if seconds else 0.0
+            }
+        text_layer = self.ocr_routing_totals.get("text_layer", 0)
+        ocr = self.ocr_routing_totals.get("ocr", 0)
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "documents": dict(self.documents),
+            "stages": stages,
+            "queue_max": self.queue_max,
+            "dedup": {
+                key: self.dedup_totals.get(key, 0)
+                for key in ("duplicates", "reused", "skipped", "tokens_saved", "index_bytes_saved")
+            },
+            "ocr_routing": {
+                "text_layer": text_layer,
+                "ocr": ocr,
+                "unknown": self.ocr_routing_totals.get("unknown", 0),
+                # Fracción de páginas (≈ tiempo y coste de OCR) que no pasó por el motor
+                "ocr_saved_ratio": round(text_layer / (text_layer + ocr), 3) if text_layer + ocr else 0.0
+            },
+            "rss_max_bytes": self.rss_max,
+            "peak_rss_bytes": peak_rss_bytes()
+        }
+
+    def finish_batch(self) -> Dict[str, Any]:
+        """Emitir el resumen del batch y devolverlo"""
+        self.sample()
+        summary = self.summary()
+        self.emit("batch", **summary)
+        return summary
+
+    def close(self) -> None:
+        if self._out is not None and self._out is not sys.stdout:
+            self._out.close()
+        self._out = None
+
+
+# ============ PROFILING ============
+
+class SamplingProfiler:
+    """
+    Profiler por muestreo de las pilas de todos los threads
+
+    Un thread de fondo lee `sys._current_frames()` cada `interval` segundos;
+    el coste no depende del número de llamadas (a diferencia de cProfile),
+    así que el perfil refleja el reparto real de tiempo del pipeline. Los
+    procesos del pool de OCR no se muestrean: su tiempo aparece como espera
+    en el thread que los coordina y en la telemetría de la etapa `ocr`.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.total += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_folded(self, path: str) -> None:
+        """Escribir las pilas en formato folded (`pila;...;función N`)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, n: int = 15) -> list:
+        """Funciones con más muestras propias (hoja de la pila)"""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)